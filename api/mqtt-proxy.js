@@ -7,6 +7,9 @@ const log = (...args) => {
   }
 };
 
+// Broker URL can be overridden (e.g. local stand-in broker for replay/load tests)
+const MQTT_BROKER_URL = process.env.MQTT_BROKER_URL || 'ws://89.24.76.191:9001';
+
 // Global MQTT client to maintain connection
 let mqttClient = null;
 let isConnecting = false;
@@ -26,10 +29,10 @@ function connectToMqtt() {
   }
 
   isConnecting = true;
-  log('MQTT Proxy: Attempting to connect to ws://89.24.76.191:9001 (external IP)');
+  log(`MQTT Proxy: Attempting to connect to ${MQTT_BROKER_URL}`);
 
   try {
-    mqttClient = mqtt.connect('ws://89.24.76.191:9001', {
+    mqttClient = mqtt.connect(MQTT_BROKER_URL, {
       clientId: `proxy-${Math.random().toString(16).substring(2, 8)}`,
       clean: false,
       reconnectPeriod: 5000,
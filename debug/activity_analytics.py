@@ -0,0 +1,747 @@
+#!/usr/bin/env python3
+"""
+Analytika historie aktivity brány (Log/Brana/ID) nad sloupcovými poli NumPy
+Monitor zprávy vypíše jako "ACTIVITY LOG" a zapomene - tady se historie
+(záznamy z traffic_recorder.py nebo logy z mqtt-realtime-monitor.py)
+načte do sloupců (čas, druh, kód) a agregáty se počítají vektorově:
+
+- operace a otevření brány po hodinách a dnech (místní čas)
+- aktivita jednotlivých uživatelů (počet, podíl, první/poslední, špička)
+- latence příkaz -> první změna stavu a příkaz -> ustálený stav
+- neobvyklé shluky operací (počet za minutu, který je při obvyklém provozu
+  v danou hodinu nepravděpodobný - Poissonův práh)
+
+Data se zpracovávají po dávkách pevné velikosti, takže paměť nezávisí na
+délce historie. Stav agregátů jde uložit (--state) a při dalším běhu se
+načtou jen novější zprávy - nic se nepřepočítává od začátku.
+
+    python debug/activity_analytics.py recordings/ --state activity.npz
+    python debug/activity_analytics.py monitor.log --log-date 2025-01-31
+"""
+
+import argparse
+import array
+import collections
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from bench_stats import format_summary
+from sim_harness import (ACTIVITY_LOG_TOPIC, COMMAND_STATUS_TOPIC, GARAGE_STATUS_TOPIC,
+                         GATE_COMMAND_TOPIC, GATE_STATUS_TOPIC, SETTLED_STATES)
+from traffic_recorder import read_messages
+
+ACTIVITY, COMMAND, GATE_STATUS, GARAGE_STATUS = range(4)
+TOPIC_KINDS = {ACTIVITY_LOG_TOPIC: ACTIVITY, GATE_COMMAND_TOPIC: COMMAND,
+               GATE_STATUS_TOPIC: GATE_STATUS, GARAGE_STATUS_TOPIC: GARAGE_STATUS}
+STATUS_KINDS = {GATE_STATUS_TOPIC: GATE_STATUS, GARAGE_STATUS_TOPIC: GARAGE_STATUS}
+OPENED_STATES = {"Brána otevřena", "P2"}
+SECOND = 1_000_000_000
+CHUNK_EVENTS = 1 << 20
+MAX_BURSTS = 200
+
+# [HH:MM:SS.mmm] INFO: 📝 ACTIVITY LOG: Log/Brana/ID = ID: Jan (mqtt-realtime-monitor.py)
+MONITOR_LINE = re.compile(r"^\[(\d\d):(\d\d):(\d\d)\.(\d{3})\] \w+: \S+ "
+                          r"(?:ACTIVITY LOG|GATE MESSAGE): (\S+) = (.*)$")
+
+
+def activity_user(payload):
+    """User from a Log/Brana/ID payload - the app sends "ID: <user>", the
+    hardware a bare ID"""
+    text = payload.strip()
+    if text.startswith("ID:"):
+        text = text[3:].strip()
+    return text or "?"
+
+
+def local_hours(ts_ns):
+    """Local hour index (hours since the epoch in local time) per timestamp.
+
+    Offsets are looked up once per distinct UTC hour, so DST changes inside
+    a batch are handled without a Python call per event.
+    """
+    utc_hours = ts_ns // (3600 * SECOND)
+    unique, inverse = np.unique(utc_hours, return_inverse=True)
+    offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in unique],
+                       dtype=np.int64)
+    return ((unique * 3600 + offsets) // 3600)[inverse]
+
+
+def poisson_threshold(rate, p):
+    """Smallest k with P(X >= k) < p for X ~ Poisson(rate)"""
+    k, pmf, tail = 0, math.exp(-rate), 1.0
+    while tail >= p:
+        tail -= pmf
+        k += 1
+        pmf *= rate / k
+    return k
+
+
+def _grown(values, size, fill=0):
+    if len(values) >= size:
+        return values
+    extra = np.full((size - len(values),) + values.shape[1:], fill, dtype=values.dtype)
+    return np.concatenate((values, extra))
+
+
+class LatencyHistogram:
+    """Fixed log-spaced bins (1 ms .. 10 min) plus exact count/min/max/sum"""
+
+    EDGES = np.geomspace(1e-3, 600.0, 121)
+
+    def __init__(self):
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        if not len(seconds):
+            return
+        self.counts += np.bincount(np.searchsorted(self.EDGES, seconds),
+                                   minlength=len(self.counts))
+        self.count += len(seconds)
+        self.total += float(seconds.sum())
+        low, high = float(seconds.min()), float(seconds.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def percentile(self, q):
+        rank = np.searchsorted(np.cumsum(self.counts), self.count * q / 100.0)
+        # Geometrický střed binu, krajní biny oříznuté na min/max
+        low = self.EDGES[rank - 1] if rank > 0 else self.min
+        high = self.EDGES[rank] if rank < len(self.EDGES) else self.max
+        return float(min(max((low * high) ** 0.5, self.min), self.max))
+
+    def summary(self):
+        """Same shape as bench_stats.summarize()"""
+        if not self.count:
+            return {"count": 0, "min": None, "mean": None, "p50": None,
+                    "p95": None, "p99": None, "max": None}
+        return {"count": self.count, "min": self.min, "mean": self.total / self.count,
+                "p50": self.percentile(50), "p95": self.percentile(95),
+                "p99": self.percentile(99), "max": self.max}
+
+    def state(self):
+        return {"counts": self.counts.tolist(), "count": self.count, "total": self.total,
+                "min": self.min, "max": self.max}
+
+    def restore(self, state):
+        self.counts = np.array(state["counts"], dtype=np.int64)
+        self.count, self.total = state["count"], state["total"]
+        self.min, self.max = state["min"], state["max"]
+
+
+class EventBuffer:
+    """Append-only column builder (array.array), handed to numpy per chunk"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ts = array.array("q")
+        self.kind = array.array("b")
+        self.code = array.array("i")
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts_ns, kind, code):
+        self.ts.append(ts_ns)
+        self.kind.append(kind)
+        self.code.append(code)
+
+    def columns(self):
+        return (np.frombuffer(self.ts, dtype=np.int64), np.frombuffer(self.kind, dtype=np.int8),
+                np.frombuffer(self.code, dtype=np.int32))
+
+
+class ActivityAnalytics:
+    """Incremental gate activity aggregates over columnar batches.
+
+    update() takes (ts_ns, kind, code) arrays; codes index `users` for
+    ACTIVITY and `values` for commands and statuses. Everything kept between
+    batches is either bounded (hour-of-day profiles, histograms) or grows
+    with calendar time and user count, never with the number of messages -
+    except burst candidates, i.e. windows with at least `burst_min`
+    operations and their events. Commands still waiting for a status, the
+    last `burst_window` of activity and the events of the last timestamp
+    (more may follow at the same millisecond) are carried into the next
+    batch; finish() folds the held events at the end of the input.
+
+    Burst thresholds depend on the usual rate of the whole history, so
+    bursts are picked from the candidates only in report() - batched and
+    one-shot runs give the same result.
+    """
+
+    def __init__(self, latency_window=60.0, burst_window=60.0, burst_min=5, burst_p=1e-6):
+        self.latency_window = latency_window
+        self.burst_window = burst_window
+        self.burst_min = burst_min
+        self.burst_p = burst_p
+        self.users = []
+        self.values = []
+        self._user_codes = {}
+        self._value_codes = {}
+        self.watermark = None
+        self.events = 0
+        self.skipped = 0
+        self.base_hour = None
+        self.operations = np.zeros(0, dtype=np.int64)
+        self.opened = np.zeros(0, dtype=np.int64)
+        self.user_counts = np.zeros(0, dtype=np.int64)
+        self.user_hours = np.zeros((0, 24), dtype=np.int64)
+        self.user_first = np.zeros(0, dtype=np.int64)
+        self.user_last = np.zeros(0, dtype=np.int64)
+        self.reaction = LatencyHistogram()
+        self.settle = LatencyHistogram()
+        self.commands = 0
+        self.unanswered = 0
+        self._last_status = {GATE_STATUS: -1, GARAGE_STATUS: -1}
+        self._pending = {"ts": np.zeros(0, np.int64), "kind": np.zeros(0, np.int8),
+                         "reacted": np.zeros(0, bool)}
+        self._tail = {"ts": np.zeros(0, np.int64), "user": np.zeros(0, np.int32),
+                      "stored": np.zeros(0, bool)}
+        self._candidates = {"ts": np.zeros(0, np.int64), "count": np.zeros(0, np.int64)}
+        self._burst_events = {"ts": np.zeros(0, np.int64), "user": np.zeros(0, np.int32)}
+        self._held = {"ts": np.zeros(0, np.int64), "kind": np.zeros(0, np.int8),
+                      "code": np.zeros(0, np.int32)}
+        # Zadržené události z uloženého stavu - zdroj čtený znovu od vodoznaku je vrátí
+        self._replay = None
+
+    # --- interning ---------------------------------------------------------
+
+    def user_code(self, name):
+        code = self._user_codes.get(name)
+        if code is None:
+            code = self._user_codes[name] = len(self.users)
+            self.users.append(name)
+        return code
+
+    def value_code(self, name):
+        code = self._value_codes.get(name)
+        if code is None:
+            code = self._value_codes[name] = len(self.values)
+            self.values.append(name)
+        return code
+
+    def _value_mask(self, codes, names):
+        wanted = np.array([self._value_codes[n] for n in names if n in self._value_codes],
+                          dtype=np.int32)
+        return np.isin(codes, wanted)
+
+    # --- batches -----------------------------------------------------------
+
+    def update(self, ts, kind, code):
+        """Accept one batch; events up to `watermark` are skipped (and counted
+        in `skipped`). Returns the number of accepted events."""
+        if self.watermark is not None:
+            fresh = ts > self.watermark
+            self.skipped += int(len(ts) - fresh.sum())
+            ts, kind, code = ts[fresh], kind[fresh], code[fresh]
+        if self._replay is not None:
+            ts, kind, code = self._drop_replayed(ts, kind, code)
+        accepted = len(ts)
+        held = self._held
+        ts = np.concatenate((held["ts"], ts))
+        kind = np.concatenate((held["kind"], kind))
+        code = np.concatenate((held["code"], code))
+        if not len(ts):
+            return 0
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts, kind, code = ts[order], kind[order], code[order]
+        # Poslední čas se drží do další dávky - ta může přinést další události
+        # ze stejné milisekundy a vodoznak je pak nesmí zahodit
+        last = ts == ts[-1]
+        self._held = {"ts": ts[last], "kind": kind[last], "code": code[last]}
+        if not last.all():
+            self._fold(ts[~last], kind[~last], code[~last])
+        return accepted
+
+    def finish(self):
+        """Fold the held events of the last timestamp (end of the input)"""
+        held = self._held
+        self._held = {"ts": held["ts"][:0], "kind": held["kind"][:0], "code": held["code"][:0]}
+        self._replay = None
+        if len(held["ts"]):
+            self._fold(held["ts"], held["kind"], held["code"])
+
+    def _drop_replayed(self, ts, kind, code):
+        """Skip the held events of a saved state when a source returns them again"""
+        held_ts = int(self._held["ts"][0])
+        keep = np.ones(len(ts), bool)
+        for index in np.flatnonzero(ts == held_ts):
+            key = (int(kind[index]), int(code[index]))
+            if self._replay.get(key):
+                self._replay[key] -= 1
+                keep[index] = False
+        if np.any(ts > held_ts):
+            self._replay = None
+        return ts[keep], kind[keep], code[keep]
+
+    def _fold(self, ts, kind, code):
+        """Fold sorted events into the aggregates, `watermark` moves to the last one"""
+        end = int(ts[-1])
+        self.events += len(ts)
+
+        activity = kind == ACTIVITY
+        self._update_users(ts[activity], code[activity])
+        transitions = {status: self._transitions(status, ts[kind == status], code[kind == status])
+                       for status in (GATE_STATUS, GARAGE_STATUS)}
+        opened_ts = transitions[GATE_STATUS][0][
+            self._value_mask(transitions[GATE_STATUS][1], OPENED_STATES)]
+        self._update_hourly(ts[activity], opened_ts)
+        self._update_latency(ts[kind == COMMAND], code[kind == COMMAND], transitions, end)
+        self._update_bursts(ts[activity], code[activity], end)
+        self.watermark = end
+
+    def _transitions(self, status, ts, codes):
+        """Status messages that changed the value (heartbeats repeat it)"""
+        if not len(ts):
+            return ts, codes
+        changed = codes != np.concatenate(([self._last_status[status]], codes[:-1]))
+        self._last_status[status] = int(codes[-1])
+        return ts[changed], codes[changed]
+
+    def _update_users(self, ts, codes):
+        if not len(ts):
+            return
+        size = len(self.users)
+        self.user_counts = _grown(self.user_counts, size)
+        self.user_hours = _grown(self.user_hours, size)
+        self.user_first = _grown(self.user_first, size, np.iinfo(np.int64).max)
+        self.user_last = _grown(self.user_last, size)
+        self.user_counts += np.bincount(codes, minlength=size)
+        hour_of_day = local_hours(ts) % 24
+        self.user_hours += np.bincount(codes * 24 + hour_of_day,
+                                       minlength=size * 24).reshape(size, 24)
+        # ts je seřazené - první výskyt = první čas, poslední výskyt odzadu
+        unique, first = np.unique(codes, return_index=True)
+        self.user_first[unique] = np.minimum(self.user_first[unique], ts[first])
+        unique, last = np.unique(codes[::-1], return_index=True)
+        self.user_last[unique] = np.maximum(self.user_last[unique], ts[::-1][last])
+
+    def _update_hourly(self, activity_ts, opened_ts):
+        for name, stamps in (("operations", activity_ts), ("opened", opened_ts)):
+            if not len(stamps):
+                continue
+            hours = local_hours(stamps)
+            if self.base_hour is None:
+                # Celé dny - po dnech se pak jen přeskládá tvar pole
+                self.base_hour = int(hours[0]) - int(hours[0]) % 24
+            if hours[0] < self.base_hour:
+                shift = self.base_hour - (int(hours[0]) - int(hours[0]) % 24)
+                self.operations = np.concatenate((np.zeros(shift, np.int64), self.operations))
+                self.opened = np.concatenate((np.zeros(shift, np.int64), self.opened))
+                self.base_hour -= shift
+            offsets = hours - self.base_hour
+            counts = np.bincount(offsets)
+            size = -(-len(counts) // 24) * 24
+            self.operations = _grown(self.operations, size)
+            self.opened = _grown(self.opened, size)
+            target = getattr(self, name)
+            target[:len(counts)] += counts
+
+    def _update_latency(self, command_ts, command_codes, transitions, end):
+        window = int(self.latency_window * SECOND)
+        kinds = np.full(len(command_ts), -1, dtype=np.int8)
+        for command, topic in COMMAND_STATUS_TOPIC.items():
+            kinds[self._value_mask(command_codes, [command])] = STATUS_KINDS[topic]
+        known = kinds >= 0
+        self.commands += int(known.sum())
+        pending = self._pending
+        ts = np.concatenate((pending["ts"], command_ts[known]))
+        kinds = np.concatenate((pending["kind"], kinds[known]))
+        reacted = np.concatenate((pending["reacted"], np.zeros(int(known.sum()), bool)))
+        carry = np.zeros(len(ts), bool)
+        for status in (GATE_STATUS, GARAGE_STATUS):
+            mine = kinds == status
+            if not mine.any():
+                continue
+            status_ts, status_codes = transitions[status]
+            settled_ts = status_ts[self._value_mask(status_codes, SETTLED_STATES)]
+            react = self._first_after(ts[mine], status_ts, window)
+            settle = self._first_after(ts[mine], settled_ts, window)
+            new_reaction = ~reacted[mine] & (react >= 0)
+            self.reaction.add(react[new_reaction] / SECOND)
+            self.settle.add(settle[settle >= 0] / SECOND)
+            reacted_mine = reacted[mine] | (react >= 0)
+            # Okno ještě neskončilo - rozhodne až další dávka
+            waiting = (settle < 0) & (ts[mine] + window > end)
+            self.unanswered += int(((settle < 0) & ~waiting & ~reacted_mine).sum())
+            reacted[mine] = reacted_mine
+            carry[np.flatnonzero(mine)[waiting]] = True
+        self._pending = {"ts": ts[carry], "kind": kinds[carry], "reacted": reacted[carry]}
+
+    @staticmethod
+    def _first_after(command_ts, event_ts, window):
+        """Delay to the first event after each command within `window`, -1 if none"""
+        index = np.searchsorted(event_ts, command_ts, side="right")
+        found = index < len(event_ts)
+        delay = np.full(len(command_ts), -1, dtype=np.int64)
+        delay[found] = event_ts[index[found]] - command_ts[found]
+        delay[delay > window] = -1
+        return delay
+
+    def _update_bursts(self, ts, users, end):
+        """Keep windows with at least `burst_min` operations and their events -
+        whether they are bursts is decided in bursts()"""
+        window = int(self.burst_window * SECOND)
+        tail = self._tail
+        ts = np.concatenate((tail["ts"], ts))
+        users = np.concatenate((tail["user"], users))
+        stored = np.concatenate((tail["stored"], np.zeros(len(ts) - len(tail["ts"]), bool)))
+        # Okna, která přesahují konec dávky, se vyhodnotí až s další dávkou
+        complete = ts + window <= end
+        counts = np.searchsorted(ts, ts + window, side="left") - np.arange(len(ts))
+        starts = np.flatnonzero(complete & (counts >= self.burst_min))
+        if len(starts):
+            # Události uvnitř kandidátních oken (rozdílové pole přes intervaly)
+            edges = np.zeros(len(ts) + 1, dtype=np.int64)
+            np.add.at(edges, starts, 1)
+            np.add.at(edges, starts + counts[starts], -1)
+            inside = np.cumsum(edges[:-1]) > 0
+            new = inside & ~stored
+            self._burst_events = {
+                "ts": np.concatenate((self._burst_events["ts"], ts[new])),
+                "user": np.concatenate((self._burst_events["user"], users[new]))}
+            stored |= inside
+            self._candidates = {
+                "ts": np.concatenate((self._candidates["ts"], ts[starts])),
+                "count": np.concatenate((self._candidates["count"], counts[starts]))}
+        self._tail = {"ts": ts[~complete], "user": users[~complete], "stored": stored[~complete]}
+
+    def _thresholds(self):
+        """Operations per burst window that the usual rate of each hour of day
+        reaches with probability below `burst_p` - 24 values, not per event"""
+        if not len(self.operations):
+            return np.zeros(24, dtype=np.int64)
+        days = max(1, len(self.operations) // 24)
+        rates = self.operations.reshape(-1, 24).sum(axis=0) / days * self.burst_window / 3600.0
+        return np.array([poisson_threshold(rate, self.burst_p) for rate in rates])
+
+    def bursts(self):
+        """Abnormal bursts (last MAX_BURSTS) against the thresholds of the whole history"""
+        candidates = self._candidates
+        if not len(candidates["ts"]):
+            return []
+        window = int(self.burst_window * SECOND)
+        threshold = np.maximum(self.burst_min,
+                               self._thresholds()[local_hours(candidates["ts"]) % 24])
+        over = candidates["count"] >= threshold
+        starts = candidates["ts"][over]
+        if not len(starts):
+            return []
+        order = np.argsort(self._burst_events["ts"], kind="stable")
+        ts, users = self._burst_events["ts"][order], self._burst_events["user"][order]
+        order = np.argsort(starts, kind="stable")
+        starts = starts[order]
+        ends = ts[np.searchsorted(ts, starts + window, side="left") - 1]
+        # Překrývající se okna -> jedna epizoda
+        running_end = np.maximum.accumulate(ends)
+        new_episode = np.concatenate(([True], starts[1:] > running_end[:-1]))
+        first = np.flatnonzero(new_episode)
+        last = np.concatenate((first[1:], [len(starts)])) - 1
+        bursts = []
+        for a, b in zip(first[-MAX_BURSTS:], last[-MAX_BURSTS:]):
+            begin, finish = int(starts[a]), int(running_end[b])
+            low = int(np.searchsorted(ts, begin, side="left"))
+            high = int(np.searchsorted(ts, finish, side="right"))
+            counts = np.bincount(users[low:high])
+            top = int(counts.argmax())
+            bursts.append({"start": begin, "end": finish, "events": high - low,
+                           "top_user": self.users[top], "top_share": counts[top] / (high - low)})
+        return bursts
+
+    # --- výsledky ----------------------------------------------------------
+
+    def report(self, top=10):
+        """Aggregates as plain Python data (JSON friendly)"""
+        days = {}
+        if self.base_hour is not None:
+            per_day = self.operations.reshape(-1, 24).sum(axis=1)
+            opened = self.opened.reshape(-1, 24).sum(axis=1)
+            first_day = self.base_hour // 24
+            for offset in np.flatnonzero(per_day | opened):
+                day = date.fromordinal(date(1970, 1, 1).toordinal() + first_day + int(offset))
+                days[day.isoformat()] = {"operations": int(per_day[offset]),
+                                         "opened": int(opened[offset])}
+        hour_profile = (self.operations.reshape(-1, 24).sum(axis=0).tolist()
+                        if len(self.operations) else [0] * 24)
+        busiest = []
+        if len(self.operations):
+            for offset in np.argsort(self.operations)[::-1][:5]:
+                if self.operations[offset]:
+                    hour = (self.base_hour + int(offset)) * 3600
+                    # Index je v místních hodinách - UTC formát vypíše místní čas
+                    busiest.append({"hour": datetime.fromtimestamp(hour, timezone.utc)
+                                    .strftime("%Y-%m-%d %H:00"),
+                                    "operations": int(self.operations[offset])})
+        total = int(self.user_counts.sum())
+        users = []
+        for code in np.argsort(self.user_counts)[::-1][:top]:
+            if not self.user_counts[code]:
+                break
+            users.append({"user": self.users[code], "operations": int(self.user_counts[code]),
+                          "share": self.user_counts[code] / total,
+                          "first": int(self.user_first[code]) / SECOND,
+                          "last": int(self.user_last[code]) / SECOND,
+                          "peak_hour": int(self.user_hours[code].argmax())})
+        return {
+            "events": self.events,
+            "skipped": self.skipped,
+            "operations": total,
+            "users_total": int((self.user_counts > 0).sum()),
+            "watermark": self.watermark / SECOND if self.watermark is not None else None,
+            "days": days,
+            "hour_profile": hour_profile,
+            "busiest_hours": busiest,
+            "users": users,
+            "commands": self.commands,
+            "unanswered": self.unanswered,
+            "reaction": self.reaction.summary(),
+            "settle": self.settle.summary(),
+            "bursts": [dict(b, start=b["start"] / SECOND, end=b["end"] / SECOND)
+                       for b in self.bursts()],
+        }
+
+    # --- uložení stavu -----------------------------------------------------
+
+    def save(self, path):
+        meta = {"users": self.users, "values": self.values, "watermark": self.watermark,
+                "events": self.events, "skipped": self.skipped, "base_hour": self.base_hour,
+                "commands": self.commands, "unanswered": self.unanswered,
+                "last_status": self._last_status,
+                "reaction": self.reaction.state(), "settle": self.settle.state(),
+                "settings": [self.latency_window, self.burst_window, self.burst_min,
+                             self.burst_p]}
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            np.savez_compressed(
+                f, meta=np.array(json.dumps(meta, default=float)),
+                operations=self.operations, opened=self.opened, user_counts=self.user_counts,
+                user_hours=self.user_hours, user_first=self.user_first,
+                user_last=self.user_last, pending_ts=self._pending["ts"],
+                pending_kind=self._pending["kind"], pending_reacted=self._pending["reacted"],
+                tail_ts=self._tail["ts"], tail_user=self._tail["user"],
+                tail_stored=self._tail["stored"], candidate_ts=self._candidates["ts"],
+                candidate_count=self._candidates["count"], burst_ts=self._burst_events["ts"],
+                burst_user=self._burst_events["user"], held_ts=self._held["ts"],
+                held_kind=self._held["kind"], held_code=self._held["code"])
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            analytics = cls(*meta["settings"])
+            for name in ("operations", "opened", "user_counts", "user_hours", "user_first",
+                         "user_last"):
+                setattr(analytics, name, data[name])
+            analytics._pending = {"ts": data["pending_ts"], "kind": data["pending_kind"],
+                                  "reacted": data["pending_reacted"]}
+            analytics._tail = {"ts": data["tail_ts"], "user": data["tail_user"],
+                               "stored": data["tail_stored"]}
+            analytics._candidates = {"ts": data["candidate_ts"], "count": data["candidate_count"]}
+            analytics._burst_events = {"ts": data["burst_ts"], "user": data["burst_user"]}
+            analytics._held = {"ts": data["held_ts"], "kind": data["held_kind"],
+                               "code": data["held_code"]}
+        if len(analytics._held["ts"]):
+            analytics._replay = collections.Counter(
+                zip(analytics._held["kind"].tolist(), analytics._held["code"].tolist()))
+        for name in meta["users"]:
+            analytics.user_code(name)
+        for name in meta["values"]:
+            analytics.value_code(name)
+        analytics.watermark = meta["watermark"]
+        analytics.events = meta["events"]
+        analytics.skipped = meta.get("skipped", 0)
+        analytics.base_hour = meta["base_hour"]
+        analytics.commands = meta["commands"]
+        analytics.unanswered = meta["unanswered"]
+        analytics._last_status = {int(k): v for k, v in meta["last_status"].items()}
+        analytics.reaction.restore(meta["reaction"])
+        analytics.settle.restore(meta["settle"])
+        return analytics
+
+
+# --- zdroje ----------------------------------------------------------------
+
+class Ingest:
+    """Feeds decoded messages into an EventBuffer and flushes full chunks"""
+
+    def __init__(self, analytics, chunk_events=CHUNK_EVENTS):
+        self.analytics = analytics
+        self.chunk_events = chunk_events
+        self.buffer = EventBuffer()
+        self.messages = 0
+
+    def message(self, ts_ns, topic, payload):
+        kind = TOPIC_KINDS.get(topic)
+        if kind is None:
+            return
+        text = payload.strip()
+        if kind == ACTIVITY:
+            code = self.analytics.user_code(activity_user(text))
+        else:
+            code = self.analytics.value_code(text)
+        self.buffer.append(ts_ns, kind, code)
+        self.messages += 1
+        if len(self.buffer) >= self.chunk_events:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer):
+            self.analytics.update(*self.buffer.columns())
+            self.buffer.clear()
+
+    def recording(self, directory):
+        """Recorded traffic (traffic_recorder.py) newer than the watermark"""
+        since = self.analytics.watermark + 1 if self.analytics.watermark is not None else None
+        for message in read_messages(directory, since_ns=since):
+            # Retained kopie při přihlášení nejsou nové události
+            if not message.retain and message.topic in TOPIC_KINDS:
+                self.message(message.received_ns, message.topic,
+                             bytes(message.payload).decode("utf-8", errors="replace"))
+
+    @staticmethod
+    def _monitor_lines(path):
+        """(day offset, seconds of day, topic, payload) per message line - the
+        offset grows by one at every midnight rollover"""
+        day, previous = 0, None
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                match = MONITOR_LINE.match(line.rstrip("\n"))
+                if not match:
+                    continue
+                hours, minutes, seconds, millis, topic, payload = match.groups()
+                of_day = int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+                if previous is not None and of_day < previous - 3600:
+                    day += 1
+                previous = of_day
+                yield day, of_day, topic, payload
+
+    def monitor_log(self, path, log_date=None):
+        """mqtt-realtime-monitor.py output; lines carry only the time of day, so
+        the date of the first line comes from `log_date` and rolls over at
+        midnight. Without it the file's mtime dates the last line and the
+        start date is worked back from the rollovers."""
+        if log_date is None:
+            rollovers = 0
+            for rollovers, _, _, _ in self._monitor_lines(path):
+                pass
+            log_date = date.fromordinal(date.fromtimestamp(os.path.getmtime(path)).toordinal()
+                                        - rollovers)
+        first_day = log_date.toordinal()
+        midnights = {}
+        for day, of_day, topic, payload in self._monitor_lines(path):
+            midnight = midnights.get(day)
+            if midnight is None:
+                # mktime pro každý den zvlášť - půlnoc po změně času není +86400
+                midnight = midnights[day] = time.mktime(
+                    date.fromordinal(first_day + day).timetuple())
+            self.message(int((midnight + of_day) * SECOND), topic, payload)
+
+
+def print_activity_report(report, log=print):
+    """Lidsky čitelný výpis agregátů"""
+    stamp = lambda seconds: datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M")
+    log(f"📊 {report['events']} events, {report['operations']} gate operations "
+        f"by {report['users_total']} users")
+    if report["skipped"]:
+        log(f"⏭️  {report['skipped']} events skipped - not newer than the data already "
+            "aggregated (out-of-order source or an older log fed after a newer one)")
+    if report["watermark"] is not None:
+        log(f"⏱️  Data up to {stamp(report['watermark'])}")
+    if report["days"]:
+        days = list(report["days"].items())
+        log(f"\n📅 Per day ({len(days)} days with activity, last 14 shown):")
+        for day, counts in days[-14:]:
+            log(f"  {day}  {counts['operations']:>5} operations  {counts['opened']:>4} opened")
+        peak = max(report["hour_profile"]) or 1
+        log("\n🕐 Operations by hour of day:")
+        for hour, count in enumerate(report["hour_profile"]):
+            log(f"  {hour:02d}:00 {'█' * round(30 * count / peak):<30} {count}")
+    if report["busiest_hours"]:
+        log("\n🔥 Busiest hours: " + ", ".join(f"{h['hour']} ({h['operations']})"
+                                             for h in report["busiest_hours"]))
+    if report["users"]:
+        log("\n👤 Users:")
+        for user in report["users"]:
+            log(f"  {user['user'][:24]:<24} {user['operations']:>6} ({user['share']:5.1%})  "
+                f"peak {user['peak_hour']:02d}:00  last {stamp(user['last'])}")
+    log(f"\n🚦 Commands: {report['commands']}, without any status change: {report['unanswered']}")
+    log(f"  ⚡ command -> first status: {format_summary(report['reaction'])}")
+    log(f"  🏁 command -> settled:      {format_summary(report['settle'])}")
+    if report["bursts"]:
+        log(f"\n🚨 {len(report['bursts'])} abnormal bursts (last 10):")
+        for burst in report["bursts"][-10:]:
+            log(f"  {stamp(burst['start'])}  {burst['events']} operations in "
+                f"{burst['end'] - burst['start']:.0f}s, {burst['top_share']:.0%} by "
+                f"{burst['top_user']}")
+    else:
+        log("\n✅ No abnormal bursts")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gate activity analytics (Log/Brana/ID history)")
+    parser.add_argument("sources", nargs="*",
+                        help="recording directories (traffic_recorder.py) or monitor log files")
+    parser.add_argument("--state", help="aggregate state file (.npz) - loaded, updated, saved")
+    parser.add_argument("--log-date", type=date.fromisoformat,
+                        help="date of the first line in monitor logs (default: file mtime minus "
+                             "the midnight rollovers in the log)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_EVENTS, help="events per batch")
+    parser.add_argument("--latency-window", type=float, default=60.0,
+                        help="max command -> status delay counted [s]")
+    parser.add_argument("--burst-window", type=float, default=60.0)
+    parser.add_argument("--burst-min", type=int, default=5,
+                        help="min operations in a burst window")
+    parser.add_argument("--burst-p", type=float, default=1e-6,
+                        help="burst = a count this unlikely at the usual rate for that hour "
+                             "(Poisson)")
+    parser.add_argument("--top", type=int, default=10, help="users listed")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.state and os.path.exists(args.state):
+        analytics = ActivityAnalytics.load(args.state)
+        print(f"📂 Loaded {args.state} ({analytics.events} events so far)")
+    else:
+        analytics = ActivityAnalytics(args.latency_window, args.burst_window, args.burst_min,
+                                      args.burst_p)
+    if not args.sources and not analytics.events:
+        parser.error("no sources and no saved state")
+    ingest = Ingest(analytics, args.chunk)
+    started = time.perf_counter()
+    for source in args.sources:
+        if os.path.isdir(source):
+            ingest.recording(source)
+        else:
+            ingest.monitor_log(source, args.log_date)
+        ingest.flush()
+    if args.sources:
+        print(f"📥 Ingested {ingest.messages} messages in {time.perf_counter() - started:.2f}s")
+    if args.state:
+        # Uloží se i zadržené události posledního času - další běh na ně může navázat
+        analytics.save(args.state)
+    analytics.finish()
+    report = analytics.report(args.top)
+    print_activity_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Minimální asyncio HTTP/1.1 klient pro diagnostické scripty
+Bez externích závislostí - umožňuje souběžné testy, streamování těla
+a měření fází připojení (DNS, TCP, TLS, první byte)
+"""
+
+import asyncio
+import socket
+import ssl
+import time
+from urllib.parse import urlsplit
+
+
+class HttpError(Exception):
+    """Protocol level failure (bad status line, truncated body, ...)"""
+
+
+def insecure_ssl_context():
+    """SSL context that ignores certificates - same as verify=False in requests"""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class SessionContext(ssl.SSLContext):
+    """Insecure client context that offers `session` on the next handshake.
+
+    asyncio's start_tls() has no session argument, wrap_bio() is the only
+    place to hand a saved session to OpenSSL. The session must come from a
+    connection made with this same context.
+    """
+
+    session = None
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None,
+                 session=None):
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname,
+                                session=session or self.session)
+
+
+def session_ssl_context():
+    """SessionContext with the same relaxed checks as insecure_ssl_context()"""
+    context = SessionContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def split_url(url):
+    """Return (scheme, host, port, path) for an http(s) URL"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported URL scheme: {url}")
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return scheme, parts.hostname, port, path
+
+
+class HttpResponse:
+    """Response head plus an incremental body reader"""
+
+    def __init__(self, connection, status, reason, headers, timings):
+        self.connection = connection
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.timings = timings
+        self.bytes_read = 0
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        length = headers.get("content-length")
+        self._remaining = int(length) if length is not None and not self._chunked else None
+        self._chunk_left = 0
+        self._eof = status in (204, 304) or self._remaining == 0
+
+    @property
+    def eof(self):
+        return self._eof
+
+    async def read_some(self, max_bytes=65536):
+        """Read up to max_bytes of decoded body, b'' at the end of the body"""
+        if self._eof:
+            return b""
+        reader = self.connection.reader
+        if self._chunked:
+            if self._chunk_left == 0:
+                size_line = await reader.readline()
+                if not size_line:
+                    raise HttpError("Connection closed inside chunked body")
+                self._chunk_left = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if self._chunk_left == 0:
+                    # Trailer headers end with an empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    self._eof = True
+                    return b""
+            data = await reader.read(min(max_bytes, self._chunk_left))
+            if not data:
+                raise HttpError("Connection closed inside chunk")
+            self._chunk_left -= len(data)
+            if self._chunk_left == 0:
+                await reader.readexactly(2)
+        elif self._remaining is not None:
+            data = await reader.read(min(max_bytes, self._remaining))
+            if not data:
+                raise HttpError(f"Body truncated, {self._remaining} bytes missing")
+            self._remaining -= len(data)
+            if self._remaining == 0:
+                self._eof = True
+        else:
+            data = await reader.read(max_bytes)
+            if not data:
+                self._eof = True
+                self.connection.reusable = False
+        self.bytes_read += len(data)
+        return data
+
+    async def read(self, limit=None):
+        """Read the whole body (or the first `limit` bytes) into memory"""
+        parts = []
+        total = 0
+        while not self._eof and (limit is None or total < limit):
+            want = 65536 if limit is None else min(65536, limit - total)
+            data = await self.read_some(want)
+            if not data:
+                break
+            parts.append(data)
+            total += len(data)
+        return b"".join(parts)
+
+    async def release(self):
+        """Finish the exchange - keep the connection if the body was fully read"""
+        if not self._eof or self.headers.get("connection", "").lower() == "close":
+            self.connection.reusable = False
+        if not self.connection.reusable:
+            await self.connection.close()
+
+
+class HttpConnection:
+    """Single HTTP/1.1 connection with per-phase timing"""
+
+    def __init__(self, scheme, host, port, ssl_context=None, timeout=5.0):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context or (insecure_ssl_context() if scheme == "https" else None)
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.reusable = False
+        self.requests_sent = 0
+        self.connect_timings = {}
+
+    @property
+    def key(self):
+        return (self.scheme, self.host, self.port)
+
+    async def connect(self):
+        """Resolve, open TCP and (for https) run the TLS handshake, timing each step"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        infos = await asyncio.wait_for(
+            loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM), self.timeout)
+        resolved = time.perf_counter()
+        address = infos[0][4][0]
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(address, self.port), self.timeout)
+        connected = time.perf_counter()
+        handshaked = connected
+        resumed = None
+        if self.scheme == "https":
+            await asyncio.wait_for(
+                self.writer.start_tls(self.ssl_context, server_hostname=self.host), self.timeout)
+            handshaked = time.perf_counter()
+            resumed = self.writer.get_extra_info("ssl_object").session_reused
+        self.connect_timings = {
+            "dns": resolved - started,
+            "connect": connected - resolved,
+            "tls": handshaked - connected,
+            "tls_resumed": resumed,
+            "address": address,
+        }
+        self.reusable = True
+        return self.connect_timings
+
+    @property
+    def tls_session(self):
+        """TLS session to offer on the next connection (TLS 1.3 tickets arrive
+        only after the handshake, so read it once a response came back)"""
+        if self.writer is None:
+            return None
+        ssl_object = self.writer.get_extra_info("ssl_object")
+        return ssl_object.session if ssl_object is not None else None
+
+    async def request(self, method, path, headers=None, body=None):
+        """Send one request and return the HttpResponse once headers arrived"""
+        if self.writer is None:
+            await self.connect()
+            timings = dict(self.connect_timings, reused=False)
+        else:
+            timings = {"dns": 0.0, "connect": 0.0, "tls": 0.0, "reused": True}
+        host_header = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host_header}",
+                 "User-Agent: brana-debug/1.0", "Accept: */*"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        sent = time.perf_counter()
+        self.writer.write(head + body if body else head)
+        await self.writer.drain()
+        self.requests_sent += 1
+
+        status_line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        timings["ttfb"] = time.perf_counter() - sent
+        if not status_line:
+            self.reusable = False
+            raise HttpError("Connection closed before status line")
+        try:
+            version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+            status = int(status)
+        except ValueError:
+            self.reusable = False
+            raise HttpError(f"Malformed status line: {status_line[:80]!r}")
+        response_headers = {}
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        timings["headers"] = time.perf_counter() - sent
+        # Bez čekání ve frontě semaforu - jen síť a server
+        timings["total"] = timings["dns"] + timings["connect"] + timings["tls"] + timings["headers"]
+        if version == "HTTP/1.0":
+            self.reusable = response_headers.get("connection", "").lower() == "keep-alive"
+        return HttpResponse(self, status, reason, response_headers, timings)
+
+    async def close(self):
+        self.reusable = False
+        if self.writer is not None:
+            writer, self.writer, self.reader = self.writer, None, None
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), 1.0)
+            except (OSError, asyncio.TimeoutError, ssl.SSLError):
+                pass
+
+
+class HttpClient:
+    """Keep-alive pool with a global and a per-host concurrency limit"""
+
+    def __init__(self, concurrency=20, per_host=4, timeout=5.0, keep_alive=True):
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._global = asyncio.Semaphore(concurrency)
+        self._per_host_limit = per_host
+        self._per_host = {}
+        self._idle = {}
+        self._ssl_context = insecure_ssl_context()
+
+    def _host_semaphore(self, key):
+        if key not in self._per_host:
+            self._per_host[key] = asyncio.Semaphore(self._per_host_limit)
+        return self._per_host[key]
+
+    def _checkout(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            connection = idle.pop()
+            if connection.reusable and not connection.reader.at_eof():
+                return connection
+        scheme, host, port = key
+        return HttpConnection(scheme, host, port, self._ssl_context, self.timeout)
+
+    def _checkin(self, connection):
+        if self.keep_alive and connection.reusable:
+            self._idle.setdefault(connection.key, []).append(connection)
+
+    async def fetch(self, method, url, headers=None, body=None, read_limit=None,
+                    on_response=None):
+        """Run one request under the concurrency limits.
+
+        Returns (response, body) - `body` holds at most `read_limit` bytes, or
+        whatever `on_response(response)` returned when a callback is given.
+        """
+        scheme, host, port, path = split_url(url)
+        key = (scheme, host, port)
+        async with self._global, self._host_semaphore(key):
+            connection = self._checkout(key)
+            try:
+                response = await connection.request(method, path, headers, body)
+                if on_response is not None:
+                    result = await on_response(response)
+                else:
+                    result = await asyncio.wait_for(response.read(read_limit), self.timeout)
+                await response.release()
+            except BaseException:
+                await connection.close()
+                raise
+            self._checkin(connection)
+            return response, result
+
+    async def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                await connection.close()
+        self._idle.clear()
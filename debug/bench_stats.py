@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Sdílené statistiky pro diagnostické a benchmark scripty
+Percentily, souhrny latencí a histogram s pevnou pamětí
+"""
+
+import bisect
+import math
+
+
+def percentile(sorted_values, q):
+    """Percentile (0-100) from an already sorted list, linear interpolation"""
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * (q / 100.0)
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(samples):
+    """Count/min/mean/p50/p95/p99/max summary of a list of numbers"""
+    values = sorted(samples)
+    if not values:
+        return {"count": 0, "min": None, "mean": None, "p50": None,
+                "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "min": values[0],
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def format_summary(summary, unit="s", scale=1.0):
+    """One-line human readable form of summarize() output"""
+    if not summary or not summary.get("count"):
+        return "no samples"
+    fmt = lambda v: f"{v * scale:.3f}{unit}"
+    return (f"n={summary['count']} p50={fmt(summary['p50'])} "
+            f"p95={fmt(summary['p95'])} p99={fmt(summary['p99'])} "
+            f"max={fmt(summary['max'])}")
+
+
+def render_buckets(rows, unit="ms", scale=1000.0, width=30):
+    """Text bars for Histogram.buckets() output (also after a JSON round trip)"""
+    peak = max((count for _, count in rows), default=0)
+    lines = []
+    for bound, count in rows:
+        label = f"<={bound * scale:.3g}{unit}" if bound is not None else "more"
+        bar = "█" * (round(width * count / peak) if peak else 0)
+        lines.append(f"{label:>12} {bar:<{width}} {count}")
+    return lines
+
+
+class Histogram:
+    """Log-bucketed histogram with fixed memory - for unbounded sample streams.
+
+    Bucket bounds grow geometrically from `low` to `high` (`per_decade`
+    buckets per power of ten), values outside land in the edge buckets.
+    Percentiles are bucket upper bounds, i.e. accurate to one bucket width
+    (~26 % with the default 10 per decade).
+    """
+
+    def __init__(self, low=1e-5, high=100.0, per_decade=10):
+        steps = int(round(math.log10(high / low) * per_decade))
+        self.bounds = [low * 10 ** (step / per_decade) for step in range(steps + 1)]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the samples of a histogram with the same bounds (e.g. from another process)"""
+        if other.bounds != self.bounds:
+            raise ValueError("Histogram bounds differ")
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th (0-100) percentile"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """Same shape as summarize()"""
+        if not self.count:
+            return summarize([])
+        return {
+            "count": self.count,
+            "min": self.min,
+            "mean": self.total / self.count,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+    def buckets(self):
+        """[(upper bound, count)] of the non-empty range, None = overflow"""
+        filled = [index for index, count in enumerate(self.counts) if count]
+        if not filled:
+            return []
+        bounds = self.bounds + [None]
+        return [(bounds[index], self.counts[index])
+                for index in range(filled[0], filled[-1] + 1)]
+
+    def render(self, unit="ms", scale=1000.0, width=30):
+        """Text bars, one line per bucket of the non-empty range"""
+        return render_buckets(self.buckets(), unit, scale, width)
+
+    def prometheus_lines(self, name, labels=""):
+        """Cumulative _bucket/_sum/_count lines of a Prometheus histogram"""
+        prefix = f"{labels}," if labels else ""
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            yield f'{name}_bucket{{{prefix}le="{bound:.6g}"}} {seen}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        suffix = f"{{{labels}}}" if labels else ""
+        yield f"{name}_sum{suffix} {self.total:.6f}"
+        yield f"{name}_count{suffix} {self.count}"
@@ -4,17 +4,87 @@ Diagnostický script pro testování všech camera endpointů
 Testuje HTTP i HTTPS verze a analyzuje odpovědi
 """
 
+import argparse
+import asyncio
+import json
 import requests
 import time
 import sys
 from urllib3.exceptions import InsecureRequestWarning
 import warnings
 
+from async_http import HttpClient
+from bench_stats import format_summary, summarize
+
 # Potlač SSL warnings pro testování
 warnings.simplefilter('ignore', InsecureRequestWarning)
 
-def test_endpoint(url, timeout=5):
-    """Test jednoho endpointu s kompletní analýzou"""
+VERCEL_BASE = "https://brana-git-dev-ivan-vondraceks-projects.vercel.app/api/camera-proxy"
+HTTPS_BASE = "https://89.24.76.191:10443"
+HTTP_BASE = "http://89.24.76.191:10180"
+
+# (skupina, URL) - Vercel proxy, HTTPS přímé, HTTP přímé
+ENDPOINTS = [
+    # Vercel proxy (toto by mělo fungovat)
+    ("vercel_proxy", f"{VERCEL_BASE}/video"),
+    ("vercel_proxy", f"{VERCEL_BASE}/stream.mjpg"),
+    ("vercel_proxy", f"{VERCEL_BASE}/photo.jpg"),
+
+    # HTTPS přímé (problematické)
+    ("https_direct", f"{HTTPS_BASE}/video"),
+    ("https_direct", f"{HTTPS_BASE}/stream.mjpg"),
+    ("https_direct", f"{HTTPS_BASE}/video.mjpg"),
+    ("https_direct", f"{HTTPS_BASE}/photo.jpg"),
+
+    # HTTP přímé (pro srovnání - Mixed Content v HTTPS)
+    ("http_direct", f"{HTTP_BASE}/video"),
+    ("http_direct", f"{HTTP_BASE}/stream.mjpg"),
+    ("http_direct", f"{HTTP_BASE}/video.mjpg"),
+    ("http_direct", f"{HTTP_BASE}/photo.jpg"),
+]
+
+def local_endpoints(http_base, https_base=None):
+    """Stejná sada endpointů přesměrovaná na lokální simulaci kamery"""
+    rewritten = []
+    for group, url in ENDPOINTS:
+        if group == "vercel_proxy":
+            rewritten.append((group, url.replace(VERCEL_BASE, f"{http_base}/api/camera-proxy")))
+        elif group == "https_direct":
+            if https_base:
+                rewritten.append((group, url.replace(HTTPS_BASE, https_base)))
+        else:
+            rewritten.append((group, url.replace(HTTP_BASE, http_base)))
+    return rewritten
+
+def detect_content(first_bytes):
+    """Odhad typu obsahu podle prvních bytů"""
+    if first_bytes.startswith(b'\xff\xd8\xff'):
+        return "jpeg"
+    if first_bytes.startswith(b'--'):
+        return "mjpeg"
+    if b'<html' in first_bytes.lower():
+        return "html"
+    return "unknown"
+
+def test_endpoint(url, timeout=5, rounds=1):
+    """Test jednoho endpointu s kompletní analýzou
+
+    Při rounds > 1 se endpoint volá opakovaně a jako response_time se vrací
+    medián, vypíše se i rozložení p50/p95/p99.
+    """
+    if rounds > 1:
+        samples = []
+        outcome = None
+        for _ in range(rounds):
+            outcome = test_endpoint(url, timeout)
+            if outcome[0]:
+                samples.append(outcome[2])
+        summary = summarize(samples)
+        print(f"📈 Latency over {rounds} rounds: {format_summary(summary)}")
+        if not samples:
+            return outcome
+        return True, outcome[1], summary["p50"]
+
     print(f"\n🔍 Testuju: {url}")
     
     try:
@@ -38,11 +108,12 @@ def test_endpoint(url, timeout=5):
             print(f"🔤 First 20 bytes: {first_bytes[:20]}")
             
             # Detect content type by first bytes
-            if first_bytes.startswith(b'\xff\xd8\xff'):
+            detected = detect_content(first_bytes)
+            if detected == "jpeg":
                 print("📸 Detected: JPEG image")
-            elif first_bytes.startswith(b'--'):
+            elif detected == "mjpeg":
                 print("🎥 Detected: MJPEG stream boundary")
-            elif b'<html' in first_bytes.lower():
+            elif detected == "html":
                 print("📄 Detected: HTML page")
             else:
                 print(f"❓ Unknown content type")
@@ -65,42 +136,81 @@ def test_endpoint(url, timeout=5):
         print(f"💥 Unexpected error: {e}")
         return False, "unknown_error", 0
 
-def main():
-    print("🚀 Camera Endpoint Diagnostic Tool")
-    print("=" * 50)
-    
-    # Test všech endpointů
-    endpoints = [
-        # Vercel proxy (toto by mělo fungovat)
-        "https://brana-git-dev-ivan-vondraceks-projects.vercel.app/api/camera-proxy/video",
-        "https://brana-git-dev-ivan-vondraceks-projects.vercel.app/api/camera-proxy/stream.mjpg",
-        "https://brana-git-dev-ivan-vondraceks-projects.vercel.app/api/camera-proxy/photo.jpg",
-        
-        # HTTPS přímé (problematické)
-        "https://89.24.76.191:10443/video",
-        "https://89.24.76.191:10443/stream.mjpg", 
-        "https://89.24.76.191:10443/video.mjpg",
-        "https://89.24.76.191:10443/photo.jpg",
-        
-        # HTTP přímé (pro srovnání - Mixed Content v HTTPS)
-        "http://89.24.76.191:10180/video",
-        "http://89.24.76.191:10180/stream.mjpg",
-        "http://89.24.76.191:10180/video.mjpg", 
-        "http://89.24.76.191:10180/photo.jpg",
-    ]
-    
+async def probe_once(client, url, read_bytes=100):
+    """Jeden asynchronní pokus - latence do hlaviček a typ obsahu"""
+    started = time.perf_counter()
+    try:
+        response, first_bytes = await client.fetch("GET", url, read_limit=read_bytes)
+    except asyncio.TimeoutError:
+        return {"success": False, "status": "timeout", "time": time.perf_counter() - started}
+    except OSError as e:
+        return {"success": False, "status": "connection_error", "error": str(e),
+                "time": time.perf_counter() - started}
+    except Exception as e:
+        return {"success": False, "status": "unknown_error", "error": str(e),
+                "time": time.perf_counter() - started}
+    return {
+        "success": True,
+        "status": response.status,
+        "time": response.timings["total"],
+        "phases": {phase: response.timings[phase] for phase in ("dns", "connect", "tls", "ttfb")},
+        "content_type": response.headers.get("content-type", "N/A"),
+        "detected": detect_content(first_bytes),
+    }
+
+async def probe_endpoint(client, group, url, rounds):
+    """Opakované kolo pokusů pro jeden endpoint - vrací rozložení latence"""
+    attempts = []
+    for _ in range(rounds):
+        attempts.append(await probe_once(client, url))
+    ok = [a for a in attempts if a["success"]]
+    statuses = {}
+    for a in attempts:
+        statuses[str(a["status"])] = statuses.get(str(a["status"]), 0) + 1
+    return {
+        "endpoint": url,
+        "group": group,
+        "success": bool(ok),
+        "status": ok[-1]["status"] if ok else attempts[-1]["status"],
+        "response_time": summarize([a["time"] for a in ok])["p50"] if ok else 0,
+        "latency": summarize([a["time"] for a in ok]),
+        "phases": {phase: summarize([a["phases"][phase] for a in ok])["p50"]
+                   for phase in ("dns", "connect", "tls", "ttfb")} if ok else None,
+        "success_rate": len(ok) / len(attempts),
+        "statuses": statuses,
+        "detected": ok[-1]["detected"] if ok else None,
+    }
+
+async def probe_all(endpoints, rounds=5, concurrency=20, per_host=4, timeout=5.0,
+                    deadline=None):
+    """Souběžný test všech endpointů s globálním a per-host limitem
+
+    Endpointy běží paralelně, kola jednoho endpointu po sobě (aby se
+    neměřila vlastní fronta). Po `deadline` sekundách se zbytek zruší.
+    """
+    client = HttpClient(concurrency=concurrency, per_host=per_host, timeout=timeout,
+                        keep_alive=False)
+    tasks = [asyncio.ensure_future(probe_endpoint(client, group, url, rounds))
+             for group, url in endpoints]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+    finally:
+        await client.close()
     results = []
-    
-    for endpoint in endpoints:
-        success, status, response_time = test_endpoint(endpoint)
-        results.append({
-            'endpoint': endpoint,
-            'success': success,
-            'status': status,
-            'response_time': response_time
-        })
-    
-    # Summary
+    for (group, url), task in zip(endpoints, tasks):
+        if task.done() and not task.cancelled() and task.exception() is None:
+            results.append(task.result())
+        else:
+            results.append({"endpoint": url, "group": group, "success": False,
+                            "status": "deadline", "response_time": 0,
+                            "latency": summarize([]), "success_rate": 0.0,
+                            "statuses": {}, "detected": None})
+    return results
+
+def print_summary(results):
+    """Souhrn a doporučení pro výsledky sekvenčního i souběžného běhu"""
     print("\n" + "=" * 50)
     print("📊 SUMMARY:")
     print("=" * 50)
@@ -111,6 +221,11 @@ def main():
     print(f"✅ Working endpoints: {len(working)}/{len(results)}")
     for r in working:
         print(f"  ✅ {r['endpoint']} - {r['status']} ({r['response_time']:.3f}s)")
+        if r.get('latency', {}).get('count', 0) > 1:
+            print(f"     📈 {format_summary(r['latency'])} success={r['success_rate']:.0%}")
+        if r.get('phases'):
+            print("     🧩 " + " ".join(f"{phase}={value * 1000:.1f}ms"
+                                       for phase, value in r['phases'].items()))
     
     print(f"\n❌ Failed endpoints: {len(failed)}/{len(results)}")
     for r in failed:
@@ -129,5 +244,163 @@ def main():
         print("   - Jsou porty 10180/10443 otevřené?")
         print("   - Funguje síťové připojení k 89.24.76.191?")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Camera endpoint diagnostic tool")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="test all endpoints at once (asyncio) instead of one by one")
+    parser.add_argument("--rounds", type=int, default=1,
+                        help="requests per endpoint, >1 reports p50/p95/p99")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="max requests in flight (concurrent mode)")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="max requests in flight per host:port (concurrent mode)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="per request timeout [s]")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="hard budget for the whole concurrent run [s], e.g. for cron")
+    parser.add_argument("--analyze-stream", action="store_true",
+                        help="read the MJPEG stream endpoints for --duration/--frames "
+                             "and report fps, frame sizes, jitter and throughput")
+    parser.add_argument("--stale", action="store_true",
+                        help="watch streams and poll photo.jpg for --duration and flag "
+                             "frozen, black or repeated pictures")
+    parser.add_argument("--proxy-stream", action="store_true",
+                        help="read every stream through the proxy and directly at the same "
+                             "time and report added latency, buffering and cut-offs")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds to read each stream (--analyze-stream, --stale, "
+                             "--proxy-stream)")
+    parser.add_argument("--frames", type=int, default=None,
+                        help="stop each stream after N frames (--analyze-stream)")
+    parser.add_argument("--phases", action="store_true",
+                        help="split each request into DNS/connect/TLS/TTFB and compare cold, "
+                             "TLS-resumed and keep-alive connections (uses --rounds, min 3)")
+    # Volitelné režimy se importují až v cestě, která je používá - tady jen jejich přepínače
+    from conn_phases import MODES
+    from sim_harness import add_camera_arguments
+    from stale_frames import add_stale_arguments
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES),
+                        help="connection modes for --phases")
+    parser.add_argument("--url", action="append", default=None,
+                        help="endpoint(s) to test instead of the built-in list")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--sim", action="store_true",
+                        help="test a local fake camera (debug/sim_harness.py) instead of production")
+    add_stale_arguments(parser.add_argument_group("stale picture detection (--stale)"))
+    add_camera_arguments(parser.add_argument_group("simulation (--sim)"))
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("🚀 Camera Endpoint Diagnostic Tool")
+    print("=" * 50)
+    
+    endpoints = [("custom", url) for url in args.url] if args.url else ENDPOINTS
+    if args.sim:
+        from sim_harness import SimulationHarness, camera_options_from_args
+        if args.proxy_stream:
+            # Synthetic snímky se opakují - párování přes trasy potřebuje unikátní
+            args.stamp_frames = True
+        harness = SimulationHarness(https_port=0, gate=False, run_broker=False,
+                                    camera_options=camera_options_from_args(args),
+                                    log=print).start_in_thread()
+        https_base = f"https://127.0.0.1:{harness.https_port}" if harness.https_camera else None
+        if not args.url:
+            endpoints = local_endpoints(harness.camera_url, https_base)
+
+    if args.analyze_stream:
+        from mjpeg_analyzer import analyze_stream, print_stream_report
+        stream_urls = [url for _, url in endpoints
+                       if args.url or url.endswith((".mjpg", "/video"))]
+        print(f"🎥 Analyzing {len(stream_urls)} streams for {args.duration:.0f}s"
+              + (f" / {args.frames} frames" if args.frames else ""))
+
+        async def analyze_all():
+            return await asyncio.gather(*(analyze_stream(url, args.duration, args.frames,
+                                                         args.timeout)
+                                          for url in stream_urls))
+
+        reports = asyncio.run(analyze_all())
+        for report in reports:
+            print_stream_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(reports, f, indent=2)
+            print(f"💾 Results saved to {args.json}")
+        return 0 if any(r['frames'] for r in reports) else 1
+
+    if args.proxy_stream:
+        from proxy_stream import compare_streams, print_proxy_stream_report
+        streams = [(group, url) for group, url in endpoints
+                   if args.url or url.endswith((".mjpg", "/video"))]
+        print(f"🔀 Reading {len(streams)} streams at once for {args.duration:.0f}s")
+        result = asyncio.run(compare_streams(streams, args.duration, args.timeout))
+        live_ok = print_proxy_stream_report(result)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"💾 Results saved to {args.json}")
+        return 0 if live_ok else 1
+
+    if args.stale:
+        from stale_frames import detector_options_from_args, print_stale_summary, watch_all
+        # Jedna URL na kameru a typ - proxy i přímé cesty vedou na stejný obraz
+        urls = [url for _, url in endpoints
+                if args.url or url.endswith(("/video", "/photo.jpg"))]
+        print(f"🧊 Watching {len(urls)} camera URLs for {args.duration:.0f}s")
+        reports, cpu_share = asyncio.run(watch_all(urls, args.duration, args.poll_interval,
+                                                   args.timeout,
+                                                   **detector_options_from_args(args)))
+        stale = print_stale_summary(reports, cpu_share)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(reports, f, indent=2)
+            print(f"💾 Results saved to {args.json}")
+        return 1 if stale or not any(r['frames'] for r in reports) else 0
+
+    if args.phases:
+        from conn_phases import measure_all, print_phase_report
+        rounds = max(args.rounds, 3)
+        print(f"🧩 Phase timing: {len(endpoints)} endpoints x {rounds} rounds "
+              f"({', '.join(args.modes)})")
+        results = asyncio.run(measure_all(endpoints, rounds, args.timeout, args.modes))
+        comparisons = print_phase_report(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({"endpoints": results, "proxy_vs_direct": comparisons}, f, indent=2)
+            print(f"💾 Results saved to {args.json}")
+        return 0 if any(mode["summary"]["total"]["count"]
+                        for r in results for mode in r["modes"].values()) else 1
+
+    if args.concurrent:
+        print(f"⚡ Concurrent mode: {len(endpoints)} endpoints x {args.rounds} rounds "
+              f"(concurrency={args.concurrency}, per-host={args.per_host})")
+        started = time.perf_counter()
+        results = asyncio.run(probe_all(endpoints, rounds=args.rounds,
+                                        concurrency=args.concurrency,
+                                        per_host=args.per_host, timeout=args.timeout,
+                                        deadline=args.deadline))
+        print(f"⏱️  Run took {time.perf_counter() - started:.2f}s")
+    else:
+        # Test všech endpointů
+        results = []
+        for group, endpoint in endpoints:
+            success, status, response_time = test_endpoint(endpoint, args.timeout, args.rounds)
+            results.append({
+                'endpoint': endpoint,
+                'group': group,
+                'success': success,
+                'status': status,
+                'response_time': response_time
+            })
+    
+    print_summary(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.json}")
+
+    return 0 if any(r['success'] for r in results) else 1
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Kanárkové zprávy pro měření zpoždění broker -> konzument
+
+CanaryProbe posílá se stálou frekvencí zprávy s pořadovým číslem a časem
+odeslání na soukromý topic Debug/Brana/Canary/<běh> a zároveň je sám
+přijímá minimálním asyncio odběratelem (reference). Monitor i debug tool
+pak počítají na stejném topicu totéž v paho callbacku:
+
+  lag        odeslání -> začátek on_message (histogram)
+  callback   doba strávená v jejich vlastním on_message (histogram)
+  mezery, přeházené pořadí a duplicity
+
+Reference ukazuje zpoždění brokeru a sítě, rozdíl konzument - reference je
+čas ztracený v Python klientovi (paho vlákno, GIL, pomalé callbacky).
+Odesílatel i konzumenti běží na jednom stroji, takže se time.time_ns()
+porovnává bez posunu hodin.
+
+    python debug/canary.py --sim --rate 50 --duration 10
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import struct
+import sys
+import threading
+import time
+
+from bench_stats import Histogram, format_summary, render_buckets
+from mqtt_wire import AsyncMqttClient
+
+CANARY_PREFIX = "Debug/Brana/Canary"
+
+# Pořadové číslo a time.time_ns() při odeslání
+CANARY = struct.Struct("<Qq")
+
+# Chybějící čísla starší než tohle okno se už nečekají a počítají se jako ztracená
+REORDER_WINDOW = 1000
+
+
+class CanaryTracker:
+    """Lag/callback histograms plus gap, reorder and duplicate counts of one consumer.
+
+    Fed from the consumer's network thread and read by reporting and
+    /metrics threads, so every access goes through one lock.
+    """
+
+    def __init__(self, name, reorder_window=REORDER_WINDOW):
+        self.name = name
+        self.reorder_window = reorder_window
+        self.lag = Histogram()
+        self.callback = Histogram(low=1e-6, high=10.0)
+        self.received = 0
+        self.malformed = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.max_reorder = 0
+        self.gaps = 0
+        self.expired = 0
+        self.first = None
+        self.highest = None
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def observe(self, payload, received_ns=None):
+        """Account one canary payload - False if it is not a canary"""
+        received_ns = received_ns or time.time_ns()
+        with self._lock:
+            return self._observe(payload, received_ns)
+
+    def _observe(self, payload, received_ns):
+        if len(payload) != CANARY.size:
+            self.malformed += 1
+            return False
+        seq, sent_ns = CANARY.unpack(payload)
+        self.lag.add(max(0, received_ns - sent_ns) / 1e9)
+        self.received += 1
+        if self.highest is None:
+            self.first = self.highest = seq
+        elif seq > self.highest:
+            if seq > self.highest + 1:
+                self.gaps += 1
+                self._missing.update(range(max(self.highest + 1, seq - self.reorder_window), seq))
+                self.expired += max(0, seq - self.reorder_window - self.highest - 1)
+            self.highest = seq
+            if len(self._missing) > self.reorder_window:
+                self._expire()
+        elif seq in self._missing:
+            self._missing.discard(seq)
+            self.reordered += 1
+            self.max_reorder = max(self.max_reorder, self.highest - seq)
+        else:
+            self.duplicates += 1
+        return True
+
+    def _expire(self):
+        horizon = self.highest - self.reorder_window
+        stale = [seq for seq in self._missing if seq < horizon]
+        self._missing.difference_update(stale)
+        self.expired += len(stale)
+
+    def callback_done(self, seconds):
+        """Time spent in the consumer's on_message (every message, not just canaries)"""
+        with self._lock:
+            self.callback.add(seconds)
+
+    def set_callback(self, histogram):
+        """Replace the callback histogram (e.g. merged from shard workers)"""
+        with self._lock:
+            self.callback = histogram
+
+    def histograms(self):
+        """Consistent copies of the lag and callback histograms"""
+        with self._lock:
+            return copy.deepcopy(self.lag), copy.deepcopy(self.callback)
+
+    def report(self):
+        with self._lock:
+            return self._report()
+
+    def _report(self):
+        expected = 0 if self.highest is None else self.highest - self.first + 1
+        return {
+            "name": self.name,
+            "received": self.received,
+            "expected": expected,
+            "lost": len(self._missing) + self.expired,
+            "gaps": self.gaps,
+            "reordered": self.reordered,
+            "max_reorder": self.max_reorder,
+            "duplicates": self.duplicates,
+            "malformed": self.malformed,
+            "lag": self.lag.summary(),
+            "lag_histogram": self.lag.buckets(),
+            "callback": self.callback.summary(),
+            "callback_histogram": self.callback.buckets(),
+        }
+
+
+def prometheus_lines(trackers):
+    """Extra /metrics lines (see topic_stats.MetricsServer), one family per metric"""
+    histograms = [tracker.histograms() for tracker in trackers]
+    yield "# TYPE brana_canary_lag_seconds histogram"
+    for tracker, (lag, _) in zip(trackers, histograms):
+        yield from lag.prometheus_lines("brana_canary_lag_seconds", f'consumer="{tracker.name}"')
+    yield "# TYPE brana_canary_callback_seconds histogram"
+    for tracker, (_, callback) in zip(trackers, histograms):
+        yield from callback.prometheus_lines("brana_canary_callback_seconds",
+                                             f'consumer="{tracker.name}"')
+    reports = [tracker.report() for tracker in trackers]
+    for key in ("lost", "reordered", "duplicates"):
+        yield f"# TYPE brana_canary_{key}_total counter"
+        for report in reports:
+            yield f'brana_canary_{key}_total{{consumer="{report["name"]}"}} {report[key]}'
+
+
+def lag_breakdown(consumer, reference):
+    """Split the consumer's lag into broker/network (reference) and client time"""
+    breakdown = {}
+    for key in ("p50", "p95", "p99"):
+        mine, base = consumer["lag"][key], reference["lag"][key]
+        breakdown[key] = None if mine is None or base is None else {
+            "broker": base, "client": max(0.0, mine - base)}
+    return breakdown
+
+
+def print_canary_report(report, reference=None, histograms=True, log=print):
+    """Lag/callback summaries, sequence problems and the broker vs client split"""
+    icon = "✅" if not report["lost"] and not report["reordered"] else "⚠️ "
+    log(f"🐤 Canary [{report['name']}]: {report['received']}/{report['expected']} received, "
+        f"{report['lost']} lost in {report['gaps']} gaps, {report['reordered']} reordered "
+        f"(max depth {report['max_reorder']}), {report['duplicates']} duplicates {icon}")
+    log(f"   lag      {format_summary(report['lag'], 'ms', 1000)}")
+    if report["callback"]["count"]:
+        log(f"   callback {format_summary(report['callback'], 'µs', 1e6)}")
+    if reference is not None and reference is not report:
+        for key, part in lag_breakdown(report, reference).items():
+            if part is not None:
+                log(f"   {key}: broker+network {part['broker'] * 1000:.2f}ms"
+                    f" + python client {part['client'] * 1000:.2f}ms")
+    if histograms:
+        for title, rows, unit, scale in (("lag", report["lag_histogram"], "ms", 1000),
+                                         ("callback", report["callback_histogram"], "µs", 1e6)):
+            if rows:
+                log(f"   {title} histogram:")
+                for line in render_buckets(rows, unit, scale):
+                    log(f"   {line}")
+
+
+class CanaryProbe:
+    """Fixed-rate canary publisher plus a reference subscriber on a daemon thread"""
+
+    def __init__(self, host, port, transport="tcp", rate=10.0, qos=0, log=print):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.rate = rate
+        self.qos = qos
+        self.log = log
+        self.run_id = f"{os.getpid()}-{int(time.time())}"
+        self.topic = f"{CANARY_PREFIX}/{self.run_id}"
+        self.reference = CanaryTracker("reference")
+        self.published = 0
+        self.error = None
+        self.loop = None
+        self._stopped = None
+        self._thread = None
+
+    def _on_reference(self, topic, payload, qos, retain):
+        if topic == self.topic:
+            self.reference.observe(payload)
+
+    async def run(self, ready=None):
+        stamp = self.run_id
+        subscriber = AsyncMqttClient(f"debug-canary-ref-{stamp}", on_message=self._on_reference)
+        publisher = AsyncMqttClient(f"debug-canary-pub-{stamp}")
+        try:
+            for client in (subscriber, publisher):
+                return_code = await client.connect(self.host, self.port, self.transport)
+                if return_code != 0:
+                    raise ConnectionError(f"CONNACK rc={return_code}")
+            await subscriber.subscribe([(self.topic, self.qos)])
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            if ready is not None:
+                ready.set()
+        self.log(f"🐤 Canary publishing {self.rate:g}/s QoS {self.qos} on {self.topic}")
+        started = asyncio.get_running_loop().time()
+        try:
+            while not self._stopped.is_set() and publisher.connected:
+                delay = started + self.published / self.rate - asyncio.get_running_loop().time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._stopped.wait(), delay)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                waiter = publisher.publish_nowait(
+                    self.topic, CANARY.pack(self.published, time.time_ns()), self.qos)
+                if waiter is not None:
+                    # PUBACK nikdo nečeká - jen ať výjimka po odpojení nevisí v logu
+                    waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self.published += 1
+                await publisher.stream.drain()
+            # Poslední zprávy ještě doputují k odběratelům
+            await asyncio.sleep(0.2)
+        except (OSError, ConnectionError) as e:
+            self.error = e
+        finally:
+            for client in (publisher, subscriber):
+                await client.disconnect()
+
+    def start_in_thread(self, timeout=15.0):
+        """Run the probe on a daemon thread - for paho based scripts"""
+        ready = threading.Event()
+
+        def run():
+            async def main():
+                self.loop = asyncio.get_running_loop()
+                self._stopped = asyncio.Event()
+                await self.run(ready)
+            asyncio.run(main())
+
+        self._thread = threading.Thread(target=run, name="canary-probe", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout):
+            raise TimeoutError("Canary probe did not connect")
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop_thread(self, timeout=5.0):
+        if self._thread is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def add_canary_arguments(parser):
+    """Shared CLI knobs for scripts that host a probe"""
+    parser.add_argument("--canary", type=float, default=None, metavar="RATE",
+                        help="publish sequence-numbered canaries at RATE/s on a private "
+                             "topic and measure broker -> callback lag (debug/canary.py)")
+    parser.add_argument("--canary-qos", type=int, choices=(0, 1, 2), default=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Broker round trip of canary messages "
+                                                 "(reference subscriber only)")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--sim", action="store_true",
+                        help="run against the in-process stand-in broker (debug/sim_harness.py)")
+    parser.add_argument("--rate", type=float, default=10.0, help="canaries per second")
+    parser.add_argument("--qos", type=int, choices=(0, 1, 2), default=0)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    args = parser.parse_args(argv)
+
+    harness = None
+    if args.sim:
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(camera=False, log=print).start_in_thread()
+        host, port = "127.0.0.1", harness.mqtt_port
+    else:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 9001)
+
+    probe = CanaryProbe(host, port, args.transport, args.rate, args.qos)
+    try:
+        probe.start_in_thread()
+        time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ConnectionError, TimeoutError) as e:
+        print(f"❌ Canary probe failed: {type(e).__name__}: {e}")
+        return 1
+    finally:
+        probe.stop_thread()
+        if harness is not None:
+            harness.stop_thread()
+    report = probe.reference.report()
+    print(f"📤 Published {probe.published}")
+    print_canary_report(report)
+    return 0 if report["received"] and not report["lost"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
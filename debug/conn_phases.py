@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Rozklad HTTP požadavku na fáze - DNS, TCP connect, TLS handshake a čas
+do prvního bytu (TTFB) - pro tři režimy připojení:
+
+  cold       každý požadavek na novém spojení, plný TLS handshake
+  resumed    nové spojení, ale s TLS session z minulého (session resumption)
+  keepalive  všechny požadavky na jednom keep-alive spojení
+
+Ze srovnání režimů je vidět, kolik by přineslo znovupoužití spojení, a ze
+srovnání Vercel /api/camera-proxy/* s přímým :10443/:10180, jestli proxy
+stojí hlavně handshake, nebo upstream fetch (ten se schová v TTFB proxy).
+
+    python debug/camera_test.py --phases --rounds 10
+"""
+
+import asyncio
+import ssl
+
+from async_http import HttpConnection, HttpError, session_ssl_context, split_url
+from bench_stats import percentile, summarize
+
+MODES = ("cold", "resumed", "keepalive")
+PHASES = ("dns", "connect", "tls", "ttfb", "total")
+HANDSHAKE_PHASES = ("dns", "connect", "tls")
+
+# Víc se nečte - keep-alive potřebuje celé tělo, ale photo.jpg je malý
+READ_LIMIT = 512 * 1024
+
+
+async def probe_series(url, mode, rounds=5, timeout=5.0, read_limit=READ_LIMIT):
+    """GET `url` `rounds` times in one connection mode, per-phase samples.
+
+    resumed/keepalive run one extra warm-up request first - it provides the
+    TLS session or opens the connection and is not counted. Returns None for
+    `resumed` on plain http.
+    """
+    scheme, host, port, path = split_url(url)
+    if mode == "resumed" and scheme != "https":
+        return None
+    context = session_ssl_context() if scheme == "https" else None
+    samples = {phase: [] for phase in PHASES}
+    series = {"url": url, "mode": mode, "samples": samples, "errors": [], "status": None,
+              "resumed": 0, "reused": 0, "note": None}
+    warmup = 0 if mode == "cold" else 1
+    connection = None
+    for index in range(rounds + warmup):
+        if connection is None:
+            connection = HttpConnection(scheme, host, port, context, timeout)
+        try:
+            response = await connection.request("GET", path)
+            # MJPEG stream nikdy neskončí - stačí hlavičky, spojení se zavře
+            if not response.headers.get("content-type", "").startswith("multipart/"):
+                await asyncio.wait_for(response.read(read_limit), timeout)
+            if mode == "resumed":
+                context.session = connection.tls_session
+            await response.release()
+        except (HttpError, OSError, asyncio.TimeoutError, ssl.SSLError) as e:
+            await connection.close()
+            connection = None
+            series["errors"].append(f"{type(e).__name__}: {e}")
+            continue
+        timings = response.timings
+        series["status"] = response.status
+        counted = index >= warmup and (mode != "keepalive" or timings["reused"])
+        if counted:
+            for phase in PHASES:
+                samples[phase].append(timings["ttfb"] if phase == "ttfb" else
+                                      timings.get(phase, 0.0))
+            series["resumed"] += bool(timings.get("tls_resumed"))
+            series["reused"] += timings["reused"]
+        if mode == "keepalive" and not connection.reusable:
+            await connection.close()
+            series["note"] = "server closes the connection (streaming body or Connection: close)"
+            break
+        if mode != "keepalive":
+            await connection.close()
+            connection = None
+    if connection is not None:
+        await connection.close()
+    series["summary"] = {phase: summarize(values) for phase, values in samples.items()}
+    return series
+
+
+async def measure_endpoint(group, url, rounds=5, timeout=5.0, modes=MODES):
+    """All modes for one endpoint, one after another so they don't compete"""
+    result = {"endpoint": url, "group": group, "modes": {}}
+    for mode in modes:
+        series = await probe_series(url, mode, rounds, timeout)
+        if series is not None:
+            result["modes"][mode] = series
+    return result
+
+
+async def measure_all(endpoints, rounds=5, timeout=5.0, modes=MODES):
+    """Endpoints run sequentially - the proxy ones share one host and parallel
+    probes would measure each other's handshakes"""
+    return [await measure_endpoint(group, url, rounds, timeout, modes)
+            for group, url in endpoints]
+
+
+def p50(result, mode, phase):
+    series = result["modes"].get(mode)
+    if not series or not series["summary"][phase]["count"]:
+        return None
+    return series["summary"][phase]["p50"]
+
+
+def handshake(result, mode):
+    """p50 of the per-request dns + connect + tls sum"""
+    series = result["modes"].get(mode)
+    if not series or not series["samples"]["total"]:
+        return None
+    samples = series["samples"]
+    return percentile(sorted(map(sum, zip(*(samples[phase] for phase in HANDSHAKE_PHASES)))), 50)
+
+
+def reuse_gains(result):
+    """What keep-alive and TLS resumption save per request (p50, seconds)"""
+    cold = p50(result, "cold", "total")
+    gains = {"cold": cold, "keepalive": None, "resumed": None, "resume_rate": None}
+    if cold is None:
+        return gains
+    keepalive = p50(result, "keepalive", "total")
+    if keepalive is not None:
+        gains["keepalive"] = cold - keepalive
+    resumed = result["modes"].get("resumed")
+    if resumed and resumed["summary"]["tls"]["count"]:
+        gains["resumed"] = p50(result, "cold", "tls") - p50(result, "resumed", "tls")
+        gains["resume_rate"] = resumed["resumed"] / resumed["summary"]["tls"]["count"]
+    return gains
+
+
+def compare_routes(results, proxy_group="vercel_proxy"):
+    """Pair each proxy endpoint with direct endpoints serving the same file.
+
+    Cold p50s are compared phase by phase: the handshake delta is what the
+    extra hop costs in connection setup, the TTFB delta is the function plus
+    its upstream fetch to the camera. The three deltas are differences of
+    separate medians, so they need not add up to the total one.
+    """
+    direct = {}
+    for result in results:
+        if result["group"] != proxy_group:
+            direct.setdefault(result["endpoint"].rsplit("/", 1)[-1], []).append(result)
+    comparisons = []
+    for proxy in results:
+        if proxy["group"] != proxy_group or p50(proxy, "cold", "total") is None:
+            continue
+        for other in direct.get(proxy["endpoint"].rsplit("/", 1)[-1], []):
+            if p50(other, "cold", "total") is None:
+                continue
+            handshake_delta = handshake(proxy, "cold") - handshake(other, "cold")
+            fetch_delta = p50(proxy, "cold", "ttfb") - p50(other, "cold", "ttfb")
+            overhead = p50(proxy, "cold", "total") - p50(other, "cold", "total")
+            comparisons.append({
+                "proxy": proxy["endpoint"],
+                "direct": other["endpoint"],
+                "direct_group": other["group"],
+                "overhead": overhead,
+                "handshake_delta": handshake_delta,
+                "fetch_delta": fetch_delta,
+                # Rychlejší proxy nemá co vysvětlovat, i když je jedna fáze pomalejší
+                "dominant": (None if overhead <= 0 or max(handshake_delta, fetch_delta) <= 0
+                             else "handshake" if handshake_delta > fetch_delta
+                             else "upstream fetch"),
+                "proxy_keepalive": p50(proxy, "keepalive", "total"),
+                "direct_cold": p50(other, "cold", "total"),
+            })
+    return comparisons
+
+
+def _ms(value, width=7):
+    return f"{value * 1000:{width}.1f}" if value is not None else " " * (width - 1) + "-"
+
+
+def print_phase_report(results, log=print):
+    """Per endpoint phase table, reuse gains and the proxy vs direct split"""
+    for result in results:
+        log(f"\n📡 {result['endpoint']} ({result['group']})")
+        log(f"   {'mode':<10}{'dns':>8}{'connect':>8}{'tls':>8}{'ttfb':>8}{'total':>8}  p50 ms")
+        for mode, series in result["modes"].items():
+            extra = []
+            if mode == "resumed" and series["summary"]["tls"]["count"]:
+                extra.append(f"resumed {series['resumed']}/{series['summary']['tls']['count']}")
+            if series["errors"]:
+                extra.append(f"{len(series['errors'])} errors")
+            if series["note"]:
+                extra.append(series["note"])
+            row = "".join(_ms(p50(result, mode, phase), 8) for phase in PHASES)
+            log(f"   {mode:<10}{row}  {', '.join(extra)}".rstrip())
+        gains = reuse_gains(result)
+        if gains["keepalive"] is not None:
+            log(f"   💡 keep-alive saves {gains['keepalive'] * 1000:.1f}ms/request "
+                f"({gains['keepalive'] / gains['cold']:.0%})")
+        if gains["resumed"] is not None:
+            if gains["resume_rate"]:
+                log(f"   🔁 TLS resumption saves {gains['resumed'] * 1000:.1f}ms of "
+                    f"{p50(result, 'cold', 'tls') * 1000:.1f}ms handshake "
+                    f"({gains['resume_rate']:.0%} resumed)")
+            else:
+                log("   ⚠️  server never resumed the TLS session")
+
+    comparisons = compare_routes(results)
+    if not comparisons:
+        return comparisons
+    log("\n🆚 Proxy vs direct (cold p50):")
+    for item in comparisons:
+        log(f"   {item['proxy'].rsplit('/', 1)[-1]} vs {item['direct_group']}: "
+            f"total {item['overhead'] * 1000:+.1f}ms; separate medians: "
+            f"handshake {item['handshake_delta'] * 1000:+.1f}ms, "
+            f"TTFB/upstream fetch {item['fetch_delta'] * 1000:+.1f}ms -> "
+            + (f"mostly {item['dominant']}" if item["dominant"] else "proxy is not slower"))
+        if item["proxy_keepalive"] is not None:
+            log(f"      with keep-alive the proxy takes {item['proxy_keepalive'] * 1000:.1f}ms "
+                f"vs {item['direct_cold'] * 1000:.1f}ms cold direct")
+    return comparisons
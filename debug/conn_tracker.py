@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Sledování TCP spojení na MQTT port bez spouštění lsof
+Čte přímo tabulky socketů jádra (/proc/net/tcp, /proc/net/tcp6), porovnává
+4-tice mezi jednotlivými průchody a hlásí otevření/zavření spojení s dobou
+života a procesem, kterému socket patří (prohlížeč, node, ostatní)
+
+Bez /proc (macOS) se použije lsof jako dřív.
+"""
+
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2", "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT",
+    "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+# Stavy, které už neznamenají živé spojení
+CLOSED_STATES = {"TIME_WAIT", "CLOSE", "LISTEN"}
+
+BROWSER_NAMES = ("chrome", "chromium", "firefox", "brave", "safari", "opera", "msedge", "vivaldi")
+
+
+def _decode_address(hex_address):
+    """'0100007F:1F90' -> ('127.0.0.1', 8080); IPv6 as four little-endian words"""
+    address, port = hex_address.split(":")
+    raw = bytes.fromhex(address)
+    if len(raw) == 4:
+        host = socket.inet_ntop(socket.AF_INET, raw[::-1])
+    else:
+        words = struct.unpack("<4I", raw)
+        host = socket.inet_ntop(socket.AF_INET6, struct.pack(">4I", *words))
+        if host.startswith("::ffff:"):
+            host = host[7:]
+    return host, int(port, 16)
+
+
+def categorize(process_name):
+    name = (process_name or "").lower()
+    if any(browser in name for browser in BROWSER_NAMES):
+        return "browser"
+    if "node" in name:
+        return "node"
+    if "python" in name:
+        return "python"
+    return "other"
+
+
+class SocketInfo:
+    """One TCP socket from the kernel table"""
+
+    __slots__ = ("local", "remote", "state", "inode", "pid", "process", "first_seen")
+
+    def __init__(self, local, remote, state, inode):
+        self.local = local
+        self.remote = remote
+        self.state = state
+        self.inode = inode
+        self.pid = None
+        self.process = None
+        self.first_seen = None
+
+    @property
+    def key(self):
+        return (self.local, self.remote)
+
+    @property
+    def category(self):
+        return categorize(self.process)
+
+    def as_dict(self):
+        return {"local": f"{self.local[0]}:{self.local[1]}",
+                "remote": f"{self.remote[0]}:{self.remote[1]}",
+                "state": self.state, "pid": self.pid, "process": self.process,
+                "category": self.category}
+
+    def describe(self):
+        owner = f"{self.process}[{self.pid}]" if self.pid else "unknown process"
+        return (f"{self.local[0]}:{self.local[1]} -> {self.remote[0]}:{self.remote[1]} "
+                f"{self.state} ({owner})")
+
+
+class ConnectionTracker:
+    """Diffs TCP 4-tuples on the given ports between polls.
+
+    poll() returns a list of ('open'|'close', SocketInfo, lifetime) events.
+    Socket -> process mapping walks /proc/<pid>/fd only when an unknown
+    inode shows up, so steady-state polls just read the socket tables.
+    """
+
+    def __init__(self, ports=(9001,), proc_root="/proc"):
+        self.ports = set(ports)
+        self.proc_root = proc_root
+        self.use_proc = os.path.exists(os.path.join(proc_root, "net", "tcp"))
+        self.current = {}
+        self._inode_owner = {}
+        self.polls = 0
+        self.poll_time = 0.0
+
+    def _read_table(self, name):
+        path = os.path.join(self.proc_root, "net", name)
+        try:
+            with open(path) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            return
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10:
+                continue
+            local = _decode_address(fields[1])
+            remote = _decode_address(fields[2])
+            if local[1] not in self.ports and remote[1] not in self.ports:
+                continue
+            state = TCP_STATES.get(fields[3], fields[3])
+            if state in CLOSED_STATES:
+                continue
+            yield SocketInfo(local, remote, state, int(fields[9]))
+
+    def _snapshot_lsof(self):
+        sockets = {}
+        for port in self.ports:
+            try:
+                result = subprocess.run(["lsof", "-nP", "-i", f"TCP:{port}"],
+                                        capture_output=True, text=True)
+            except OSError:
+                continue
+            for line in result.stdout.strip().split("\n")[1:]:
+                fields = line.split()
+                if len(fields) < 9 or "->" not in fields[8]:
+                    continue
+                local_text, remote_text = fields[8].split("->")
+                local = tuple(local_text.rsplit(":", 1))
+                remote = tuple(remote_text.rsplit(":", 1))
+                info = SocketInfo((local[0], int(local[1])), (remote[0], int(remote[1])),
+                                  fields[9].strip("()") if len(fields) > 9 else "?", 0)
+                info.pid = int(fields[1])
+                info.process = fields[0]
+                sockets[info.key] = info
+        return sockets
+
+    def _resolve_owners(self, inodes):
+        """Map socket inodes to (pid, process name) by walking /proc/*/fd once"""
+        wanted = {inode for inode in inodes if inode and inode not in self._inode_owner}
+        if not wanted:
+            return
+        for pid in os.listdir(self.proc_root):
+            if not pid.isdigit():
+                continue
+            fd_dir = os.path.join(self.proc_root, pid, "fd")
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith("socket:["):
+                    inode = int(target[8:-1])
+                    if inode in wanted:
+                        self._inode_owner[inode] = (int(pid), self._process_name(pid))
+                        wanted.discard(inode)
+            if not wanted:
+                break
+        for inode in wanted:
+            # Cizí proces bez oprávnění / už zaniklý - nehledat znovu
+            self._inode_owner[inode] = (None, None)
+
+    def _process_name(self, pid):
+        try:
+            with open(os.path.join(self.proc_root, pid, "cmdline"), "rb") as f:
+                argv = f.read().split(b"\0")
+            name = os.path.basename(argv[0].decode(errors="replace")) if argv and argv[0] else ""
+            if name:
+                return name
+        except OSError:
+            pass
+        try:
+            with open(os.path.join(self.proc_root, pid, "comm")) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def snapshot(self):
+        """Current live sockets on the tracked ports, keyed by 4-tuple"""
+        if not self.use_proc:
+            return self._snapshot_lsof()
+        sockets = {}
+        for table in ("tcp", "tcp6"):
+            for info in self._read_table(table):
+                sockets[info.key] = info
+        self._resolve_owners(info.inode for info in sockets.values())
+        for info in sockets.values():
+            info.pid, info.process = self._inode_owner.get(info.inode, (None, None))
+        return sockets
+
+    def poll(self):
+        """Diff against the previous poll - returns open/close events"""
+        started = time.perf_counter()
+        now = time.monotonic()
+        sockets = self.snapshot()
+        events = []
+        for key, info in sockets.items():
+            previous = self.current.get(key)
+            if previous is None:
+                info.first_seen = now
+                events.append(("open", info, 0.0))
+            else:
+                info.first_seen = previous.first_seen
+        for key, info in self.current.items():
+            if key not in sockets:
+                events.append(("close", info, now - info.first_seen))
+                self._inode_owner.pop(info.inode, None)
+        self.current = sockets
+        self.polls += 1
+        self.poll_time += time.perf_counter() - started
+        return events
+
+    def counts_by_category(self):
+        counts = {}
+        for info in self.current.values():
+            counts[info.category] = counts.get(info.category, 0) + 1
+        return counts
+
+
+CATEGORY_ICONS = {"browser": "🌐 BROWSER", "node": "⚙️  NODE", "python": "🐍 PYTHON",
+                  "other": "❓ OTHER"}
+
+
+def format_event(kind, info, lifetime):
+    label = CATEGORY_ICONS.get(info.category, "❓ OTHER")
+    if kind == "open":
+        return f"🟢 OPEN  {label}: {info.describe()}"
+    return f"🔴 CLOSE {label}: {info.describe()} after {lifetime:.2f}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Track TCP connections on MQTT ports")
+    parser.add_argument("--port", type=int, action="append", default=None,
+                        help="port to track (repeatable, default 9001)")
+    parser.add_argument("--interval", type=float, default=0.2, help="poll interval [s]")
+    args = parser.parse_args(argv)
+    tracker = ConnectionTracker(args.port or [9001])
+    source = "/proc/net/tcp*" if tracker.use_proc else "lsof"
+    print(f"🔍 Tracking ports {sorted(tracker.ports)} every {args.interval}s via {source}")
+    try:
+        while True:
+            for event in tracker.poll():
+                print(f"[{time.strftime('%H:%M:%S')}] {format_event(*event)}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        average = tracker.poll_time / max(1, tracker.polls) * 1000
+        print(f"\n🛑 {tracker.polls} polls, {average:.2f}ms per poll")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Průběžná diagnostika - démon s historií v SQLite (debug/diag_store.py)
+Pravidelně spouští kontroly MQTT brokeru, HTTP proxy, počtu spojení na
+MQTT port a kamerových endpointů, výsledky ukládá do databáze a jednou
+za hodinu starší data sbalí do rollupů.
+
+    python debug/diag_daemon.py run --interval mqtt=60 --interval camera=300
+    python debug/diag_daemon.py query mqtt --days 30
+    python debug/diag_daemon.py compare --window 1h --baseline 7d
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+from async_http import HttpClient, HttpError
+from diag_store import DAY, HOUR, DiagnosticsStore
+from mqtt_wire import CONNACK_CODES, AsyncMqttClient, MqttProtocolError
+
+DEFAULT_INTERVALS = {"mqtt": 60.0, "proxy": 60.0, "connections": 30.0, "camera": 300.0}
+
+# Víc spojení na broker z jednoho stroje = pravděpodobný leak (viz generate_report)
+MAX_HEALTHY_CONNECTIONS = 4
+
+
+def parse_duration(text):
+    """'90' / '90s' / '15m' / '2h' / '7d' -> seconds"""
+    text = str(text).strip().lower()
+    units = {"s": 1, "m": 60, "h": HOUR, "d": DAY}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def parse_intervals(specs):
+    intervals = dict(DEFAULT_INTERVALS)
+    for spec in specs or []:
+        name, _, value = spec.partition("=")
+        if name not in DEFAULT_INTERVALS:
+            raise ValueError(f"Unknown check {name!r} (use {', '.join(DEFAULT_INTERVALS)})")
+        intervals[name] = parse_duration(value) if value else 0
+    return {name: interval for name, interval in intervals.items() if interval > 0}
+
+
+class DiagnosisDaemon:
+    """Runs each check on its own schedule and stores every result"""
+
+    def __init__(self, store, broker_host, broker_port, transport="websockets",
+                 proxy_url="http://localhost:3003/api/mqtt-proxy", camera_endpoints=None,
+                 intervals=None, timeout=10.0, log=print):
+        self.store = store
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.transport = transport
+        self.proxy_url = proxy_url
+        self.camera_endpoints = camera_endpoints
+        self.intervals = intervals if intervals is not None else dict(DEFAULT_INTERVALS)
+        self.timeout = timeout
+        self.log = log
+        self.checks = {"mqtt": self.check_mqtt, "proxy": self.check_proxy,
+                       "connections": self.check_connections, "camera": self.check_camera}
+
+    async def check_mqtt(self):
+        client = AsyncMqttClient(f"debug-daemon-{int(time.time())}")
+        try:
+            return_code = await client.connect(self.broker_host, self.broker_port,
+                                               self.transport, timeout=self.timeout)
+        except (OSError, asyncio.TimeoutError, MqttProtocolError) as e:
+            return [("mqtt", False, None, None, "", {"error": f"{type(e).__name__}: {e}"})]
+        await client.disconnect()
+        detail = {"rc": return_code, "tcp": client.timings.get("tcp"),
+                  "connack": client.timings.get("connack")}
+        if return_code != 0:
+            detail["error"] = CONNACK_CODES.get(return_code, "unknown")
+        return [("mqtt", return_code == 0, client.timings.get("total"), None, "", detail)]
+
+    async def check_proxy(self):
+        client = HttpClient(concurrency=1, per_host=1, timeout=self.timeout, keep_alive=False)
+        started = time.perf_counter()
+        try:
+            response, body = await asyncio.wait_for(
+                client.fetch("GET", self.proxy_url, read_limit=64 * 1024), self.timeout)
+        except (HttpError, OSError, asyncio.TimeoutError) as e:
+            return [("proxy", False, None, None, self.proxy_url,
+                     {"error": f"{type(e).__name__}: {e}"})]
+        finally:
+            await client.close()
+        latency = time.perf_counter() - started
+        connected = response.status == 200 and b'"connected":true' in body.replace(b" ", b"")
+        return [("proxy", connected, latency, None, self.proxy_url, {"status": response.status})]
+
+    async def check_connections(self):
+        from conn_tracker import ConnectionTracker
+        sockets = ConnectionTracker([self.broker_port]).snapshot()
+        count = len(sockets)
+        categories = {}
+        for info in sockets.values():
+            categories[info.category] = categories.get(info.category, 0) + 1
+        return [("connections", count <= MAX_HEALTHY_CONNECTIONS, None, float(count), "",
+                 categories)]
+
+    async def check_camera(self):
+        from camera_test import ENDPOINTS, probe_all
+        results = await probe_all(self.camera_endpoints or ENDPOINTS, rounds=1,
+                                  timeout=self.timeout, deadline=self.timeout * 2)
+        return [("camera", result["success"], result["response_time"] if result["success"] else None,
+                 None, result["endpoint"],
+                 {"group": result["group"], "status": result["status"]})
+                for result in results]
+
+    async def run_check(self, name):
+        started = time.time()
+        try:
+            rows = await self.checks[name]()
+        except Exception as e:
+            rows = [(name, False, None, None, "", {"error": f"{type(e).__name__}: {e}"})]
+        self.store.record_many([row + (started,) for row in rows])
+        ok = sum(1 for row in rows if row[1])
+        self.log(f"{'✅' if ok == len(rows) else '❌'} {name}: {ok}/{len(rows)} ok")
+        return rows
+
+    async def _schedule(self, name, interval):
+        next_run = time.monotonic()
+        while True:
+            await self.run_check(name)
+            next_run += interval
+            # Když se kontrola protáhne, další běh se nestřádá
+            next_run = max(next_run, time.monotonic())
+            await asyncio.sleep(next_run - time.monotonic())
+
+    async def _rollups(self, interval=HOUR):
+        while True:
+            folded = self.store.rollup()
+            if folded:
+                self.log(f"🗜️  Rolled up {folded} old rows")
+            await asyncio.sleep(interval)
+
+    async def run_once(self):
+        await asyncio.gather(*(self.run_check(name) for name in self.intervals))
+
+    async def run_forever(self):
+        for name, interval in self.intervals.items():
+            self.log(f"⏰ {name} every {interval:g}s")
+        tasks = [asyncio.ensure_future(self._schedule(name, interval))
+                 for name, interval in self.intervals.items()]
+        tasks.append(asyncio.ensure_future(self._rollups()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def print_history(store, test, days, resolution, log=print):
+    rows = store.history(test, time.time() - days * DAY, resolution=resolution)
+    if not rows:
+        log(f"No {test} results in the last {days:g} days")
+        return
+    target = None
+    for row in rows:
+        if row["target"] != target:
+            target = row["target"]
+            log(f"\n📈 {test} {target}".rstrip())
+        stamp = datetime.fromtimestamp(row["bucket"]).strftime("%Y-%m-%d %H:%M")
+        latency = (f"avg {row['latency_avg'] * 1000:7.1f}ms p95≤{row['latency_p95'] * 1000:7.1f}ms"
+                   if row["latency_avg"] is not None else " " * 29)
+        value = f" value {row['value_avg']:.1f}" if row["value_avg"] is not None else ""
+        log(f"  {stamp}  {row['count']:>5} runs  ok {row['success_rate']:6.1%}  {latency}{value}")
+
+
+def print_comparison(findings, log=print):
+    regressions = 0
+    for finding in findings:
+        name = f"{finding['test']} {finding['target']}".rstrip()
+        if finding["regressions"] is None:
+            log(f"  ·  {name}: not enough samples for a baseline")
+        elif finding["regressions"]:
+            regressions += 1
+            log(f"  🔺 {name}: {', '.join(finding['regressions'])}")
+        else:
+            recent = finding["recent"]
+            p95 = f", p95 {recent['p95'] * 1000:.0f}ms" if recent["p95"] is not None else ""
+            log(f"  ✅ {name}: ok {recent['success_rate']:.1%}{p95}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Continuous diagnosis with SQLite history")
+    parser.add_argument("--db", default="brana-diagnostics.db", help="SQLite database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run checks on a schedule")
+    run.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    run.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    run.add_argument("--proxy-url", default=None,
+                     help="default http://localhost:3003/api/mqtt-proxy; "
+                          "with --sim the proxy check only runs when this is given")
+    run.add_argument("--camera-url", action="append", help="camera endpoint (repeatable)")
+    run.add_argument("--interval", action="append", metavar="CHECK=DURATION",
+                     help="e.g. mqtt=60, camera=5m, proxy=0 disables (repeatable)")
+    run.add_argument("--timeout", type=float, default=10.0)
+    run.add_argument("--once", action="store_true", help="run every check once and exit")
+    run.add_argument("--sim", action="store_true",
+                     help="check the in-process stand-in broker and fake camera")
+
+    query = commands.add_parser("query", help="show aggregated history")
+    query.add_argument("test", nargs="?", help="check name (default all)")
+    query.add_argument("--days", type=float, default=7)
+    query.add_argument("--resolution", default="1h", help="bucket size, e.g. 1h or 1d")
+
+    compare = commands.add_parser("compare", help="flag regressions against a rolling baseline")
+    compare.add_argument("test", nargs="?", help="check name (default all)")
+    compare.add_argument("--window", default="1h", help="recent window")
+    compare.add_argument("--baseline", default="7d", help="baseline length before the window")
+    compare.add_argument("--latency-factor", type=float, default=1.5)
+    compare.add_argument("--success-drop", type=float, default=0.05)
+
+    commands.add_parser("rollup", help="fold old samples into rollups now")
+    args = parser.parse_args(argv)
+
+    store = DiagnosticsStore(args.db)
+    try:
+        if args.command == "query":
+            for test in [args.test] if args.test else store.tests():
+                print_history(store, test, args.days, int(parse_duration(args.resolution)))
+            return 0
+        if args.command == "compare":
+            print(f"📊 Last {args.window} vs {args.baseline} baseline")
+            findings = []
+            for test in [args.test] if args.test else store.tests():
+                findings += store.compare(test, parse_duration(args.window),
+                                          parse_duration(args.baseline), args.latency_factor,
+                                          success_drop=args.success_drop)
+            return 1 if print_comparison(findings) else 0
+        if args.command == "rollup":
+            print(f"🗜️  Rolled up {store.rollup()} rows")
+            return 0
+        return run_daemon(store, args)
+    finally:
+        store.close()
+
+
+def run_daemon(store, args):
+    intervals = parse_intervals(args.interval)
+    broker_host, _, broker_port = args.broker.partition(":")
+    broker_port = int(broker_port or 9001)
+    camera_endpoints = [("custom", url) for url in args.camera_url] if args.camera_url else None
+    harness = None
+    if args.sim:
+        from camera_test import local_endpoints
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(camera=True).start_in_thread()
+        broker_host, broker_port = "127.0.0.1", harness.mqtt_port
+        camera_endpoints = camera_endpoints or local_endpoints(harness.camera_url)
+        if args.proxy_url is None:
+            # Harness nemá MQTT proxy - kontrola by jen plnila historii chybami
+            intervals.pop("proxy", None)
+    proxy_url = args.proxy_url or "http://localhost:3003/api/mqtt-proxy"
+    daemon = DiagnosisDaemon(store, broker_host, broker_port, args.transport, proxy_url,
+                             camera_endpoints, intervals, args.timeout)
+    print(f"🩺 Diagnosis daemon -> {store.path}")
+    try:
+        asyncio.run(daemon.run_once() if args.once else daemon.run_forever())
+    except KeyboardInterrupt:
+        print("\n🛑 Daemon stopped")
+    finally:
+        if harness is not None:
+            harness.stop_thread()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
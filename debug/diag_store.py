@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+SQLite úložiště výsledků diagnostiky (historie místo přepisování JSON)
+Surové vzorky: tabulka samples s indexem (test, ts). Starší data se
+agregují do hodinových a pak denních rollupů (počet, úspěchy, latence
+min/avg/max/p95), surové řádky se mažou - měsíc historie je pak pár
+tisíc řádků a dotaz jde přes index.
+
+Regrese: poslední okno (např. 1 h) proti klouzavé baseline (např. 7 dní
+před ním) - p95 latence a úspěšnost po test/cíl.
+
+Latence (rollupy, historie i porovnání) se počítá jen z úspěšných vzorků,
+timeouty a chyby jsou vidět v úspěšnosti.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from bench_stats import percentile
+
+HOUR = 3600
+DAY = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    test TEXT NOT NULL,
+    target TEXT NOT NULL DEFAULT '',
+    ts REAL NOT NULL,
+    success INTEGER NOT NULL,
+    latency REAL,
+    value REAL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_test_ts ON samples (test, ts);
+CREATE TABLE IF NOT EXISTS rollups (
+    test TEXT NOT NULL,
+    target TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket REAL NOT NULL,
+    count INTEGER NOT NULL,
+    successes INTEGER NOT NULL,
+    latency_count INTEGER NOT NULL,
+    latency_sum REAL,
+    latency_min REAL,
+    latency_max REAL,
+    latency_p95 REAL,
+    value_sum REAL,
+    value_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (test, target, resolution, bucket)
+);
+CREATE INDEX IF NOT EXISTS rollups_test_ts ON rollups (test, resolution, bucket);
+"""
+
+
+class DiagnosticsStore:
+    """Append-only result history with rollups and regression checks"""
+
+    def __init__(self, path="brana-diagnostics.db"):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record(self, test, success, latency=None, value=None, target="", detail=None, ts=None):
+        self.record_many([(test, success, latency, value, target, detail, ts)])
+
+    def record_many(self, rows):
+        """rows: (test, success, latency, value, target, detail, ts) tuples"""
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO samples (test, target, ts, success, latency, value, detail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(test, target or "", ts if ts is not None else now, int(bool(success)), latency,
+                  value, json.dumps(detail, ensure_ascii=False) if detail is not None else None)
+                 for test, success, latency, value, target, detail, ts in rows])
+
+    # ----- rollupy
+
+    def rollup(self, raw_days=14, hourly_days=90, now=None):
+        """Fold raw samples older than raw_days into hourly rollups and hourly
+        rollups older than hourly_days into daily ones - returns rows folded"""
+        now = time.time() if now is None else now
+        folded = self._rollup_raw(now - raw_days * DAY)
+        folded += self._rollup_hourly(now - hourly_days * DAY)
+        return folded
+
+    def _rollup_raw(self, cutoff):
+        # Jen celé hodiny - rozpracovaná hodina zůstane surová
+        cutoff = cutoff // HOUR * HOUR
+        groups = {}
+        rows = self.db.execute(
+            "SELECT test, target, ts, success, latency, value FROM samples WHERE ts < ?", (cutoff,))
+        for test, target, ts, success, latency, value in rows:
+            key = (test, target, ts // HOUR * HOUR)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {"count": 0, "successes": 0, "latencies": [], "values": []}
+            group["count"] += 1
+            group["successes"] += success
+            if latency is not None and success:
+                group["latencies"].append(latency)
+            if value is not None:
+                group["values"].append(value)
+        with self.db:
+            for (test, target, bucket), group in groups.items():
+                latencies = sorted(group["latencies"])
+                self._merge_rollup(test, target, HOUR, bucket, group["count"], group["successes"],
+                                   len(latencies), sum(latencies),
+                                   latencies[0] if latencies else None,
+                                   latencies[-1] if latencies else None,
+                                   percentile(latencies, 95) if latencies else None,
+                                   sum(group["values"]), len(group["values"]))
+            deleted = self.db.execute("DELETE FROM samples WHERE ts < ?", (cutoff,)).rowcount
+        return deleted
+
+    def _rollup_hourly(self, cutoff):
+        cutoff = cutoff // DAY * DAY
+        rows = self.db.execute(
+            "SELECT test, target, bucket, count, successes, latency_count, latency_sum, latency_min, "
+            "latency_max, latency_p95, value_sum, value_count FROM rollups "
+            "WHERE resolution = ? AND bucket < ?", (HOUR, cutoff)).fetchall()
+        with self.db:
+            for (test, target, bucket, count, successes, latency_count, latency_sum, latency_min,
+                 latency_max, latency_p95, value_sum, value_count) in rows:
+                # p95 dne = nejhorší hodinové p95 (konzervativní odhad)
+                self._merge_rollup(test, target, DAY, bucket // DAY * DAY, count, successes,
+                                   latency_count, latency_sum, latency_min, latency_max,
+                                   latency_p95, value_sum, value_count)
+            deleted = self.db.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                                      (HOUR, cutoff)).rowcount
+        return deleted
+
+    def _merge_rollup(self, test, target, resolution, bucket, count, successes, latency_count,
+                      latency_sum, latency_min, latency_max, latency_p95, value_sum, value_count):
+        self.db.execute(
+            "INSERT INTO rollups (test, target, resolution, bucket, count, successes, latency_count, "
+            "latency_sum, latency_min, latency_max, latency_p95, value_sum, value_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (test, target, resolution, bucket) DO UPDATE SET "
+            "count = count + excluded.count, successes = successes + excluded.successes, "
+            "latency_count = latency_count + excluded.latency_count, "
+            "latency_sum = COALESCE(latency_sum, 0) + COALESCE(excluded.latency_sum, 0), "
+            "latency_min = MIN(COALESCE(latency_min, excluded.latency_min), "
+            "                  COALESCE(excluded.latency_min, latency_min)), "
+            "latency_max = MAX(COALESCE(latency_max, excluded.latency_max), "
+            "                  COALESCE(excluded.latency_max, latency_max)), "
+            "latency_p95 = MAX(COALESCE(latency_p95, excluded.latency_p95), "
+            "                  COALESCE(excluded.latency_p95, latency_p95)), "
+            "value_sum = COALESCE(value_sum, 0) + COALESCE(excluded.value_sum, 0), "
+            "value_count = value_count + excluded.value_count",
+            (test, target, resolution, bucket, count, successes, latency_count, latency_sum,
+             latency_min, latency_max, latency_p95, value_sum, value_count))
+
+    # ----- dotazy
+
+    def tests(self):
+        rows = self.db.execute("SELECT DISTINCT test FROM samples UNION SELECT DISTINCT test FROM rollups")
+        return sorted(row[0] for row in rows)
+
+    def history(self, test, since, until=None, resolution=HOUR):
+        """Per-bucket aggregates over raw samples and rollups.
+
+        Raw samples are grouped in SQL, so a month at hourly resolution is
+        one indexed range scan per table.
+        """
+        until = time.time() if until is None else until
+        buckets = {}
+
+        def add(target, bucket, count, successes, latency_count, latency_sum, latency_max,
+                latency_p95, value_sum, value_count):
+            entry = buckets.setdefault((target, bucket), {
+                "target": target, "bucket": bucket, "count": 0, "successes": 0,
+                "latency_count": 0, "latency_sum": 0.0, "latency_max": None,
+                "latency_p95": None, "value_sum": 0.0, "value_count": 0})
+            entry["count"] += count
+            entry["successes"] += successes
+            entry["latency_count"] += latency_count
+            entry["latency_sum"] += latency_sum or 0.0
+            for key, new in (("latency_max", latency_max), ("latency_p95", latency_p95)):
+                if new is not None and (entry[key] is None or new > entry[key]):
+                    entry[key] = new
+            entry["value_sum"] += value_sum or 0.0
+            entry["value_count"] += value_count
+
+        raw = self.db.execute(
+            "SELECT target, CAST(ts / :res AS INTEGER) * :res, COUNT(*), SUM(success), "
+            "COUNT(CASE WHEN success THEN latency END), SUM(CASE WHEN success THEN latency END), "
+            "MAX(CASE WHEN success THEN latency END), SUM(value), COUNT(value) "
+            "FROM samples WHERE test = :test AND ts >= :since AND ts < :until "
+            "GROUP BY 1, 2", {"res": resolution, "test": test, "since": since, "until": until})
+        for (target, bucket, count, successes, latency_count, latency_sum, latency_max,
+             value_sum, value_count) in raw:
+            # p95 z max není přesné, ale pro přehled stačí; přesné p95 je v compare()
+            add(target, bucket, count, successes, latency_count, latency_sum, latency_max,
+                latency_max, value_sum, value_count)
+        rolled = self.db.execute(
+            "SELECT target, bucket, count, successes, latency_count, latency_sum, latency_max, "
+            "latency_p95, value_sum, value_count FROM rollups "
+            "WHERE test = ? AND bucket + resolution > ? AND bucket < ?", (test, since, until))
+        for (target, bucket, count, successes, latency_count, latency_sum, latency_max,
+             latency_p95, value_sum, value_count) in rolled:
+            add(target, bucket // resolution * resolution, count, successes, latency_count,
+                latency_sum, latency_max, latency_p95, value_sum, value_count)
+
+        result = []
+        for entry in sorted(buckets.values(), key=lambda e: (e["target"], e["bucket"])):
+            entry["success_rate"] = entry["successes"] / entry["count"] if entry["count"] else None
+            entry["latency_avg"] = (entry["latency_sum"] / entry["latency_count"]
+                                    if entry["latency_count"] else None)
+            entry["value_avg"] = entry["value_sum"] / entry["value_count"] if entry["value_count"] else None
+            result.append(entry)
+        return result
+
+    def _window_stats(self, test, since, until):
+        stats = {}
+        rows = self.db.execute(
+            "SELECT target, success, latency FROM samples WHERE test = ? AND ts >= ? AND ts < ?",
+            (test, since, until))
+        for target, success, latency in rows:
+            entry = stats.setdefault(target, {"count": 0, "successes": 0, "latencies": [],
+                                              "rolled_p95": []})
+            entry["count"] += 1
+            entry["successes"] += success
+            if latency is not None and success:
+                entry["latencies"].append(latency)
+        rows = self.db.execute(
+            "SELECT target, count, successes, latency_p95 FROM rollups "
+            "WHERE test = ? AND bucket >= ? AND bucket < ?", (test, since, until))
+        for target, count, successes, latency_p95 in rows:
+            entry = stats.setdefault(target, {"count": 0, "successes": 0, "latencies": [],
+                                              "rolled_p95": []})
+            entry["count"] += count
+            entry["successes"] += successes
+            if latency_p95 is not None:
+                entry["rolled_p95"].append(latency_p95)
+        result = {}
+        for target, entry in stats.items():
+            latencies = sorted(entry["latencies"])
+            if latencies:
+                p95 = percentile(latencies, 95)
+                p50 = percentile(latencies, 50)
+            elif entry["rolled_p95"]:
+                # Jen rollupy - medián hodinových p95
+                p95 = percentile(sorted(entry["rolled_p95"]), 50)
+                p50 = None
+            else:
+                p95 = p50 = None
+            result[target] = {"count": entry["count"],
+                              "success_rate": entry["successes"] / entry["count"],
+                              "p50": p50, "p95": p95}
+        return result
+
+    def compare(self, test, window=HOUR, baseline=7 * DAY, latency_factor=1.5,
+                min_latency_delta=0.02, success_drop=0.05, min_samples=3, now=None):
+        """Recent window vs the rolling baseline before it, per target.
+
+        A regression is p95 latency above latency_factor × baseline (and at
+        least min_latency_delta seconds worse), or a success rate more than
+        success_drop below the baseline.
+        """
+        now = time.time() if now is None else now
+        recent = self._window_stats(test, now - window, now)
+        before = self._window_stats(test, now - window - baseline, now - window)
+        findings = []
+        for target, current in sorted(recent.items()):
+            reference = before.get(target)
+            finding = {"test": test, "target": target, "recent": current, "baseline": reference,
+                       "regressions": []}
+            if reference is None or reference["count"] < min_samples or current["count"] < min_samples:
+                finding["regressions"] = None
+                findings.append(finding)
+                continue
+            if current["success_rate"] < reference["success_rate"] - success_drop:
+                finding["regressions"].append(
+                    f"success rate {reference['success_rate']:.1%} -> {current['success_rate']:.1%}")
+            if (current["p95"] is not None and reference["p95"] is not None
+                    and current["p95"] > reference["p95"] * latency_factor
+                    and current["p95"] - reference["p95"] >= min_latency_delta):
+                finding["regressions"].append(
+                    f"p95 {reference['p95'] * 1000:.0f}ms -> {current['p95'] * 1000:.0f}ms")
+            findings.append(finding)
+        return findings
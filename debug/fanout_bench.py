@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Benchmark rozesílání kamery z backendu (backend/src/modules/camera)
+Otevře N souběžných diváků /api/camera/<id>/stream proti backendu, který
+čte lokální falešnou kameru (debug/sim_harness.py FakeCamera se
+značkovanými snímky), a po stupních N měří:
+    - fps a zpoždění snímků každého diváka proti zdroji
+    - duplicitní / přeskočené / poškozené snímky
+    - vliv pomalých diváků na rychlé (každý stupeň i s --slow diváky)
+    - RSS a CPU procesu backendu (/proc, jinak jen RSS z /health)
+    - kolik upstream spojení na kameru backend otevřel
+
+Backend omezuje nové streamy na 50/min z jedné IP (streamLimiter
+v server.ts). Na Linuxu se proto proti lokálnímu backendu každý divák
+připojuje z jiné adresy 127.x.y.z, jinak by se místo fan-outu měřil
+rate limit.
+
+    cd backend && npm run build
+    python debug/fanout_bench.py --start-backend --viewers 1,5,10,20 --slow 2
+    python debug/fanout_bench.py --backend http://127.0.0.1:3001 --backend-pid 1234
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from async_http import HttpClient, HttpError, split_url
+from bench_stats import format_summary, summarize
+from mjpeg_analyzer import MjpegFrameParser, boundary_from_content_type
+from sim_harness import SimulationHarness, read_frame_stamp
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+CAMERA_ID = "fanout-bench"
+
+# Fan-out se považuje za rozpadlý pod 80 % zdrojových fps nebo nad 1 s zpoždění
+MIN_FPS_RATIO = 0.8
+MAX_LAG_P95 = 1.0
+
+
+def parse_counts(spec):
+    """'1,5,10' -> [1, 5, 10]"""
+    return [int(part) for part in spec.split(",") if part.strip()]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SourceAddresses:
+    """Distinct loopback source addresses (127.0.0.2, 127.0.0.3, ...)
+
+    Only used on Linux against a loopback backend, where the whole
+    127.0.0.0/8 range is local without configuration.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self._next = int(ipaddress.IPv4Address("127.0.0.2"))
+
+    def take(self):
+        if not self.enabled:
+            return None
+        address = str(ipaddress.IPv4Address(self._next))
+        self._next += 1
+        return address
+
+
+class ProcessSampler:
+    """CPU % and RSS of the backend process from /proc/<pid>"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.tick = os.sysconf("SC_CLK_TCK")
+        self._last = None
+
+    def _cpu_seconds(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.tick
+
+    def _rss(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return None
+
+    def sample(self):
+        """(cpu % since the previous sample or None, rss bytes)"""
+        now = time.perf_counter()
+        cpu = self._cpu_seconds()
+        percent = None
+        if self._last is not None:
+            percent = 100.0 * (cpu - self._last[1]) / max(1e-6, now - self._last[0])
+        self._last = (now, cpu)
+        return percent, self._rss()
+
+
+class Viewer:
+    """One MJPEG consumer - reads as fast as it can, or `slow_rate` bytes/s"""
+
+    def __init__(self, index, url, slow_rate=None, source_address=None, timeout=10.0):
+        self.index = index
+        self.url = url
+        self.slow_rate = slow_rate
+        self.source_address = source_address
+        self.timeout = timeout
+        self.status = None
+        self.error = None
+        self.frames = 0
+        self.unique = 0
+        self.bytes = 0
+        self.lags = []
+        self.duplicates = 0
+        self.skipped = 0
+        self.unstamped = 0
+        self.first_frame = None
+        self.max_gap = 0.0
+        self._newest = None
+        self._last_frame_at = None
+
+    def _on_frame(self, view):
+        now = time.perf_counter()
+        self.frames += 1
+        if self._last_frame_at is not None:
+            self.max_gap = max(self.max_gap, now - self._last_frame_at)
+        else:
+            self.first_frame = now - self._started
+        self._last_frame_at = now
+        stamp = read_frame_stamp(view)
+        if stamp is None:
+            self.unstamped += 1
+            return
+        index, produced_ns = stamp
+        self.lags.append((time.time_ns() - produced_ns) / 1e9)
+        if self._newest is None or index > self._newest:
+            if self._newest is not None:
+                self.skipped += index - self._newest - 1
+            self._newest = index
+            self.unique += 1
+        else:
+            # Stejný nebo starší snímek znovu (víc upstream spojení)
+            self.duplicates += 1
+
+    async def _connect(self, host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.slow_rate:
+            # Malý buffer - pomalý divák se projeví na backendu hned, ne až po MB
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+        if self.source_address:
+            sock.bind((self.source_address, 0))
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (host, port)),
+                                   self.timeout)
+        except BaseException:
+            sock.close()
+            raise
+        return await asyncio.open_connection(sock=sock)
+
+    async def run(self, duration):
+        _, host, port, path = split_url(self.url)
+        self._started = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await self._connect(socket.gethostbyname(host), port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                         f"Accept: multipart/x-mixed-replace\r\n\r\n".encode("latin-1"))
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+            lines = head.decode("latin-1").split("\r\n")
+            self.status = int(lines[0].split(" ")[1])
+            if self.status != 200:
+                self.error = f"HTTP {self.status}"
+                return self
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parser = MjpegFrameParser(boundary_from_content_type(headers.get("content-type", "")),
+                                      on_frame=self._on_frame)
+            deadline = self._started + duration
+            read_size = 4096 if self.slow_rate else 65536
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    data = await asyncio.wait_for(reader.read(read_size),
+                                                  min(remaining, self.timeout))
+                except asyncio.TimeoutError:
+                    if time.perf_counter() < deadline:
+                        self.error = f"stalled (no data for {self.timeout:g}s)"
+                    break
+                if not data:
+                    self.error = "stream ended"
+                    break
+                self.bytes += len(data)
+                parser.feed(data)
+                if self.slow_rate:
+                    await asyncio.sleep(len(data) / self.slow_rate)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError,
+                IndexError) as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.elapsed = time.perf_counter() - self._started
+            if writer is not None:
+                writer.close()
+        return self
+
+    def report(self):
+        return {
+            "viewer": self.index,
+            "slow": bool(self.slow_rate),
+            "status": self.status,
+            "error": self.error,
+            "frames": self.frames,
+            "unique_frames": self.unique,
+            # Bez značek nejde duplicity poznat - počítá se každý snímek
+            "fps": (self.unique if self.unique or not self.unstamped else self.frames)
+                   / self.elapsed if self.elapsed > 0 else 0.0,
+            "delivered_fps": self.frames / self.elapsed if self.elapsed > 0 else 0.0,
+            "bytes_per_sec": self.bytes / self.elapsed if self.elapsed > 0 else 0.0,
+            "first_frame": self.first_frame,
+            "max_gap": self.max_gap,
+            "lag": summarize(self.lags),
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "unstamped": self.unstamped,
+        }
+
+
+class FanoutBenchmark:
+    """Steps the number of concurrent viewers against one backend camera"""
+
+    def __init__(self, backend_url, camera, camera_stream_url, source_fps, backend_pid=None,
+                 slow_rate=50000.0, timeout=10.0, log=print):
+        self.backend_url = backend_url.rstrip("/")
+        self.camera = camera
+        self.camera_stream_url = camera_stream_url
+        self.source_fps = source_fps
+        self.backend_pid = backend_pid
+        self.slow_rate = slow_rate
+        self.timeout = timeout
+        self.log = log
+        self.stream_url = f"{self.backend_url}/api/camera/{CAMERA_ID}/stream"
+        host = split_url(self.backend_url)[1]
+        self.addresses = SourceAddresses(sys.platform.startswith("linux")
+                                         and socket.gethostbyname(host).startswith("127."))
+        self.http = HttpClient(concurrency=2, per_host=2, timeout=timeout)
+
+    async def register_camera(self):
+        body = json.dumps({"id": CAMERA_ID, "name": "Fan-out benchmark camera", "type": "mjpeg",
+                           "streamUrl": self.camera_stream_url, "timeout": 5000,
+                           "retryAttempts": 5}).encode()
+        response, payload = await self.http.fetch(
+            "POST", f"{self.backend_url}/api/camera", {"Content-Type": "application/json"}, body)
+        if response.status != 201:
+            raise RuntimeError(f"Camera registration failed: HTTP {response.status} "
+                               f"{payload[:200].decode('utf-8', 'replace')}")
+
+    async def wait_ready(self, timeout=30.0):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                response, _ = await self.http.fetch("GET", f"{self.backend_url}/health")
+                if response.status == 200:
+                    return
+            except (HttpError, OSError, asyncio.TimeoutError):
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"Backend {self.backend_url} not ready after {timeout:g}s")
+            await asyncio.sleep(0.2)
+
+    async def _health_rss(self):
+        try:
+            response, payload = await self.http.fetch("GET", f"{self.backend_url}/health")
+            return json.loads(payload)["memory"]["rss"]
+        except (HttpError, OSError, asyncio.TimeoutError, ValueError, KeyError):
+            return None
+
+    async def _sample_server(self, samples, stop):
+        sampler = ProcessSampler(self.backend_pid) if self.backend_pid else None
+        if sampler is not None:
+            sampler.sample()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+            if sampler is not None:
+                try:
+                    cpu, rss = sampler.sample()
+                except OSError:
+                    sampler = None
+                    continue
+            else:
+                cpu, rss = None, await self._health_rss()
+            camera = self.camera.stats if self.camera is not None else {}
+            samples.append({"cpu": cpu, "rss": rss, "upstream": camera.get("active_streams")})
+
+    async def run_step(self, viewers, slow, duration):
+        upstream_before = self.camera.stats["streams"] if self.camera is not None else None
+        clients = [Viewer(index, self.stream_url, None, self.addresses.take(), self.timeout)
+                   for index in range(viewers)]
+        clients += [Viewer(viewers + index, self.stream_url, self.slow_rate, self.addresses.take(),
+                           self.timeout) for index in range(slow)]
+        samples = []
+        stop = asyncio.Event()
+        sampler = asyncio.ensure_future(self._sample_server(samples, stop))
+        try:
+            await asyncio.gather(*(client.run(duration) for client in clients))
+        finally:
+            stop.set()
+            await sampler
+        reports = [client.report() for client in clients]
+        upstream_opened = (self.camera.stats["streams"] - upstream_before
+                           if self.camera is not None else None)
+        return summarize_step(viewers, slow, reports, samples, upstream_opened, self.source_fps)
+
+    async def run(self, counts, slow=0, duration=10.0, pause=1.0):
+        await self.wait_ready()
+        await self.register_camera()
+        steps = []
+        try:
+            for viewers in counts:
+                for slow_count in ([0, slow] if slow else [0]):
+                    label = f"{viewers} viewers" + (f" + {slow_count} slow" if slow_count else "")
+                    self.log(f"📺 {label} for {duration:g}s ...")
+                    step = await self.run_step(viewers, slow_count, duration)
+                    steps.append(step)
+                    print_step(step, self.log)
+                    # Backend si má stihnout uklidit odpojené klienty
+                    await asyncio.sleep(pause)
+        finally:
+            await self.http.close()
+        return analyze_fanout(steps, slow)
+
+
+def summarize_step(viewers, slow, reports, samples, upstream_opened, source_fps):
+    fast = [r for r in reports if not r["slow"]]
+    slow_reports = [r for r in reports if r["slow"]]
+    fast_ok = [r for r in fast if r["status"] == 200]
+    errors = {}
+    for report in reports:
+        if report["error"]:
+            errors[report["error"]] = errors.get(report["error"], 0) + 1
+    lags = [lag for r in fast_ok for lag in ([] if not r["lag"]["count"] else [r["lag"]["p50"]])]
+    cpu = [s["cpu"] for s in samples if s["cpu"] is not None]
+    rss = [s["rss"] for s in samples if s["rss"] is not None]
+    upstream = [s["upstream"] for s in samples if s["upstream"] is not None]
+    step = {
+        "viewers": viewers,
+        "slow": slow,
+        "source_fps": source_fps,
+        "connected": len(fast_ok),
+        "errors": errors,
+        "fast_fps": summarize([r["fps"] for r in fast_ok]),
+        "duplication": (sum(r["frames"] for r in fast_ok) / sum(r["unique_frames"] for r in fast_ok)
+                        if sum(r["unique_frames"] for r in fast_ok) else None),
+        "fast_lag_p50": summarize(lags),
+        "fast_lag_p95_max": max((r["lag"]["p95"] for r in fast_ok if r["lag"]["count"]), default=None),
+        "fast_max_gap": max((r["max_gap"] for r in fast_ok), default=None),
+        "first_frame": summarize([r["first_frame"] for r in fast_ok if r["first_frame"] is not None]),
+        "duplicates": sum(r["duplicates"] for r in fast_ok),
+        "skipped": sum(r["skipped"] for r in fast_ok),
+        "unstamped": sum(r["unstamped"] for r in fast_ok),
+        "slow_fps": summarize([r["fps"] for r in slow_reports if r["status"] == 200]),
+        "server_cpu": sum(cpu) / len(cpu) if cpu else None,
+        "server_rss_max": max(rss) if rss else None,
+        "upstream_opened": upstream_opened,
+        "upstream_max": max(upstream) if upstream else None,
+        "viewers_detail": reports,
+    }
+    min_fps = step["fast_fps"]["min"]
+    step["healthy"] = bool(
+        step["connected"] == viewers and not errors
+        and min_fps is not None and min_fps >= source_fps * MIN_FPS_RATIO
+        and (step["fast_lag_p95_max"] is None or step["fast_lag_p95_max"] <= MAX_LAG_P95))
+    return step
+
+
+def analyze_fanout(steps, slow):
+    """Largest healthy viewer count and the fast-viewer cost of slow viewers"""
+    baseline = [s for s in steps if s["slow"] == 0]
+    max_viewers = 0
+    for step in baseline:
+        if not step["healthy"]:
+            break
+        max_viewers = step["viewers"]
+    slow_impact = []
+    if slow:
+        for step in steps:
+            if step["slow"]:
+                base = next(s for s in baseline if s["viewers"] == step["viewers"])
+                slow_impact.append({
+                    "viewers": step["viewers"],
+                    "fps_delta": _delta(step["fast_fps"]["mean"], base["fast_fps"]["mean"]),
+                    "lag_p95_delta": _delta(step["fast_lag_p95_max"], base["fast_lag_p95_max"]),
+                    "rss_delta": _delta(step["server_rss_max"], base["server_rss_max"]),
+                })
+    return {"steps": steps, "max_healthy_viewers": max_viewers, "slow_impact": slow_impact}
+
+
+def _delta(value, base):
+    return value - base if value is not None and base is not None else None
+
+
+def _mb(value):
+    return f"{value / 1048576:.0f}MB" if value is not None else "-"
+
+
+def print_step(step, log=print):
+    marker = "✅" if step["healthy"] else "❌"
+    fps = step["fast_fps"]
+    log(f"  {marker} {step['connected']}/{step['viewers']} connected, fps "
+        f"min {fps['min'] or 0:.1f} mean {fps['mean'] or 0:.1f} (source {step['source_fps']:g}), "
+        f"errors {step['errors'] or 'none'}")
+    log(f"     lag p50 {format_summary(step['fast_lag_p50'], unit='ms', scale=1000)}, "
+        f"worst viewer p95 {(step['fast_lag_p95_max'] or 0) * 1000:.0f}ms, "
+        f"max gap {(step['fast_max_gap'] or 0) * 1000:.0f}ms")
+    duplication = f" (each frame ×{step['duplication']:.1f})" if step["duplication"] else ""
+    log(f"     frames dup {step['duplicates']}{duplication} skipped {step['skipped']} "
+        f"unstamped {step['unstamped']}")
+    if step["slow"]:
+        log(f"     slow viewers fps mean {step['slow_fps']['mean'] or 0:.1f}")
+    cpu = f"{step['server_cpu']:.0f}%" if step["server_cpu"] is not None else "-"
+    log(f"     backend cpu {cpu} rss max {_mb(step['server_rss_max'])}, "
+        f"upstream opened {step['upstream_opened']} (max open {step['upstream_max']})")
+
+
+def print_fanout_summary(analysis, log=print):
+    log("\n📊 Fan-out summary")
+    for step in analysis["steps"]:
+        cpu = f"{step['server_cpu']:5.0f}%" if step["server_cpu"] is not None else "     -"
+        slow = f"+{step['slow']} slow" if step["slow"] else ""
+        log(f"  {'✅' if step['healthy'] else '❌'} {step['viewers']:>4} viewers {slow:<7} "
+            f"fps {step['fast_fps']['mean'] or 0:5.1f}  "
+            f"lag p95 {(step['fast_lag_p95_max'] or 0) * 1000:7.0f}ms  cpu {cpu}  "
+            f"rss {_mb(step['server_rss_max']):>6}  upstream {step['upstream_opened']}")
+    for impact in analysis["slow_impact"]:
+        fps = f"{impact['fps_delta']:+.1f}" if impact["fps_delta"] is not None else "-"
+        lag = f"{impact['lag_p95_delta'] * 1000:+.0f}ms" if impact["lag_p95_delta"] is not None else "-"
+        log(f"  🐌 slow viewers at {impact['viewers']}: fast fps {fps}, lag p95 {lag}, "
+            f"rss {_mb(impact['rss_delta']) if impact['rss_delta'] is not None else '-'}")
+    last = analysis["steps"][-1] if analysis["steps"] else None
+    if last and last["upstream_opened"] and last["upstream_opened"] > 1:
+        log(f"⚠️  Backend opened {last['upstream_opened']} camera connections for "
+            f"{last['viewers'] + last['slow']} viewers (up to {last['upstream_max']} open at once) "
+            f"- viewers get duplicate frames")
+    log(f"👪 Stream stays healthy up to {analysis['max_healthy_viewers']} concurrent viewers")
+
+
+def start_backend(port, log=print):
+    """node backend/dist/server.js in a scratch directory (its logs/ go there)"""
+    server = os.path.join(BACKEND_DIR, "dist", "server.js")
+    if not os.path.exists(server):
+        raise FileNotFoundError(f"{server} missing - run `npm run build` in backend/")
+    workdir = tempfile.mkdtemp(prefix="brana-fanout-")
+    env = dict(os.environ, PORT=str(port), NODE_ENV="production", LOG_LEVEL="warn",
+               NODE_PATH=os.path.join(BACKEND_DIR, "node_modules"))
+    process = subprocess.Popen(["node", server], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    log(f"🟢 Backend pid {process.pid} on port {port} (logs in {workdir}/logs)")
+    return process
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-viewer fan-out benchmark for the camera backend")
+    parser.add_argument("--backend", default="http://127.0.0.1:3001", help="backend base URL")
+    parser.add_argument("--start-backend", action="store_true",
+                        help="start backend/dist/server.js on a free port for the run")
+    parser.add_argument("--backend-pid", type=int, help="sample CPU/RSS of this process")
+    parser.add_argument("--viewers", default="1,2,5,10,20", help="viewer counts per step")
+    parser.add_argument("--slow", type=int, default=0,
+                        help="repeat each step with this many slow viewers added")
+    parser.add_argument("--slow-rate", type=float, default=50000.0, help="slow viewer bytes/s")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    parser.add_argument("--fps", type=float, default=15.0, help="fake camera fps")
+    parser.add_argument("--frame-size", type=int, default=40000, help="fake camera frame bytes")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+
+    harness = SimulationHarness(gate=False, run_broker=False,
+                                camera_options={"fps": args.fps, "frame_size": args.frame_size,
+                                                "stamp": True}).start_in_thread()
+    backend = None
+    backend_url, backend_pid = args.backend, args.backend_pid
+    try:
+        if args.start_backend:
+            port = free_port()
+            backend = start_backend(port)
+            backend_url, backend_pid = f"http://127.0.0.1:{port}", backend.pid
+        print(f"📺 Fan-out benchmark: {backend_url} <- {harness.camera_url}/stream.mjpg")
+        print("=" * 50)
+        bench = FanoutBenchmark(backend_url, harness.camera, f"{harness.camera_url}/stream.mjpg",
+                                args.fps, backend_pid, args.slow_rate, args.timeout)
+        try:
+            analysis = asyncio.run(bench.run(parse_counts(args.viewers), args.slow, args.duration))
+        except KeyboardInterrupt:
+            print("\n🛑 Benchmark interrupted")
+            return 130
+        except (RuntimeError, TimeoutError, OSError, HttpError) as e:
+            print(f"❌ {e}")
+            return 1
+        print_fanout_summary(analysis)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"benchmark": "camera_fanout", "version": 1, "backend": backend_url,
+                           **analysis}, f, indent=2)
+            print(f"💾 Result saved to {args.output}")
+        return 0 if analysis["steps"] and analysis["steps"][0]["healthy"] else 1
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(10)
+        harness.stop_thread()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark odezvy brány: publish do IoT/Brana/Ovladani -> změna IoT/Brana/Status(2)
+Měří to, co cítí uživatel - čas od příkazu do první změny stavu a do
+ustáleného stavu (monotónní hodiny), percentily a timeouty
+
+Výchozí cíl je simulovaná brána (debug/sim_harness.py) na lokálním
+brokeru, takže se nic fyzicky nehýbe. Skutečná brána vyžaduje
+--target real a --yes-move-the-gate.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from bench_stats import format_summary, summarize
+from mqtt_wire import is_loopback
+from sim_harness import COMMAND_STATUS_TOPIC, SETTLED_STATES, SimulationHarness
+
+COMMAND_TOPIC = "IoT/Brana/Ovladani"
+GATE_TOPIC = "IoT/Brana/Status"
+GARAGE_TOPIC = "IoT/Brana/Status2"
+LOG_TOPIC = "Log/Brana/ID"
+
+
+def make_client(client_id, transport):
+    return mqtt.Client(client_id, transport=transport)
+
+
+class GateLatencyBenchmark:
+    """Publishes commands and timestamps the status transitions they cause"""
+
+    def __init__(self, host, port, transport="websockets", log=print):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.log = log
+        self._client = None
+        self._cond = threading.Condition()
+        self._events = []          # (monotonic, topic, payload)
+        self._seen = 0
+        self._last = {}
+
+    def connect(self, timeout=10.0):
+        connected = threading.Event()
+        self._client = make_client(f"gate-bench-{int(time.time())}", self.transport)
+
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                client.subscribe([(GATE_TOPIC, 1), (GARAGE_TOPIC, 1), (LOG_TOPIC, 1)])
+                connected.set()
+
+        def on_message(client, userdata, msg):
+            received = time.monotonic()
+            payload = msg.payload.decode("utf-8", errors="ignore").strip()
+            with self._cond:
+                if msg.retain:
+                    # Retained hodnota je výchozí stav, ne přechod
+                    self._last.setdefault(msg.topic, payload)
+                    return
+                self._events.append((received, msg.topic, payload))
+                self._cond.notify_all()
+
+        self._client.on_connect = on_connect
+        self._client.on_message = on_message
+        self._client.connect(self.host, self.port, 60)
+        self._client.loop_start()
+        if not connected.wait(timeout):
+            raise ConnectionError(f"Benchmark client could not connect to {self.host}:{self.port}")
+        time.sleep(0.2)  # retained stavy
+
+    def _wait_for(self, start_index, predicate, deadline):
+        """Index of the first event from start_index matching predicate, or None"""
+        index = start_index
+        with self._cond:
+            while True:
+                while index < len(self._events):
+                    if predicate(self._events[index]):
+                        return index
+                    index += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def issue(self, command, timeout):
+        """One command - returns a sample dict with first-change and settle latency"""
+        topic = COMMAND_STATUS_TOPIC.get(command, GATE_TOPIC)
+        with self._cond:
+            # Stav podle všech dosud přijatých zpráv, i těch po minulém měření
+            for _, event_topic, payload in self._events[self._seen:]:
+                self._last[event_topic] = payload
+            start_index = self._seen = len(self._events)
+            previous = self._last.get(topic)
+        sent = time.monotonic()
+        info = self._client.publish(COMMAND_TOPIC, command, qos=0)
+        info.wait_for_publish(timeout)
+        published = time.monotonic()
+        deadline = sent + timeout
+        sample = {"command": command, "sent_at": sent, "publish_latency": published - sent,
+                  "first_change": None, "settled": None, "log_latency": None,
+                  "states": [], "timeout": False}
+
+        if command == "3":
+            # Garáž hlásí pohyb pokaždé stejnou zprávou - přechodem je každá nová
+            changed = self._wait_for(start_index, lambda e: e[1] == topic, deadline)
+        else:
+            changed = self._wait_for(start_index,
+                                     lambda e: e[1] == topic and e[2] != previous, deadline)
+        if changed is None:
+            sample["timeout"] = True
+            return sample
+        sample["first_change"] = self._events[changed][0] - sent
+        settled = None
+        if command != "3":
+            # Garáž posílá jen "pohyb" a P1 při zavření - na ustálení se nečeká
+            settled = self._wait_for(changed,
+                                     lambda e: e[1] == topic and e[2] in SETTLED_STATES,
+                                     deadline)
+        with self._cond:
+            end = settled if settled is not None else changed
+            events = self._events[start_index:end + 1]
+            for received, event_topic, payload in events:
+                if event_topic == topic:
+                    sample["states"].append([round(received - sent, 6), payload])
+                elif event_topic == LOG_TOPIC and sample["log_latency"] is None:
+                    sample["log_latency"] = received - sent
+        if settled is not None:
+            sample["settled"] = self._events[settled][0] - sent
+        elif command != "3":
+            sample["timeout"] = True
+        return sample
+
+    def run(self, count, command="1", spacing=2.0, timeout=30.0):
+        samples = []
+        for index in range(count):
+            sample = self.issue(command, timeout)
+            samples.append(sample)
+            if sample["timeout"]:
+                self.log(f"  ⏰ #{index + 1}: timeout after {timeout:.0f}s")
+            else:
+                settled = f"{sample['settled']:.3f}s" if sample["settled"] is not None else "-"
+                self.log(f"  ✅ #{index + 1}: first change {sample['first_change']:.3f}s, "
+                         f"settled {settled}")
+            if index + 1 < count:
+                time.sleep(spacing)
+        return samples
+
+    def close(self):
+        if self._client is not None:
+            self._client.loop_stop()
+            self._client.disconnect()
+
+
+def build_result(samples, meta):
+    """Comparable result document - same keys for every run"""
+    ok = [s for s in samples if not s["timeout"]]
+    return {
+        "benchmark": "gate_round_trip",
+        "version": 1,
+        "timestamp": datetime.now().isoformat(),
+        "meta": meta,
+        "summary": {
+            "commands": len(samples),
+            "timeouts": len(samples) - len(ok),
+            "first_change": summarize([s["first_change"] for s in ok]),
+            "settled": summarize([s["settled"] for s in ok if s["settled"] is not None]),
+            "publish_latency": summarize([s["publish_latency"] for s in samples]),
+        },
+        "samples": samples,
+    }
+
+
+def compare_results(old, new, log=print):
+    """Print p50/p95/p99 deltas between two saved result files"""
+    log(f"📊 {old['timestamp']} ({old['meta'].get('target')}) -> "
+        f"{new['timestamp']} ({new['meta'].get('target')})")
+    for metric in ("first_change", "settled"):
+        for key in ("p50", "p95", "p99"):
+            before = old["summary"][metric][key]
+            after = new["summary"][metric][key]
+            if before is None or after is None:
+                continue
+            delta = (after - before) / before if before else 0.0
+            marker = "🔺" if delta > 0.1 else ("🔻" if delta < -0.1 else "  ")
+            log(f"  {marker} {metric:<12} {key}: {before * 1000:8.1f}ms -> {after * 1000:8.1f}ms "
+                f"({delta:+.0%})")
+    log(f"  ⏰ timeouts: {old['summary']['timeouts']} -> {new['summary']['timeouts']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gate command round-trip latency benchmark")
+    parser.add_argument("--broker", default="local",
+                        help="host:port, or 'local' for the in-process stand-in broker")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="tcp")
+    parser.add_argument("--target", choices=["sim", "real"], default="sim",
+                        help="sim = start a simulated gate on the (local) broker")
+    parser.add_argument("--yes-move-the-gate", action="store_true",
+                        help="required with --target real - commands move the real gate")
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("--command", default="1", choices=sorted(COMMAND_STATUS_TOPIC))
+    parser.add_argument("--spacing", type=float, default=None,
+                        help="pause between commands [s] (default travel time + 0.5 sim / 20 real)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per command [s]")
+    parser.add_argument("--travel-time", type=float, default=0.5, help="simulated travel [s]")
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two saved results and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            compare_results(json.load(f_old), json.load(f_new))
+        return 0
+
+    if args.target == "real" and not args.yes_move_the_gate:
+        print("🛑 --target real moves the physical gate - add --yes-move-the-gate")
+        return 2
+    local = args.broker == "local"
+    if local and args.target == "real":
+        print("🛑 The real gate is not on the local stand-in broker - pass --broker host:port")
+        return 2
+    host, _, port = ("127.0.0.1:0" if local else args.broker).partition(":")
+    port = int(port or 1883)
+    if args.target == "sim" and not is_loopback(host):
+        print(f"🛑 Simulated gate runs only against a local broker, not {host}")
+        return 2
+    if args.spacing is not None:
+        spacing = args.spacing
+    else:
+        # Další příkaz až po doběhnutí pohybu, jinak se měří zbytky minulého
+        spacing = args.travel_time + 0.5 if args.target == "sim" else 20.0
+
+    print("⏱️  Gate round-trip benchmark")
+    print("=" * 50)
+    harness = None
+    if args.target == "sim":
+        harness = SimulationHarness(host, port, run_broker=local, camera=False,
+                                    gate_options={"transport": args.transport,
+                                                  "travel_time": args.travel_time},
+                                    log=print).start_in_thread()
+        port = harness.mqtt_port
+    bench = GateLatencyBenchmark(host, port, args.transport)
+    try:
+        bench.connect()
+        samples = bench.run(args.count, args.command, spacing, args.timeout)
+    finally:
+        bench.close()
+        if harness is not None:
+            harness.stop_thread()
+
+    result = build_result(samples, {"target": args.target, "broker": args.broker,
+                                    "transport": args.transport, "command": args.command,
+                                    "spacing": spacing, "timeout": args.timeout})
+    summary = result["summary"]
+    print(f"\n📊 {summary['commands']} commands, {summary['timeouts']} timeouts")
+    print(f"  first change: {format_summary(summary['first_change'], unit='ms', scale=1000)}")
+    print(f"  settled:      {format_summary(summary['settled'], unit='ms', scale=1000)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"💾 Result saved to {args.output}")
+    return 0 if summary["timeouts"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Streamovací analyzátor MJPEG (multipart/x-mixed-replace) streamu
+Čte tělo odpovědi po dobu N sekund / N snímků a měří doručené fps,
+velikosti snímků, jitter mezi snímky, čas do prvního snímku a bytes/s
+
+Parser pracuje inkrementálně nad jedním znovupoužívaným bufferem
+(bytearray + memoryview), hledání markerů dělá bytearray.find v C,
+takže v Pythonu se neprochází žádný byte jednotlivě.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from async_http import HttpConnection, split_url
+from bench_stats import format_summary, summarize
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+HEADER_END = b"\r\n\r\n"
+
+
+def boundary_from_content_type(content_type):
+    """Vytáhne boundary z hlavičky Content-Type (bez úvodních --)"""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary":
+            value = value.strip().strip('"')
+            return value[2:] if value.startswith("--") else value
+    return None
+
+
+class MjpegFrameParser:
+    """Incremental multipart/JPEG frame splitter over a reused buffer.
+
+    feed() copies each network chunk into a preallocated bytearray and
+    emits complete frames as memoryview slices via on_frame(view) - the
+    view is only valid during the callback. Parts with a Content-Length
+    header are cut by length, others by the JPEG SOI/EOI markers (nested
+    SOI/EOI pairs such as EXIF thumbnails are skipped) or, failing that, at
+    the last EOI before the next boundary.
+    """
+
+    def __init__(self, boundary=None, on_frame=None, initial_size=1 << 20,
+                 max_frame_size=16 << 20):
+        self.boundary = b"--" + boundary.encode("latin-1") if boundary else None
+        self.on_frame = on_frame
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(initial_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self._scan = 0          # odkud pokračovat v hledání markeru
+        self._part_length = None
+        self._in_frame = False
+        self._depth = 0         # otevřené SOI v aktuálním snímku bez délky
+        self.frames = 0
+        self.bytes_fed = 0
+        self.discarded = 0
+        self.busy_time = 0.0
+
+    def _reserve(self, size):
+        """Make room for `size` more bytes, compacting or growing the buffer"""
+        if self._end + size <= len(self._buffer):
+            return
+        pending = self._end - self._start
+        if pending + size > len(self._buffer):
+            new_size = len(self._buffer)
+            while pending + size > new_size:
+                new_size *= 2
+            self._view.release()
+            grown = bytearray(new_size)
+            grown[:pending] = self._buffer[self._start:self._end]
+            self._buffer = grown
+            self._view = memoryview(self._buffer)
+        elif pending:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
+
+    def feed(self, data):
+        """Append a chunk and emit every frame completed by it"""
+        started = time.perf_counter()
+        size = len(data)
+        self._reserve(size)
+        self._view[self._end:self._end + size] = data
+        self._end += size
+        self.bytes_fed += size
+        emitted = 0
+        while self._parse_one():
+            emitted += 1
+        if self._end - self._start > self.max_frame_size:
+            # Nesmyslná data bez markerů - zahodit, ať buffer neroste donekonečna
+            self.discarded += self._end - self._start
+            self._start = self._scan = self._end
+            self._in_frame = False
+            self._part_length = None
+        self.busy_time += time.perf_counter() - started
+        return emitted
+
+    def _parse_one(self):
+        buf = self._buffer
+        if self._part_length is None and not self._in_frame and self.boundary is not None:
+            # Hlavičky části: "--boundary\r\nContent-Type: ...\r\n\r\n"
+            marker = buf.find(self.boundary, self._start, self._end)
+            if marker < 0:
+                # Nech si konec pro případ, že je boundary rozdělená mezi chunky
+                self._start = max(self._start, self._end - len(self.boundary))
+                return False
+            header_end = buf.find(HEADER_END, marker, self._end)
+            if header_end < 0:
+                self._start = marker
+                return False
+            length = None
+            for line in bytes(buf[marker:header_end]).split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    try:
+                        length = int(value.strip())
+                    except ValueError:
+                        length = None
+            self._start = self._scan = header_end + len(HEADER_END)
+            self._part_length = length
+            self._in_frame = length is None
+            self._depth = 0
+            if length is None:
+                return True
+        if self._part_length is not None:
+            if self._end - self._start < self._part_length:
+                return False
+            self._emit(self._start, self._start + self._part_length)
+            self._part_length = None
+            return True
+        # Bez délky: SOI ... EOI, vnořený JPEG (náhled v EXIF) má vlastní
+        # SOI/EOI, takže snímek končí až EOI ve stejné hloubce
+        if not self._in_frame:
+            soi = buf.find(SOI, self._start, self._end)
+            if soi < 0:
+                self._start = max(self._start, self._end - 1)
+                return False
+            self._start = soi
+            self._scan = soi + 2
+            self._depth = 1
+            self._in_frame = True
+        while True:
+            eoi = buf.find(EOI, self._scan, self._end)
+            limit = eoi if eoi >= 0 else self._end
+            if self.boundary is not None:
+                marker = buf.find(self.boundary, self._scan, limit)
+                if marker >= 0:
+                    # Část skončila bez EOI ve správné hloubce - vezmi
+                    # poslední EOI před boundary, jinak celou část bez CRLF
+                    end = buf.rfind(EOI, self._start, marker)
+                    if end >= 0:
+                        end += 2
+                    else:
+                        end = marker - 2 if buf.endswith(b"\r\n", self._start, marker) else marker
+                    self._emit(self._start, end)
+                    self._in_frame = False
+                    return True
+            soi = buf.find(SOI, self._scan, limit)
+            if soi >= 0:
+                self._depth += 1
+                self._scan = soi + 2
+                continue
+            if eoi < 0:
+                keep = len(self.boundary) if self.boundary is not None else 1
+                self._scan = max(self._scan, self._end - keep)
+                return False
+            self._scan = eoi + 2
+            self._depth -= 1
+            if self._depth <= 0:
+                break
+        self._emit(self._start, eoi + 2)
+        self._in_frame = False
+        return True
+
+    def _emit(self, start, end):
+        self.frames += 1
+        if self.on_frame is not None:
+            frame = self._view[start:end]
+            try:
+                self.on_frame(frame)
+            finally:
+                frame.release()
+        self._start = self._scan = end
+
+
+class StreamStats:
+    """Arrival times and sizes of frames for one stream"""
+
+    def __init__(self, url):
+        self.url = url
+        self.request_started = None
+        self.headers_at = None
+        self.arrivals = []
+        self.sizes = []
+        self.bytes_total = 0
+        self.ended = None
+        self.error = None
+        self.status = None
+        self.content_type = None
+
+    def frame(self, view):
+        self.arrivals.append(time.perf_counter())
+        self.sizes.append(len(view))
+
+    def report(self, parser=None):
+        elapsed = (self.ended or time.perf_counter()) - self.request_started
+        intervals = [b - a for a, b in zip(self.arrivals, self.arrivals[1:])]
+        fps = None
+        if len(self.arrivals) > 1:
+            fps = (len(self.arrivals) - 1) / (self.arrivals[-1] - self.arrivals[0])
+        result = {
+            "url": self.url,
+            "status": self.status,
+            "content_type": self.content_type,
+            "error": self.error,
+            "frames": len(self.arrivals),
+            "duration": elapsed,
+            "fps": fps,
+            "time_to_headers": (self.headers_at - self.request_started) if self.headers_at else None,
+            "time_to_first_frame": (self.arrivals[0] - self.request_started) if self.arrivals else None,
+            "bytes_total": self.bytes_total,
+            "bytes_per_sec": self.bytes_total / elapsed if elapsed > 0 else 0,
+            "frame_size": summarize(self.sizes),
+            "interval": summarize(intervals),
+            "jitter": statistics.pstdev(intervals) if len(intervals) > 1 else None,
+        }
+        if parser is not None:
+            result["parser_busy"] = parser.busy_time / elapsed if elapsed > 0 else 0
+            result["discarded_bytes"] = parser.discarded
+        return result
+
+
+async def analyze_stream(url, duration=10.0, max_frames=None, timeout=5.0,
+                         on_frame=None, read_size=65536, on_data=None):
+    """Čte stream po dobu `duration` sekund nebo do `max_frames` snímků.
+
+    `on_frame(view, stats)` se volá pro každý kompletní snímek (např. pro
+    detekci zamrzlého obrazu), `on_data(size, stats)` pro každé přečtení
+    ze socketu. Vrací slovník s metrikami streamu.
+    """
+    stats = StreamStats(url)
+    scheme, host, port, path = split_url(url)
+    connection = HttpConnection(scheme, host, port, timeout=timeout)
+    stats.request_started = time.perf_counter()
+    parser = None
+    try:
+        response = await connection.request("GET", path)
+        stats.headers_at = time.perf_counter()
+        stats.status = response.status
+        stats.content_type = response.headers.get("content-type", "")
+        if response.status != 200:
+            stats.error = f"HTTP {response.status}"
+            return stats.report()
+
+        def frame_callback(view):
+            stats.frame(view)
+            if on_frame is not None:
+                on_frame(view, stats)
+
+        parser = MjpegFrameParser(boundary_from_content_type(stats.content_type),
+                                  on_frame=frame_callback)
+        deadline = stats.request_started + duration
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or (max_frames and parser.frames >= max_frames):
+                break
+            try:
+                data = await asyncio.wait_for(response.read_some(read_size),
+                                              min(remaining, timeout))
+            except asyncio.TimeoutError:
+                if time.perf_counter() < deadline:
+                    stats.error = f"stalled (no data for {timeout:.1f}s)"
+                break
+            if not data:
+                stats.error = "stream ended"
+                break
+            stats.bytes_total += len(data)
+            if on_data is not None:
+                on_data(len(data), stats)
+            parser.feed(data)
+    except asyncio.TimeoutError:
+        stats.error = "timeout"
+    except OSError as e:
+        stats.error = f"connection error: {e}"
+    except Exception as e:
+        stats.error = f"{type(e).__name__}: {e}"
+    finally:
+        stats.ended = time.perf_counter()
+        await connection.close()
+    return stats.report(parser)
+
+
+def print_stream_report(report):
+    """Lidsky čitelný výpis výsledku analyze_stream"""
+    print(f"\n🎥 {report['url']}")
+    if report["status"] is None or report["status"] != 200:
+        print(f"  ❌ {report['error'] or report['status']}")
+        return
+    fps = f"{report['fps']:.2f}" if report["fps"] else "n/a"
+    ttff = report["time_to_first_frame"]
+    print(f"  📦 Content-Type: {report['content_type']}")
+    print(f"  🖼️  Frames: {report['frames']} in {report['duration']:.2f}s, fps={fps}")
+    print(f"  ⏱️  Time to first frame: {ttff:.3f}s" if ttff is not None else "  ⏱️  No complete frame")
+    print(f"  📏 Frame size: {format_summary(report['frame_size'], unit='kB', scale=1 / 1024)}")
+    print(f"  📈 Interval: {format_summary(report['interval'], unit='ms', scale=1000)}")
+    if report["jitter"] is not None:
+        print(f"  〰️  Jitter (stdev): {report['jitter'] * 1000:.1f}ms")
+    print(f"  🚚 Throughput: {report['bytes_per_sec'] / 1024:.1f} kB/s")
+    if "parser_busy" in report:
+        print(f"  🧮 Parser busy: {report['parser_busy']:.2%}")
+    if report["error"]:
+        print(f"  ⚠️  {report['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MJPEG stream analyzer")
+    parser.add_argument("urls", nargs="+", help="stream URLs (analysed concurrently)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per stream")
+    parser.add_argument("--frames", type=int, default=None, help="stop after N frames")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    async def run():
+        return await asyncio.gather(*(analyze_stream(u, args.duration, args.frames, args.timeout)
+                                      for u in args.urls))
+
+    reports = asyncio.run(run())
+    for report in reports:
+        print_stream_report(report)
+    return 0 if all(r["frames"] for r in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Zátěžový generátor MQTT spojení
+Rozjíždí tisíce simulovaných klientů v jednom procesu (asyncio),
+s nastavitelnou rychlostí náběhu, a měří latenci CONNACK, chybové kódy
+a úspěšnost v závislosti na počtu současně otevřených spojení
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from bench_stats import format_summary, summarize
+from mqtt_wire import CONNACK_CODES, AsyncMqttClient, MqttProtocolError
+
+
+def parse_ramp(spec):
+    """'200@20,1000@100' -> [(200, 20.0), (1000, 100.0)] (clients@clients_per_sec)"""
+    stages = []
+    for part in spec.split(","):
+        count, _, rate = part.strip().partition("@")
+        stages.append((int(count), float(rate or count)))
+    return stages
+
+
+def raise_fd_limit(wanted):
+    """Raise RLIMIT_NOFILE towards the hard limit so thousands of sockets fit"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+class ConnectionLoadTest:
+    """Ramped connection storm against one broker"""
+
+    def __init__(self, host, port, transport="websockets", path="/mqtt",
+                 client_prefix="debug-multi", connect_timeout=10.0, hold=5.0,
+                 keepalive=60, bucket_size=None, log=print):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.path = path
+        self.client_prefix = client_prefix
+        self.connect_timeout = connect_timeout
+        self.hold = hold
+        self.keepalive = keepalive
+        self.bucket_size = bucket_size
+        self.log = log
+        self.results = []
+        self.clients = []
+        self.open_connections = 0
+        self.peak_open = 0
+
+    async def _run_client(self, index, scheduled_at):
+        client_id = f"{self.client_prefix}-{index}-{int(time.time())}"
+        result = {"index": index, "client_id": client_id, "connected": False,
+                  "error": None, "concurrency": self.open_connections,
+                  "start_delay": time.perf_counter() - scheduled_at}
+        client = AsyncMqttClient(client_id, keepalive=self.keepalive)
+        try:
+            return_code = await client.connect(self.host, self.port, self.transport,
+                                               self.path, self.connect_timeout)
+            result["connack_latency"] = client.timings["connack"]
+            result["total_latency"] = client.timings["total"]
+            result["tcp_latency"] = client.timings["tcp"]
+            if return_code == 0:
+                result["connected"] = True
+                self.open_connections += 1
+                self.peak_open = max(self.peak_open, self.open_connections)
+                self.clients.append(client)
+            else:
+                result["error"] = f"rc={return_code} {CONNACK_CODES.get(return_code, 'unknown')}"
+        except asyncio.TimeoutError:
+            result["error"] = "timeout"
+        except ConnectionRefusedError:
+            result["error"] = "refused"
+        except ConnectionResetError:
+            result["error"] = "reset"
+        except asyncio.IncompleteReadError:
+            result["error"] = "closed_by_broker"
+        except MqttProtocolError as e:
+            result["error"] = f"protocol: {e}"
+        except OSError as e:
+            result["error"] = f"os_error: {e.strerror or e}"
+        self.results.append(result)
+        return result
+
+    async def run(self, stages):
+        """Run the ramp stages, hold all connections, then close them"""
+        raise_fd_limit(sum(count for count, _ in stages) + 256)
+        started = time.perf_counter()
+        tasks = []
+        index = 0
+        offset = 0.0
+        for count, rate in stages:
+            self.log(f"📈 Ramp stage: {count} clients at {rate:.0f}/s")
+            for _ in range(count):
+                scheduled_at = started + offset
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(self._run_client(index, scheduled_at)))
+                index += 1
+                offset += 1.0 / rate
+        await asyncio.gather(*tasks)
+        ramp_done = time.perf_counter()
+        self.log(f"⏳ Holding {self.open_connections} connections for {self.hold:.0f}s...")
+        await asyncio.sleep(self.hold)
+        dropped = sum(1 for c in self.clients if not c.connected)
+        for client in self.clients:
+            await client.disconnect()
+        return self.report(ramp_done - started, dropped)
+
+    def curve(self):
+        """Success rate and CONNACK latency bucketed by concurrent open connections"""
+        if not self.results:
+            return []
+        size = self.bucket_size or max(1, len(self.results) // 10)
+        buckets = {}
+        for result in self.results:
+            buckets.setdefault(result["concurrency"] // size, []).append(result)
+        curve = []
+        for key in sorted(buckets):
+            group = buckets[key]
+            ok = [r for r in group if r["connected"]]
+            curve.append({
+                "concurrency_from": key * size,
+                "concurrency_to": key * size + size - 1,
+                "attempts": len(group),
+                "success_rate": len(ok) / len(group),
+                "connack_latency": summarize([r["connack_latency"] for r in ok]),
+            })
+        return curve
+
+    def report(self, ramp_duration, dropped_while_holding):
+        ok = [r for r in self.results if r["connected"]]
+        errors = {}
+        for result in self.results:
+            if result["error"]:
+                errors[result["error"]] = errors.get(result["error"], 0) + 1
+        return {
+            "broker": f"{self.transport}://{self.host}:{self.port}",
+            "total": len(self.results),
+            "successful": len(ok),
+            "success_rate": len(ok) / len(self.results) if self.results else 0,
+            "peak_open": self.peak_open,
+            "dropped_while_holding": dropped_while_holding,
+            "ramp_duration": ramp_duration,
+            "connack_latency": summarize([r["connack_latency"] for r in ok]),
+            "errors": errors,
+            "curve": self.curve(),
+            "details": sorted(self.results, key=lambda r: r["index"]),
+        }
+
+
+def print_load_report(report, log=print):
+    log(f"📊 {report['successful']}/{report['total']} connected "
+        f"({report['success_rate']:.1%}), peak open {report['peak_open']}, "
+        f"dropped while holding {report['dropped_while_holding']}")
+    log(f"⏱️  CONNACK latency: {format_summary(report['connack_latency'], unit='ms', scale=1000)}")
+    for error, count in sorted(report["errors"].items(), key=lambda e: -e[1]):
+        log(f"  ❌ {error}: {count}x")
+    log("📉 Success rate vs. concurrent connections:")
+    for point in report["curve"]:
+        p95 = point["connack_latency"]["p95"]
+        p95_text = f"{p95 * 1000:.1f}ms" if p95 is not None else "-"
+        log(f"  {point['concurrency_from']:>6}-{point['concurrency_to']:<6} "
+            f"n={point['attempts']:<5} ok={point['success_rate']:6.1%} p95={p95_text}")
+
+
+def run_load_test(host, port, stages, transport="websockets", hold=5.0,
+                  connect_timeout=10.0, client_prefix="debug-multi", log=print):
+    """Synchronous wrapper for scripts that are not asyncio based"""
+    test = ConnectionLoadTest(host, port, transport=transport, hold=hold,
+                              connect_timeout=connect_timeout,
+                              client_prefix=client_prefix, log=log)
+    return asyncio.run(test.run(stages))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MQTT connection load generator")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--ramp", default="100@20",
+                        help="stages as clients@per_second, e.g. 200@20,1000@100")
+    parser.add_argument("--hold", type=float, default=5.0,
+                        help="seconds to keep all connections open after the ramp")
+    parser.add_argument("--timeout", type=float, default=10.0, help="CONNACK timeout [s]")
+    parser.add_argument("--json", metavar="PATH", help="write full report as JSON")
+    args = parser.parse_args(argv)
+    host, _, port = args.broker.partition(":")
+    report = run_load_test(host, int(port or 9001), parse_ramp(args.ramp), args.transport,
+                           args.hold, args.timeout)
+    print_load_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.json}")
+    return 0 if report["successful"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Propustnost datové cesty MQTT brokeru - QoS × velikost zprávy × okno
+Párový publisher + subscriber (debug/mqtt_wire.py) na vlastním topicu.
+Každá zpráva nese pořadové číslo a čas odeslání, takže subscriber počítá
+ztráty, duplicity, přeházené pořadí a latenci publish -> doručení.
+
+Pro každou konfiguraci:
+    1. saturace - publisher posílá, co stihne (u QoS 1/2 max `window`
+       nepotvrzených zpráv), výsledkem je strop doručených msg/s
+    2. ověření - otevřená smyčka na 80 % (pak 50 %) stropu; rychlost,
+       kterou subscriber bez ztrát a s rozumnou latencí udrží, je
+       "maximální udržitelná"
+
+Výsledná tabulka slouží k volbě QoS pro IoT/Brana/* a Log/Brana/ID.
+Na vzdálený broker (produkce!) jen s --allow-remote.
+
+    python debug/mqtt_throughput.py --sim
+    python debug/mqtt_throughput.py --broker 127.0.0.1:1883 --transport tcp --qos 0,1 --sizes 64,4096
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+
+from bench_stats import format_summary, summarize
+from mqtt_wire import AsyncMqttClient, is_loopback, topic_matches
+
+DEFAULT_TOPIC = "Debug/Brana/Throughput"
+# Provoz brány a historie aktivity (activity_analytics.py) - sem benchmark nesmí
+PRODUCTION_FILTERS = ("IoT/Brana/#", "Log/Brana/#")
+
+# Seq + čas odeslání (perf_counter_ns - publisher i subscriber jsou v jednom procesu)
+HEADER = struct.Struct("<QQ")
+
+# Typické velikosti zpráv aplikace pro doporučení QoS
+TOPIC_PROFILES = (("IoT/Brana/*", 32), ("Log/Brana/ID", 128))
+
+# Udržitelná rychlost: doručeno >= 98 % nabídky, beze ztrát, p99 pod limitem
+MIN_DELIVERY_RATIO = 0.98
+MAX_SUSTAINED_P99 = 0.1
+VERIFY_FRACTIONS = (0.8, 0.5)
+
+
+def parse_ints(spec):
+    """'0,1,2' -> [0, 1, 2]"""
+    return [int(part) for part in spec.split(",") if part.strip()]
+
+
+def make_payload(sequence, size):
+    header = HEADER.pack(sequence, time.perf_counter_ns())
+    return header + b"x" * max(0, size - HEADER.size)
+
+
+class _Receiver:
+    """Subscriber-side bookkeeping for one trial"""
+
+    def __init__(self):
+        self.seen = set()
+        self.highest = -1
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.latencies = []
+
+    def on_message(self, topic, payload, qos, retain):
+        now = time.perf_counter_ns()
+        if len(payload) < HEADER.size:
+            return
+        sequence, sent_ns = HEADER.unpack_from(payload)
+        self.received += 1
+        if sequence in self.seen:
+            self.duplicates += 1
+            return
+        self.seen.add(sequence)
+        if sequence < self.highest:
+            self.reordered += 1
+        else:
+            self.highest = sequence
+        self.latencies.append((now - sent_ns) / 1e9)
+
+
+class ThroughputBenchmark:
+    """Sweeps QoS, payload size and in-flight window against one broker"""
+
+    def __init__(self, host, port, transport="websockets", topic=DEFAULT_TOPIC, duration=3.0,
+                 settle=2.0, verify=True, log=print):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.topic = topic
+        self.duration = duration
+        self.settle = settle
+        self.verify = verify
+        self.log = log
+        self._run = 0
+
+    async def _pair(self, qos, receiver):
+        self._run += 1
+        stamp = f"{int(time.time())}-{self._run}"
+        topic = f"{self.topic}/{stamp}"
+        subscriber = AsyncMqttClient(f"bench-sub-{stamp}", on_message=receiver.on_message)
+        publisher = AsyncMqttClient(f"bench-pub-{stamp}")
+        for client in (subscriber, publisher):
+            return_code = await client.connect(self.host, self.port, self.transport)
+            if return_code != 0:
+                raise ConnectionError(f"CONNACK rc={return_code}")
+        await subscriber.subscribe([(topic, qos)])
+        return topic, publisher, subscriber
+
+    async def trial(self, qos, size, window, rate=None):
+        """One timed run - `rate` None means as fast as the window allows"""
+        receiver = _Receiver()
+        topic, publisher, subscriber = await self._pair(qos, receiver)
+        pending = set()
+        errors = 0
+        sent = 0
+        started = time.perf_counter()
+        stop_at = started + self.duration
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at or not publisher.connected:
+                    break
+                if rate is not None:
+                    delay = started + sent / rate - now
+                    if delay > 0:
+                        await publisher.stream.drain()
+                        await asyncio.sleep(delay)
+                waiter = publisher.publish_nowait(topic, make_payload(sent, size), qos)
+                sent += 1
+                if waiter is not None:
+                    pending.add(waiter)
+                    if len(pending) >= window:
+                        done, pending = await asyncio.wait(pending,
+                                                           return_when=asyncio.FIRST_COMPLETED)
+                        errors += sum(1 for future in done if future.exception() is not None)
+                elif sent % 64 == 0:
+                    # QoS 0 nemá potvrzení - zpětný tlak jen přes socket buffer
+                    await publisher.stream.drain()
+            await publisher.stream.drain()
+            elapsed = time.perf_counter() - started
+            if pending:
+                done, pending = await asyncio.wait(pending, timeout=self.settle)
+                errors += sum(1 for future in done if future.exception() is not None) + len(pending)
+            # Doběhnout doručení, ale ne déle než settle
+            deadline = time.perf_counter() + self.settle
+            while len(receiver.seen) < sent and time.perf_counter() < deadline:
+                await asyncio.sleep(0.02)
+        finally:
+            for client in (publisher, subscriber):
+                await client.disconnect()
+        return summarize_trial(qos, size, window, rate, sent, elapsed, errors, receiver)
+
+    async def run_config(self, qos, size, window):
+        saturation = await self.trial(qos, size, window)
+        result = {"qos": qos, "size": size, "window": window if qos else None,
+                  "saturation": saturation, "trials": [], "sustainable_rate": None}
+        ceiling = saturation["delivered_rate"]
+        if saturation["sustained"]:
+            result["sustainable_rate"] = saturation["offered_rate"]
+        if self.verify and ceiling > 0 and not saturation["sustained"]:
+            for fraction in VERIFY_FRACTIONS:
+                trial = await self.trial(qos, size, window, rate=max(1.0, ceiling * fraction))
+                result["trials"].append(trial)
+                if trial["sustained"]:
+                    result["sustainable_rate"] = max(result["sustainable_rate"] or 0.0,
+                                                     trial["offered_rate"])
+                    break
+        return result
+
+    async def run(self, qos_levels, sizes, windows):
+        results = []
+        for qos in qos_levels:
+            for size in sizes:
+                # QoS 0 nemá potvrzení - okno nehraje roli
+                for window in (windows if qos else [None]):
+                    label = f"QoS {qos}, {size} B" + (f", window {window}" if qos else "")
+                    self.log(f"🚀 {label} ...")
+                    result = await self.run_config(qos, size, window or 1)
+                    results.append(result)
+                    print_config(result, self.log)
+        return {"configs": results, "recommendations": recommend(results)}
+
+
+def summarize_trial(qos, size, window, rate, sent, elapsed, errors, receiver):
+    unique = len(receiver.seen)
+    latency = summarize(receiver.latencies)
+    # Rostoucí latence = fronta se plní, i když zatím nic nechybí
+    third = len(receiver.latencies) // 3
+    growing = bool(third >= 10 and
+                   summarize(receiver.latencies[-third:])["p50"]
+                   > 2 * summarize(receiver.latencies[:third])["p50"] + 0.01)
+    offered = sent / elapsed if elapsed > 0 else 0.0
+    delivered = unique / elapsed if elapsed > 0 else 0.0
+    lost = max(0, sent - unique)
+    sustained = bool(sent and lost == 0 and errors == 0 and not growing
+                     and delivered >= offered * MIN_DELIVERY_RATIO
+                     and latency["p99"] is not None and latency["p99"] <= MAX_SUSTAINED_P99)
+    return {
+        "target_rate": rate,
+        "sent": sent,
+        "offered_rate": offered,
+        "delivered_rate": delivered,
+        "throughput_bytes": delivered * size,
+        "lost": lost,
+        "loss_ratio": lost / sent if sent else 0.0,
+        "duplicates": receiver.duplicates,
+        "reordered": receiver.reordered,
+        "publish_errors": errors,
+        "latency": latency,
+        "latency_growing": growing,
+        "sustained": sustained,
+    }
+
+
+def recommend(results):
+    """Per app topic profile: sustainable rate and p99 per QoS at the nearest size"""
+    recommendations = []
+    sizes = sorted({r["size"] for r in results})
+    for topic, typical in TOPIC_PROFILES:
+        if not sizes:
+            break
+        size = min(sizes, key=lambda s: abs(s - typical))
+        options = []
+        for qos in sorted({r["qos"] for r in results}):
+            candidates = [r for r in results if r["qos"] == qos and r["size"] == size]
+            best = max(candidates, key=lambda r: r["sustainable_rate"] or 0.0)
+            verified = next((t for t in best["trials"] if t["sustained"]), best["saturation"])
+            options.append({"qos": qos, "window": best["window"],
+                            "sustainable_rate": best["sustainable_rate"],
+                            "p99": verified["latency"]["p99"],
+                            "loss_at_saturation": best["saturation"]["loss_ratio"]})
+        recommendations.append({"topic": topic, "size": size, "options": options})
+    return recommendations
+
+
+def _rate(value):
+    return f"{value:,.0f}/s" if value else "-"
+
+
+def print_config(result, log=print):
+    saturation = result["saturation"]
+    log(f"  📈 ceiling {_rate(saturation['delivered_rate'])} "
+        f"({saturation['throughput_bytes'] / 1048576:.1f} MB/s), "
+        f"loss {saturation['loss_ratio']:.2%}, dup {saturation['duplicates']}, "
+        f"reordered {saturation['reordered']}, errors {saturation['publish_errors']}")
+    log(f"     latency {format_summary(saturation['latency'], unit='ms', scale=1000)}")
+    for trial in result["trials"]:
+        marker = "✅" if trial["sustained"] else "❌"
+        growing = " (latency growing)" if trial["latency_growing"] else ""
+        log(f"  {marker} at {_rate(trial['target_rate'])}: delivered {_rate(trial['delivered_rate'])}, "
+            f"loss {trial['loss_ratio']:.2%}, p99 {(trial['latency']['p99'] or 0) * 1000:.1f}ms{growing}")
+
+
+def print_throughput_summary(analysis, log=print):
+    log("\n📊 Throughput summary (loss/dup at saturation, latency at the sustainable rate)")
+    log(f"  {'QoS':>3} {'size':>7} {'window':>6} {'ceiling':>12} {'sustainable':>12} "
+        f"{'loss':>7} {'dup':>5} {'p50':>9} {'p99':>9}")
+    for result in analysis["configs"]:
+        saturation = result["saturation"]
+        verified = next((t for t in result["trials"] if t["sustained"]), saturation)
+        p50, p99 = verified["latency"]["p50"], verified["latency"]["p99"]
+        log(f"  {result['qos']:>3} {result['size']:>6}B {result['window'] or '-':>6} "
+            f"{_rate(saturation['delivered_rate']):>12} {_rate(result['sustainable_rate']):>12} "
+            f"{saturation['loss_ratio']:>7.2%} {saturation['duplicates']:>5} "
+            f"{(p50 or 0) * 1000:>7.2f}ms {(p99 or 0) * 1000:>7.2f}ms")
+    for recommendation in analysis["recommendations"]:
+        log(f"\n🎯 {recommendation['topic']} (~{recommendation['size']} B):")
+        for option in recommendation["options"]:
+            window = f" window {option['window']}" if option["window"] else ""
+            p99 = f"{option['p99'] * 1000:.2f}ms" if option["p99"] is not None else "-"
+            log(f"   QoS {option['qos']}{window}: sustainable {_rate(option['sustainable_rate'])}, "
+                f"p99 {p99}, loss at saturation {option['loss_at_saturation']:.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MQTT publish throughput across QoS, sizes and windows")
+    parser.add_argument("--broker", default="127.0.0.1:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--sim", action="store_true", help="benchmark the in-process stand-in broker")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="allow flooding a non-loopback broker (production gate broker!)")
+    parser.add_argument("--topic", default=DEFAULT_TOPIC, help="topic prefix for bench traffic")
+    parser.add_argument("--qos", default="0,1,2", help="QoS levels")
+    parser.add_argument("--sizes", default="64,1024,16384", help="payload sizes in bytes")
+    parser.add_argument("--windows", default="1,16,128", help="max unacked QoS>0 publishes")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per trial")
+    parser.add_argument("--settle", type=float, default=2.0, help="wait for stragglers [s]")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="only measure the saturation ceiling (no paced trials)")
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+    # Benchmark publikuje na <prefix>/<čas>-<běh>
+    bench_topic = f"{args.topic}/0"
+    if any(topic_matches(topic_filter, bench_topic) for topic_filter in PRODUCTION_FILTERS):
+        print(f"🛑 Refusing to benchmark on the gate's own topics ({', '.join(PRODUCTION_FILTERS)})")
+        return 2
+
+    harness = None
+    if args.sim:
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(gate=False, camera=False).start_in_thread()
+        host, port = "127.0.0.1", harness.mqtt_port
+    else:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 9001)
+        if not is_loopback(host) and not args.allow_remote:
+            print(f"🛑 {host} is not local - flooding it affects the gate; pass --allow-remote")
+            return 2
+
+    benchmark = ThroughputBenchmark(host, port, args.transport, args.topic, args.duration,
+                                    args.settle, verify=not args.no_verify)
+    print(f"📦 MQTT throughput: {args.transport}://{host}:{port}")
+    print("=" * 50)
+    try:
+        analysis = asyncio.run(benchmark.run(parse_ints(args.qos), parse_ints(args.sizes),
+                                             parse_ints(args.windows)))
+    except KeyboardInterrupt:
+        print("\n🛑 Benchmark interrupted")
+        return 130
+    except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+        print(f"❌ {type(e).__name__}: {e}")
+        return 1
+    finally:
+        if harness is not None:
+            harness.stop_thread()
+    print_throughput_summary(analysis)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "mqtt_throughput", "version": 1,
+                       "broker": f"{host}:{port}", "transport": args.transport, **analysis},
+                      f, indent=2)
+        print(f"💾 Result saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Minimální MQTT 3.1.1 wire protokol pro asyncio (TCP i WebSocket)
+Používá se tam, kde by paho (jedno vlákno na klienta) nestačilo -
+zátěžové testy s tisíci klienty, benchmarky a lokální broker
+"""
+
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import os
+import socket
+import struct
+import time
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+CONNACK_CODES = {
+    0: "accepted",
+    1: "unacceptable_protocol_version",
+    2: "identifier_rejected",
+    3: "server_unavailable",
+    4: "bad_username_or_password",
+    5: "not_authorized",
+}
+
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_OP_CONT, WS_OP_BINARY, WS_OP_CLOSE, WS_OP_PING, WS_OP_PONG = 0x0, 0x2, 0x8, 0x9, 0xA
+
+
+class MqttProtocolError(Exception):
+    """Malformed packet or unexpected response"""
+
+
+# --- kódování paketů -------------------------------------------------------
+
+def encode_remaining_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_string(value):
+    data = value.encode("utf-8") if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type, flags, body=b""):
+    return bytes([(packet_type << 4) | flags]) + encode_remaining_length(len(body)) + body
+
+
+def connect_packet(client_id, keepalive=60, clean=True, username=None, password=None):
+    flags = 0x02 if clean else 0
+    payload = encode_string(client_id)
+    if username is not None:
+        flags |= 0x80
+        payload += encode_string(username)
+    if password is not None:
+        flags |= 0x40
+        payload += encode_string(password)
+    body = encode_string("MQTT") + bytes([4, flags]) + struct.pack("!H", keepalive) + payload
+    return packet(CONNECT, 0, body)
+
+
+def connack_packet(return_code, session_present=False):
+    return packet(CONNACK, 0, bytes([1 if session_present else 0, return_code]))
+
+
+def publish_packet(topic, payload, qos=0, retain=False, packet_id=None, dup=False):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    flags = (qos << 1) | (1 if retain else 0) | (0x08 if dup else 0)
+    body = encode_string(topic)
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return packet(PUBLISH, flags, body + payload)
+
+
+def ack_packet(packet_type, packet_id):
+    """PUBACK / PUBREC / PUBREL / PUBCOMP / UNSUBACK"""
+    return packet(packet_type, 0x02 if packet_type == PUBREL else 0, struct.pack("!H", packet_id))
+
+
+def subscribe_packet(packet_id, filters):
+    body = struct.pack("!H", packet_id)
+    for topic_filter, qos in filters:
+        body += encode_string(topic_filter) + bytes([qos])
+    return packet(SUBSCRIBE, 0x02, body)
+
+
+def suback_packet(packet_id, granted):
+    return packet(SUBACK, 0, struct.pack("!H", packet_id) + bytes(granted))
+
+
+PINGREQ_PACKET = packet(PINGREQ, 0)
+PINGRESP_PACKET = packet(PINGRESP, 0)
+DISCONNECT_PACKET = packet(DISCONNECT, 0)
+
+
+# --- dekódování --------------------------------------------------------------
+
+def parse_publish(flags, body):
+    """Return (topic, payload, qos, retain, packet_id, dup)"""
+    qos = (flags >> 1) & 0x03
+    topic_length = struct.unpack_from("!H", body)[0]
+    topic = body[2:2 + topic_length].decode("utf-8")
+    offset = 2 + topic_length
+    packet_id = None
+    if qos:
+        packet_id = struct.unpack_from("!H", body, offset)[0]
+        offset += 2
+    return topic, body[offset:], qos, bool(flags & 0x01), packet_id, bool(flags & 0x08)
+
+
+def parse_connect(body):
+    """Return dict with client_id, keepalive, clean, username, password"""
+    offset = 2 + struct.unpack_from("!H", body)[0]
+    level, flags = body[offset], body[offset + 1]
+    keepalive = struct.unpack_from("!H", body, offset + 2)[0]
+    offset += 4
+
+    def read_field():
+        nonlocal offset
+        length = struct.unpack_from("!H", body, offset)[0]
+        value = body[offset + 2:offset + 2 + length]
+        offset += 2 + length
+        return value
+
+    client_id = read_field().decode("utf-8")
+    will = None
+    if flags & 0x04:
+        will = (read_field().decode("utf-8"), read_field(), (flags >> 3) & 0x03, bool(flags & 0x20))
+    username = read_field().decode("utf-8") if flags & 0x80 else None
+    password = read_field() if flags & 0x40 else None
+    return {"client_id": client_id, "protocol_level": level, "keepalive": keepalive,
+            "clean": bool(flags & 0x02), "will": will,
+            "username": username, "password": password}
+
+
+def parse_subscribe(body):
+    """Return (packet_id, [(filter, qos), ...])"""
+    packet_id = struct.unpack_from("!H", body)[0]
+    offset = 2
+    filters = []
+    while offset < len(body):
+        length = struct.unpack_from("!H", body, offset)[0]
+        topic_filter = body[offset + 2:offset + 2 + length].decode("utf-8")
+        offset += 2 + length
+        filters.append((topic_filter, body[offset] & 0x03))
+        offset += 1
+    return packet_id, filters
+
+
+# Sdílené odběry (mosquitto 1.6+): $share/<skupina>/<filtr>
+SHARE_PREFIX = "$share/"
+
+
+def topic_matches(topic_filter, topic):
+    """MQTT wildcard match (+ and #), $-topics only match explicit filters"""
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for index, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def filters_overlap(first, second):
+    """True when some topic matches both filters (wildcards on either side)"""
+    for one, other in ((first, second), (second, first)):
+        if one.startswith("$") and other[:1] in ("+", "#"):
+            return False
+    first_parts = first.split("/")
+    second_parts = second.split("/")
+    for index in range(max(len(first_parts), len(second_parts))):
+        one = first_parts[index] if index < len(first_parts) else None
+        other = second_parts[index] if index < len(second_parts) else None
+        # "#" pokrývá zbytek úrovní i nadřazenou úroveň (IoT/# bere i IoT)
+        if one == "#" or other == "#":
+            return True
+        if one is None or other is None:
+            return False
+        if one != "+" and other != "+" and one != other:
+            return False
+    return True
+
+
+# --- transport -------------------------------------------------------------
+
+class TcpTransport:
+    """Plain TCP byte stream"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def readexactly(self, size):
+        return await self.reader.readexactly(size)
+
+    def write(self, data):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        transport = self.writer.transport
+        if transport is not None:
+            transport.abort()
+
+
+class WebSocketTransport:
+    """Binary WebSocket frames presented as a byte stream (RFC 6455)"""
+
+    def __init__(self, reader, writer, mask_outgoing):
+        self.reader = reader
+        self.writer = writer
+        self.mask_outgoing = mask_outgoing
+        self._pending = bytearray()
+        self.closed = False
+
+    async def _read_frame(self):
+        header = await self.reader.readexactly(2)
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+        mask = await self.reader.readexactly(4) if masked else None
+        data = await self.reader.readexactly(length) if length else b""
+        if mask:
+            data = _apply_mask(data, mask)
+        return opcode, data
+
+    async def readexactly(self, size):
+        while len(self._pending) < size:
+            opcode, data = await self._read_frame()
+            if opcode in (WS_OP_BINARY, WS_OP_CONT, 0x1):
+                self._pending += data
+            elif opcode == WS_OP_PING:
+                self._send_frame(WS_OP_PONG, data)
+            elif opcode == WS_OP_CLOSE:
+                self.closed = True
+                raise asyncio.IncompleteReadError(bytes(self._pending), size)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    def _send_frame(self, opcode, data):
+        length = len(data)
+        first = 0x80 | opcode
+        mask_bit = 0x80 if self.mask_outgoing else 0
+        if length < 126:
+            header = bytes([first, mask_bit | length])
+        elif length < 65536:
+            header = bytes([first, mask_bit | 126]) + struct.pack("!H", length)
+        else:
+            header = bytes([first, mask_bit | 127]) + struct.pack("!Q", length)
+        if self.mask_outgoing:
+            mask = os.urandom(4)
+            self.writer.write(header + mask + _apply_mask(data, mask))
+        else:
+            self.writer.write(header + data)
+
+    def write(self, data):
+        self._send_frame(WS_OP_BINARY, data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._send_frame(WS_OP_CLOSE, struct.pack("!H", 1000))
+            except (OSError, RuntimeError):
+                pass
+        self.closed = True
+        self.writer.close()
+
+    def abort(self):
+        transport = self.writer.transport
+        if transport is not None:
+            transport.abort()
+
+
+def _apply_mask(data, mask):
+    # XOR přes int je v CPythonu rychlý i pro velké payloady
+    if not data:
+        return data
+    repeated = (mask * (len(data) // 4 + 1))[:len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(data), "big")
+
+
+def websocket_accept_key(key):
+    return base64.b64encode(hashlib.sha1(key.encode("latin-1") + WS_GUID).digest()).decode("latin-1")
+
+
+def is_loopback(host):
+    """True if every address of `host` is local (guard before flooding a broker)"""
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback
+                   for info in socket.getaddrinfo(host, None))
+    except (socket.gaierror, ValueError):
+        return False
+
+
+async def open_transport(host, port, transport="websockets", path="/mqtt", timeout=10.0):
+    """Open TCP (and WebSocket upgrade) - returns (transport, timings)"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connected = time.perf_counter()
+    timings = {"tcp": connected - started, "ws": 0.0}
+    if transport == "tcp":
+        return TcpTransport(reader, writer), timings
+    key = base64.b64encode(os.urandom(16)).decode("latin-1")
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                  "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+                  "Sec-WebSocket-Protocol: mqtt\r\n\r\n").encode("latin-1"))
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    except BaseException:
+        writer.close()
+        raise
+    status_line = head.split(b"\r\n", 1)[0]
+    if b" 101 " not in status_line + b" ":
+        writer.close()
+        raise MqttProtocolError(f"WebSocket upgrade refused: {status_line.decode('latin-1', 'replace')}")
+    timings["ws"] = time.perf_counter() - connected
+    return WebSocketTransport(reader, writer, mask_outgoing=True), timings
+
+
+async def read_packet(stream):
+    """Read one MQTT packet - returns (type, flags, body)"""
+    # Každý paket má aspoň 2 byty - typ a první byte délky jedním čtením
+    header = await stream.readexactly(2)
+    byte = header[1]
+    length = byte & 0x7F
+    multiplier = 128
+    while byte & 0x80:
+        if multiplier > 128 ** 3:
+            raise MqttProtocolError("Malformed remaining length")
+        byte = (await stream.readexactly(1))[0]
+        length += (byte & 0x7F) * multiplier
+        multiplier *= 128
+    body = await stream.readexactly(length) if length else b""
+    return header[0] >> 4, header[0] & 0x0F, body
+
+
+class AsyncMqttClient:
+    """Small asyncio MQTT client - one instance per simulated connection.
+
+    Received PUBLISH packets are handed to `on_message(topic, payload, qos,
+    retain)`; QoS 1/2 handshakes are answered automatically and a QoS 2
+    PUBLISH resent before its PUBREL is delivered only once. Outgoing QoS
+    1/2 publishes can be awaited until PUBACK/PUBCOMP.
+    """
+
+    def __init__(self, client_id, on_message=None, keepalive=60, clean=True):
+        self.client_id = client_id
+        self.on_message = on_message
+        self.keepalive = keepalive
+        self.clean = clean
+        self.stream = None
+        self.connected = False
+        self.timings = {}
+        self.disconnect_reason = None
+        self._next_id = 0
+        self._waiters = {}
+        self._pending_qos2 = set()  # příchozí QoS 2 mezi PUBREC a PUBREL
+        self._reader_task = None
+        self._ping_task = None
+
+    def _packet_id(self):
+        self._next_id = self._next_id % 65535 + 1
+        return self._next_id
+
+    async def connect(self, host, port, transport="websockets", path="/mqtt", timeout=10.0):
+        """Connect and wait for CONNACK - returns the CONNACK return code"""
+        started = time.perf_counter()
+        self.stream, self.timings = await open_transport(host, port, transport, path, timeout)
+        sent = time.perf_counter()
+        self.stream.write(connect_packet(self.client_id, self.keepalive, self.clean))
+        try:
+            await self.stream.drain()
+            packet_type, _, body = await asyncio.wait_for(read_packet(self.stream), timeout)
+        except BaseException:
+            self.stream.abort()
+            raise
+        if packet_type != CONNACK or len(body) < 2:
+            self.stream.abort()
+            raise MqttProtocolError(f"Expected CONNACK, got packet type {packet_type}")
+        now = time.perf_counter()
+        self.timings["connack"] = now - sent
+        self.timings["total"] = now - started
+        return_code = body[1]
+        if return_code == 0:
+            if self.clean or not body[0] & 0x01:
+                # Bez session present broker QoS 2 handshaky nedokončí
+                self._pending_qos2.clear()
+            self.connected = True
+            self._reader_task = asyncio.ensure_future(self._read_loop())
+            if self.keepalive:
+                self._ping_task = asyncio.ensure_future(self._ping_loop())
+        else:
+            self.stream.close()
+        return return_code
+
+    async def _read_loop(self):
+        try:
+            while True:
+                packet_type, flags, body = await read_packet(self.stream)
+                if packet_type == PUBLISH:
+                    topic, payload, qos, retain, packet_id, _ = parse_publish(flags, body)
+                    if qos == 1:
+                        self.stream.write(ack_packet(PUBACK, packet_id))
+                    elif qos == 2:
+                        self.stream.write(ack_packet(PUBREC, packet_id))
+                        if packet_id in self._pending_qos2:
+                            continue  # duplicitní QoS 2 - už doručeno
+                        self._pending_qos2.add(packet_id)
+                    if self.on_message is not None:
+                        self.on_message(topic, payload, qos, retain)
+                elif packet_type == PUBREL:
+                    packet_id = struct.unpack("!H", body[:2])[0]
+                    self._pending_qos2.discard(packet_id)
+                    self.stream.write(ack_packet(PUBCOMP, packet_id))
+                elif packet_type == PUBREC:
+                    packet_id = struct.unpack("!H", body[:2])[0]
+                    self.stream.write(ack_packet(PUBREL, packet_id))
+                elif packet_type in (PUBACK, PUBCOMP, SUBACK, UNSUBACK):
+                    packet_id = struct.unpack("!H", body[:2])[0]
+                    waiter = self._waiters.pop(packet_id, None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(body[2:])
+        except (asyncio.IncompleteReadError, OSError, MqttProtocolError) as e:
+            self.disconnect_reason = type(e).__name__
+        except asyncio.CancelledError:
+            self.disconnect_reason = "closed"
+        finally:
+            self.connected = False
+            for waiter in self._waiters.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("MQTT connection lost"))
+            self._waiters.clear()
+            if self._ping_task is not None:
+                self._ping_task.cancel()
+
+    async def _ping_loop(self):
+        interval = max(1.0, self.keepalive * 0.75)
+        while self.connected:
+            await asyncio.sleep(interval)
+            self.stream.write(PINGREQ_PACKET)
+
+    def _expect(self, packet_id):
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[packet_id] = waiter
+        return waiter
+
+    async def subscribe(self, filters, timeout=10.0):
+        """Subscribe to [(filter, qos)] and wait for SUBACK"""
+        packet_id = self._packet_id()
+        waiter = self._expect(packet_id)
+        self.stream.write(subscribe_packet(packet_id, filters))
+        await self.stream.drain()
+        return list(await asyncio.wait_for(waiter, timeout))
+
+    def publish_nowait(self, topic, payload, qos=0, retain=False):
+        """Queue a PUBLISH - for QoS>0 returns a future resolved on PUBACK/PUBCOMP"""
+        if qos == 0:
+            self.stream.write(publish_packet(topic, payload, 0, retain))
+            return None
+        packet_id = self._packet_id()
+        waiter = self._expect(packet_id)
+        self.stream.write(publish_packet(topic, payload, qos, retain, packet_id))
+        return waiter
+
+    async def publish(self, topic, payload, qos=0, retain=False, timeout=10.0):
+        waiter = self.publish_nowait(topic, payload, qos, retain)
+        await self.stream.drain()
+        if waiter is not None:
+            await asyncio.wait_for(waiter, timeout)
+
+    async def disconnect(self):
+        if self.stream is None:
+            return
+        if self.connected:
+            try:
+                self.stream.write(DISCONNECT_PACKET)
+                await asyncio.wait_for(self.stream.drain(), 1.0)
+            except (OSError, asyncio.TimeoutError, RuntimeError):
+                pass
+        self.connected = False
+        for task in (self._reader_task, self._ping_task):
+            if task is not None:
+                task.cancel()
+        self.stream.close()
+
+    def abort(self):
+        """Drop the socket without DISCONNECT (simulates a crashed client)"""
+        self.connected = False
+        for task in (self._reader_task, self._ping_task):
+            if task is not None:
+                task.cancel()
+        if self.stream is not None:
+            self.stream.abort()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Omezená fronta pro výpis z paho callbacku
+Callback jen uloží čas + surová data, formátování (strftime, dekódování)
+a zápis na výstup dělá vlákno na pozadí po dávkách. Síťové vlákno paho
+tak nikdy nečeká na terminál a nevznikají falešné keepalive/CONNACK
+problémy.
+
+Politiky při zaplnění:
+    block        callback počká na místo (nic se neztratí, může brzdit)
+    drop-oldest  zahodí nejstarší čekající řádek
+    sample       od poloviny kapacity propouští jen každou N-tou zprávu,
+                 při plné frontě zahazuje nové
+"""
+
+import collections
+import sys
+import threading
+import time
+
+POLICIES = ("block", "drop-oldest", "sample")
+
+
+class OutputQueue:
+    """Bounded handoff queue with a batching writer thread.
+
+    put(formatter, *args) stores (time.time(), formatter, args); the writer
+    calls formatter(timestamp, *args) -> str and writes whole batches.
+    Items put with essential=True (connection events, errors) bypass the
+    overflow policy so they are never lost.
+    """
+
+    def __init__(self, sink=None, maxsize=10000, policy="drop-oldest", sample_every=10,
+                 flush_interval=0.05):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r} (use {', '.join(POLICIES)})")
+        self.sink = sink or sys.stdout
+        self.maxsize = maxsize
+        self.policy = policy
+        self.sample_every = max(1, sample_every)
+        self.flush_interval = flush_interval
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.max_depth = 0
+        self.batches = 0
+        self.write_time = 0.0
+        self.callbacks = 0
+        self.callback_time = 0.0
+        self.callback_max = 0.0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._sample_counter = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, formatter, *args, essential=False):
+        item = (time.time(), formatter, args)
+        with self._cond:
+            items = self._items
+            if not essential and len(items) >= self.maxsize // 2 and self.policy == "sample":
+                self._sample_counter += 1
+                if self._sample_counter % self.sample_every:
+                    self.sampled_out += 1
+                    return False
+            if not essential and len(items) >= self.maxsize:
+                self._cond.notify_all()
+                if self.policy == "block" and self._running:
+                    while len(self._items) >= self.maxsize and self._running:
+                        self._cond.wait(self.flush_interval)
+                    # Writer mezitím frontu vyměnil
+                    items = self._items
+                elif self.policy == "drop-oldest":
+                    items.popleft()
+                    self.dropped += 1
+                else:
+                    self.dropped += 1
+                    return False
+            items.append(item)
+            self.enqueued += 1
+            if len(items) > self.max_depth:
+                self.max_depth = len(items)
+        return True
+
+    def callback_done(self, seconds):
+        """Account time spent in one message callback"""
+        self.callbacks += 1
+        self.callback_time += seconds
+        if seconds > self.callback_max:
+            self.callback_max = seconds
+
+    def add_callbacks(self, count, total, maximum):
+        """Account callbacks that ran elsewhere (sharded monitor workers)"""
+        self.callbacks += count
+        self.callback_time += total
+        if maximum > self.callback_max:
+            self.callback_max = maximum
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Flush everything still queued and stop the writer"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._write_batch()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._items) < self.maxsize:
+                    # Dávka = vše za flush_interval; plná fronta budí hned
+                    self._cond.wait(self.flush_interval)
+                running = self._running
+            self._write_batch()
+            if not running:
+                return
+
+    def _write_batch(self):
+        with self._cond:
+            if not self._items:
+                return
+            batch = self._items
+            self._items = collections.deque()
+            self._cond.notify_all()
+        started = time.perf_counter()
+        lines = []
+        for timestamp, formatter, args in batch:
+            try:
+                lines.append(formatter(timestamp, *args))
+            except Exception as e:
+                lines.append(f"<output formatting failed: {type(e).__name__}: {e}>")
+        self.sink.write("\n".join(lines) + "\n")
+        self.sink.flush()
+        self.written += len(lines)
+        self.batches += 1
+        self.write_time += time.perf_counter() - started
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "callbacks": self.callbacks,
+            "callback_avg": self.callback_time / self.callbacks if self.callbacks else 0.0,
+            "callback_max": self.callback_max,
+        }
+
+    def describe(self):
+        stats = self.stats()
+        return (f"queue {stats['depth']}/{self.maxsize} (max {stats['max_depth']}), "
+                f"written {stats['written']} in {stats['batches']} batches, "
+                f"dropped {stats['dropped']}, sampled out {stats['sampled_out']}, "
+                f"callback avg {stats['callback_avg'] * 1e6:.1f}µs max {stats['callback_max'] * 1e6:.1f}µs")
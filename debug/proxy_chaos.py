@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+Chaos test obnovy MQTT proxy (api/mqtt-proxy.js, dev-mqtt-proxy.js) po výpadku brokeru
+
+Proxy drží jediného globálního mqttClient s clean: false, reconnectPeriod
+5000 a příznakem isConnecting. Po krátkém výpadku brokeru pak lastMessages
+někdy zůstává staré. Tenhle test pustí proxy proti stand-in brokeru
+(debug/sim_harness.py), do kterého posílá čerstvé Log/Brana/ID zprávy,
+a střídavě mu škodí:
+
+  kill           broker utrhne spojení proxy (bez DISCONNECT)
+  drop           provoz broker <-> proxy se na --outage sekund zahazuje
+                 (TCP zůstává otevřené, keepalive to musí poznat)
+  stall          totéž, ale data se jen zdrží a po obnovení dojdou
+  restart        broker spadne a po --outage sekundách naběhne na stejném portu
+  restart-empty  restart bez perzistence - retained zprávy jsou pryč
+
+Po celou dobu se GET /api/mqtt-proxy dotazuje každých --poll-interval
+sekund. Pro každý scénář se měří:
+
+  reconnect      konec výpadku -> nový CONNECT proxy na brokeru
+  recovery       konec výpadku -> první odpověď s čerstvým lastMessages
+  stale served   kolik odpovědí vrátilo staré zprávy (a kolik z nich
+                 přitom tvrdilo connected: true)
+  duplicity      víc souběžných spojení proxy, nové clientId, takeovery
+
+Doba obnovy se s --db ukládá do historie diagnostiky (debug/diag_store.py,
+test proxy_recovery), takže `diag_daemon.py compare proxy_recovery`
+ukáže, jestli se po změně v proxy zhoršila.
+
+    python debug/proxy_chaos.py --start-proxy
+    MQTT_BROKER_URL=ws://127.0.0.1:1884 node dev-mqtt-proxy.js
+    python debug/proxy_chaos.py --proxy http://localhost:3003/api/mqtt-proxy \\
+        --scenario kill,restart --outage 10 --db brana-diagnostics.db
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from async_http import HttpError
+from bench_stats import format_summary, summarize
+from diag_store import DiagnosticsStore
+from mqtt_wire import AsyncMqttClient, MqttProtocolError, packet, read_packet
+from sim_harness import ACTIVITY_LOG_TOPIC, StandInBroker
+from traffic_replay import ProxyWatcher
+
+SCENARIOS = ("kill", "drop", "stall", "restart", "restart-empty")
+
+# clientId z api/mqtt-proxy.js a dev-mqtt-proxy.js
+PROXY_CLIENT_PREFIXES = ("proxy-", "dev-proxy-")
+
+DEV_PROXY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dev-mqtt-proxy.js")
+DEV_PROXY_URL = "http://127.0.0.1:3003/api/mqtt-proxy"
+
+
+class _ChaosStream:
+    """Broker side stream of a proxy connection that can be cut off.
+
+    The client is read in whole packets. During "stall" reads wait (the
+    packets sit in the socket like on a slow link) and writes are held back
+    until the fault heals; during "drop" packets in both directions are
+    thrown away.
+    """
+
+    def __init__(self, stream, broker):
+        self._stream = stream
+        self._broker = broker
+        self._held = []
+        self._inbound = bytearray()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    async def readexactly(self, size):
+        while len(self._inbound) < size:
+            if self._broker.fault == "stall":
+                await self._broker.flowing.wait()
+            packet_type, flags, body = await read_packet(self._stream)
+            if self._broker.fault == "drop":
+                self._broker.dropped_packets += 1
+                continue
+            self._inbound += packet(packet_type, flags, body)
+        if self._broker.fault == "stall":
+            await self._broker.flowing.wait()
+        data = bytes(self._inbound[:size])
+        del self._inbound[:size]
+        return data
+
+    def write(self, data):
+        if self._broker.fault == "stall":
+            self._held.append(data)
+        elif self._broker.fault == "drop":
+            self._broker.dropped_packets += 1
+        else:
+            self._stream.write(data)
+
+    async def drain(self):
+        if self._broker.fault is None:
+            await self._stream.drain()
+
+    def release(self):
+        held, self._held = self._held, []
+        for data in held:
+            self._stream.write(data)
+
+
+class ChaosBroker(StandInBroker):
+    """Stand-in broker that can kill, blackhole or stall the proxy's
+    connections and logs every proxy connect/disconnect with the number
+    of proxy sessions alive at that moment.
+    """
+
+    def __init__(self, *args, targets=PROXY_CLIENT_PREFIXES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.targets = tuple(targets)
+        self.fault = None
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        self.dropped_packets = 0
+        self.events = []
+        self._streams = set()
+
+    def is_target(self, client_id):
+        return client_id.startswith(self.targets)
+
+    def target_sessions(self):
+        return [session for session in self.sessions.values() if self.is_target(session.client_id)]
+
+    def _open_session(self, connect, stream, writer, peer):
+        if not self.is_target(connect["client_id"]):
+            return super()._open_session(connect, stream, writer, peer)
+        takeover = connect["client_id"] in self.sessions
+        stream = _ChaosStream(stream, self)
+        self._streams.add(stream)
+        session = super()._open_session(connect, stream, writer, peer)
+        self.events.append((time.perf_counter(), "takeover" if takeover else "connect",
+                            session.client_id, connect["clean"], len(self.target_sessions())))
+        return session
+
+    def _close_session(self, session):
+        closing = self.sessions.get(session.client_id) is session and self.is_target(session.client_id)
+        super()._close_session(session)
+        if self.is_target(session.client_id):
+            self._streams.discard(session.stream)
+        if closing:
+            self.events.append((time.perf_counter(), "disconnect", session.client_id, None,
+                                len(self.target_sessions())))
+
+    def kill_targets(self):
+        """Abort the proxy's sockets without DISCONNECT"""
+        for session in self.target_sessions():
+            session.stream.abort()
+
+    def set_fault(self, mode):
+        self.fault = mode
+        self.flowing.clear()
+
+    def heal(self):
+        self.fault = None
+        for stream in list(self._streams):
+            stream.release()
+        self.flowing.set()
+
+
+class StatusFeed:
+    """Publishes a unique retained Log/Brana/ID entry every `interval`
+    seconds and reconnects right away when the broker goes away."""
+
+    def __init__(self, host, port, interval=0.5, on_sent=None):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.on_sent = on_sent or (lambda topic, payload, sent_at: None)
+        self.sent = 0
+        self.reconnects = 0
+        self._stopped = asyncio.Event()
+        self._task = None
+
+    async def _run(self):
+        while not self._stopped.is_set():
+            client = AsyncMqttClient(f"chaos-feed-{os.getpid()}", keepalive=10)
+            try:
+                return_code = await client.connect(self.host, self.port, "tcp", timeout=2.0)
+                if return_code != 0:
+                    raise ConnectionError(f"CONNACK rc={return_code}")
+            except (OSError, ConnectionError, asyncio.TimeoutError, MqttProtocolError):
+                await asyncio.sleep(0.2)
+                continue
+            self.reconnects += 1
+            while client.connected and not self._stopped.is_set():
+                payload = f"CHAOS{self.sent:06d}"
+                waiter = client.publish_nowait(ACTIVITY_LOG_TOPIC, payload, 1, True)
+                waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self.on_sent(ACTIVITY_LOG_TOPIC, payload, time.perf_counter())
+                self.sent += 1
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            await client.disconnect()
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            await self._task
+
+
+class ChaosWatcher(ProxyWatcher):
+    """ProxyWatcher that also keeps a timeline of every poll:
+    (at, answered, connected, clientId, isConnecting, worst lag).
+
+    The worst lag is None when the proxy shows a value on a fed topic that
+    the feed never published (the initial null of lastMessages, ...) or
+    nothing fed at all - such a poll is never fresh.
+    """
+
+    def __init__(self, url, interval=0.25, timeout=3.0):
+        super().__init__(url, interval, timeout)
+        self.timeline = []
+
+    def reset(self):
+        super().reset()
+        self.timeline = []
+
+    async def poll_once(self):
+        started = time.perf_counter()
+        try:
+            response, body = await self.client.fetch("GET", self.url, read_limit=1 << 20)
+            document = json.loads(body)
+        except (HttpError, OSError, asyncio.TimeoutError, ValueError):
+            self.errors += 1
+            self.timeline.append((time.perf_counter(), False, False, None, None, None))
+            return
+        now = time.perf_counter()
+        self.polls += 1
+        self.poll_latencies.append(now - started)
+        connected = response.status == 200 and bool(document.get("connected"))
+        if not connected:
+            self.disconnected += 1
+        lags = []
+        unknown = False
+        for topic, value in (document.get("messages") or {}).items():
+            history = self.history.get(topic)
+            if not history:
+                continue
+            if not any(payload == value for _, payload in history):
+                # _lag by to vzalo jako "chybí od první zprávy" a chvíli by to vypadalo čerstvě
+                unknown = True
+                continue
+            lags.append(self._lag(topic, value, now))
+        self.lags.extend(lags)
+        self.timeline.append((now, response.status == 200, connected, document.get("clientId"),
+                              document.get("isConnecting"),
+                              None if unknown else max(lags, default=None)))
+
+
+def _timeline_strip(samples, start, end, stale_after, slot=0.5):
+    """One character per `slot` seconds: · fresh, s stale or no fed value,
+    d disconnected, x error"""
+    slots = [" "] * max(1, int((end - start) / slot) + 1)
+    rank = {" ": 0, "·": 1, "s": 2, "d": 3, "x": 4}
+    for at, answered, connected, _, _, lag in samples:
+        if not answered:
+            mark = "x"
+        elif not connected:
+            mark = "d"
+        elif lag is None or lag > stale_after:
+            mark = "s"
+        else:
+            mark = "·"
+        index = min(len(slots) - 1, int((at - start) / slot))
+        if rank[mark] > rank[slots[index]]:
+            slots[index] = mark
+    return "".join(slots)
+
+
+class ProxyChaosTest:
+    """Runs the chaos scenarios against a proxy connected to a ChaosBroker"""
+
+    def __init__(self, proxy_url, broker_port=1884, outage=5.0, publish_interval=0.5,
+                 poll_interval=0.25, stale_after=1.5, recover_timeout=150.0, settle=5.0,
+                 process=None, log=print):
+        self.proxy_url = proxy_url
+        # Proxy spuštěná přes --start-proxy - když skončí, nemá smysl čekat
+        self.process = process
+        self.outage = outage
+        self.stale_after = stale_after
+        self.recover_timeout = recover_timeout
+        self.settle = settle
+        self.log = log
+        self.broker = ChaosBroker("127.0.0.1", broker_port, log=log)
+        self.watcher = ChaosWatcher(proxy_url, poll_interval)
+        self.feed = None
+        self.publish_interval = publish_interval
+
+    def _fresh(self, sample):
+        _, answered, connected, _, _, lag = sample
+        return answered and connected and lag is not None and lag <= self.stale_after
+
+    def _check_process(self):
+        if self.process is not None and self.process.poll() is not None:
+            raise ConnectionError("dev-mqtt-proxy.js is not running")
+
+    async def _wait_session(self, timeout):
+        """Wait until the proxy holds a broker session (dev-mqtt-proxy.js
+        only connects on the first GET) - False on timeout"""
+        deadline = time.perf_counter() + timeout
+        while not self.broker.target_sessions():
+            self._check_process()
+            if time.perf_counter() >= deadline:
+                return False
+            await asyncio.sleep(self.watcher.interval / 2)
+        return True
+
+    async def _wait_fresh(self, since, timeout, first_event=None):
+        """First fresh poll taken after `since` (None on timeout).
+
+        With `first_event`, a proxy that lost its broker session since that
+        event only counts as recovered on polls after its next CONNECT -
+        before that the cache is merely not old enough to look stale yet.
+        """
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self._check_process()
+            after = since
+            if first_event is not None:
+                events = self.broker.events[first_event:]
+                lost = [at for at, kind, *_ in events if kind == "disconnect"]
+                if lost:
+                    back = [at for at, kind, *_ in events if kind != "disconnect" and at > lost[-1]]
+                    after = max(after, back[0]) if back else None
+            if after is not None:
+                for sample in self.watcher.timeline:
+                    if sample[0] >= after and self._fresh(sample):
+                        return sample[0]
+            await asyncio.sleep(self.watcher.interval / 2)
+        return None
+
+    async def _inject(self, scenario):
+        if scenario == "kill":
+            self.broker.kill_targets()
+            # Sessions close on the next loop iterations
+            await asyncio.sleep(0.1)
+        elif scenario in ("drop", "stall"):
+            self.broker.set_fault(scenario)
+            await asyncio.sleep(self.outage)
+            self.broker.heal()
+        elif scenario in ("restart", "restart-empty"):
+            await self.broker.stop()
+            if scenario == "restart-empty":
+                self.broker.retained.clear()
+            await asyncio.sleep(self.outage)
+            await self.broker.start()
+        else:
+            raise ValueError(f"Unknown scenario {scenario}")
+
+    async def run_scenario(self, scenario):
+        baseline = await self._wait_fresh(time.perf_counter(), self.recover_timeout)
+        injected = await self._wait_session(self.recover_timeout)
+        sessions_before = len(self.broker.target_sessions())
+        first_event = len(self.broker.events)
+        first_sample = len(self.watcher.timeline)
+        started = time.perf_counter()
+        self.log(f"\n💥 {scenario}: " + ("killing the proxy's connection" if scenario == "kill"
+                                         else f"{self.outage:g}s outage"))
+        recovered = None
+        if injected:
+            await self._inject(scenario)
+        healed = time.perf_counter()
+        if injected:
+            recovered = await self._wait_fresh(healed, self.recover_timeout, first_event)
+            await asyncio.sleep(self.settle)
+        ended = time.perf_counter()
+
+        samples = self.watcher.timeline[first_sample:]
+        events = self.broker.events[first_event:]
+        until = recovered if recovered is not None else ended
+        outage_samples = [sample for sample in samples if sample[0] <= until]
+        stale = [sample for sample in outage_samples
+                 if sample[1] and not self._fresh(sample)]
+        reconnects = [at for at, kind, *_ in events if kind != "disconnect" and at >= started]
+        proxy_down = [sample[0] for sample in samples if sample[1] and not sample[2]]
+        proxy_back = [sample[0] for sample in samples
+                      if proxy_down and sample[0] > proxy_down[0] and sample[2]]
+        client_ids = sorted({client_id for _, kind, client_id, *_ in events if kind != "disconnect"})
+        reported_ids = sorted({sample[3] for sample in samples if sample[3]})
+        concurrent = max([sessions_before] + [live for *_, live in events])
+        lags = [sample[5] for sample in outage_samples if sample[1] and sample[5] is not None]
+        result = {
+            "scenario": scenario,
+            "outage": 0.0 if scenario == "kill" else self.outage,
+            "baseline_fresh": baseline is not None,
+            "injected": injected,
+            # 0 = proxy got back in while the fault was still on
+            "reconnect": max(0.0, reconnects[0] - healed) if reconnects else None,
+            "proxy_reconnect": proxy_back[0] - healed if proxy_back else None,
+            "recovery": recovered - healed if recovered is not None else None,
+            "outage_seen": (recovered - started) if recovered is not None else None,
+            "polls": len(outage_samples),
+            "stale_served": len(stale),
+            "stale_claiming_connected": sum(1 for sample in stale if sample[2]),
+            "errors": sum(1 for sample in outage_samples if not sample[1]),
+            "worst_lag": max(lags, default=None),
+            "connects": len(reconnects),
+            "takeovers": sum(1 for _, kind, *_ in events if kind == "takeover"),
+            "max_concurrent_sessions": concurrent,
+            "client_ids": client_ids,
+            "reported_client_ids": reported_ids,
+            "clean_session": sorted({clean for _, kind, _, clean, _ in events if kind != "disconnect"}),
+            "timeline": _timeline_strip(samples, started, ended, self.stale_after),
+        }
+        result["duplicates"] = concurrent > 1 or len(reported_ids) > 1
+        result["ok"] = injected and recovered is not None and concurrent <= 1
+        return result
+
+    async def run(self, scenarios):
+        await self.broker.start()
+        self.feed = StatusFeed("127.0.0.1", self.broker.port, self.publish_interval,
+                               on_sent=self.watcher.sent)
+        self.feed.start()
+        self.watcher.start()
+        results = []
+        try:
+            self.log(f"⏳ Waiting for {self.proxy_url} to connect to the broker on port "
+                     f"{self.broker.port}...")
+            if await self._wait_fresh(time.perf_counter(), 60.0) is None:
+                raise ConnectionError("Proxy never showed a fresh Log/Brana/ID - is it "
+                                      f"pointed at ws://127.0.0.1:{self.broker.port}?")
+            for scenario in scenarios:
+                result = await self.run_scenario(scenario)
+                print_scenario(result, self.stale_after, self.log)
+                results.append(result)
+        finally:
+            await self.watcher.stop()
+            await self.feed.stop()
+            await self.broker.stop()
+        return {"proxy": self.proxy_url, "outage": self.outage, "stale_after": self.stale_after,
+                "poll_interval": self.watcher.interval, "published": self.feed.sent,
+                "dropped_packets": self.broker.dropped_packets,
+                "poll_latency": summarize(self.watcher.poll_latencies), "scenarios": results}
+
+
+def _seconds(value):
+    return f"{value:.1f}s" if value is not None else "never"
+
+
+def print_scenario(result, stale_after, log=print):
+    icon = "✅" if result["ok"] and not result["duplicates"] else "❌"
+    log(f"   {icon} recovery {_seconds(result['recovery'])} after the outage "
+        f"(users saw {_seconds(result['outage_seen'])}), broker reconnect "
+        f"{_seconds(result['reconnect'])}, proxy connected again {_seconds(result['proxy_reconnect'])}")
+    log(f"   📨 {result['stale_served']}/{result['polls']} responses stale (>{stale_after:g}s), "
+        f"{result['stale_claiming_connected']} of them with connected: true, "
+        f"{result['errors']} errors, worst lag {_seconds(result['worst_lag'])}")
+    log(f"   👥 {result['connects']} connect(s), {result['takeovers']} takeover(s), "
+        f"max {result['max_concurrent_sessions']} concurrent proxy session(s), "
+        f"client ids {', '.join(result['client_ids']) or '-'}")
+    if len(result["reported_client_ids"]) > 1:
+        log(f"   ⚠️  proxy switched clientId {' -> '.join(result['reported_client_ids'])} - "
+            "the clean: false session is orphaned")
+    if not result["injected"]:
+        log("   ⚠️  fault not injected - the proxy had no broker session")
+    elif not result["baseline_fresh"]:
+        log("   ⚠️  proxy was not fresh before the fault - result is unreliable")
+    log(f"   [{result['timeline']}]  · fresh  s stale/no feed value  d disconnected  x error (0.5s/char)")
+
+
+def print_summary(report, log=print):
+    log("\n📊 Recovery summary:")
+    for result in report["scenarios"]:
+        log(f"   {result['scenario']:14s} recovery {_seconds(result['recovery']):>7s}  "
+            f"stale {result['stale_served']:4d}  "
+            + ("duplicate clients ❌" if result["duplicates"] else "single client ✅"))
+    recoveries = [result["recovery"] for result in report["scenarios"] if result["recovery"] is not None]
+    if recoveries:
+        log(f"   recovery time {format_summary(summarize(recoveries), 's', 1)}")
+    if any(result["stale_claiming_connected"] for result in report["scenarios"]):
+        log("   💡 The proxy answered connected: true with stale lastMessages - clients cannot "
+            "tell a blip from a quiet gate. Expose the age of lastMessages or the last "
+            "'close' time in the GET response.")
+    if any(result["duplicates"] for result in report["scenarios"]):
+        log("   💡 A GET during mqtt.js auto-reconnect created a second client (isConnecting is "
+            "reset on 'close'). Reuse the existing mqttClient instead of calling mqtt.connect again.")
+
+
+def record_history(report, path, log=print):
+    """Store recovery per scenario as test proxy_recovery (see diag_daemon.py compare)"""
+    store = DiagnosticsStore(path)
+    try:
+        store.record_many([
+            ("proxy_recovery", result["ok"] and not result["duplicates"], result["recovery"],
+             result["stale_served"], result["scenario"],
+             {key: result[key] for key in ("reconnect", "proxy_reconnect", "outage",
+                                           "stale_claiming_connected", "max_concurrent_sessions",
+                                           "takeovers")}, None)
+            for result in report["scenarios"]])
+    finally:
+        store.close()
+    log(f"💾 Recovery times recorded in {path} (test proxy_recovery)")
+
+
+def start_dev_proxy(broker_port, log=print):
+    """node dev-mqtt-proxy.js against the chaos broker (listens on :3003)"""
+    workdir = tempfile.mkdtemp(prefix="brana-chaos-")
+    output = open(os.path.join(workdir, "dev-mqtt-proxy.log"), "w")
+    env = dict(os.environ, MQTT_BROKER_URL=f"ws://127.0.0.1:{broker_port}")
+    process = subprocess.Popen(["node", os.path.abspath(DEV_PROXY)],
+                               cwd=os.path.dirname(os.path.abspath(DEV_PROXY)), env=env,
+                               stdout=output, stderr=subprocess.STDOUT)
+    log(f"🟢 dev-mqtt-proxy.js pid {process.pid} (log {output.name})")
+    return process
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Broker outage / reconnect chaos test "
+                                                 "for the MQTT proxy")
+    parser.add_argument("--proxy", default=DEV_PROXY_URL, help="GET /api/mqtt-proxy URL")
+    parser.add_argument("--start-proxy", action="store_true",
+                        help="run `node dev-mqtt-proxy.js` against the chaos broker")
+    parser.add_argument("--broker-port", type=int, default=1884,
+                        help="stand-in broker port (tcp + ws) the proxy connects to")
+    parser.add_argument("--scenario", default="kill,drop,stall,restart,restart-empty",
+                        help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--outage", type=float, default=5.0, help="fault length in seconds")
+    parser.add_argument("--publish-interval", type=float, default=0.5,
+                        help="seconds between fresh Log/Brana/ID messages")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="proxy poll interval")
+    parser.add_argument("--stale-after", type=float, default=1.5,
+                        help="lastMessages older than this many seconds is stale")
+    parser.add_argument("--recover-timeout", type=float, default=150.0,
+                        help="give up waiting for fresh data (keepalive 60s may need ~120s)")
+    parser.add_argument("--settle", type=float, default=5.0,
+                        help="seconds to keep watching after recovery (late duplicates)")
+    parser.add_argument("--db", metavar="PATH", help="record recovery times in the diagnostics history")
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenario.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    process = start_dev_proxy(args.broker_port) if args.start_proxy else None
+    test = ProxyChaosTest(args.proxy, args.broker_port, args.outage, args.publish_interval,
+                          args.poll_interval, args.stale_after, args.recover_timeout, args.settle,
+                          process)
+    try:
+        report = asyncio.run(test.run(scenarios))
+    except KeyboardInterrupt:
+        return 1
+    except (OSError, ConnectionError) as e:
+        print(f"❌ {e}")
+        if process is not None and process.poll() is not None:
+            print(f"   dev-mqtt-proxy.js exited with {process.returncode} - `npm install` done?")
+        return 1
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(5)
+
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Saved {args.output}")
+    if args.db:
+        record_history(report, args.db)
+    return 0 if all(result["ok"] and not result["duplicates"] for result in report["scenarios"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Zátěžový test HTTP MQTT proxy (api/mqtt-proxy.js, dev-mqtt-proxy.js)
+Posílá GET/POST na /api/mqtt-proxy v daném poměru přes sdílená keep-alive
+spojení, buď cílovou rychlostí (otevřená smyčka, req/s), nebo s pevným
+počtem souběžných klientů (uzavřená smyčka). Po stupních zvyšuje zátěž
+a hlásí histogram latence, chybovost a propustnost v čase - a od jaké
+rychlosti proxy s jedním globálním mqttClient začne zdržovat nebo padat.
+
+V režimu rychlosti se latence počítá i od plánovaného startu požadavku,
+takže čekání na volné spojení se neschová (coordinated omission).
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import sys
+import time
+
+from async_http import HttpClient, HttpError
+from bench_stats import format_summary, summarize
+
+# POST nesmí hýbat bránou - výchozí topic nikdo neodebírá
+DEFAULT_POST_TOPIC = "Debug/Brana/ProxyLoad"
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def parse_steps(spec):
+    """'5,10,20' -> [5.0, 10.0, 20.0]"""
+    return [float(part) for part in spec.split(",") if part.strip()]
+
+
+def latency_histogram(latencies):
+    """Counts per LATENCY_BUCKETS_MS bucket (+ overflow) for latencies in seconds"""
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for latency in latencies:
+        counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency * 1000)] += 1
+    return counts
+
+
+class ProxyLoadTest:
+    """Drives one proxy URL at a fixed rate or concurrency for each step"""
+
+    def __init__(self, url, connections=20, timeout=10.0, post_ratio=0.1,
+                 post_topic=DEFAULT_POST_TOPIC, bucket_size=1.0, seed=None, log=print):
+        self.url = url
+        self.connections = connections
+        self.timeout = timeout
+        self.post_ratio = post_ratio
+        self.post_topic = post_topic
+        self.bucket_size = bucket_size
+        self.log = log
+        self._random = random.Random(seed)
+        self._sequence = 0
+
+    async def _request(self, client, scheduled_at, results, started):
+        self._sequence += 1
+        is_post = self._random.random() < self.post_ratio
+        sample = {"at": scheduled_at - started, "method": "POST" if is_post else "GET",
+                  "status": None, "error": None, "latency": None, "service": None,
+                  "reused": None}
+        begin = time.perf_counter()
+        try:
+            if is_post:
+                body = json.dumps({"topic": self.post_topic,
+                                   "message": f"proxy-load-{self._sequence}"}).encode()
+                response, payload = await asyncio.wait_for(
+                    client.fetch("POST", self.url, {"Content-Type": "application/json"}, body,
+                                 read_limit=64 * 1024), self.timeout)
+            else:
+                response, payload = await asyncio.wait_for(
+                    client.fetch("GET", self.url, read_limit=64 * 1024), self.timeout)
+            end = time.perf_counter()
+            sample["status"] = response.status
+            sample["reused"] = response.timings.get("reused")
+            if response.status >= 400:
+                sample["error"] = f"HTTP {response.status}"
+            elif not is_post:
+                try:
+                    if not json.loads(payload).get("connected"):
+                        # Proxy odpověděla, ale nemá spojení na broker
+                        sample["error"] = "proxy not connected"
+                except ValueError:
+                    sample["error"] = "invalid JSON"
+        except asyncio.TimeoutError:
+            end = time.perf_counter()
+            sample["error"] = "timeout"
+        except (HttpError, OSError) as e:
+            end = time.perf_counter()
+            sample["error"] = type(e).__name__
+        sample["service"] = end - begin
+        sample["latency"] = end - scheduled_at
+        results.append(sample)
+
+    async def run_rate(self, client, rate, duration):
+        """Open loop - requests start on schedule whether or not earlier ones finished"""
+        results = []
+        tasks = []
+        started = time.perf_counter()
+        total = int(rate * duration)
+        for index in range(total):
+            scheduled_at = started + index / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self._request(client, scheduled_at, results, started)))
+        await asyncio.gather(*tasks)
+        return results, time.perf_counter() - started
+
+    async def run_concurrency(self, client, workers, duration):
+        """Closed loop - `workers` clients each fire the next request when the last one ends"""
+        results = []
+        started = time.perf_counter()
+        stop_at = started + duration
+
+        async def worker():
+            while time.perf_counter() < stop_at:
+                await self._request(client, time.perf_counter(), results, started)
+
+        await asyncio.gather(*(worker() for _ in range(int(workers))))
+        return results, time.perf_counter() - started
+
+    def _over_time(self, results):
+        buckets = {}
+        for sample in results:
+            index = int((sample["at"] + sample["latency"]) // self.bucket_size)
+            buckets.setdefault(index, []).append(sample)
+        curve = []
+        for index in sorted(buckets):
+            samples = buckets[index]
+            ok = [s["latency"] for s in samples if s["error"] is None]
+            curve.append({"t": index * self.bucket_size,
+                          "completed": len(samples),
+                          "throughput": len(samples) / self.bucket_size,
+                          "errors": len(samples) - len(ok),
+                          "p95": summarize(ok)["p95"]})
+        return curve
+
+    def summarize_step(self, mode, target, results, elapsed):
+        ok = [s for s in results if s["error"] is None]
+        errors = {}
+        for sample in results:
+            if sample["error"] is not None:
+                errors[sample["error"]] = errors.get(sample["error"], 0) + 1
+        latencies = [s["latency"] for s in ok]
+        return {
+            "mode": mode,
+            "target": target,
+            "requests": len(results),
+            "ok": len(ok),
+            "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+            "errors": errors,
+            "throughput": len(ok) / elapsed if elapsed > 0 else 0.0,
+            "latency": summarize(latencies),
+            "service_time": summarize([s["service"] for s in ok]),
+            "get_latency": summarize([s["latency"] for s in ok if s["method"] == "GET"]),
+            "post_latency": summarize([s["latency"] for s in ok if s["method"] == "POST"]),
+            "histogram_ms": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["inf"],
+                                     latency_histogram(latencies))),
+            "reused_ratio": (sum(1 for s in results if s["reused"]) / len(results)) if results else 0.0,
+            "over_time": self._over_time(results),
+        }
+
+    async def run(self, rates=None, concurrency=None, duration=10.0, pause=2.0):
+        client = HttpClient(concurrency=self.connections, per_host=self.connections,
+                            timeout=self.timeout)
+        steps = [("rate", r) for r in rates or []] + [("concurrency", c) for c in concurrency or []]
+        reports = []
+        try:
+            for mode, target in steps:
+                label = f"{target:g} req/s" if mode == "rate" else f"{target:g} clients"
+                self.log(f"🚀 {label} for {duration:g}s ...")
+                if mode == "rate":
+                    results, elapsed = await self.run_rate(client, target, duration)
+                else:
+                    results, elapsed = await self.run_concurrency(client, target, duration)
+                report = self.summarize_step(mode, target, results, elapsed)
+                reports.append(report)
+                print_step(report, self.log)
+                if pause:
+                    await asyncio.sleep(pause)
+        finally:
+            await client.close()
+        return analyze_steps(reports)
+
+
+def analyze_steps(steps, latency_factor=2.0, max_error_rate=0.01):
+    """Mark the first step where p95 grows past latency_factor × the first
+    step's p95 or the error rate exceeds max_error_rate"""
+    baseline = next((s["latency"]["p95"] for s in steps if s["latency"]["p95"] is not None), None)
+    knee = None
+    for step in steps:
+        p95 = step["latency"]["p95"]
+        step["degraded"] = bool(step["error_rate"] > max_error_rate
+                                or (baseline and p95 is not None and p95 > baseline * latency_factor))
+        if step["degraded"] and knee is None:
+            knee = step
+    return {"steps": steps, "baseline_p95": baseline,
+            "knee": {"mode": knee["mode"], "target": knee["target"]} if knee else None}
+
+
+def print_step(step, log=print):
+    marker = "❌" if step["error_rate"] > 0.01 else "✅"
+    log(f"  {marker} {step['requests']} requests, {step['throughput']:.1f} ok/s, "
+        f"errors {step['error_rate']:.1%} {step['errors'] or ''}")
+    log(f"     latency {format_summary(step['latency'], unit='ms', scale=1000)}")
+    log(f"     service {format_summary(step['service_time'], unit='ms', scale=1000)}, "
+        f"keep-alive reuse {step['reused_ratio']:.0%}")
+    total = sum(step["histogram_ms"].values()) or 1
+    for bound, count in step["histogram_ms"].items():
+        if count:
+            bar = "█" * max(1, round(30 * count / total))
+            log(f"     ≤{bound:>5}ms {count:>6} {bar}")
+
+
+def print_load_summary(analysis, log=print):
+    log("\n📊 Step summary")
+    for step in analysis["steps"]:
+        unit = "req/s" if step["mode"] == "rate" else "clients"
+        p95 = step["latency"]["p95"]
+        p95_text = f"{p95 * 1000:8.1f}ms" if p95 is not None else "       -"
+        log(f"  {'🔺' if step['degraded'] else '  '} {step['target']:>6g} {unit:<7} "
+            f"p95 {p95_text}  errors {step['error_rate']:6.1%}  {step['throughput']:7.1f} ok/s")
+    knee = analysis["knee"]
+    if knee:
+        unit = "req/s" if knee["mode"] == "rate" else "concurrent clients"
+        log(f"🐢 Proxy degrades from {knee['target']:g} {unit}")
+    else:
+        log("✅ No degradation in the tested range")
+
+
+def run_proxy_load(url, rates=None, concurrency=None, duration=10.0, post_ratio=0.1,
+                   post_topic=DEFAULT_POST_TOPIC, connections=20, timeout=10.0, log=print):
+    """Synchronous entry point for mqtt-debug-tool.py"""
+    test = ProxyLoadTest(url, connections, timeout, post_ratio, post_topic, log=log)
+    analysis = asyncio.run(test.run(rates, concurrency, duration))
+    print_load_summary(analysis, log)
+    return analysis
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the HTTP MQTT proxy")
+    parser.add_argument("--url", default="http://localhost:3003/api/mqtt-proxy")
+    parser.add_argument("--rates", help="open-loop steps in req/s, e.g. 5,10,20,50")
+    parser.add_argument("--concurrency", help="closed-loop steps in clients, e.g. 1,4,16")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    parser.add_argument("--post-ratio", type=float, default=0.1, help="share of POST requests")
+    parser.add_argument("--post-topic", default=DEFAULT_POST_TOPIC)
+    parser.add_argument("--connections", type=int, default=20, help="keep-alive pool size")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+    if args.post_topic == "IoT/Brana/Ovladani":
+        print("🛑 Refusing to load test with gate commands")
+        return 2
+    rates = parse_steps(args.rates) if args.rates else None
+    concurrency = parse_steps(args.concurrency) if args.concurrency else None
+    if not rates and not concurrency:
+        rates = [5, 10, 20, 50]
+    print(f"🌐 Proxy load test: {args.url}")
+    print("=" * 50)
+    analysis = run_proxy_load(args.url, rates, concurrency, args.duration, args.post_ratio,
+                              args.post_topic, args.connections, args.timeout)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "proxy_load", "version": 1, "url": args.url, **analysis},
+                      f, indent=2)
+        print(f"💾 Result saved to {args.output}")
+    return 0 if analysis["knee"] is None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Srovnání MJPEG streamu přes Vercel /api/camera-proxy/* a přímo z kamery
+
+Všechny trasy se čtou současně v jedné asyncio smyčce, takže časy
+příchodu snímků jsou srovnatelné. Snímky se párují podle obsahu
+(blake2b), pro každou dvojici proxy / přímá trasa se stejným souborem
+se počítá:
+
+  - zpoždění, které proxy přidává ke každému snímku
+  - shlukování (snímky přicházející naráz = proxy bufferuje)
+  - udržitelné bytes/s v sekundových oknech
+  - kde a proč stream skončil (limit velikosti/délky odpovědi)
+  - jestli proxy vůbec vrací multipart stream, nebo jen jeden obrázek
+
+Z toho vychází verdikt, jestli živý náhled může jít přes proxy.
+
+    python debug/camera_test.py --proxy-stream --duration 15
+    python debug/camera_test.py --sim --proxy-stream --proxy-flush 1 --proxy-cutoff-kb 2000
+"""
+
+import asyncio
+import hashlib
+import statistics
+import time
+
+from bench_stats import format_summary, summarize
+from mjpeg_analyzer import analyze_stream
+
+# Interval kratší než tento podíl mediánu přímé trasy = snímek přišel ve shluku
+CLUMP_FRACTION = 0.25
+# Proxy bufferuje, když je ve shlucích o tolik víc snímků než na přímé trase
+CLUMP_EXCESS = 0.2
+# Živý náhled snese takové zpoždění (p95) a takový úbytek fps
+MAX_ADDED_P95 = 0.5
+MIN_FPS_RATIO = 0.8
+# Hledání páru jen tolik snímků dopředu - synthetic snímky se opakují
+MATCH_WINDOW = 600
+
+
+class RouteRecorder:
+    """Frame arrivals with content keys and socket reads of one route"""
+
+    def __init__(self):
+        self.frames = []
+        self.reads = []
+
+    def frame(self, view, stats):
+        self.frames.append((stats.arrivals[-1], hashlib.blake2b(view, digest_size=8).digest()))
+
+    def data(self, size, stats):
+        self.reads.append((time.perf_counter(), size))
+
+
+async def record_route(group, url, duration, timeout):
+    recorder = RouteRecorder()
+    report = await analyze_stream(url, duration, timeout=timeout, on_frame=recorder.frame,
+                                  on_data=recorder.data)
+    return {"group": group, "url": url, "report": report, "recorder": recorder}
+
+
+def windowed_rates(reads, window=1.0):
+    """Bytes per second in full `window`s from the first read on"""
+    if not reads:
+        return []
+    start = reads[0][0]
+    counts = [0] * int((reads[-1][0] - start) / window)
+    for at, size in reads:
+        index = int((at - start) / window)
+        if index < len(counts):
+            counts[index] += size
+    return [count / window for count in counts]
+
+
+def route_metrics(route, duration, clump_gap):
+    """Per-route arrival pattern, throughput and cut-off"""
+    report = route["report"]
+    arrivals = [at for at, _ in route["recorder"].frames]
+    intervals = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    rates = windowed_rates(route["recorder"].reads)
+    streaming = (report["content_type"] or "").startswith("multipart/")
+    cut = None
+    if report["status"] == 200 and report["error"] and report["duration"] < duration - 0.5:
+        cut = {"at": report["duration"], "bytes": report["bytes_total"],
+               "frames": report["frames"], "reason": report["error"]}
+    return {
+        "group": route["group"],
+        "url": route["url"],
+        "status": report["status"],
+        "error": report["error"],
+        "streaming": streaming,
+        "frames": report["frames"],
+        "fps": report["fps"],
+        # Snímky za celou dobu od požadavku - shluky nezkreslí tempo jako fps mezi snímky
+        "delivered_fps": report["frames"] / report["duration"] if report["duration"] else None,
+        "time_to_first_frame": report["time_to_first_frame"],
+        "clumped": (sum(1 for interval in intervals if interval < clump_gap) / len(intervals)
+                    if intervals else None),
+        "interval_cv": (statistics.pstdev(intervals) / statistics.mean(intervals)
+                        if len(intervals) > 1 and statistics.mean(intervals) > 0 else None),
+        "max_gap": max(intervals, default=None),
+        "bytes_per_sec": report["bytes_per_sec"],
+        "sustained": {"median": statistics.median(rates) if rates else None,
+                      "min": min(rates, default=None)},
+        "cut": cut,
+    }
+
+
+def align(frames, reference, window=MATCH_WINDOW):
+    """Pair frames with the same content, both sequences in arrival order.
+
+    Returns (deltas, matched reference indexes) - delta is arrival on
+    `frames` minus arrival on `reference` of the same picture.
+    """
+    deltas = []
+    matched = []
+    pointer = 0
+    for arrived, key in frames:
+        for index in range(pointer, min(len(reference), pointer + window)):
+            if reference[index][1] == key:
+                deltas.append(arrived - reference[index][0])
+                matched.append(index)
+                pointer = index + 1
+                break
+    return deltas, matched
+
+
+def compare_route(proxy, direct, proxy_metrics, direct_metrics):
+    """Proxy vs direct for the same stream, with a verdict"""
+    deltas, matched = align(proxy["recorder"].frames, direct["recorder"].frames)
+    proxy_frames = proxy["recorder"].frames
+    missing = 0
+    if proxy_frames and matched:
+        # Snímky přímé trasy, které během života proxy streamu přes proxy nepřišly
+        missing = (matched[-1] - matched[0] + 1) - len(matched)
+    fps_ratio = None
+    if proxy_metrics["delivered_fps"] and direct_metrics["delivered_fps"]:
+        fps_ratio = proxy_metrics["delivered_fps"] / direct_metrics["delivered_fps"]
+    added = summarize(deltas)
+    reasons = []
+    if proxy_metrics["status"] != 200:
+        reasons.append(f"proxy failed ({proxy_metrics['error'] or proxy_metrics['status']})")
+    elif not proxy_metrics["streaming"]:
+        reasons.append("proxy returns a single image, not a multipart stream")
+    else:
+        if proxy_metrics["cut"]:
+            reasons.append(f"cut off after {proxy_metrics['cut']['at']:.1f}s")
+        if (proxy_metrics["clumped"] is not None and direct_metrics["clumped"] is not None
+                and proxy_metrics["clumped"] - direct_metrics["clumped"] > CLUMP_EXCESS):
+            reasons.append(f"buffered ({proxy_metrics['clumped']:.0%} of frames in clumps)")
+        if added["count"] and added["p95"] > MAX_ADDED_P95:
+            reasons.append(f"adds {added['p95'] * 1000:.0f}ms p95")
+        if fps_ratio is not None and fps_ratio < MIN_FPS_RATIO:
+            reasons.append(f"delivers {fps_ratio:.0%} of direct fps")
+        if not added["count"]:
+            reasons.append("no frame matched the direct stream")
+    return {
+        "proxy": proxy["url"],
+        "direct": direct["url"],
+        "direct_group": direct["group"],
+        "matched": len(deltas),
+        "missing": missing,
+        "fps_ratio": fps_ratio,
+        "added_latency": added,
+        "first_frame_delta": (proxy_metrics["time_to_first_frame"]
+                              - direct_metrics["time_to_first_frame"]
+                              if proxy_metrics["time_to_first_frame"] is not None
+                              and direct_metrics["time_to_first_frame"] is not None else None),
+        "reasons": reasons,
+        "live_ok": not reasons,
+    }
+
+
+async def compare_streams(endpoints, duration=10.0, timeout=5.0, proxy_group="vercel_proxy"):
+    """Read every stream endpoint at once and pair proxy routes with direct ones"""
+    routes = await asyncio.gather(*(record_route(group, url, duration, timeout)
+                                    for group, url in endpoints))
+    direct_routes = [route for route in routes if route["group"] != proxy_group]
+    # Shluk se posuzuje podle tempa přímé trasy (kamera), ne podle proxy
+    direct_intervals = [b[0] - a[0] for route in direct_routes
+                        for a, b in zip(route["recorder"].frames, route["recorder"].frames[1:])]
+    clump_gap = (statistics.median(direct_intervals) * CLUMP_FRACTION
+                 if direct_intervals else 0.02)
+    metrics = {route["url"]: route_metrics(route, duration, clump_gap) for route in routes}
+    comparisons = []
+    for proxy in routes:
+        if proxy["group"] != proxy_group:
+            continue
+        name = proxy["url"].rsplit("/", 1)[-1]
+        pairs = [compare_route(proxy, direct, metrics[proxy["url"]], metrics[direct["url"]])
+                 for direct in direct_routes
+                 if direct["url"].rsplit("/", 1)[-1] == name and direct["recorder"].frames]
+        # Přímá trasa s jiným obrazem (jiná kamera/instance) se nepočítá, pokud jiná sedí
+        matched = [pair for pair in pairs if pair["matched"]]
+        comparisons.extend(matched or pairs[:1])
+    return {"duration": duration, "clump_gap": clump_gap,
+            "routes": list(metrics.values()), "comparisons": comparisons}
+
+
+def _kb(value):
+    return f"{value / 1024:.0f}kB/s" if value is not None else "-"
+
+
+def print_proxy_stream_report(result, log=print):
+    """Per-route arrival pattern, proxy vs direct pairs and the live view verdict"""
+    for route in result["routes"]:
+        log(f"\n🎥 {route['url']} ({route['group']})")
+        if route["status"] != 200:
+            log(f"   ❌ {route['error'] or route['status']}")
+            continue
+        if not route["streaming"]:
+            log(f"   🖼️  not a multipart stream - {route['frames']} frame(s) then "
+                f"{route['error'] or 'end'}")
+            continue
+        fps = f"{route['delivered_fps']:.1f}" if route["delivered_fps"] else "-"
+        ttff = route["time_to_first_frame"]
+        log(f"   {route['frames']} frames, {fps} fps, first frame "
+            + (f"{ttff * 1000:.0f}ms" if ttff is not None else "-"))
+        if route["clumped"] is not None:
+            log(f"   〰️  {route['clumped']:.0%} in clumps (<{result['clump_gap'] * 1000:.0f}ms apart), "
+                f"max gap {route['max_gap'] * 1000:.0f}ms, interval CV {route['interval_cv'] or 0:.2f}")
+        log(f"   🚚 {_kb(route['bytes_per_sec'])} average, sustained median "
+            f"{_kb(route['sustained']['median'])} / min {_kb(route['sustained']['min'])}")
+        if route["cut"]:
+            cut = route["cut"]
+            log(f"   ✂️  cut after {cut['at']:.1f}s, {cut['bytes'] / 1024 / 1024:.2f}MB, "
+                f"{cut['frames']} frames ({cut['reason']})")
+
+    if not result["comparisons"]:
+        log("\n⚠️  No proxy/direct stream pair with frames to compare")
+        return False
+    log("\n🆚 Proxy vs direct:")
+    for item in result["comparisons"]:
+        log(f"   {item['proxy'].rsplit('/', 1)[-1]} vs {item['direct_group']}: "
+            + ("✅ live view OK" if item["live_ok"] else "❌ " + "; ".join(item["reasons"])))
+        if item["matched"]:
+            first = item["first_frame_delta"]
+            log(f"      added latency {format_summary(item['added_latency'], 'ms', 1000)}"
+                + (f", first frame {first * 1000:+.0f}ms" if first is not None else ""))
+            log(f"      {item['matched']} frames matched, {item['missing']} missing"
+                + (f", {item['fps_ratio']:.0%} of direct fps" if item["fps_ratio"] else ""))
+    live_ok = all(item["live_ok"] for item in result["comparisons"])
+    log("\n📺 Live view through the proxy: "
+        + ("✅ viable" if live_ok else "❌ not viable - keep it on the direct stream"))
+    return live_ok
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+Audit váhy a cachování PWA při studeném startu
+
+Projde sestavenou aplikaci - adresář build/ nebo její lokálně servírovanou
+kopii (npx serve -s build, vercel dev) - od index.html přes všechny
+odkazované skripty, styly, fonty a obrázky, manifest, service worker a
+jeho precache seznam i asset-manifest.json z react-scripts build. Pro
+každý soubor zjistí velikost raw / gzip / brotli, Cache-Control a jestli
+je na kritické cestě (bez něj se tlačítko brány nevykreslí).
+
+Z toho počítá:
+
+  - kritické bajty a round-tripy první návštěvy
+  - totéž pro opakovanou návštěvu podle public/service-worker.js
+    (navigace vždy ze sítě, statika z precache nebo z HTTP cache podle
+    Cache-Control) - s-maxage bez max-age znamená revalidaci každého souboru
+  - odhad doby do použitelného tlačítka na slabém mobilním připojení
+  - duplicitní bundly (stejný obsah, stará kopie se stejným jménem,
+    stejný balíček ve více chuncích) a bundly, na které nic neodkazuje
+
+a porovná to s rozpočty (--budget first_kb=170 ...). Nesplněný rozpočet =
+návratový kód 1, takže se dá pustit po `npm run build` v CI.
+
+    python debug/pwa_audit.py build
+    python debug/pwa_audit.py http://localhost:3000 --profile slow-3g --budget usable_s=8
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+from async_http import HttpClient, HttpError
+from diag_daemon import parse_duration
+
+try:
+    import brotli
+except ImportError:  # bez brotli se počítá jen gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 11
+
+# Přenos (kbit/s) a RTT (s) - DevTools "Slow 3G", Lighthouse mobile, běžné 4G
+PROFILES = {
+    "slow-3g": (400, 0.4),
+    "slow-4g": (1600, 0.15),
+    "4g": (9000, 0.085),
+}
+# DNS + TCP + TLS před prvním bajtem HTML
+SETUP_ROUND_TRIPS = 3
+
+DEFAULT_BUDGETS = {
+    "first_kb": 170.0,      # kritické bajty první návštěvy (po kompresi)
+    "repeat_kb": 20.0,      # kritické bajty opakované návštěvy
+    "repeat_rtt": 2,        # round-tripy opakované návštěvy (kromě navázání spojení)
+    "js_kb": 150.0,         # kritický JS po kompresi
+    "css_kb": 30.0,         # kritické CSS po kompresi
+    "usable_s": 5.0,        # odhad doby do použitelného tlačítka na --profile
+}
+
+TEXT_KINDS = {"document", "script", "style", "manifest", "worker", "data", "svg"}
+
+# Výchozí hlavička Vercelu pro statiku bez pravidla ve vercel.json
+VERCEL_DEFAULT_CACHE = "public, max-age=0, must-revalidate"
+
+BUNDLE_RE = re.compile(r"^/static/(?:js|css)/[^/]+\.(?:js|css)$")
+HASHED_RE = re.compile(r"\.([0-9a-f]{8,20})(?=\.(?:chunk\.)?(?:js|css)$)")
+JS_REF_RE = re.compile(r"""["'`](/?static/(?:js|css|media)/[\w.\-]+|/[\w\-./]+\.(?:js|json|css|png|svg|ico|woff2?|jpg|webp))["'`]""")
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")]+)['"]?\s*\)|@import\s+['"]([^'"]+)['"]""")
+PRECACHE_RE = re.compile(r"(?:urlsToCache\s*=|precacheAndRoute\(|__WB_MANIFEST)\s*\[(.*?)\]", re.S)
+LICENSE_RE = re.compile(r"@license\s+([\w@./\-]+)")
+
+
+def kind_of(path):
+    extension = os.path.splitext(path)[1].lower()
+    if path.endswith("/") or extension in (".html", ".htm"):
+        return "document"
+    if path.rsplit("/", 1)[-1] in ("service-worker.js", "sw.js"):
+        return "worker"
+    return {".js": "script", ".mjs": "script", ".css": "style", ".json": "data",
+            ".webmanifest": "manifest", ".svg": "svg", ".woff": "font", ".woff2": "font",
+            ".ttf": "font", ".png": "image", ".jpg": "image", ".jpeg": "image", ".gif": "image",
+            ".webp": "image", ".ico": "image", ".txt": "data"}.get(extension, "other")
+
+
+def parse_cache_control(value):
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def _seconds(directives, name):
+    try:
+        return int(directives.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class Asset:
+    """One crawled file with its sizes, headers and place on the critical path"""
+
+    def __init__(self, path, kind, critical, wave, referrer):
+        self.path = path
+        self.kind = kind
+        self.critical = critical
+        self.wave = wave
+        self.referrers = {referrer} if referrer else set()
+        self.status = None
+        self.headers = {}
+        self.body = b""
+        self.raw = 0
+        self.gzip = None
+        self.brotli = None
+        self.served_encoding = None
+        self.served_bytes = None
+        self.digest = None
+
+    def measure(self):
+        self.raw = len(self.body)
+        self.digest = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        if self.kind in TEXT_KINDS and self.body:
+            self.gzip = len(gzip.compress(self.body, GZIP_LEVEL, mtime=0))
+            if brotli is not None:
+                self.brotli = len(brotli.compress(self.body, quality=BROTLI_QUALITY))
+
+    @property
+    def transfer(self):
+        """Bytes on the wire - what the server sent, else the best compression"""
+        if self.served_bytes is not None:
+            return self.served_bytes
+        if self.kind not in TEXT_KINDS:
+            return self.raw
+        return min(size for size in (self.raw, self.gzip, self.brotli) if size is not None)
+
+    @property
+    def cache_control(self):
+        return self.headers.get("cache-control", "")
+
+    def to_dict(self):
+        return {"path": self.path, "kind": self.kind, "status": self.status,
+                "critical": self.critical, "wave": self.wave, "raw": self.raw,
+                "gzip": self.gzip, "brotli": self.brotli, "transfer": self.transfer,
+                "served_encoding": self.served_encoding, "cache_control": self.cache_control,
+                "etag": "etag" in self.headers, "last_modified": "last-modified" in self.headers,
+                "referrers": sorted(self.referrers)}
+
+
+# --- zdroje ----------------------------------------------------------------
+
+class DirectorySource:
+    """build/ on disk, headers taken from the vercel.json rules"""
+
+    def __init__(self, root, vercel_config=None):
+        self.root = os.path.abspath(root)
+        self.rules = []
+        config_path = vercel_config or os.path.join(self.root, "..", "vercel.json")
+        if os.path.exists(config_path):
+            with open(config_path, encoding="utf-8") as f:
+                for rule in json.load(f).get("headers", []):
+                    pattern = "^" + re.sub(r"\\\(\\\.\\\*\\\)", "(.*)", re.escape(rule["source"])) + "$"
+                    self.rules.append((re.compile(pattern),
+                                       {header["key"].lower(): header["value"]
+                                        for header in rule["headers"]}))
+        self.description = f"{self.root} (headers from {'vercel.json' if self.rules else 'defaults'})"
+
+    def list_bundles(self):
+        found = []
+        for folder in ("static/js", "static/css"):
+            directory = os.path.join(self.root, folder)
+            if os.path.isdir(directory):
+                found += [f"/{folder}/{name}" for name in sorted(os.listdir(directory))]
+        return found
+
+    async def get(self, path, encoded=False):
+        file_path = os.path.join(self.root, "index.html" if path == "/" else path.lstrip("/"))
+        if not os.path.isfile(file_path) or not os.path.abspath(file_path).startswith(self.root):
+            return 404, {}, b""
+        with open(file_path, "rb") as f:
+            body = f.read()
+        headers = {"cache-control": VERCEL_DEFAULT_CACHE, "etag": "assumed"}
+        served = "/index.html" if path == "/" else path
+        for pattern, values in self.rules:
+            if pattern.match(served):
+                headers.update(values)
+        return 200, headers, body
+
+    async def close(self):
+        pass
+
+
+class HttpSource:
+    """A locally served copy of the build (npx serve -s build, vercel dev)"""
+
+    def __init__(self, base_url, timeout=10.0):
+        self.base_url = base_url.rstrip("/")
+        self.client = HttpClient(concurrency=6, per_host=6, timeout=timeout)
+        self.description = self.base_url
+
+    def list_bundles(self):
+        return []
+
+    async def get(self, path, encoded=False):
+        headers = {"Accept-Encoding": "br, gzip" if encoded else "identity"}
+        response, body = await self.client.fetch("GET", self.base_url + path, headers=headers)
+        return response.status, response.headers, body
+
+    async def close(self):
+        await self.client.close()
+
+
+# --- procházení ------------------------------------------------------------
+
+class _HtmlReferences(HTMLParser):
+    """(url, kind, critical) for everything index.html loads"""
+
+    def __init__(self):
+        super().__init__()
+        self.references = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "script" and attrs.get("src"):
+            self.references.append((attrs["src"], "script", "async" not in attrs))
+        elif tag == "link" and attrs.get("href"):
+            rel = (attrs.get("rel") or "").lower().split()
+            if "stylesheet" in rel:
+                self.references.append((attrs["href"], "style", True))
+            elif "modulepreload" in rel or ("preload" in rel and attrs.get("as") in ("script", "style", "font")):
+                self.references.append((attrs["href"], None, True))
+            elif "manifest" in rel:
+                self.references.append((attrs["href"], "manifest", False))
+            elif rel and rel[0] in ("icon", "apple-touch-icon", "shortcut", "prefetch"):
+                self.references.append((attrs["href"], None, False))
+        elif tag == "img" and attrs.get("src"):
+            self.references.append((attrs["src"], "image", False))
+
+
+class PwaAudit:
+    """Crawls the app from / and collects every reachable asset"""
+
+    def __init__(self, source, service_worker="/service-worker.js"):
+        self.source = source
+        self.service_worker = service_worker
+        self.assets = {}
+        self.missing = []
+        self.precache = []
+        self.entrypoints = []
+        self.manifest_files = []
+
+    def _resolve(self, base, reference):
+        reference = reference.replace("%PUBLIC_URL%", "").strip()
+        if not reference or reference.startswith(("data:", "blob:", "#", "mailto:", "javascript:")):
+            return None
+        parts = urlsplit(urljoin("http://app" + base, reference))
+        if parts.netloc != "app":
+            return None  # jiný origin (Firebase, kamera) - mimo build
+        return parts.path or "/"
+
+    async def _fetch(self, asset):
+        try:
+            asset.status, asset.headers, asset.body = await self.source.get(asset.path)
+            if (asset.status == 200 and asset.kind != "document"
+                    and asset.headers.get("content-type", "").startswith("text/html")):
+                # SPA rewrite (serve -s, vercel.json) vrací index.html místo 404
+                asset.status, asset.body = "index.html fallback", b""
+            if asset.status == 200 and asset.kind in TEXT_KINDS and isinstance(self.source, HttpSource):
+                _, headers, encoded = await self.source.get(asset.path, encoded=True)
+                asset.served_encoding = headers.get("content-encoding", "identity")
+                asset.served_bytes = len(encoded)
+        except (HttpError, OSError, asyncio.TimeoutError) as e:
+            asset.status = f"{type(e).__name__}: {e}"
+        asset.measure()
+
+    def _references(self, asset):
+        """(path, kind, critical, wave) of what this asset pulls in"""
+        text = asset.body.decode("utf-8", errors="replace")
+        found = []
+        if asset.kind == "document":
+            parser = _HtmlReferences()
+            parser.feed(text)
+            for reference, kind, critical in parser.references:
+                found.append((reference, kind, critical and asset.critical, asset.wave + 1))
+        elif asset.kind == "style":
+            for url, imported in CSS_URL_RE.findall(text):
+                reference = url or imported
+                # Fonty a @import blokují vykreslení, obrázky z CSS ne
+                blocking = bool(imported) or kind_of(reference.split("?")[0]) == "font"
+                found.append((reference, None, blocking and asset.critical, asset.wave + 1))
+        elif asset.kind in ("script", "worker"):
+            for reference in JS_REF_RE.findall(text):
+                found.append(("/" + reference.lstrip("/"), None, False, asset.wave + 1))
+        elif asset.kind == "manifest":
+            try:
+                document = json.loads(text)
+            except ValueError:
+                document = {}
+            for icon in document.get("icons", []):
+                found.append((icon.get("src", ""), "image", False, asset.wave + 1))
+        if asset.kind == "worker":
+            for block in PRECACHE_RE.findall(text):
+                for reference in re.findall(r"""(?:url\s*:\s*)?["']([^"']+)["']""", block):
+                    path = self._resolve(asset.path, reference)
+                    if path:
+                        self.precache.append(path)
+                        found.append((reference, None, False, asset.wave + 1))
+        return found
+
+    def _add(self, path, kind, critical, wave, referrer):
+        asset = self.assets.get(path)
+        if asset is None:
+            asset = self.assets[path] = Asset(path, kind or kind_of(path), critical, wave, referrer)
+            return asset
+        asset.referrers.add(referrer)
+        if critical and not asset.critical:
+            asset.critical = True
+            asset.wave = wave
+        return None
+
+    async def _crawl(self, queue):
+        while queue:
+            batch, queue = queue, []
+            await asyncio.gather(*(self._fetch(asset) for asset in batch))
+            for asset in batch:
+                if asset.status != 200:
+                    self.missing.append(asset.path)
+                    continue
+                for reference, kind, critical, wave in self._references(asset):
+                    path = self._resolve(asset.path, reference)
+                    if path is None:
+                        continue
+                    new = self._add(path, kind, critical, wave, asset.path)
+                    if new is not None:
+                        queue.append(new)
+
+    async def run(self):
+        queue = [self._add("/", "document", True, 0, None)]
+        queue.append(self._add(self.service_worker, "worker", False, 1, "/"))
+        queue.append(self._add("/asset-manifest.json", "data", False, 1, None))
+        await self._crawl(queue)
+        # Odkazy z JS nemusí existovat (regex je hrubý) - jen HTML/CSS/manifest chybí doopravdy
+        for path in [path for path, asset in self.assets.items() if asset.status != 200]:
+            asset = self.assets[path]
+            if asset.referrers and all(self.assets[referrer].kind in ("script", "worker")
+                                       for referrer in asset.referrers if referrer in self.assets):
+                del self.assets[path]
+                self.missing.remove(path)
+        self._read_asset_manifest()
+        queue = [self._add(path, None, True, 1, "/asset-manifest.json")
+                 for path in self.entrypoints if path not in self.assets]
+        # Zbylé bundly jen kvůli velikosti a hledání nepoužitých
+        for path in set(self.manifest_files) | set(self.source.list_bundles()):
+            if BUNDLE_RE.match(path) and path not in self.assets:
+                queue.append(self._add(path, None, False, 2, None))
+        await self._crawl(queue)
+        for path in self.entrypoints:
+            if path in self.assets:
+                self.assets[path].critical = True
+        await self.source.close()
+        return self.report()
+
+    def _read_asset_manifest(self):
+        asset = self.assets.get("/asset-manifest.json")
+        if asset is None or asset.status != 200:
+            self.assets.pop("/asset-manifest.json", None)
+            if "/asset-manifest.json" in self.missing:
+                self.missing.remove("/asset-manifest.json")
+            return
+        try:
+            document = json.loads(asset.body)
+        except ValueError:
+            return
+        self.entrypoints = [path for path in (self._resolve("/", entry)
+                                              for entry in document.get("entrypoints", [])) if path]
+        self.manifest_files = [path for path in (self._resolve("/", entry)
+                                                 for entry in (document.get("files") or {}).values())
+                               if path]
+
+    # ----- vyhodnocení
+
+    def _reachable_bundles(self):
+        """Bundles loaded from index.html, directly or through chunk hashes in loaded JS"""
+        bundles = {path: asset for path, asset in self.assets.items()
+                   if BUNDLE_RE.match(path) and asset.status == 200}
+        reachable = {path for path, asset in bundles.items()
+                     if asset.critical or any(referrer not in bundles and referrer != "/asset-manifest.json"
+                                              for referrer in asset.referrers)}
+        while True:
+            texts = [bundles[path].body for path in reachable if bundles[path].kind == "script"]
+            found = set()
+            for path, asset in bundles.items():
+                if path in reachable:
+                    continue
+                match = HASHED_RE.search(path)
+                if asset.referrers & reachable or (
+                        match and any(match.group(1).encode() in text for text in texts)):
+                    found.add(path)
+            if not found:
+                return reachable
+            reachable |= found
+
+    def duplicates(self):
+        by_digest = {}
+        for asset in self.assets.values():
+            if asset.status == 200 and asset.raw:
+                by_digest.setdefault(asset.digest, []).append(asset.path)
+        identical = [sorted(paths) for paths in by_digest.values() if len(paths) > 1]
+        by_name = {}
+        for path in (p for p, asset in self.assets.items() if BUNDLE_RE.match(p) and asset.status == 200):
+            by_name.setdefault(HASHED_RE.sub("", path), []).append(path)
+        versions = [sorted(paths) for paths in by_name.values() if len(paths) > 1]
+        packages = {}
+        for path, asset in self.assets.items():
+            if asset.kind == "script" and asset.status == 200:
+                license_text = self._license(path)
+                for package in set(LICENSE_RE.findall(license_text)):
+                    packages.setdefault(package, []).append(path)
+        shared = {package: sorted(paths) for package, paths in packages.items() if len(paths) > 1}
+        return {"identical": identical, "versions": versions, "packages": shared}
+
+    def _license(self, path):
+        """Banner comments of a bundle (react-scripts moves them to .LICENSE.txt)"""
+        asset = self.assets[path]
+        text = asset.body[:4096].decode("utf-8", errors="ignore")
+        if isinstance(self.source, DirectorySource):
+            license_path = os.path.join(self.source.root, path.lstrip("/") + ".LICENSE.txt")
+            if os.path.exists(license_path):
+                with open(license_path, encoding="utf-8", errors="ignore") as f:
+                    text += f.read()
+        return text
+
+    def unused(self, reachable):
+        return [{"path": path, "raw": asset.raw, "transfer": asset.transfer}
+                for path, asset in sorted(self.assets.items())
+                if BUNDLE_RE.match(path) and asset.status == 200 and path not in reachable]
+
+    def repeat_outcome(self, asset):
+        """How a repeat visit gets this asset through public/service-worker.js"""
+        if asset.kind == "document":
+            return "network"  # navigace: fetch(..., cache: 'no-store')
+        if asset.path in self.precache:
+            return "sw-cache"
+        directives = parse_cache_control(asset.cache_control)
+        if "no-store" in directives:
+            return "network"
+        max_age = _seconds(directives, "max-age")
+        if "no-cache" not in directives and ("immutable" in directives or (max_age or 0) > 0):
+            return "http-cache"
+        if "etag" in asset.headers or "last-modified" in asset.headers:
+            return "revalidate"
+        return "network"
+
+    def critical_path(self, repeat=False):
+        critical = [asset for asset in self.assets.values() if asset.critical and asset.status == 200]
+        transfer = 0
+        waves = set()
+        outcomes = {}
+        kinds = {}
+        for asset in critical:
+            outcome = self.repeat_outcome(asset) if repeat else "network"
+            outcomes[asset.path] = outcome
+            if outcome == "network":
+                transfer += asset.transfer
+                kinds[asset.kind] = kinds.get(asset.kind, 0) + asset.transfer
+            if outcome in ("network", "revalidate"):
+                waves.add(asset.wave)
+        return {"assets": len(critical), "transfer": transfer, "round_trips": len(waves),
+                "by_kind": kinds, "outcomes": outcomes}
+
+    def report(self):
+        reachable = self._reachable_bundles()
+        first = self.critical_path()
+        repeat = self.critical_path(repeat=True)
+        estimates = {name: {"first": estimate(first, bandwidth, rtt),
+                            "repeat": estimate(repeat, bandwidth, rtt)}
+                     for name, (bandwidth, rtt) in PROFILES.items()}
+        return {
+            "source": self.source.description,
+            "brotli": brotli is not None,
+            "assets": [asset.to_dict() for asset in sorted(
+                self.assets.values(), key=lambda a: (not a.critical, a.wave, -a.raw))],
+            "missing": sorted(self.missing),
+            "precache": self.precache,
+            "entrypoints": self.entrypoints,
+            "first_visit": first,
+            "repeat_visit": repeat,
+            "estimates": estimates,
+            "duplicates": self.duplicates(),
+            "unused": self.unused(reachable),
+        }
+
+
+def estimate(path, bandwidth_kbps, rtt):
+    """Seconds until the critical path is loaded - round trips plus bytes,
+    no TCP slow start, no parse/execute time"""
+    return (SETUP_ROUND_TRIPS + path["round_trips"]) * rtt + path["transfer"] * 8 / (bandwidth_kbps * 1000)
+
+
+# --- rozpočty a výstup -----------------------------------------------------
+
+def parse_budgets(specs):
+    budgets = dict(DEFAULT_BUDGETS)
+    for spec in specs or []:
+        name, _, value = spec.partition("=")
+        if name not in budgets or not value:
+            raise ValueError(f"Bad budget '{spec}' (known: {', '.join(budgets)})")
+        budgets[name] = parse_duration(value) if name == "usable_s" else float(value)
+    return budgets
+
+
+def check_budgets(report, budgets, profile):
+    first, repeat = report["first_visit"], report["repeat_visit"]
+    measured = {
+        "first_kb": first["transfer"] / 1024,
+        "repeat_kb": repeat["transfer"] / 1024,
+        "repeat_rtt": repeat["round_trips"],
+        "js_kb": first["by_kind"].get("script", 0) / 1024,
+        "css_kb": first["by_kind"].get("style", 0) / 1024,
+        "usable_s": report["estimates"][profile]["first"],
+    }
+    return [{"budget": name, "limit": limit, "value": measured[name], "ok": measured[name] <= limit}
+            for name, limit in budgets.items()]
+
+
+def _kb(value):
+    return f"{value / 1024:.1f}" if value is not None else "-"
+
+
+def print_audit(report, checks, profile, log=print):
+    log(f"📦 PWA audit of {report['source']}")
+    if not report["brotli"]:
+        log("   ℹ️  brotli module not installed - br column empty (pip install brotli)")
+    log(f"\n   {'':2s}{'path':44s} {'raw kB':>8s} {'gzip':>7s} {'br':>7s} {'wire':>7s}  "
+        f"{'repeat':10s} cache-control")
+    outcomes = report["repeat_visit"]["outcomes"]
+    for asset in report["assets"]:
+        if asset["status"] != 200:
+            continue
+        mark = "⚡" if asset["critical"] else "  "
+        log(f"   {mark}{asset['path'][:44]:44s} {_kb(asset['raw']):>8s} {_kb(asset['gzip']):>7s} "
+            f"{_kb(asset['brotli']):>7s} {_kb(asset['transfer']):>7s}  "
+            f"{outcomes.get(asset['path'], ''):10s} {asset['cache_control'] or '-'}")
+    for path in report["missing"]:
+        log(f"   ❌ {path} referenced but missing")
+
+    first, repeat = report["first_visit"], report["repeat_visit"]
+    log(f"\n⚡ Critical path ({first['assets']} files, ⚡ above):")
+    log(f"   first visit  {_kb(first['transfer'])} kB in {first['round_trips']} round trip(s) "
+        f"after connection setup")
+    log(f"   repeat visit {_kb(repeat['transfer'])} kB in {repeat['round_trips']} round trip(s)")
+    for name, values in report["estimates"].items():
+        log(f"   {name:8s} usable after ~{values['first']:.1f}s first / ~{values['repeat']:.1f}s repeat"
+            + ("  ← budget profile" if name == profile else ""))
+
+    duplicates = report["duplicates"]
+    if duplicates["identical"] or duplicates["versions"] or duplicates["packages"]:
+        log("\n👯 Duplicates:")
+        for paths in duplicates["identical"]:
+            log(f"   same content: {', '.join(paths)}")
+        for paths in duplicates["versions"]:
+            log(f"   several builds of one bundle: {', '.join(paths)}")
+        for package, paths in sorted(duplicates["packages"].items()):
+            log(f"   {package} bundled in {len(paths)} chunks: {', '.join(paths)}")
+    if report["unused"]:
+        log("\n🗑️  Bundles nothing loads:")
+        for item in report["unused"]:
+            log(f"   {item['path']} ({_kb(item['raw'])} kB)")
+
+    log("\n🎯 Budgets:")
+    for check in checks:
+        unit = {"repeat_rtt": "", "usable_s": "s"}.get(check["budget"], " kB")
+        log(f"   {'✅' if check['ok'] else '❌'} {check['budget']:10s} {check['value']:.1f}{unit} "
+            f"(limit {check['limit']:g}{unit})")
+    for line in recommendations(report):
+        log(line)
+
+
+def recommendations(report):
+    outcomes = report["repeat_visit"]["outcomes"]
+    assets = {asset["path"]: asset for asset in report["assets"]}
+    lines = []
+    revalidated = [path for path, outcome in outcomes.items() if outcome == "revalidate"]
+    if revalidated:
+        shared_only = [path for path in revalidated
+                       if "s-maxage" in parse_cache_control(assets[path]["cache_control"])
+                       and "max-age" not in parse_cache_control(assets[path]["cache_control"])]
+        lines.append(f"💡 {len(revalidated)} critical file(s) are revalidated on every visit"
+                     + (" - s-maxage only applies to the CDN, browsers need max-age; hashed "
+                        "/static/ files can use 'public, max-age=31536000, immutable'"
+                        if shared_only else ""))
+    if not any(outcome == "sw-cache" for outcome in outcomes.values()) and len(outcomes) > 1:
+        lines.append("💡 The service worker precaches none of the critical bundles - add the "
+                     "asset-manifest.json entrypoints to urlsToCache so a repeat visit needs only "
+                     "the HTML")
+    uncompressed = [asset["path"] for asset in report["assets"]
+                    if asset["served_encoding"] == "identity" and asset["raw"] > 1024]
+    if uncompressed:
+        lines.append(f"💡 {len(uncompressed)} text file(s) were served without gzip/brotli "
+                     f"(e.g. {uncompressed[0]}) - the wire column is what the phone downloads")
+    if report["unused"]:
+        lines.append("💡 Unreferenced bundles are left over from older builds or dead code - "
+                     "clean build/ before deploying")
+    if report["duplicates"]["packages"]:
+        lines.append("💡 Packages bundled into several chunks - check lazy imports share one "
+                     "vendor chunk")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start page weight and caching audit "
+                                                 "of the built PWA")
+    parser.add_argument("target", nargs="?", default="build",
+                        help="build directory or base URL of a locally served build")
+    parser.add_argument("--vercel-config", help="vercel.json with header rules (directory mode)")
+    parser.add_argument("--service-worker", default="/service-worker.js")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="slow-4g",
+                        help="connection used for the usable_s budget")
+    parser.add_argument("--budget", action="append", metavar="NAME=VALUE",
+                        help=f"override a budget ({', '.join(DEFAULT_BUDGETS)})")
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        budgets = parse_budgets(args.budget)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.target.startswith(("http://", "https://")):
+        source = HttpSource(args.target)
+    elif os.path.isdir(args.target):
+        source = DirectorySource(args.target, args.vercel_config)
+    else:
+        print(f"❌ {args.target} is neither a URL nor a directory - run `npm run build` first")
+        return 1
+
+    report = asyncio.run(PwaAudit(source, args.service_worker).run())
+    if not any(asset["path"] == "/" and asset["status"] == 200 for asset in report["assets"]):
+        print(f"❌ No index.html at {report['source']}")
+        return 1
+    checks = check_budgets(report, budgets, args.profile)
+    report["budgets"] = checks
+    print_audit(report, checks, args.profile)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Saved {args.output}")
+    return 0 if all(check["ok"] for check in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
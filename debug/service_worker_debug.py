@@ -2,9 +2,14 @@
 """
 Service Worker debugging script
 Analyzuje proč Service Worker generuje tisíce "Failed to fetch" chyb
+
+    python debug/service_worker_debug.py
+    python debug/service_worker_debug.py --audit build   # váha a cachování buildu
 """
 
+import argparse
 import requests
+import sys
 import time
 import json
 from urllib.parse import urlparse
@@ -127,11 +132,26 @@ def recommendations():
    - Přidaj SW error reporting
    - Monitor fetch failure rates
    - Alert při abnormal retry patterns
+
+🔧 5. PŘED NASAZENÍM:
+   - Ověř backoff/circuit breaker nastavení simulací retry bouře:
+     python debug/sw_retry_sim.py --page viewer --scenario healthy:20,error:60,healthy:30
 """)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service Worker debug analysis")
+    parser.add_argument("--audit", metavar="BUILD_OR_URL",
+                        help="cold-start page weight and caching audit of the built app "
+                             "instead (debug/pwa_audit.py, extra options passed through)")
+    args, extra = parser.parse_known_args(argv)
+    if args.audit:
+        from pwa_audit import main as audit_main
+        return audit_main([args.audit] + extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
     analyze_service_worker_issue()
     recommendations()
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Sledování MQTT session podle $SYS událostí brokeru - hledání leaků
+Z řádků `$SYS/broker/log/#` ("New client connected from ... as ID (...)",
+"Client ID disconnected.") drží v paměti index client ID, časy připojení
+a odpojení, rodiny podle prefixu (proxy-xxxxxx z api/mqtt-proxy.js,
+dev-proxy-, debug-multi-, gate-control-, ...) a délky session.
+
+Hlásí:
+    storm   jedno client ID nebo celá rodina se připojuje dokola
+    orphan  session, kterou už nahradila novější z téže rodiny (víc než
+            povolený limit naráz), nebo dlouho visící ladicí klient
+    growth  počet různých ID v rodině za okno roste - typicky cold starty
+            serverless proxy, z nichž každý otevře nové spojení
+
+Mosquitto posílá logy na $SYS/broker/log/# jen s `log_dest topic`.
+Stand-in broker (debug/sim_harness.py) je posílá vždy.
+
+    python debug/session_tracker.py --broker 89.24.76.191:9001 --interval 60
+    python debug/session_tracker.py --from-recording recordings/
+"""
+
+import argparse
+import asyncio
+import collections
+import re
+import sys
+import threading
+import time
+
+from bench_stats import format_summary, summarize
+
+LOG_FILTER = "$SYS/broker/log/#"
+COUNT_TOPIC = "$SYS/broker/clients/connected"
+
+# Kolik současných session z jedné rodiny je v pořádku
+DEFAULT_LIMITS = {"proxy": 1, "dev-proxy": 1, "mqtt-monitor-listener": 1}
+
+# Krátkodobí ladicí klienti - po hodině připojení už jsou to sirotci
+TRANSIENT_PREFIXES = ("debug-", "replay-", "gate-bench")
+
+_TIMESTAMP = re.compile(r"^\d+(?:\.\d+)?:\s*")
+_CONNECT = re.compile(r"^New client connected from (\S+) as (\S+) \(([^)]*)\)\.?$")
+_DISCONNECT = re.compile(r"^Client (\S+?)(?: \[[^\]]*\])? (disconnected|closed its connection"
+                         r"|has exceeded timeout|already connected)")
+_SOCKET_ERROR = re.compile(r"^Socket error on client (\S+?), disconnecting")
+# Čísla (čítač, timestamp) nebo hex sufix z Math.random() - aspoň 6 znaků
+# a jedna číslice, ať slova jako "dead" nebo "cafe" zůstanou součástí jména
+_RANDOM_PART = re.compile(r"^(?:\d+|(?=[0-9a-f]*\d)[0-9a-f]{6,})$")
+
+_REASONS = {"disconnected": "disconnected", "closed its connection": "closed",
+            "has exceeded timeout": "timeout", "already connected": "taken over"}
+
+
+def parse_log_line(line):
+    """Mosquitto log line -> ("connect", id, peer, keepalive) /
+    ("disconnect", id, reason) / None for lines that are not session events"""
+    line = _TIMESTAMP.sub("", line.strip())
+    match = _CONNECT.match(line)
+    if match:
+        keepalive = None
+        for flag in match.group(3).split(","):
+            flag = flag.strip()
+            if flag[:1] == "k" and flag[1:].isdigit():
+                keepalive = int(flag[1:])
+        return ("connect", match.group(2), match.group(1), keepalive)
+    match = _DISCONNECT.match(line)
+    if match:
+        return ("disconnect", match.group(1), _REASONS[match.group(2)])
+    match = _SOCKET_ERROR.match(line)
+    if match:
+        return ("disconnect", match.group(1), "socket error")
+    return None
+
+
+def client_family(client_id):
+    """'proxy-3fa9c1' -> 'proxy', 'debug-multi-7-1700000000' -> 'debug-multi'
+
+    Trailing dash-separated parts that look random (numbers, or hex of at
+    least 6 characters with a digit) are dropped; IDs without such parts
+    are their own family.
+    """
+    parts = client_id.split("-")
+    while len(parts) > 1 and _RANDOM_PART.match(parts[-1]):
+        parts.pop()
+    return "-".join(parts)
+
+
+def parse_limits(specs):
+    """['proxy=2', 'gate-control=3'] -> DEFAULT_LIMITS updated"""
+    limits = dict(DEFAULT_LIMITS)
+    for spec in specs or []:
+        family, _, value = spec.partition("=")
+        limits[family] = int(value)
+    return limits
+
+
+class _Session:
+    __slots__ = ("client_id", "family", "peer", "keepalive", "connected_at", "disconnected_at",
+                 "reason")
+
+    def __init__(self, client_id, family, peer, keepalive, connected_at):
+        self.client_id = client_id
+        self.family = family
+        self.peer = peer
+        self.keepalive = keepalive
+        self.connected_at = connected_at
+        self.disconnected_at = None
+        self.reason = None
+
+
+class _Family:
+    __slots__ = ("connects", "disconnects", "connect_times", "lifetimes", "reasons")
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        # (čas, client ID) připojení za poslední 2 okna
+        self.connect_times = collections.deque()
+        self.lifetimes = collections.deque(maxlen=1000)
+        self.reasons = collections.Counter()
+
+
+class SessionTracker:
+    """In-memory index of broker client sessions fed from $SYS messages.
+
+    observe() can be called from the paho network thread for every
+    message: non-$SYS topics return immediately and session events cost
+    one regex match. Memory stays bounded - closed sessions and connect
+    history older than two windows are pruned.
+    """
+
+    def __init__(self, window=300.0, storm_window=60.0, storm_connects=5, family_storm=20,
+                 growth_threshold=10, orphan_age=3600.0, limits=None, clock=time.time):
+        self.window = window
+        self.storm_window = storm_window
+        self.storm_connects = storm_connects
+        self.family_storm = family_storm
+        self.growth_threshold = growth_threshold
+        self.orphan_age = orphan_age
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.clock = clock
+        self.started = clock()
+        self.sessions = {}
+        self.closed = collections.deque()
+        self.families = {}
+        self.id_connects = {}
+        self.broker_connected = None
+        self.events = 0
+        self._lock = threading.Lock()
+
+    def observe(self, topic, payload, now=None):
+        """Feed one MQTT message; returns the parsed session event or None"""
+        if not topic.startswith("$SYS/broker/"):
+            return None
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", errors="replace")
+        if topic == COUNT_TOPIC:
+            try:
+                self.broker_connected = int(payload)
+            except ValueError:
+                pass
+            return None
+        if not topic.startswith("$SYS/broker/log/"):
+            return None
+        event = parse_log_line(payload)
+        if event is None:
+            return None
+        if event[0] == "connect":
+            self.connected(event[1], event[2], event[3], now)
+        else:
+            self.disconnected(event[1], event[2], now)
+        return event
+
+    def _family(self, name):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = _Family()
+        return family
+
+    def connected(self, client_id, peer=None, keepalive=None, now=None):
+        now = self.clock() if now is None else now
+        name = client_family(client_id)
+        with self._lock:
+            self.events += 1
+            previous = self.sessions.get(client_id)
+            if previous is not None:
+                # Stejné ID bez odpojení - broker starou session převzal
+                self._close(previous, "taken over", now)
+            self.sessions[client_id] = _Session(client_id, name, peer, keepalive, now)
+            family = self._family(name)
+            family.connects += 1
+            family.connect_times.append((now, client_id))
+            self.id_connects.setdefault(client_id, collections.deque()).append(now)
+
+    def disconnected(self, client_id, reason="disconnected", now=None):
+        now = self.clock() if now is None else now
+        with self._lock:
+            self.events += 1
+            session = self.sessions.get(client_id)
+            if session is not None:
+                self._close(session, reason, now)
+
+    def _close(self, session, reason, now):
+        del self.sessions[session.client_id]
+        session.disconnected_at = now
+        session.reason = reason
+        family = self._family(session.family)
+        family.disconnects += 1
+        family.lifetimes.append(now - session.connected_at)
+        family.reasons[reason] += 1
+        self.closed.append(session)
+
+    def prune(self, now=None):
+        """Drop history older than two windows"""
+        now = self.clock() if now is None else now
+        horizon = now - 2 * max(self.window, self.storm_window)
+        with self._lock:
+            while self.closed and self.closed[0].disconnected_at < horizon:
+                self.closed.popleft()
+            for family in self.families.values():
+                while family.connect_times and family.connect_times[0][0] < horizon:
+                    family.connect_times.popleft()
+            for client_id in list(self.id_connects):
+                times = self.id_connects[client_id]
+                while times and times[0] < now - self.storm_window:
+                    times.popleft()
+                if not times:
+                    del self.id_connects[client_id]
+
+    def findings(self, now=None):
+        """Storms, orphans and distinct-ID growth as a list of dicts"""
+        now = self.clock() if now is None else now
+        self.prune(now)
+        findings = []
+        with self._lock:
+            for client_id, times in self.id_connects.items():
+                if len(times) >= self.storm_connects:
+                    findings.append({"kind": "storm", "family": client_family(client_id),
+                                     "client_id": client_id,
+                                     "detail": f"{len(times)} connects in {self.storm_window:g}s"})
+            open_by_family = {}
+            for session in self.sessions.values():
+                open_by_family.setdefault(session.family, []).append(session)
+            for name, family in sorted(self.families.items()):
+                recent = [client_id for t, client_id in family.connect_times
+                          if t >= now - self.storm_window]
+                if len(recent) >= self.family_storm:
+                    findings.append({"kind": "storm", "family": name, "client_id": None,
+                                     "detail": f"{len(recent)} connects from "
+                                               f"{len(set(recent))} IDs in {self.storm_window:g}s"})
+                current = {client_id for t, client_id in family.connect_times if t >= now - self.window}
+                previous = {client_id for t, client_id in family.connect_times
+                            if now - 2 * self.window <= t < now - self.window}
+                if len(current) >= self.growth_threshold and len(current) > len(previous):
+                    findings.append({"kind": "growth", "family": name, "client_id": None,
+                                     "detail": f"{len(current)} distinct IDs in {self.window:g}s "
+                                               f"(previous window {len(previous)})"})
+            for name, sessions in sorted(open_by_family.items()):
+                sessions.sort(key=lambda s: s.connected_at)
+                limit = self.limits.get(name)
+                superseded = sessions[:-limit] if limit and len(sessions) > limit else []
+                for index, session in enumerate(superseded):
+                    findings.append({"kind": "orphan", "family": name, "client_id": session.client_id,
+                                     "detail": f"open {now - session.connected_at:.0f}s, "
+                                               f"{len(sessions) - 1 - index} newer {name} sessions "
+                                               f"(limit {limit})"})
+                if name.startswith(TRANSIENT_PREFIXES):
+                    for session in sessions:
+                        if session not in superseded and now - session.connected_at > self.orphan_age:
+                            findings.append({"kind": "orphan", "family": name,
+                                             "client_id": session.client_id,
+                                             "detail": f"debug client open "
+                                                       f"{now - session.connected_at:.0f}s"})
+        return findings
+
+    def report(self, now=None):
+        now = self.clock() if now is None else now
+        findings = self.findings(now)
+        with self._lock:
+            families = {}
+            for name, family in sorted(self.families.items()):
+                families[name] = {
+                    "open": sum(1 for s in self.sessions.values() if s.family == name),
+                    "connects": family.connects,
+                    "disconnects": family.disconnects,
+                    "distinct_window": len({client_id for t, client_id in family.connect_times
+                                            if t >= now - self.window}),
+                    "lifetime": summarize(family.lifetimes),
+                    "reasons": dict(family.reasons),
+                }
+            tracked = len(self.sessions)
+        return {
+            "observed_for": now - self.started,
+            "events": self.events,
+            "open": tracked,
+            "broker_connected": self.broker_connected,
+            # Session připojené před startem trackeru v logu nejsou
+            "untracked": (self.broker_connected - tracked
+                          if self.broker_connected is not None else None),
+            "families": families,
+            "findings": findings,
+        }
+
+    def prometheus_lines(self, now=None):
+        """Extra /metrics lines (see topic_stats.MetricsServer)"""
+        report = self.report(now)
+        yield "# TYPE brana_mqtt_sessions_open gauge"
+        for name, family in report["families"].items():
+            yield f'brana_mqtt_sessions_open{{family="{name}"}} {family["open"]}'
+        yield "# TYPE brana_mqtt_session_connects_total counter"
+        for name, family in report["families"].items():
+            yield f'brana_mqtt_session_connects_total{{family="{name}"}} {family["connects"]}'
+        yield "# TYPE brana_mqtt_session_findings gauge"
+        counts = collections.Counter(finding["kind"] for finding in report["findings"])
+        for kind in ("storm", "orphan", "growth"):
+            yield f'brana_mqtt_session_findings{{kind="{kind}"}} {counts[kind]}'
+
+
+_ICONS = {"storm": "🌪️ ", "orphan": "👻", "growth": "📈"}
+
+
+def format_finding(finding):
+    subject = finding["client_id"] or f"{finding['family']}-*"
+    return f"{_ICONS[finding['kind']]} {finding['kind']} {subject}: {finding['detail']}"
+
+
+def print_session_report(report, log=print):
+    broker = report["broker_connected"]
+    broker_text = f", broker reports {broker} ({report['untracked']} untracked)" if broker is not None else ""
+    log(f"👥 {report['open']} tracked sessions{broker_text}, "
+        f"{report['events']} events in {report['observed_for']:.0f}s")
+    for name, family in report["families"].items():
+        reasons = ", ".join(f"{k}={v}" for k, v in sorted(family["reasons"].items()))
+        log(f"  {name:<24} open {family['open']:>3}  connects {family['connects']:>5}  "
+            f"distinct/window {family['distinct_window']:>4}  {reasons}")
+        if family["lifetime"]["count"]:
+            log(f"  {'':<24} lifetime {format_summary(family['lifetime'])}")
+    for finding in report["findings"]:
+        log(f"  {format_finding(finding)}")
+    if not report["findings"]:
+        log("  ✅ No storms, orphans or ID growth")
+
+
+def analyze_recording(directory, tracker, since_ns=None, until_ns=None):
+    """Replay $SYS messages from a traffic_recorder.py log into the tracker"""
+    from traffic_recorder import read_messages
+    last = None
+    for message in read_messages(directory, "$SYS/broker/#", since_ns, until_ns):
+        if last is None:
+            tracker.started = message.received_ns / 1e9
+        last = message.received_ns / 1e9
+        tracker.observe(message.topic, message.payload, now=last)
+    return last
+
+
+async def run_live(tracker, host, port, transport, interval):
+    from mqtt_wire import AsyncMqttClient
+    client = AsyncMqttClient(f"session-tracker-{int(time.time())}",
+                             on_message=lambda topic, payload, qos, retain:
+                             tracker.observe(topic, payload))
+    return_code = await client.connect(host, port, transport)
+    if return_code != 0:
+        print(f"❌ CONNACK rc={return_code}")
+        return 1
+    await client.subscribe([(LOG_FILTER, 0), (COUNT_TOPIC, 0)])
+    print(f"👀 Tracking sessions on {host}:{port} (report every {interval:g}s)")
+    reported = set()
+    try:
+        while client.connected:
+            await asyncio.sleep(interval)
+            report = tracker.report()
+            print_session_report(report)
+            for finding in report["findings"]:
+                key = (finding["kind"], finding["family"], finding["client_id"])
+                if key not in reported:
+                    reported.add(key)
+                    print(f"🚨 NEW {format_finding(finding)}")
+        print(f"🔌 Disconnected ({client.disconnect_reason})")
+        return 1
+    finally:
+        client.abort()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Track MQTT client sessions from $SYS events")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--from-recording", metavar="DIR",
+                        help="analyze $SYS messages recorded by the monitor (--record) instead")
+    parser.add_argument("--since", help="recording start (ISO time or seconds ago)")
+    parser.add_argument("--until", help="recording end (ISO time or seconds ago)")
+    parser.add_argument("--interval", type=float, default=60.0, help="live report period [s]")
+    parser.add_argument("--window", type=float, default=300.0,
+                        help="distinct-ID growth window [s]")
+    parser.add_argument("--storm-window", type=float, default=60.0)
+    parser.add_argument("--storm-connects", type=int, default=5,
+                        help="connects of one client ID within the storm window")
+    parser.add_argument("--family-storm", type=int, default=20,
+                        help="connects of one family within the storm window")
+    parser.add_argument("--growth", type=int, default=10,
+                        help="distinct IDs per family and window worth flagging")
+    parser.add_argument("--orphan-age", type=float, default=3600.0,
+                        help="debug clients open longer than this are orphans [s]")
+    parser.add_argument("--limit", action="append", metavar="FAMILY=N",
+                        help="allowed concurrent sessions per family (repeatable)")
+    args = parser.parse_args(argv)
+
+    tracker_args = dict(window=args.window, storm_window=args.storm_window,
+                        storm_connects=args.storm_connects, family_storm=args.family_storm,
+                        growth_threshold=args.growth, orphan_age=args.orphan_age,
+                        limits=parse_limits(args.limit))
+    if args.from_recording:
+        from traffic_recorder import parse_time
+        tracker = SessionTracker(**tracker_args)
+        last = analyze_recording(args.from_recording, tracker,
+                                 parse_time(args.since) if args.since else None,
+                                 parse_time(args.until) if args.until else None)
+        if last is None:
+            print(f"No $SYS messages in {args.from_recording} (record with $SYS subscribed)")
+            return 1
+        report = tracker.report(last)
+        print_session_report(report)
+        return 1 if report["findings"] else 0
+
+    host, _, port = args.broker.partition(":")
+    tracker = SessionTracker(**tracker_args)
+    try:
+        return asyncio.run(run_live(tracker, host, int(port or 9001), args.transport, args.interval))
+    except KeyboardInterrupt:
+        print_session_report(tracker.report())
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Shardovaný příjem zpráv pro mqtt-realtime-monitor.py (--shards N)
+
+Jeden paho klient na jednom vlákně na vytíženém brokeru nestíhá přijímat,
+dekódovat a formátovat všechno. Tady zprávy přijímá N worker procesů:
+
+  shared   každý worker odebírá $share/<skupina>/# a broker (mosquitto 1.6+)
+           mezi ně zprávy rozděluje. Na sdílené odběry se neposílají
+           retained zprávy, proto v úvodním snímku proti single režimu chybí.
+  filters  workery dostanou disjunktní sady filtrů (--shard-filter IoT/#
+           --shard-filter Log/# ...) po kruhu; filtry se nesmí překrývat,
+           jinak by se zprávy vypsaly dvakrát.
+
+Worker zprávu orazítkuje časem příjmu, naformátuje řádek stejně jako
+single režim a lokálně sčítá dobu callbacků. Po dávkách (--shard-batch)
+posílá koordinátorovi události s vodoznakem - časem, do kterého už nic
+dalšího nepošle. Koordinátor dávky slévá podle času příjmu a událost
+uvolní, až ji předběhnou vodoznaky všech workerů. Výstup je tak seřazený
+jako z jednoho procesu, jen zpožděný zhruba o jednu dávku.
+
+Škálování s počtem jader:
+    python debug/sharded_monitor.py --sim --rate 20000 --shards 1,2,4 --duration 10
+"""
+
+import argparse
+import heapq
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from bench_stats import Histogram, format_summary
+from mqtt_wire import SHARE_PREFIX, filters_overlap, topic_matches
+
+MODES = ("shared", "filters")
+
+# Druhy událostí od workerů
+MESSAGE, LOG, CANARY = 0, 1, 2
+
+# Statistiky callbacků posílá worker nejvýš jednou za tolik sekund
+STATS_INTERVAL = 1.0
+
+
+def format_log(timestamp, level, message):
+    stamp = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+    return f"[{stamp}] {level}: {message}"
+
+
+def format_message(timestamp, topic, payload):
+    """Plain line for the benchmark - the monitor passes its own formatter"""
+    return format_log(timestamp, "INFO", f"📨 MQTT: {topic} = {payload.decode('utf-8', errors='ignore')}")
+
+
+def preformatted(timestamp, line):
+    """OutputQueue formatter for lines a worker already formatted"""
+    return line
+
+
+def shard_subscriptions(shards, mode="shared", filters=None, group="brana-monitor",
+                        sys_filters=(), canary_topic=None):
+    """[(filter, qos)] per shard - $SYS and the canary go to shard 0 only"""
+    filters = list(filters or ["#"])
+    if mode == "shared":
+        plan = [[(f"{SHARE_PREFIX}{group}/{topic_filter}", 1) for topic_filter in filters]
+                for _ in range(shards)]
+    elif mode == "filters":
+        if len(filters) < shards:
+            raise ValueError(f"{shards} shards need at least {shards} --shard-filter values")
+        for index, first in enumerate(filters):
+            for second in filters[index + 1:]:
+                if filters_overlap(first, second):
+                    raise ValueError(f"Filters {first} and {second} overlap - messages would "
+                                     "be printed twice")
+        plan = [[(topic_filter, 1) for topic_filter in filters[index::shards]]
+                for index in range(shards)]
+    else:
+        raise ValueError(f"Unknown shard mode {mode!r} (use {', '.join(MODES)})")
+    plan[0] += [(topic_filter, 1) for topic_filter in sys_filters]
+    if canary_topic and not any(topic_matches(topic_filter, canary_topic) for topic_filter in filters):
+        plan[0].append((canary_topic, 1))
+    return plan
+
+
+def shard_worker(index, host, port, subscriptions, formatter, log_formatter, canary_topic,
+                 payloads, batch_interval, events, stop):
+    """Worker process: paho client -> timestamped, formatted events in batches"""
+    import paho.mqtt.client as mqtt
+
+    # Ctrl+C patří koordinátorovi, worker skončí přes `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    lock = threading.Lock()
+    batch = []
+    counters = {"messages": 0, "callbacks": 0, "callback_time": 0.0, "callback_max": 0.0}
+    canary_callback = Histogram(low=1e-6, high=10.0) if canary_topic else None
+
+    def log(message, level="INFO"):
+        with lock:
+            received = time.time()
+            batch.append((received, LOG, None, 0, False, 0,
+                          log_formatter(received, level, message), None, None))
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            log(f"✅ Shard {index} connected to MQTT broker ({len(subscriptions)} filters)")
+            client.subscribe(subscriptions)
+        else:
+            log(f"❌ Shard {index} connection failed (rc={rc})")
+
+    def on_message(client, userdata, msg):
+        started = time.perf_counter()
+        with lock:
+            received = time.time()
+            if msg.topic == canary_topic:
+                # Kanárky se jen měří, do statistik callbacků nepatří (jako single režim)
+                batch.append((received, CANARY, msg.topic, 0, False, 0, None, msg.payload,
+                              time.time_ns()))
+                return
+            payload = msg.payload if payloads or msg.topic.startswith("$SYS/broker/") else None
+            batch.append((received, MESSAGE, msg.topic, len(msg.payload), msg.retain, msg.qos,
+                          formatter(received, msg.topic, msg.payload), payload, None))
+            counters["messages"] += 1
+        duration = time.perf_counter() - started
+        counters["callbacks"] += 1
+        counters["callback_time"] += duration
+        if duration > counters["callback_max"]:
+            counters["callback_max"] = duration
+        if canary_callback is not None:
+            canary_callback.add(duration)
+
+    def on_disconnect(client, userdata, rc):
+        log(f"🔌 Shard {index} disconnected (rc={rc})")
+
+    def flush(final=False):
+        with lock:
+            watermark = time.time()
+            items = batch[:]
+            del batch[:]
+            stats = dict(counters)
+        if final or time.monotonic() - flush.last_stats >= STATS_INTERVAL:
+            stats["canary_callback"] = canary_callback
+            flush.last_stats = time.monotonic()
+        events.put(("batch", index, watermark, items, stats))
+
+    flush.last_stats = 0.0
+    client = mqtt.Client(f"mqtt-monitor-listener-{index}")
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.on_disconnect = on_disconnect
+    try:
+        client.connect(host, port, 60)
+        client.loop_start()
+        while not stop.wait(batch_interval):
+            flush()
+        client.disconnect()
+        client.loop_stop()
+    except Exception as e:
+        log(f"❌ Shard {index} exception: {e}")
+    finally:
+        flush(final=True)
+        events.put(("done", index, None, None, None))
+
+
+class ShardedListener:
+    """Runs the shard workers and merges their events back in receive order.
+
+    on_event(event) gets (received, kind, topic, size, retain, qos, line,
+    payload, received_ns) tuples in receive-time order, on_stats(count,
+    total, maximum, canary_callback) the callback time spent in the workers
+    since the last call plus the merged canary callback histogram.
+    """
+
+    def __init__(self, host, port, shards=2, mode="shared", filters=None, group="brana-monitor",
+                 sys_filters=(), formatter=format_message, log_formatter=format_log,
+                 canary_topic=None, payloads=False, batch_interval=0.05, on_event=None,
+                 on_stats=None):
+        self.host = host
+        self.port = port
+        self.shards = shards
+        self.mode = mode
+        self.subscriptions = shard_subscriptions(shards, mode, filters, group, sys_filters,
+                                                 canary_topic)
+        self.formatter = formatter
+        self.log_formatter = log_formatter
+        self.canary_topic = canary_topic
+        self.payloads = payloads
+        self.batch_interval = batch_interval
+        self.on_event = on_event or (lambda event: None)
+        self.on_stats = on_stats or (lambda count, total, maximum, canary_callback: None)
+        self.released = 0
+        self.out_of_order = 0
+        self.max_pending = 0
+        self.merge_delay = Histogram()
+        self.shard_stats = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._stop = self._context.Event()
+        self._processes = []
+        self._heap = []
+        self._watermarks = {}
+        self._sequence = 0
+        self._last_released = 0.0
+        self._canary_callbacks = {}
+
+    def start(self):
+        for index, subscriptions in enumerate(self.subscriptions):
+            process = self._context.Process(
+                target=shard_worker, name=f"mqtt-shard-{index}", daemon=True,
+                args=(index, self.host, self.port, subscriptions, self.formatter,
+                      self.log_formatter, self.canary_topic, self.payloads, self.batch_interval,
+                      self._events, self._stop))
+            process.start()
+            self._processes.append(process)
+            self._watermarks[index] = 0.0
+        return self
+
+    def _release(self):
+        watermark = min(self._watermarks.values(), default=float("inf"))
+        now = time.time()
+        while self._heap and self._heap[0][0] <= watermark:
+            received, _, _, event = heapq.heappop(self._heap)
+            if received < self._last_released:
+                self.out_of_order += 1
+            self._last_released = received
+            self.released += 1
+            self.merge_delay.add(max(0.0, now - received))
+            self.on_event(event)
+
+    def _accept(self, kind, index, watermark, items, stats):
+        if kind == "done":
+            self._watermarks.pop(index, None)
+            self._release()
+            return
+        for event in items:
+            self._sequence += 1
+            heapq.heappush(self._heap, (event[0], index, self._sequence, event))
+        self.max_pending = max(self.max_pending, len(self._heap))
+        self._watermarks[index] = watermark
+        previous = self.shard_stats.get(index, {"callbacks": 0, "callback_time": 0.0})
+        self.shard_stats[index] = stats
+        canary_callback = stats.pop("canary_callback", None)
+        if canary_callback is not None:
+            self._canary_callbacks[index] = canary_callback
+        merged = None
+        if self._canary_callbacks:
+            merged = Histogram(low=1e-6, high=10.0)
+            for histogram in self._canary_callbacks.values():
+                merged.merge(histogram)
+        self.on_stats(stats["callbacks"] - previous["callbacks"],
+                      stats["callback_time"] - previous["callback_time"],
+                      stats["callback_max"], merged)
+        self._release()
+
+    def run(self):
+        """Merge until every worker is done (blocks, Ctrl+C propagates)"""
+        while self._watermarks:
+            try:
+                self._accept(*self._events.get(timeout=0.2))
+            except queue.Empty:
+                if not any(process.is_alive() for process in self._processes):
+                    break
+
+    def stop(self, timeout=5.0):
+        """Stop the workers and deliver what they still had"""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        while self._watermarks and time.monotonic() < deadline:
+            try:
+                self._accept(*self._events.get(timeout=0.2))
+            except queue.Empty:
+                if not any(process.is_alive() for process in self._processes):
+                    break
+        self._watermarks.clear()
+        self._release()
+        for process in self._processes:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+
+    def report(self):
+        return {
+            "shards": self.shards,
+            "mode": self.mode,
+            "released": self.released,
+            "out_of_order": self.out_of_order,
+            "max_pending": self.max_pending,
+            "merge_delay": self.merge_delay.summary(),
+            "per_shard": {index: stats["messages"] for index, stats in sorted(self.shard_stats.items())},
+        }
+
+
+def print_shard_report(report, log=print):
+    shares = ", ".join(f"#{index} {count}" for index, count in report["per_shard"].items())
+    log(f"🧩 {report['shards']} {report['mode']} shards: {report['released']} events merged "
+        f"({shares}), {report['out_of_order']} out of order, max {report['max_pending']} pending")
+    log(f"   merge delay {format_summary(report['merge_delay'], 'ms', 1000)}")
+
+
+def bench(host, port, shards, mode, filters, duration, batch_interval):
+    """Messages/s one shard configuration delivers to the coordinator"""
+    received = []
+    listener = ShardedListener(host, port, shards, mode, filters, batch_interval=batch_interval,
+                               on_event=lambda event: received.append(event[0])
+                               if event[1] == MESSAGE else None).start()
+    stopper = threading.Timer(duration + 2.0, listener._stop.set)
+    stopper.start()
+    try:
+        listener.run()
+    finally:
+        stopper.cancel()
+        listener.stop()
+    report = listener.report()
+    # Úvodní 2 s na připojení workerů se nepočítají
+    steady = [at for at in received if at >= received[0] + 2.0] if received else []
+    span = (steady[-1] - steady[0]) if len(steady) > 1 else 0.0
+    report["rate"] = (len(steady) - 1) / span if span > 0 else 0.0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded MQTT receive throughput per worker count")
+    parser.add_argument("--broker", default="127.0.0.1:1883", help="host:port (tcp)")
+    parser.add_argument("--sim", action="store_true",
+                        help="stand-in broker with a fake gate publishing --rate msgs/s "
+                             "(debug/sim_harness.py)")
+    parser.add_argument("--rate", type=float, default=5000.0, help="fake gate messages/s (--sim)")
+    parser.add_argument("--shards", default="1,2,4", help="worker counts to compare")
+    parser.add_argument("--mode", choices=MODES, default="shared")
+    parser.add_argument("--shard-filter", action="append", metavar="FILTER",
+                        help="topic filter (repeatable), split between shards in filters mode")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--batch", type=float, default=0.05, help="worker batch interval [s]")
+    args = parser.parse_args(argv)
+
+    harness = None
+    if args.sim:
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(camera=False, log=print,
+                                    gate_options={"status_rate": args.rate / 2,
+                                                  "log_rate": args.rate / 2}).start_in_thread()
+        host, port = "127.0.0.1", harness.mqtt_port
+    else:
+        host, _, port = args.broker.partition(":")
+        port = int(port or 1883)
+
+    print(f"🧮 {multiprocessing.cpu_count()} CPU(s) - throughput only scales up to the core count")
+    results = []
+    try:
+        for shards in [int(value) for value in args.shards.split(",")]:
+            report = bench(host, port, shards, args.mode, args.shard_filter, args.duration, args.batch)
+            results.append(report)
+            print(f"\n⚡ {report['rate']:.0f} msgs/s merged")
+            print_shard_report(report)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if harness is not None:
+            harness.stop_thread()
+    if results and results[0]["rate"]:
+        print("\n📊 Speed-up: " + ", ".join(f"{report['shards']} → {report['rate'] / results[0]['rate']:.2f}×"
+                                            for report in results))
+    return 0 if all(report["out_of_order"] == 0 for report in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1027 @@
+#!/usr/bin/env python3
+"""
+Lokální simulace produkce pro offline diagnostiku a benchmarky
+- broker MQTT (TCP i WebSocket na stejném portu, jako :9001)
+- falešná brána publikující IoT/Brana/* a Log/Brana/ID
+- kamera s JPEG/MJPEG endpointy (/photo.jpg, /stream.mjpg, /video.mjpg,
+  /video i /api/camera-proxy/*), nastavitelné fps, velikost snímku,
+  latence a injektování chyb
+
+Vše běží v jednom asyncio loopu - buď přímo (asyncio), nebo na pozadí
+ve vlákně pro synchronní scripty (SimulationHarness.start_in_thread).
+
+Použití:
+    python3 debug/sim_harness.py --mqtt-port 9001 --camera-port 10180
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from mqtt_wire import (
+    CONNECT, DISCONNECT, PINGREQ, PINGRESP_PACKET, PUBACK, PUBCOMP,
+    PUBLISH, PUBREC, PUBREL, SUBSCRIBE, UNSUBACK, UNSUBSCRIBE,
+    SHARE_PREFIX, AsyncMqttClient, MqttProtocolError, WebSocketTransport, ack_packet,
+    connack_packet, parse_connect, parse_publish, parse_subscribe,
+    publish_packet, read_packet, suback_packet, topic_matches,
+    websocket_accept_key,
+)
+
+GATE_STATUS_TOPIC = "IoT/Brana/Status"
+GARAGE_STATUS_TOPIC = "IoT/Brana/Status2"
+GATE_COMMAND_TOPIC = "IoT/Brana/Ovladani"
+ACTIVITY_LOG_TOPIC = "Log/Brana/ID"
+
+# Příkazy z src/services/mqttService.ts: 1 = brána, 3 = garáž, 6 = STOP
+COMMAND_STATUS_TOPIC = {"1": GATE_STATUS_TOPIC, "3": GARAGE_STATUS_TOPIC, "6": GATE_STATUS_TOPIC}
+
+# Stavy, kterými pohyb končí (text i kódy P1-P6, viz parseGateStatus)
+SETTLED_STATES = {"Brána zavřena", "Brána otevřena", "Zastavena", "STOP režim",
+                  "P1", "P2", "P5", "P6", "Garáž zavřena", "Garáž otevřena"}
+
+
+# --- broker ----------------------------------------------------------------
+
+class _PrefixedTcp:
+    """Server side TCP stream that re-injects the sniffed first byte"""
+
+    def __init__(self, prefix, reader, writer):
+        self._prefix = prefix
+        self.reader = reader
+        self.writer = writer
+
+    async def readexactly(self, size):
+        if self._prefix:
+            prefix, self._prefix = self._prefix, b""
+            return prefix + (await self.reader.readexactly(size - len(prefix)) if size > len(prefix) else b"")
+        return await self.reader.readexactly(size)
+
+    def write(self, data):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        if self.writer.transport is not None:
+            self.writer.transport.abort()
+
+
+class BrokerSession:
+    """One connected client as seen by the stand-in broker"""
+
+    def __init__(self, client_id, stream, writer, keepalive, will, peer):
+        self.client_id = client_id
+        self.stream = stream
+        self.writer = writer
+        self.keepalive = keepalive
+        self.will = will
+        self.peer = peer
+        self.subscriptions = {}
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.next_id = 0
+        self.pending_qos2 = set()
+        self.dropped = 0
+
+    def packet_id(self):
+        self.next_id = self.next_id % 65535 + 1
+        return self.next_id
+
+
+class StandInBroker:
+    """MQTT 3.1.1 broker stand-in for offline runs and throughput tests.
+
+    Speaks raw TCP and MQTT-over-WebSocket on the same port (the first byte
+    decides), keeps retained messages, honours + / # wildcards and QoS 0-2
+    handshakes (without persistence or retransmission), shares
+    $share/<group>/<filter> subscriptions round-robin (no retained
+    messages on those, like mosquitto), delivers wills and
+    publishes mosquitto-style $SYS client counts and connect/disconnect log
+    lines. Slow consumers lose QoS 0 messages once their socket buffer is
+    above `max_buffer` instead of growing memory without limit.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, sys_topics=True,
+                 max_buffer=8 << 20, log=None):
+        self.host = host
+        self.port = port
+        self.sys_topics = sys_topics
+        self.max_buffer = max_buffer
+        self.log = log or (lambda message: None)
+        self.sessions = {}
+        self.retained = {}
+        self._match_cache = {}
+        self._share_turn = 0
+        self._server = None
+        self._handlers = set()
+        self._watchdog = None
+        self.stats = {"connects": 0, "disconnects": 0, "messages_in": 0,
+                      "messages_out": 0, "dropped": 0, "bytes_in": 0}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  backlog=4096, reuse_address=True)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._watchdog = asyncio.ensure_future(self._keepalive_watchdog())
+        self.log(f"📡 Stand-in broker listening on {self.host}:{self.port} (tcp + ws)")
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._watchdog.cancel()
+            self.drop_connections()
+            # Handlery doběhnou samy, ať je asyncio.run nemusí rušit
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=2.0)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _keepalive_watchdog(self):
+        """Drop sessions silent for 1.5x keepalive (cheaper than a timeout per read)"""
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.keepalive and now - session.last_seen > session.keepalive * 1.5:
+                    session.stream.abort()
+
+    def drop_connections(self):
+        """Abort every client socket without DISCONNECT (wills fire)"""
+        for session in list(self.sessions.values()):
+            session.stream.abort()
+
+    # ----- připojení
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        session = None
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            first = await reader.readexactly(1)
+            if first == b"G":
+                stream = await self._accept_websocket(first, reader, writer)
+            else:
+                stream = _PrefixedTcp(first, reader, writer)
+            packet_type, _, body = await asyncio.wait_for(read_packet(stream), 10.0)
+            if packet_type != CONNECT:
+                raise MqttProtocolError("First packet is not CONNECT")
+            connect = parse_connect(body)
+            session = self._open_session(connect, stream, writer, peer)
+            await self._serve(session)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.TimeoutError,
+                MqttProtocolError, OSError, ValueError, IndexError):
+            pass
+        finally:
+            if session is not None:
+                self._close_session(session)
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _accept_websocket(self, first, reader, writer):
+        head = first + await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10.0)
+        headers = {}
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            raise MqttProtocolError("Not a WebSocket upgrade")
+        protocol = "mqtt" if "mqtt" in headers.get("sec-websocket-protocol", "") else None
+        response = ("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                    f"Connection: Upgrade\r\nSec-WebSocket-Accept: {websocket_accept_key(key)}\r\n")
+        if protocol:
+            response += f"Sec-WebSocket-Protocol: {protocol}\r\n"
+        writer.write((response + "\r\n").encode("latin-1"))
+        return WebSocketTransport(reader, writer, mask_outgoing=False)
+
+    def _open_session(self, connect, stream, writer, peer):
+        client_id = connect["client_id"] or f"auto-{id(stream):x}"
+        previous = self.sessions.get(client_id)
+        if previous is not None:
+            # Stejné client ID - starší spojení se odpojí (jako mosquitto)
+            previous.will = None
+            previous.stream.abort()
+        session = BrokerSession(client_id, stream, writer, connect["keepalive"],
+                                connect["will"], peer)
+        self.sessions[client_id] = session
+        self.stats["connects"] += 1
+        stream.write(connack_packet(0))
+        self._sys_event(f"New client connected from {peer[0] if peer else '?'}:"
+                        f"{peer[1] if peer else 0} as {client_id} "
+                        f"(c{1 if connect['clean'] else 0}, k{connect['keepalive']}).")
+        return session
+
+    def _close_session(self, session):
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+            self._match_cache.clear()
+            self.stats["disconnects"] += 1
+            if session.will is not None:
+                topic, payload, qos, retain = session.will
+                self.publish(topic, payload, qos, retain)
+            self._sys_event(f"Client {session.client_id} disconnected.")
+
+    def _sys_event(self, line):
+        if not self.sys_topics:
+            return
+        self.publish("$SYS/broker/clients/connected", str(len(self.sessions)), retain=True)
+        self.publish("$SYS/broker/log/N", line)
+
+    async def _serve(self, session):
+        stream = session.stream
+        while True:
+            packet_type, flags, body = await read_packet(stream)
+            session.last_seen = time.monotonic()
+            self.stats["bytes_in"] += len(body) + 2
+            if packet_type == PUBLISH:
+                topic, payload, qos, retain, packet_id, _ = parse_publish(flags, body)
+                if qos == 1:
+                    stream.write(ack_packet(PUBACK, packet_id))
+                elif qos == 2:
+                    stream.write(ack_packet(PUBREC, packet_id))
+                    if packet_id in session.pending_qos2:
+                        continue  # duplicitní QoS 2 - už doručeno
+                    session.pending_qos2.add(packet_id)
+                self.stats["messages_in"] += 1
+                self.publish(topic, payload, qos, retain)
+            elif packet_type == PUBREL:
+                packet_id = int.from_bytes(body[:2], "big")
+                session.pending_qos2.discard(packet_id)
+                stream.write(ack_packet(PUBCOMP, packet_id))
+            elif packet_type == PUBREC:
+                stream.write(ack_packet(PUBREL, int.from_bytes(body[:2], "big")))
+            elif packet_type in (PUBACK, PUBCOMP):
+                pass
+            elif packet_type == SUBSCRIBE:
+                packet_id, filters = parse_subscribe(body)
+                for topic_filter, qos in filters:
+                    session.subscriptions[topic_filter] = qos
+                self._match_cache.clear()
+                stream.write(suback_packet(packet_id, [qos for _, qos in filters]))
+                for topic_filter, qos in filters:
+                    self._send_retained(session, topic_filter, qos)
+            elif packet_type == UNSUBSCRIBE:
+                packet_id = int.from_bytes(body[:2], "big")
+                offset = 2
+                while offset < len(body):
+                    length = int.from_bytes(body[offset:offset + 2], "big")
+                    session.subscriptions.pop(body[offset + 2:offset + 2 + length].decode("utf-8"), None)
+                    offset += 2 + length
+                self._match_cache.clear()
+                stream.write(ack_packet(UNSUBACK, packet_id))
+            elif packet_type == PINGREQ:
+                stream.write(PINGRESP_PACKET)
+            elif packet_type == DISCONNECT:
+                session.will = None
+                return
+            elif packet_type == CONNECT:
+                raise MqttProtocolError("Second CONNECT")
+            if session.writer.transport.get_write_buffer_size() > 65536:
+                await stream.drain()
+
+    # ----- směrování
+
+    def _subscribers(self, topic):
+        """([(session, qos)], [[(session, qos)] per $share group]) for a topic"""
+        entry = self._match_cache.get(topic)
+        if entry is None:
+            matches = []
+            groups = {}
+            for session in self.sessions.values():
+                granted = -1
+                for topic_filter, qos in session.subscriptions.items():
+                    if topic_filter.startswith(SHARE_PREFIX):
+                        _, group, shared_filter = topic_filter.split("/", 2)
+                        if topic_matches(shared_filter, topic):
+                            groups.setdefault(group, []).append((session, qos))
+                    elif qos > granted and topic_matches(topic_filter, topic):
+                        granted = qos
+                if granted >= 0:
+                    matches.append((session, granted))
+            if len(self._match_cache) > 10000:
+                self._match_cache.clear()
+            entry = self._match_cache[topic] = (matches, list(groups.values()))
+        return entry
+
+    def _deliver(self, session, topic, payload, qos, retain, shared=None):
+        transport = session.writer.transport
+        if transport is None or transport.is_closing():
+            return
+        if qos == 0 and transport.get_write_buffer_size() > self.max_buffer:
+            session.dropped += 1
+            self.stats["dropped"] += 1
+            return
+        if qos == 0:
+            data = shared if shared is not None else publish_packet(topic, payload, 0, retain)
+        else:
+            data = publish_packet(topic, payload, qos, retain, session.packet_id())
+        session.stream.write(data)
+        self.stats["messages_out"] += 1
+
+    def _send_retained(self, session, topic_filter, granted):
+        for topic, (payload, qos) in list(self.retained.items()):
+            if topic_matches(topic_filter, topic):
+                self._deliver(session, topic, payload, min(qos, granted), True)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Route a message to every matching subscriber (also used internally)"""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        shared = None
+        matches, groups = self._subscribers(topic)
+        if groups:
+            # $share skupina dostane zprávu jen jednou - členové se střídají
+            self._share_turn += 1
+            matches = matches + [members[self._share_turn % len(members)] for members in groups]
+        for session, granted in matches:
+            effective = min(qos, granted)
+            if effective == 0 and shared is None:
+                shared = publish_packet(topic, payload, 0, False)
+            self._deliver(session, topic, payload, effective, False, shared)
+
+
+# --- brána -----------------------------------------------------------------
+
+class FakeGate:
+    """Simulated gate controller on any broker.
+
+    Answers IoT/Brana/Ovladani like the hardware (1 = gate toggle, 3 =
+    garage, 6 = STOP) with 'Otevírá se...' / 'Brána otevřena' style
+    statuses and a Log/Brana/ID entry, all retained. `status_rate` and
+    `log_rate` add a steady stream of heartbeat / activity messages per
+    second for throughput tests. QoS>0 publishes not acknowledged within
+    `ack_timeout` (or lost with the connection) are counted in `unacked`.
+    """
+
+    def __init__(self, host, port, transport="tcp", react_delay=0.05, travel_time=0.5,
+                 status_rate=0.0, log_rate=0.0, qos=1, ack_timeout=10.0, log=None):
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.react_delay = react_delay
+        self.travel_time = travel_time
+        self.status_rate = status_rate
+        self.log_rate = log_rate
+        self.qos = qos
+        self.ack_timeout = ack_timeout
+        self.log = log or (lambda message: None)
+        self.gate_status = "Brána zavřena"
+        self.gate_open = False
+        self.garage_open = False
+        self.commands = 0
+        self.published = 0
+        self.acked = 0
+        self.unacked = 0
+        self._client = None
+        self._tasks = []
+
+    async def start(self):
+        self._client = AsyncMqttClient(f"sim-gate-{os.getpid()}-{id(self):x}",
+                                       on_message=self._on_message, keepalive=30)
+        return_code = await self._client.connect(self.host, self.port, self.transport)
+        if return_code != 0:
+            raise ConnectionError(f"Fake gate refused by broker (rc={return_code})")
+        await self._client.subscribe([(GATE_COMMAND_TOPIC, 1)])
+        self._publish(GATE_STATUS_TOPIC, self.gate_status)
+        self._publish(GARAGE_STATUS_TOPIC, "P1")
+        if self.status_rate > 0:
+            self._tasks.append(asyncio.ensure_future(
+                self._steady(self.status_rate, lambda i: (GATE_STATUS_TOPIC, self.gate_status))))
+        if self.log_rate > 0:
+            self._tasks.append(asyncio.ensure_future(
+                self._steady(self.log_rate, lambda i: (ACTIVITY_LOG_TOPIC, f"{1000 + i % 50}"))))
+        self.log(f"🤖 Fake gate online on {self.host}:{self.port}")
+        return self
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._client is not None:
+            await self._client.disconnect()
+        if self.unacked:
+            self.log(f"⚠️  Fake gate: {self.unacked}/{self.published} QoS {self.qos} "
+                     f"publishes not acknowledged")
+
+    def _publish(self, topic, payload, retain=True):
+        if self._client is not None and self._client.connected:
+            waiter = self._client.publish_nowait(topic, payload, self.qos, retain)
+            self.published += 1
+            if waiter is not None:
+                timer = asyncio.get_running_loop().call_later(self.ack_timeout, waiter.cancel)
+                waiter.add_done_callback(lambda future: self._ack_done(future, timer))
+
+    def _ack_done(self, future, timer):
+        timer.cancel()
+        # Zrušeno = timeout, výjimka = spojení spadlo před PUBACK/PUBCOMP
+        if future.cancelled() or future.exception() is not None:
+            self.unacked += 1
+        else:
+            self.acked += 1
+
+    def _later(self, delay, topic, payload):
+        asyncio.get_running_loop().call_later(delay, self._set_and_publish, topic, payload)
+
+    def _set_and_publish(self, topic, payload):
+        if topic == GATE_STATUS_TOPIC:
+            self.gate_status = payload
+        self._publish(topic, payload)
+
+    def _on_message(self, topic, payload, qos, retain):
+        if topic != GATE_COMMAND_TOPIC or retain:
+            return
+        command = payload.decode("utf-8", errors="ignore").strip()
+        self.commands += 1
+        self._later(self.react_delay, ACTIVITY_LOG_TOPIC, f"SIM{self.commands:04d}")
+        if command == "1":
+            self.gate_open = not self.gate_open
+            self._later(self.react_delay, GATE_STATUS_TOPIC,
+                        "Otevírá se..." if self.gate_open else "Zavírá se...")
+            self._later(self.react_delay + self.travel_time, GATE_STATUS_TOPIC,
+                        "Brána otevřena" if self.gate_open else "Brána zavřena")
+        elif command == "3":
+            self.garage_open = not self.garage_open
+            self._later(self.react_delay, GARAGE_STATUS_TOPIC, "Garáž v pohybu")
+            if not self.garage_open:
+                self._later(self.react_delay + self.travel_time, GARAGE_STATUS_TOPIC, "P1")
+        elif command == "6":
+            self._later(self.react_delay, GATE_STATUS_TOPIC, "STOP režim")
+
+    async def _steady(self, rate, make_message):
+        """Publish `rate` messages/s in 10 ms batches (keeps up at high rates)"""
+        tick = 0.01
+        sent = 0
+        started = time.perf_counter()
+        while True:
+            due = int((time.perf_counter() - started) * rate)
+            while sent < due and self._client.connected:
+                topic, payload = make_message(sent)
+                self._publish(topic, payload, retain=False)
+                sent += 1
+            if self._client.stream is not None:
+                await self._client.stream.drain()
+            await asyncio.sleep(tick)
+
+
+# --- kamera ----------------------------------------------------------------
+
+def synthetic_frames(count, size, seed=0):
+    """JPEG-shaped blobs (SOI, APP0, filler without 0xFF, EOI) of ~`size` bytes"""
+    rng = random.Random(seed)
+    header = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    frames = []
+    for index in range(count):
+        filler_size = max(0, size - len(header) - 2)
+        seed_bytes = bytes(rng.randrange(0, 255) for _ in range(min(256, filler_size)))
+        filler = (seed_bytes * (filler_size // 256 + 1))[:filler_size] if seed_bytes else b""
+        frames.append(header + filler + b"\xff\xd9")
+    return frames
+
+
+def real_jpeg_frames(count, width=640, height=480, quality=70, scene="live"):
+    """Real JPEGs of a moving gradient (needs Pillow), or None without it
+
+    scene "reencoded" keeps the first picture and only the on-screen clock
+    ticks (a stuck sensor behind a live encoder), "black" is a dark frame
+    with the same clock.
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return None
+    import io
+    frames = []
+    for index in range(count):
+        if scene == "black":
+            image = Image.new("RGB", (width, height), (3, 3, 3))
+        else:
+            image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        if scene == "live":
+            x = (index * 17) % width
+            draw.rectangle([x, height // 3, x + 60, height // 3 + 60], fill=(255, 64, 0))
+        elif scene == "reencoded":
+            draw.rectangle([0, height // 3, 60, height // 3 + 60], fill=(255, 64, 0))
+        draw.text((10, 10), f"SIM {index:05d}", fill=(255, 255, 255))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def scene_frames(frames, scene):
+    """Frame list for the simpler scenes - "frozen" serves identical bytes,
+    "repeat" shows every picture three times (source slower than the stream)"""
+    if scene == "frozen":
+        return frames[:1]
+    if scene == "repeat":
+        return [frame for frame in frames for _ in range(3)]
+    return frames
+
+
+def stamp_frame(frame, index, produced_ns):
+    """Insert a JPEG comment segment "BRN <index> <time_ns>" after SOI"""
+    text = b"BRN %d %d" % (index, produced_ns)
+    return frame[:2] + b"\xff\xfe" + (len(text) + 2).to_bytes(2, "big") + text + frame[2:]
+
+
+def read_frame_stamp(data, search=1024):
+    """(index, produced_ns) from a stamp_frame() frame, or None
+
+    Searches the first `search` bytes, so relayed frames that still carry
+    a multipart header in front of the JPEG are found too.
+    """
+    head = bytes(data[:search])
+    position = head.find(b"BRN ")
+    if position < 4 or head[position - 4:position - 2] != b"\xff\xfe":
+        return None
+    length = int.from_bytes(head[position - 2:position], "big")
+    try:
+        _, index, produced_ns = head[position:position + length - 2].split(b" ")
+        return int(index), int(produced_ns)
+    except ValueError:
+        return None
+
+
+class CameraFaults:
+    """Fault injection knobs - each *_rate is a per-request probability.
+
+    `proxy_flush` and `proxy_cutoff` only touch streams under
+    /api/camera-proxy/: the stream is written in clumps every
+    `proxy_flush` seconds (a buffering proxy) and closed after
+    `proxy_cutoff` bytes (a response size/duration limit).
+    """
+
+    def __init__(self, error_rate=0.0, stall_rate=0.0, reset_rate=0.0, truncate_rate=0.0,
+                 latency=0.0, latency_jitter=0.0, bytes_per_sec=None, seed=None,
+                 proxy_flush=0.0, proxy_cutoff=None):
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.reset_rate = reset_rate
+        self.truncate_rate = truncate_rate
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.bytes_per_sec = bytes_per_sec
+        self.proxy_flush = proxy_flush
+        self.proxy_cutoff = proxy_cutoff
+        self.rng = random.Random(seed)
+
+    def pick(self):
+        """Fault for the next request: error / stall / reset / truncate / None"""
+        roll = self.rng.random()
+        for name in ("error", "stall", "reset", "truncate"):
+            rate = getattr(self, f"{name}_rate")
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+    def delay(self):
+        return max(0.0, self.latency + self.rng.uniform(-1, 1) * self.latency_jitter)
+
+
+class FakeCamera:
+    """HTTP camera stand-in serving the endpoints camera_test.py probes.
+
+    /photo.jpg returns one frame (keep-alive capable), /stream.mjpg,
+    /video.mjpg and /video stream multipart MJPEG at `fps`. The same
+    paths under /api/camera-proxy/ mimic the Vercel proxy. Counters in
+    `stats` let clients measure how many upstream requests they caused.
+    With `stamp` every frame carries its index and production time
+    (stamp_frame / read_frame_stamp) for end-to-end lag measurements.
+    `scene` (live/frozen/repeat/reencoded/black) fakes a broken picture
+    for the stale frame detector (debug/stale_frames.py).
+    """
+
+    SCENES = ("live", "frozen", "repeat", "reencoded", "black")
+
+    BOUNDARY = "simframe"
+
+    def __init__(self, host="127.0.0.1", port=0, fps=15.0, frame_size=40000,
+                 frame_count=30, real_jpeg=False, faults=None, ssl_context=None, stamp=False,
+                 scene="live", log=None):
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.faults = faults or CameraFaults()
+        self.ssl_context = ssl_context
+        self.log = log or (lambda message: None)
+        picture = scene if scene in ("reencoded", "black") else "live"
+        frames = (real_jpeg or picture != "live") and real_jpeg_frames(frame_count, scene=picture)
+        if not frames and scene in ("reencoded", "black"):
+            # Bez Pillow nejde vyrobit dekódovatelný obraz - nejbližší je zamrzlý
+            self.log(f"⚠️  scene {scene} needs Pillow, serving a frozen frame instead")
+            scene = "frozen"
+        self.frames = scene_frames(frames or synthetic_frames(frame_count, frame_size), scene)
+        self.frame_index = 0
+        self.frame_produced_at = None
+        self.stamp = stamp
+        self._stamped = None
+        self._server = None
+        self._clock_task = None
+        self._frame_event = None
+        self._handlers = set()
+        self.stats = {"requests": 0, "streams": 0, "active_streams": 0, "frames_sent": 0,
+                      "bytes_sent": 0, "faults": {}}
+
+    async def start(self):
+        self._frame_event = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port,
+                                                  ssl=self.ssl_context, backlog=1024,
+                                                  reuse_address=True)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._clock_task = asyncio.ensure_future(self._clock())
+        scheme = "https" if self.ssl_context else "http"
+        self.log(f"📷 Fake camera on {scheme}://{self.host}:{self.port} ({self.fps:g} fps)")
+        return self
+
+    async def stop(self):
+        if self._clock_task is not None:
+            self._clock_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            # Streamy čekají na další snímek - zrušit je tady, ne v asyncio.run
+            for task in list(self._handlers):
+                task.cancel()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=2.0)
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def current_frame(self):
+        if self.stamp:
+            if self._stamped is None or self._stamped[0] != self.frame_index:
+                self._stamped = (self.frame_index, stamp_frame(
+                    self.frames[self.frame_index % len(self.frames)], self.frame_index,
+                    time.time_ns()))
+            return self._stamped[1]
+        return self.frames[self.frame_index % len(self.frames)]
+
+    async def _clock(self):
+        """Source frame clock - all viewers see the same frame sequence"""
+        interval = 1.0 / self.fps
+        next_at = time.perf_counter()
+        while True:
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            self.frame_index += 1
+            self.frame_produced_at = time.perf_counter()
+            event, self._frame_event = self._frame_event, asyncio.Event()
+            event.set()
+
+    def _count_fault(self, name):
+        self.stats["faults"][name] = self.stats["faults"].get(name, 0) + 1
+
+    async def _write(self, writer, data):
+        if self.faults.bytes_per_sec:
+            step = max(1, int(self.faults.bytes_per_sec / 20))
+            for offset in range(0, len(data), step):
+                writer.write(data[offset:offset + step])
+                await writer.drain()
+                await asyncio.sleep(len(data[offset:offset + step]) / self.faults.bytes_per_sec)
+        else:
+            writer.write(data)
+            await writer.drain()
+        self.stats["bytes_sent"] += len(data)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+                parts = request_line.split(" ")
+                path = parts[1].split("?", 1)[0] if len(parts) > 1 else "/"
+                keep_alive = b"connection: close" not in head.lower()
+                self.stats["requests"] += 1
+                if not await self._respond(path, writer, keep_alive):
+                    return
+        except (ConnectionError, OSError):
+            pass
+        except asyncio.CancelledError:
+            # Zrušeno ze stop(); zrušený handler by streams callback v 3.11 zalogoval
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _respond(self, path, writer, keep_alive):
+        """Serve one request - returns True if the connection stays usable"""
+        fault = self.faults.pick()
+        if fault:
+            self._count_fault(fault)
+        if fault == "reset":
+            writer.transport.abort()
+            return False
+        if fault == "stall":
+            await asyncio.sleep(3600)
+            return False
+        delay = self.faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if fault == "error":
+            body = b'{"error":"Simulated camera failure"}'
+            await self._write(writer, b"HTTP/1.1 500 Internal Server Error\r\n"
+                                      b"Content-Type: application/json\r\n"
+                                      b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            return keep_alive
+
+        name = path.rsplit("/", 1)[-1]
+        if name == "photo.jpg":
+            frame = self.current_frame
+            head = (b"HTTP/1.1 200 OK\r\nContent-Type: image/jpeg\r\n"
+                    b"Cache-Control: no-store\r\nContent-Length: %d\r\n" % len(frame))
+            head += b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n"
+            if fault == "truncate":
+                await self._write(writer, head + frame[:len(frame) // 2])
+                return False
+            await self._write(writer, head + frame)
+            self.stats["frames_sent"] += 1
+            return keep_alive
+        if name in ("stream.mjpg", "video.mjpg", "video"):
+            await self._stream(writer, truncate=(fault == "truncate"),
+                               proxied=path.startswith("/api/camera-proxy/"))
+            return False
+        body = b"<html><body>Not found</body></html>"
+        await self._write(writer, b"HTTP/1.1 404 Not Found\r\nContent-Type: text/html\r\n"
+                                  b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        return keep_alive
+
+    async def _stream(self, writer, truncate=False, proxied=False):
+        self.stats["streams"] += 1
+        self.stats["active_streams"] += 1
+        limit = self.faults.rng.randint(1, 20) if truncate else None
+        flush = self.faults.proxy_flush if proxied else 0.0
+        cutoff = self.faults.proxy_cutoff if proxied else None
+        pending = bytearray()
+        flushed_at = time.perf_counter()
+        try:
+            await self._write(writer, ("HTTP/1.1 200 OK\r\n"
+                                       f"Content-Type: multipart/x-mixed-replace; boundary={self.BOUNDARY}\r\n"
+                                       "Cache-Control: no-store\r\nConnection: close\r\n\r\n").encode("latin-1"))
+            sent = 0
+            sent_bytes = 0
+            while True:
+                frame = self.current_frame
+                part = (f"--{self.BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(frame)}\r\n\r\n").encode("latin-1")
+                if limit is not None and sent >= limit:
+                    await self._write(writer, part + frame[:len(frame) // 2])
+                    return
+                if cutoff is not None and sent_bytes + len(part) + len(frame) > cutoff:
+                    # Limit proxy utne odpověď uprostřed snímku
+                    await self._write(writer, bytes(pending) + (part + frame)[:cutoff - sent_bytes])
+                    return
+                sent_bytes += len(part) + len(frame) + 2
+                if flush:
+                    pending += part + frame + b"\r\n"
+                    if time.perf_counter() - flushed_at >= flush:
+                        await self._write(writer, bytes(pending))
+                        pending.clear()
+                        flushed_at = time.perf_counter()
+                else:
+                    await self._write(writer, part + frame + b"\r\n")
+                self.stats["frames_sent"] += 1
+                sent += 1
+                await self._frame_event.wait()
+        finally:
+            self.stats["active_streams"] -= 1
+
+
+def self_signed_context():
+    """Throwaway certificate for the HTTPS camera (openssl CLI), or None"""
+    openssl = shutil.which("openssl")
+    if not openssl:
+        return None
+    directory = tempfile.mkdtemp(prefix="brana-sim-")
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    result = subprocess.run([openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                             "-keyout", key, "-out", cert, "-days", "1",
+                             "-subj", "/CN=localhost"], capture_output=True)
+    if result.returncode != 0:
+        return None
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+# --- celý harness ----------------------------------------------------------
+
+class SimulationHarness:
+    """Broker + fake gate + fake camera(s) in one event loop.
+
+    With `run_broker=False` the gate connects to an existing broker at
+    mqtt_host:mqtt_port instead. Ports 0 pick free ports; the actual ones
+    are available after start().
+    """
+
+    def __init__(self, mqtt_host="127.0.0.1", mqtt_port=0, camera_port=0,
+                 https_port=None, run_broker=True, gate=True, camera=True,
+                 gate_options=None, camera_options=None, log=None):
+        self.mqtt_host = mqtt_host
+        self.mqtt_port = mqtt_port
+        self.camera_port = camera_port
+        self.https_port = https_port
+        self.run_broker = run_broker
+        self.log = log or (lambda message: None)
+        self.broker = StandInBroker(mqtt_host, mqtt_port, log=self.log) if run_broker else None
+        self.gate = None
+        self._gate_enabled = gate
+        self._gate_options = gate_options or {}
+        self.camera = FakeCamera("127.0.0.1", camera_port, log=self.log,
+                                 **(camera_options or {})) if camera else None
+        self.https_camera = None
+        self._camera_options = camera_options or {}
+        self.loop = None
+        self._thread = None
+        self._stopped = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.broker is not None:
+            await self.broker.start()
+            self.mqtt_port = self.broker.port
+        if self.camera is not None:
+            await self.camera.start()
+            self.camera_port = self.camera.port
+        if self.https_port is not None:
+            context = self_signed_context()
+            if context is None:
+                self.log("⚠️  openssl not available - HTTPS camera disabled")
+            else:
+                self.https_camera = FakeCamera("127.0.0.1", self.https_port, ssl_context=context,
+                                               log=self.log, **self._camera_options)
+                await self.https_camera.start()
+                self.https_port = self.https_camera.port
+        if self._gate_enabled:
+            self.gate = FakeGate(self.mqtt_host, self.mqtt_port, log=self.log,
+                                 **self._gate_options)
+            await self.gate.start()
+        return self
+
+    async def stop(self):
+        if self.gate is not None:
+            await self.gate.stop()
+        for camera in (self.camera, self.https_camera):
+            if camera is not None:
+                await camera.stop()
+        if self.broker is not None:
+            await self.broker.stop()
+
+    @property
+    def broker_address(self):
+        return f"{self.mqtt_host}:{self.mqtt_port}"
+
+    @property
+    def camera_url(self):
+        return f"http://127.0.0.1:{self.camera_port}"
+
+    def call(self, coroutine, timeout=30.0):
+        """Run a coroutine on the harness loop from another thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def start_in_thread(self, timeout=15.0):
+        """Run the harness on a daemon thread - for paho/requests based scripts"""
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            async def main():
+                self._stopped = asyncio.Event()
+                try:
+                    await self.start()
+                except Exception as e:
+                    errors.append(e)
+                    return
+                finally:
+                    ready.set()
+                await self._stopped.wait()
+                await self.stop()
+            asyncio.run(main())
+
+        self._thread = threading.Thread(target=run, name="sim-harness", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout):
+            raise TimeoutError("Simulation harness did not start")
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop_thread(self, timeout=5.0):
+        if self._thread is not None and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def add_camera_arguments(parser):
+    """Shared CLI knobs for the fake camera"""
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--frame-size", type=int, default=40000, help="bytes (synthetic frames)")
+    parser.add_argument("--real-jpeg", action="store_true", help="real JPEG frames (needs Pillow)")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay before response [s]")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share never answered")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="share reset by peer")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="share cut mid-body")
+    parser.add_argument("--bytes-per-sec", type=float, default=None, help="slow body throttle")
+    parser.add_argument("--stamp-frames", action="store_true",
+                        help="embed frame index + production time in each JPEG (lag benchmarks)")
+    parser.add_argument("--proxy-flush", type=float, default=0.0,
+                        help="/api/camera-proxy/ streams arrive in clumps every N seconds")
+    parser.add_argument("--proxy-cutoff-kb", type=float, default=None,
+                        help="/api/camera-proxy/ streams are cut after N kB")
+    parser.add_argument("--scene", choices=FakeCamera.SCENES, default="live",
+                        help="broken picture for stale frame tests (reencoded/black need Pillow)")
+
+
+def camera_options_from_args(args):
+    return {
+        "fps": args.fps,
+        "frame_size": args.frame_size,
+        "real_jpeg": args.real_jpeg,
+        "faults": CameraFaults(args.error_rate, args.stall_rate, args.reset_rate,
+                               args.truncate_rate, args.latency, args.latency_jitter,
+                               args.bytes_per_sec, proxy_flush=args.proxy_flush,
+                               proxy_cutoff=(int(args.proxy_cutoff_kb * 1024)
+                                             if args.proxy_cutoff_kb else None)),
+        "stamp": args.stamp_frames,
+        "scene": args.scene,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for broker, gate and camera")
+    parser.add_argument("--mqtt-port", type=int, default=9001)
+    parser.add_argument("--camera-port", type=int, default=10180)
+    parser.add_argument("--https-port", type=int, default=None,
+                        help="also serve the camera over HTTPS (self-signed), e.g. 10443")
+    parser.add_argument("--no-gate", action="store_true")
+    parser.add_argument("--travel-time", type=float, default=0.5, help="simulated gate travel [s]")
+    parser.add_argument("--status-rate", type=float, default=0.0,
+                        help="extra IoT/Brana/Status messages per second")
+    parser.add_argument("--log-rate", type=float, default=0.0,
+                        help="extra Log/Brana/ID messages per second")
+    add_camera_arguments(parser)
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+    harness = SimulationHarness(
+        mqtt_port=args.mqtt_port, camera_port=args.camera_port, https_port=args.https_port,
+        gate=not args.no_gate,
+        gate_options={"travel_time": args.travel_time, "status_rate": args.status_rate,
+                      "log_rate": args.log_rate},
+        camera_options=camera_options_from_args(args), log=log)
+
+    async def run():
+        await harness.start()
+        try:
+            while True:
+                await asyncio.sleep(10)
+                broker = harness.broker.stats
+                camera = harness.camera.stats
+                log(f"📊 clients={len(harness.broker.sessions)} in={broker['messages_in']} "
+                    f"out={broker['messages_out']} dropped={broker['dropped']} | "
+                    f"camera requests={camera['requests']} streams={camera['active_streams']} "
+                    f"frames={camera['frames_sent']}")
+        finally:
+            await harness.stop()
+
+    print("🧪 Brana simulation harness - Ctrl+C to stop")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🛑 Simulation stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Detekce zamrzlého, černého a opakovaného obrazu kamery
+Kamera, která pořád posílá stejný snímek, vypadá pro camera_test.py jako
+funkční - tady se kontroluje, jestli se obraz opravdu mění.
+
+Dvě úrovně, aby se dalo hlídat víc kamer na plných fps na jednom jádře:
+1. každý snímek - blake2b otisk entropicky kódovaných dat JPEGu (od SOS
+   markeru, takže COM/APP hlavičky s časem nevadí); stejný otisk = opakovaný
+   snímek, výrazně jiná velikost = obraz se změnil, nic se nedekóduje
+2. vybrané snímky - jen ty, u kterých otisk nestačí (jiné byty, ale skoro
+   stejná velikost nebo podezřele malý snímek), nejvýš jeden za
+   `sample_interval`; JPEG se dekóduje zmenšený přímo v DCT (Pillow draft)
+   na malý jasový náhled a dávka náhledů se porovná v NumPy naráz
+
+Bez NumPy/Pillow běží jen první úroveň (překódovaný zamrzlý obraz pak
+nepozná).
+
+    python debug/stale_frames.py http://89.24.76.191:10180/video --duration 60
+    python debug/camera_test.py --stale --sim --scene reencoded
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import io
+import sys
+import time
+
+from async_http import HttpClient, HttpError
+from mjpeg_analyzer import analyze_stream
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # druhá úroveň potřebuje obojí
+    np = Image = None
+
+SOS = b"\xff\xda"
+# SOS bývá v prvních stovkách bytů, EXIF náhled ho může posunout dál
+HEADER_SCAN = 64 * 1024
+THUMB_SIZE = (64, 48)
+
+
+def tier2_available():
+    return np is not None and Image is not None
+
+
+def frame_digest(data):
+    """Digest of the entropy-coded data, ignoring headers before SOS"""
+    start = bytes(data[:HEADER_SCAN]).find(SOS)
+    return hashlib.blake2b(data[max(start, 0):], digest_size=8).digest()
+
+
+def luminance_thumbnail(data, size=THUMB_SIZE):
+    """Small grayscale float32 array; draft() lets libjpeg scale in the DCT"""
+    image = Image.open(io.BytesIO(data))
+    image.draft("L", (size[0] * 2, size[1] * 2))
+    return np.asarray(image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+class StaleFrameDetector:
+    """Two-tier frozen/black/repeated frame detector for one camera.
+
+    feed() every frame, report() at the end. Changes of the picture are
+    kept as sorted timestamps: tier 1 credits them immediately, tier 2
+    credits sampled frames later (per batch), so gaps are only folded into
+    frozen episodes once no pending sample can fall into them.
+    """
+
+    def __init__(self, name, frozen_after=5.0, repeat_limit=0.5, similar_size=0.02,
+                 small_ratio=0.35, sample_interval=1.0, batch=8, max_delay=5.0,
+                 pixel_delta=12.0, changed_share=0.005, black_level=20.0, black_contrast=6.0,
+                 clock=time.monotonic):
+        self.name = name
+        self.frozen_after = frozen_after
+        self.repeat_limit = repeat_limit
+        self.similar_size = similar_size
+        self.small_ratio = small_ratio
+        self.sample_interval = sample_interval
+        self.batch = batch
+        self.max_delay = max_delay
+        self.pixel_delta = pixel_delta
+        self.changed_share = changed_share
+        self.black_level = black_level
+        self.black_contrast = black_contrast
+        self.clock = clock
+        self.tier2 = tier2_available()
+        self.started = None
+        self.frames = 0
+        self.repeats = 0
+        self.decoded = 0
+        self.undecodable = 0
+        self.near_duplicates = 0
+        self.black = 0
+        self.unverified = 0
+        self.longest_frozen = 0.0
+        self.episodes = []
+        self.busy = 0.0
+        self.decode_busy = 0.0
+        self._last_digest = None
+        self._last_size = None
+        self._sizes = []
+        self._last_sample = float("-inf")
+        self._pending = []
+        self._reference = None
+        self._changes = []
+
+    def feed(self, data, now=None):
+        """Classify one frame (bytes or memoryview, copied only when sampled)"""
+        started = time.perf_counter()
+        now = self.clock() if now is None else now
+        if self.started is None:
+            self.started = now
+            self._changes.append(now)
+        self.frames += 1
+        digest = frame_digest(data)
+        size = len(data)
+        if digest == self._last_digest:
+            self.repeats += 1
+        else:
+            similar = (self._last_size is not None
+                       and abs(size - self._last_size) <= self.similar_size * self._last_size)
+            small = (bool(self._sizes)
+                     and size < self.small_ratio * sorted(self._sizes)[len(self._sizes) // 2])
+            if not (similar or small):
+                # Výrazně jiná velikost - obraz se změnil, dekódovat netřeba
+                self._credit(now)
+            elif self.tier2 and now - self._last_sample >= self.sample_interval:
+                self._pending.append((now, bytes(data)))
+                self._last_sample = now
+            else:
+                # Otisk nestačí a vzorek teď není na řadě - bez rozhodnutí
+                self.unverified += 1
+        self._last_digest = digest
+        self._last_size = size
+        self._sizes.append(size)
+        if len(self._sizes) > 64:
+            del self._sizes[0]
+        if self._pending and (len(self._pending) >= self.batch
+                              or now - self._pending[0][0] >= self.max_delay):
+            self.flush()
+        self._fold(now - self.max_delay - self.sample_interval)
+        self.busy += time.perf_counter() - started
+
+    def flush(self):
+        """Decode pending samples and compare them to each other in one go"""
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        times, thumbs = [], []
+        for when, data in self._pending:
+            try:
+                thumbs.append(luminance_thumbnail(data))
+                times.append(when)
+            except (OSError, ValueError, SyntaxError):
+                # Nedekódovatelný snímek - nelze tvrdit, že se nezměnil
+                self.undecodable += 1
+                self._credit(when)
+        self._pending.clear()
+        if thumbs:
+            stack = np.stack(thumbs)
+            first = stack[:1] if self._reference is None else self._reference[None]
+            diff = np.abs(stack - np.concatenate((first, stack[:-1])))
+            changed = (diff > self.pixel_delta).mean(axis=(1, 2))
+            moved = changed > self.changed_share
+            if self._reference is None:
+                # První vzorek není s čím srovnat - jasně odlišné snímky se nedekódují
+                moved[0] = True
+            dark = ((stack.mean(axis=(1, 2)) < self.black_level)
+                    & (stack.std(axis=(1, 2)) < self.black_contrast))
+            for when in np.asarray(times)[moved]:
+                self._credit(float(when))
+            self.decoded += len(thumbs)
+            self.near_duplicates += int((~moved).sum())
+            self.black += int(dark.sum())
+            self._reference = stack[-1]
+        self.decode_busy += time.perf_counter() - started
+
+    def _credit(self, when):
+        bisect.insort(self._changes, when)
+
+    def _fold(self, horizon):
+        """Turn gaps between changes older than `horizon` into frozen episodes"""
+        while len(self._changes) > 1 and self._changes[1] <= horizon:
+            start = self._changes.pop(0)
+            self._gap(start, self._changes[0])
+
+    def _gap(self, start, end):
+        gap = end - start
+        self.longest_frozen = max(self.longest_frozen, gap)
+        if gap >= self.frozen_after:
+            self.episodes.append((start - self.started, gap))
+            del self.episodes[:-20]
+
+    def report(self, now=None):
+        """Counters, frozen episodes and verdicts; flushes pending samples"""
+        now = self.clock() if now is None else now
+        self.flush()
+        self._fold(float("inf"))
+        frozen_now = now - self._changes[-1] if self._changes else 0.0
+        self.longest_frozen = max(self.longest_frozen, frozen_now)
+        unique = self.frames - self.repeats
+        result = {
+            "camera": self.name,
+            "frames": self.frames,
+            "unique": unique,
+            "repeat_ratio": self.repeats / self.frames if self.frames else 0.0,
+            "decoded": self.decoded,
+            "decode_share": self.decoded / self.frames if self.frames else 0.0,
+            "undecodable": self.undecodable,
+            "unverified": self.unverified,
+            "near_duplicates": self.near_duplicates,
+            "black": self.black,
+            "black_share": self.black / self.decoded if self.decoded else None,
+            "longest_frozen": self.longest_frozen,
+            "frozen_now": frozen_now if frozen_now >= self.frozen_after else 0.0,
+            "episodes": [{"start": start, "duration": gap} for start, gap in self.episodes],
+            "cpu_per_frame": (self.busy / self.frames) if self.frames else None,
+            "tier2": self.tier2,
+        }
+        verdicts = []
+        if self.frames and self.longest_frozen >= self.frozen_after:
+            verdicts.append("frozen")
+        if result["black_share"] is not None and result["black_share"] >= 0.5:
+            verdicts.append("black")
+        if self.frames > 1 and result["repeat_ratio"] >= self.repeat_limit:
+            verdicts.append("repeated")
+        result["verdicts"] = verdicts
+        return result
+
+
+async def watch_stream(detector, url, duration=30.0, timeout=5.0):
+    """Feed every frame of an MJPEG stream into the detector"""
+    stream = await analyze_stream(url, duration, timeout=timeout,
+                                  on_frame=lambda view, stats: detector.feed(view))
+    return dict(detector.report(), url=url, fps=stream["fps"], error=stream["error"])
+
+
+async def poll_photo(detector, url, duration=30.0, interval=1.0, timeout=5.0):
+    """Poll a still image endpoint (photo.jpg) on a keep-alive connection"""
+    client = HttpClient(concurrency=1, per_host=1, timeout=timeout)
+    deadline = time.monotonic() + duration
+    error = None
+    try:
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                response, body = await client.fetch("GET", url)
+                if response.status == 200:
+                    detector.feed(body)
+                else:
+                    error = f"HTTP {response.status}"
+            except (HttpError, OSError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        await client.close()
+    return dict(detector.report(), url=url, fps=None, error=error)
+
+
+async def watch_all(urls, duration=30.0, poll_interval=1.0, timeout=5.0, **options):
+    """Watch all cameras in one event loop, with the CPU share it took.
+
+    URLs ending in .jpg are polled, everything else is read as a stream.
+    """
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    jobs = []
+    for url in urls:
+        detector = StaleFrameDetector(url, **options)
+        if url.split("?", 1)[0].endswith(".jpg"):
+            jobs.append(poll_photo(detector, url, duration, poll_interval, timeout))
+        else:
+            jobs.append(watch_stream(detector, url, duration, timeout))
+    reports = await asyncio.gather(*jobs)
+    wall = time.perf_counter() - wall_started
+    return reports, (time.process_time() - cpu_started) / wall if wall > 0 else 0.0
+
+
+def print_stale_report(report):
+    """Lidsky čitelný výpis jednoho detektoru"""
+    if not report["frames"]:
+        print(f"\n❌ {report['url']}\n  no frames ({report['error']})")
+        return
+    print(f"\n{'🧊' if report['verdicts'] else '✅'} {report['url']}")
+    print(f"  🖼️  {report['frames']} frames, {report['unique']} unique "
+          f"(repeats {report['repeat_ratio']:.0%})")
+    tier2 = (f"decoded {report['decoded']} ({report['decode_share']:.1%}), "
+             f"{report['near_duplicates']} near-duplicates, {report['black']} black"
+             if report["tier2"] else "tier 2 off (needs numpy + Pillow)")
+    print(f"  🔬 {tier2}")
+    if report["undecodable"]:
+        print(f"  ⚠️  {report['undecodable']} sampled frames were not decodable JPEGs")
+    print(f"  ⏸️  Longest unchanged picture: {report['longest_frozen']:.1f}s"
+          + (f" - frozen for {report['frozen_now']:.1f}s now" if report["frozen_now"] else ""))
+    for episode in report["episodes"][-5:]:
+        print(f"     at +{episode['start']:.1f}s for {episode['duration']:.1f}s")
+    if report["cpu_per_frame"] is not None:
+        print(f"  🧮 {report['cpu_per_frame'] * 1e6:.0f}µs CPU per frame")
+    if report["verdicts"]:
+        print(f"  🚨 {', '.join(report['verdicts']).upper()}")
+    if report["error"]:
+        print(f"  ⚠️  {report['error']}")
+
+
+def print_stale_summary(reports, cpu_share):
+    for report in reports:
+        print_stale_report(report)
+    print(f"\n🧮 {len(reports)} cameras took {cpu_share:.1%} of one core")
+    stale = [r for r in reports if r["verdicts"]]
+    if stale:
+        print(f"🚨 Stale picture on {len(stale)}/{len(reports)} cameras")
+    return len(stale)
+
+
+def add_stale_arguments(parser):
+    """Shared CLI knobs (camera_test.py --stale uses them too)"""
+    parser.add_argument("--frozen-after", type=float, default=5.0,
+                        help="unchanged picture for this long counts as frozen [s]")
+    parser.add_argument("--repeat-limit", type=float, default=0.5,
+                        help="share of byte-identical frames that counts as repeated")
+    parser.add_argument("--sample-interval", type=float, default=1.0,
+                        help="decode at most one frame per camera this often [s]")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="photo.jpg polling interval [s]")
+
+
+def detector_options_from_args(args):
+    return {"frozen_after": args.frozen_after, "repeat_limit": args.repeat_limit,
+            "sample_interval": args.sample_interval}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frozen/black/repeated camera frame detector")
+    parser.add_argument("urls", nargs="+", help="stream or photo.jpg URLs (watched concurrently)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per camera")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    add_stale_arguments(parser)
+    args = parser.parse_args(argv)
+    reports, cpu_share = asyncio.run(watch_all(args.urls, args.duration, args.poll_interval,
+                                               args.timeout, **detector_options_from_args(args)))
+    stale = print_stale_summary(reports, cpu_share)
+    return 1 if stale or not all(r["frames"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
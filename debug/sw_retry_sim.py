@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Simulátor retry bouří service workeru proti padající kameře
+
+Několik "telefonů" obnovuje snímek kamery tak jako frontend a každý posílá
+požadavky přes model service workeru s danou politikou fetch/retry/cache.
+Upstream je lokální FakeCamera (debug/sim_harness.py) s injektovanými
+chybami podle scénáře - 500, timeouty (zaseknutá odpověď), resety
+spojení, pomalé tělo. Měří se, na kolik upstream požadavků se rozroste
+jeden požadavek stránky (amplifikace), průběh upstream req/s v čase,
+souběžné upstream požadavky a podíl odpovědí z cache.
+
+Politiky:
+  current   dnešní public/service-worker.js - cache-first (camera URL má
+            ?t=, takže vždy miss), fetch bez timeoutu, při síťové chybě
+            podvržená 200 '{}'
+  retry     okamžité opakování při chybě/5xx
+  backoff   opakování s exponenciálním backoffem (full jitter) a timeoutem
+  breaker   backoff + circuit breaker, když je otevřený, poslední dobrý
+            snímek z cache
+  stale     jeden pokus s timeoutem, při chybě poslední dobrý snímek
+
+Stránky: widget = CameraWidget.tsx (tick 5 s, jeden požadavek naráz,
+pojistka se uvolní po 10 s), viewer = CameraViewer.tsx v režimu snapshot
+(tick 1 s bez pojistky). Časy jsou v sekundách modelu, --speed je zkrátí.
+
+    python debug/sw_retry_sim.py --phones 10 --scenario healthy:20,timeout:60,healthy:30
+    python debug/sw_retry_sim.py --policy current --policy breaker --breaker-failures 3 --speed 20
+"""
+
+import abc
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from async_http import HttpClient, HttpError
+from bench_stats import format_summary, summarize
+from sim_harness import CameraFaults, FakeCamera
+
+POLICIES = ("current", "retry", "backoff", "breaker", "stale")
+
+PAGES = {
+    # CameraWidget.tsx: DEFAULT_REFRESH_MS, inFlightRef, 10 s timeout obrázku
+    "widget": {"interval": 5.0, "timeout": 10.0, "guard": True},
+    # CameraViewer.tsx snapshot: setInterval(refreshSnapshot, 1000) bez pojistky
+    "viewer": {"interval": 1.0, "timeout": None, "guard": False},
+}
+
+# Nastavení CameraFaults pro fáze scénáře, bytes_per_sec a latency se škálují --speed
+FAULTS = {
+    "healthy": {},
+    "error": {"error_rate": 1.0},
+    "timeout": {"stall_rate": 1.0},
+    "reset": {"reset_rate": 1.0},
+    "slow": {"bytes_per_sec": 2000.0},
+    "flaky": {"error_rate": 0.3, "reset_rate": 0.1, "stall_rate": 0.05},
+}
+
+# Prohlížeč drží fetch bez vlastního timeoutu zhruba takhle dlouho
+BROWSER_TIMEOUT = 300.0
+# HTTP/1.1 spojení prohlížeče na jeden host
+BROWSER_CONNECTIONS = 6
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+def parse_scenario(spec):
+    """'healthy:20,timeout:60' -> [("healthy", 20.0), ("timeout", 60.0)]"""
+    phases = []
+    for part in spec.split(","):
+        name, _, seconds = part.strip().partition(":")
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault {name!r} (choose from {', '.join(FAULTS)})")
+        phases.append((name, float(seconds or 30)))
+    return phases
+
+
+class Outcome:
+    """What the page got back for one load"""
+    NETWORK = "network"
+    CACHE = "cache"
+    FAILED = "failed"
+
+
+class ServiceWorker(abc.ABC):
+    """Model of one phone's service worker - subclasses implement handle()"""
+
+    name = None
+
+    def __init__(self, sim, options, rng):
+        self.sim = sim
+        self.options = options
+        self.rng = rng
+        # Poslední dobrý snímek - klíč bez ?t=, jinak by cache nikdy netrefila
+        self.cached_frame = None
+        self.client = HttpClient(concurrency=BROWSER_CONNECTIONS, per_host=BROWSER_CONNECTIONS,
+                                 timeout=BROWSER_TIMEOUT / sim.speed)
+        # Fronta na spojení prohlížeče - čekání v ní ještě není upstream požadavek
+        self.slots = asyncio.Semaphore(BROWSER_CONNECTIONS)
+
+    async def _exchange(self, url):
+        async with self.slots:
+            self.sim.upstream_started()
+            try:
+                return await self.client.fetch("GET", url)
+            finally:
+                self.sim.upstream_finished()
+
+    async def attempt(self, url, timeout=None):
+        """One upstream GET - (status, body) or (None, error name)
+
+        The timeout (model seconds) covers the wait for a free connection
+        too, like an AbortController timer started before fetch().
+        """
+        try:
+            exchange = self._exchange(url)
+            if timeout is not None:
+                exchange = asyncio.wait_for(exchange, timeout / self.sim.speed)
+            response, body = await exchange
+        except asyncio.TimeoutError:
+            return None, "timeout"
+        except (HttpError, OSError, asyncio.IncompleteReadError) as e:
+            return None, type(e).__name__
+        if response.status == 200:
+            self.cached_frame = body
+        return response.status, body
+
+    async def wait(self, seconds):
+        await asyncio.sleep(seconds / self.sim.speed)
+
+    def from_cache(self):
+        if self.cached_frame is None:
+            return Outcome.FAILED
+        self.sim.cache_hits += 1
+        return Outcome.CACHE
+
+    @abc.abstractmethod
+    async def handle(self, url):
+        """Serve one page request for `url` - returns an Outcome"""
+
+    async def close(self):
+        await self.client.close()
+
+
+class CurrentWorker(ServiceWorker):
+    """public/service-worker.js: caches.match() then fetch(), synthetic 200 on network errors"""
+
+    name = "current"
+
+    async def handle(self, url):
+        # caches.match() na URL s ?t=&cache= nikdy netrefí
+        self.sim.cache_lookups += 1
+        status, _ = await self.attempt(url)
+        if status is None:
+            # SW vrátí 200 '{}' - obrázek se stejně nedekóduje
+            self.sim.synthetic += 1
+            return Outcome.FAILED
+        return Outcome.NETWORK if status == 200 else Outcome.FAILED
+
+
+class RetryWorker(ServiceWorker):
+    """Retries network errors and 5xx, optionally with backoff"""
+
+    name = "retry"
+    backoff = False
+
+    async def fetch_with_retries(self, url):
+        for attempt in range(self.options["retries"] + 1):
+            if attempt and self.backoff:
+                ceiling = min(self.options["backoff_max"],
+                              self.options["backoff_base"] * 2 ** (attempt - 1))
+                await self.wait(self.rng.uniform(0, ceiling))
+            status, _ = await self.attempt(url, self.options["timeout"])
+            if status is not None and status < 500:
+                return status
+        return status
+
+    async def handle(self, url):
+        status = await self.fetch_with_retries(url)
+        return Outcome.NETWORK if status == 200 else Outcome.FAILED
+
+
+class BackoffWorker(RetryWorker):
+    name = "backoff"
+    backoff = True
+
+
+class BreakerWorker(BackoffWorker):
+    """Backoff plus a per-worker circuit breaker over upstream attempts.
+
+    `breaker_failures` consecutive failed attempts open it for
+    `breaker_cooldown`, then a single half-open probe decides. While open,
+    retries stop and the page gets the last good frame.
+    """
+
+    name = "breaker"
+
+    def __init__(self, sim, options, rng):
+        super().__init__(sim, options, rng)
+        self.failures = 0
+        self.open_until = None
+        self.probing = False
+
+    def allow(self):
+        if self.open_until is None:
+            return True
+        if self.probing or time.monotonic() < self.open_until:
+            return False
+        # Half-open: projde jen jeden zkušební požadavek
+        self.probing = True
+        return True
+
+    def record(self, ok):
+        probe, self.probing = self.probing, False
+        if ok:
+            self.failures = 0
+            self.open_until = None
+            return
+        self.failures += 1
+        if probe or self.failures >= self.options["breaker_failures"]:
+            self.open_until = time.monotonic() + self.options["breaker_cooldown"] / self.sim.speed
+            self.sim.breaker_trips += 1
+
+    async def handle(self, url):
+        for attempt in range(self.options["retries"] + 1):
+            if attempt:
+                ceiling = min(self.options["backoff_max"],
+                              self.options["backoff_base"] * 2 ** (attempt - 1))
+                await self.wait(self.rng.uniform(0, ceiling))
+            if not self.allow():
+                self.sim.short_circuited += 1
+                return self.from_cache()
+            status, _ = await self.attempt(url, self.options["timeout"])
+            self.record(status is not None and status < 500)
+            if status is not None and status < 500:
+                return Outcome.NETWORK if status == 200 else Outcome.FAILED
+        return self.from_cache()
+
+
+class StaleWorker(ServiceWorker):
+    """One attempt with a timeout, last good frame on failure"""
+
+    name = "stale"
+
+    async def handle(self, url):
+        status, _ = await self.attempt(url, self.options["timeout"])
+        if status == 200:
+            return Outcome.NETWORK
+        return self.from_cache()
+
+
+WORKERS = {worker.name: worker for worker in
+           (CurrentWorker, RetryWorker, BackoffWorker, BreakerWorker, StaleWorker)}
+
+
+class RetryStormSimulation:
+    """One policy against one scenario - phones, pages and the fake camera"""
+
+    def __init__(self, policy, phases, page="widget", phones=5, speed=1.0, options=None,
+                 seed=None, log=print):
+        self.policy = policy
+        self.phases = phases
+        self.page = PAGES[page]
+        self.page_name = page
+        self.phones = phones
+        self.speed = speed
+        self.options = options or {}
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.log = log
+        self.camera = None
+        self.camera_url = None
+        self.started = None
+        self.page_requests = [0] * len(phases)
+        self.upstream = [0] * len(phases)
+        self.outcomes = {Outcome.NETWORK: 0, Outcome.CACHE: 0, Outcome.FAILED: 0}
+        self.abandoned = 0
+        self.skipped = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.synthetic = 0
+        self.short_circuited = 0
+        self.breaker_trips = 0
+        self.active = 0
+        self.peak_active = 0
+        self.per_second = []
+        self.page_latency = []
+
+    @property
+    def duration(self):
+        return sum(seconds for _, seconds in self.phases)
+
+    def model_time(self):
+        return (time.monotonic() - self.started) * self.speed
+
+    def phase_index(self, at=None):
+        at = self.model_time() if at is None else at
+        for index, (_, seconds) in enumerate(self.phases):
+            at -= seconds
+            if at < 0:
+                return index
+        return len(self.phases) - 1
+
+    def upstream_started(self):
+        at = self.model_time()
+        self.upstream[self.phase_index(at)] += 1
+        second = int(at)
+        if second >= len(self.per_second):
+            self.per_second.extend([0] * (second + 1 - len(self.per_second)))
+        self.per_second[second] += 1
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def upstream_finished(self):
+        self.active -= 1
+
+    def apply_faults(self, name):
+        defaults = CameraFaults()
+        for key in ("error_rate", "stall_rate", "reset_rate", "truncate_rate",
+                    "latency", "latency_jitter", "bytes_per_sec"):
+            setattr(self.camera.faults, key, getattr(defaults, key))
+        for key, value in FAULTS[name].items():
+            if key in ("bytes_per_sec",):
+                value *= self.speed
+            setattr(self.camera.faults, key, value)
+
+    async def load(self, worker, url, state):
+        """One page refresh: the image load through the service worker"""
+        self.page_requests[self.phase_index()] += 1
+        started = time.monotonic()
+        task = asyncio.ensure_future(worker.handle(url))
+        state["tasks"].add(task)
+        task.add_done_callback(state["tasks"].discard)
+        try:
+            timeout = self.page["timeout"]
+            outcome = await asyncio.wait_for(asyncio.shield(task),
+                                             timeout / self.speed if timeout else None)
+            self.outcomes[outcome] += 1
+            self.page_latency.append((time.monotonic() - started) * self.speed)
+        except asyncio.TimeoutError:
+            # Stránka to vzdá, SW fetch ale běží dál a drží spojení
+            self.abandoned += 1
+            self.outcomes[Outcome.FAILED] += 1
+        finally:
+            state["in_flight"] = False
+
+    async def phone(self, index, stop_at):
+        worker = WORKERS[self.policy](self, self.options, random.Random(self.rng.random()))
+        state = {"in_flight": False, "tasks": set()}
+        interval = self.page["interval"] / self.speed
+        await asyncio.sleep(self.rng.uniform(0, interval))
+        next_tick = time.monotonic()
+        try:
+            while next_tick < stop_at:
+                if self.page["guard"] and state["in_flight"]:
+                    self.skipped += 1
+                else:
+                    state["in_flight"] = True
+                    url = f"{self.camera_url}?t={int(time.time() * 1000)}&cache={random.random()}"
+                    task = asyncio.ensure_future(self.load(worker, url, state))
+                    state["tasks"].add(task)
+                    task.add_done_callback(state["tasks"].discard)
+                next_tick += interval
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+        finally:
+            for task in list(state["tasks"]):
+                task.cancel()
+            await asyncio.gather(*state["tasks"], return_exceptions=True)
+            await worker.close()
+
+    async def run(self):
+        faults = CameraFaults(seed=self.seed)
+        self.camera = await FakeCamera(frame_size=20000, faults=faults).start()
+        self.camera_url = f"http://127.0.0.1:{self.camera.port}/api/camera-proxy/photo.jpg"
+        self.started = time.monotonic()
+        stop_at = self.started + self.duration / self.speed
+        phones = asyncio.gather(*(self.phone(index, stop_at) for index in range(self.phones)))
+        try:
+            elapsed = 0.0
+            for name, seconds in self.phases:
+                self.apply_faults(name)
+                elapsed += seconds
+                await asyncio.sleep(max(0.0, self.started + elapsed / self.speed - time.monotonic()))
+            await phones
+        finally:
+            server_requests = self.camera.stats["requests"]
+            await self.camera.stop()
+        return self.report(server_requests)
+
+    def report(self, server_requests=None):
+        fault_pages = sum(count for (name, _), count in zip(self.phases, self.page_requests)
+                          if name != "healthy")
+        fault_upstream = sum(count for (name, _), count in zip(self.phases, self.upstream)
+                             if name != "healthy")
+        total_pages = sum(self.page_requests)
+        phases = []
+        for (name, seconds), pages, upstream in zip(self.phases, self.page_requests,
+                                                    self.upstream):
+            phases.append({"fault": name, "seconds": seconds, "page_requests": pages,
+                           "upstream": upstream, "rate": upstream / seconds,
+                           "amplification": upstream / pages if pages else None})
+        return {
+            "policy": self.policy,
+            "page": self.page_name,
+            "phones": self.phones,
+            "page_requests": total_pages,
+            "upstream": sum(self.upstream),
+            "server_requests": server_requests,
+            "amplification": sum(self.upstream) / total_pages if total_pages else None,
+            "fault_amplification": fault_upstream / fault_pages if fault_pages else None,
+            "phases": phases,
+            "per_second": self.per_second,
+            "peak_rate": max(self.per_second, default=0),
+            "peak_concurrent": self.peak_active,
+            "outcomes": dict(self.outcomes),
+            "success_ratio": ((self.outcomes[Outcome.NETWORK] + self.outcomes[Outcome.CACHE])
+                              / total_pages if total_pages else None),
+            "cache_hit_ratio": self.cache_hits / total_pages if total_pages else None,
+            "cache_lookups": self.cache_lookups,
+            "synthetic_responses": self.synthetic,
+            "abandoned": self.abandoned,
+            "skipped_ticks": self.skipped,
+            "short_circuited": self.short_circuited,
+            "breaker_trips": self.breaker_trips,
+            "page_latency": summarize(self.page_latency),
+        }
+
+
+def sparkline(values, width=60):
+    """Per-second counts squeezed into `width` block characters (bucket maxima)"""
+    if not values:
+        return ""
+    step = max(1, -(-len(values) // width))
+    buckets = [max(values[index:index + step]) for index in range(0, len(values), step)]
+    peak = max(buckets) or 1
+    return "".join(SPARKS[min(len(SPARKS) - 1, value * len(SPARKS) // (peak + 1))]
+                   for value in buckets)
+
+
+def _ratio(value):
+    return f"{value:.2f}x" if value is not None else "-"
+
+
+def print_policy_report(report, log=print):
+    """Amplification, rate over time and cache use of one policy run"""
+    outcomes = report["outcomes"]
+    log(f"\n🛠️  Policy {report['policy']} ({report['phones']} x {report['page']})")
+    log(f"   page requests {report['page_requests']} -> upstream {report['upstream']} "
+        f"(camera saw {report['server_requests']}): amplification "
+        f"{_ratio(report['amplification'])}, during faults {_ratio(report['fault_amplification'])}")
+    for phase in report["phases"]:
+        log(f"   {phase['fault']:<8} {phase['seconds']:>5g}s  {phase['upstream']:>6} upstream "
+            f"{phase['rate']:>7.2f} req/s  {_ratio(phase['amplification']):>7}")
+    log(f"   req/s  {sparkline(report['per_second'])}  peak {report['peak_rate']}/s, "
+        f"{report['peak_concurrent']} concurrent")
+    log(f"   page got {outcomes['network']} fresh, {outcomes['cache']} cached, "
+        f"{outcomes['failed']} failed ({report['abandoned']} abandoned, "
+        f"{report['skipped_ticks']} ticks skipped) - cache hit ratio "
+        f"{report['cache_hit_ratio'] or 0:.0%}")
+    if report["synthetic_responses"]:
+        log(f"   🎭 {report['synthetic_responses']} synthetic 200 '{{}}' responses "
+            f"(the page cannot decode them)")
+    if report["breaker_trips"]:
+        log(f"   🔌 breaker tripped {report['breaker_trips']}x, "
+            f"{report['short_circuited']} requests short-circuited")
+    log(f"   page latency {format_summary(report['page_latency'])}")
+
+
+def print_comparison(reports, log=print):
+    """One row per policy, sorted by amplification during faults"""
+    log("\n📊 Policies by upstream amplification during faults:")
+    log(f"   {'policy':<9}{'fault amp':>10}{'peak/s':>8}{'conc':>6}{'success':>9}{'cache':>7}")
+    ranked = sorted(reports, key=lambda r: (r["fault_amplification"] is None,
+                                            r["fault_amplification"] or 0))
+    for report in ranked:
+        log(f"   {report['policy']:<9}{_ratio(report['fault_amplification']):>10}"
+            f"{report['peak_rate']:>8}{report['peak_concurrent']:>6}"
+            f"{report['success_ratio'] or 0:>9.0%}{report['cache_hit_ratio'] or 0:>7.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service worker retry storm simulator")
+    parser.add_argument("--policy", action="append", choices=POLICIES,
+                        help="policy to simulate (repeatable, default all)")
+    parser.add_argument("--page", choices=sorted(PAGES), default="widget",
+                        help="frontend refresh loop to model")
+    parser.add_argument("--phones", type=int, default=5, help="simulated phones")
+    parser.add_argument("--scenario", default="healthy:20,timeout:60,healthy:30",
+                        help=f"fault phases as fault:seconds ({', '.join(FAULTS)})")
+    parser.add_argument("--speed", type=float, default=10.0,
+                        help="run the model this many times faster than real time")
+    parser.add_argument("--retries", type=int, default=3, help="retry/backoff/breaker retries")
+    parser.add_argument("--timeout", type=float, default=8.0,
+                        help="per-attempt timeout of retry/backoff/breaker/stale [s]")
+    parser.add_argument("--backoff-base", type=float, default=1.0, help="[s]")
+    parser.add_argument("--backoff-max", type=float, default=30.0, help="[s]")
+    parser.add_argument("--breaker-failures", type=int, default=3,
+                        help="consecutive failed upstream attempts (retries included) that "
+                             "open the breaker")
+    parser.add_argument("--breaker-cooldown", type=float, default=30.0,
+                        help="seconds the breaker stays open before a probe [s]")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="save all reports as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        phases = parse_scenario(args.scenario)
+    except ValueError as e:
+        parser.error(str(e))
+    options = {"retries": args.retries, "timeout": args.timeout,
+               "backoff_base": args.backoff_base, "backoff_max": args.backoff_max,
+               "breaker_failures": args.breaker_failures,
+               "breaker_cooldown": args.breaker_cooldown}
+    policies = [name for name in POLICIES if name in args.policy] if args.policy else POLICIES
+    total = sum(seconds for _, seconds in phases)
+
+    print("🌪️  Service worker retry storm simulation")
+    print("=" * 50)
+    print(f"   {args.phones} phones x {args.page}, scenario {args.scenario} "
+          f"({total:g}s model, {total / args.speed:.1f}s per policy)")
+    reports = []
+    try:
+        for policy in policies:
+            simulation = RetryStormSimulation(policy, phases, args.page, args.phones,
+                                              args.speed, options, args.seed)
+            report = asyncio.run(simulation.run())
+            print_policy_report(report)
+            reports.append(report)
+    except KeyboardInterrupt:
+        print("\n🛑 Simulation interrupted")
+        return 130
+    except OSError as e:
+        print(f"❌ {e}")
+        return 1
+    if len(reports) > 1:
+        print_comparison(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scenario": args.scenario, "options": options, "reports": reports}, f,
+                      indent=2)
+        print(f"\n💾 Reports saved to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Statistiky po topicích s klouzavými okny + /metrics pro Prometheus
+Na topic: zprávy/s a bajty/s za několik oken (10 s, 1 min, 5 min),
+histogram intervalů mezi zprávami, stáří poslední zprávy a počty
+retained vs. živých zpráv. Každá zpráva = O(1) práce nad kruhovým
+bufferem sekundových přihrádek, paměť je pevná (i počet topiců).
+
+Z grafu se pak pozná nepravidelný heartbeat IoT/Brana/Status nebo
+zaseknutý publisher, bez procházení logů.
+
+Samostatně (bez paho):
+    python debug/topic_stats.py --broker 89.24.76.191:9001 --port 9108
+"""
+
+import argparse
+import asyncio
+import bisect
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mqtt_wire import AsyncMqttClient
+
+WINDOWS = (10, 60, 300)
+
+# Hranice histogramu intervalů [s] - heartbeat brány je v řádu sekund
+INTERARRIVAL_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+OVERFLOW_TOPIC = "__other__"
+
+
+class _TopicSeries:
+    """Fixed-size per-topic state - one-second ring buckets + counters"""
+
+    __slots__ = ("epochs", "counts", "sizes", "histogram", "gap_sum", "gap_count",
+                 "live", "retained", "total_bytes", "last_seen", "last_live")
+
+    def __init__(self, slots):
+        self.epochs = [-1] * slots
+        self.counts = [0] * slots
+        self.sizes = [0] * slots
+        self.histogram = [0] * (len(INTERARRIVAL_BUCKETS) + 1)
+        self.gap_sum = 0.0
+        self.gap_count = 0
+        self.live = 0
+        self.retained = 0
+        self.total_bytes = 0
+        self.last_seen = None
+        self.last_live = None
+
+
+class TopicStats:
+    """Per-topic sliding-window aggregates, safe to feed from the paho thread.
+
+    observe() is O(1): it touches one ring bucket and one histogram slot.
+    Window sums are computed at scrape time. Topics beyond `max_topics`
+    are folded into one "__other__" series so memory stays bounded under
+    a `#` subscription.
+    """
+
+    def __init__(self, windows=WINDOWS, max_topics=500, clock=time.monotonic):
+        self.windows = tuple(sorted(windows))
+        self.slots = self.windows[-1]
+        self.max_topics = max_topics
+        self.clock = clock
+        self.started = clock()
+        self.series = {}
+        self.overflowed = 0
+        self._lock = threading.Lock()
+
+    def _series_for(self, topic):
+        series = self.series.get(topic)
+        if series is None:
+            with self._lock:
+                series = self.series.get(topic)
+                if series is None:
+                    if len(self.series) >= self.max_topics:
+                        self.overflowed += 1
+                        topic = OVERFLOW_TOPIC
+                        series = self.series.get(topic)
+                    if series is None:
+                        series = self.series[topic] = _TopicSeries(self.slots)
+        return series
+
+    def observe(self, topic, size, retained=False, now=None):
+        now = self.clock() if now is None else now
+        series = self._series_for(topic)
+        series.total_bytes += size
+        if retained:
+            # Retained = snímek stavu při subscribe, ne živý provoz
+            series.retained += 1
+            if series.last_seen is None:
+                series.last_seen = now
+            return
+        series.live += 1
+        second = int(now)
+        index = second % self.slots
+        if series.epochs[index] != second:
+            series.epochs[index] = second
+            series.counts[index] = 0
+            series.sizes[index] = 0
+        series.counts[index] += 1
+        series.sizes[index] += size
+        if series.last_live is not None:
+            gap = now - series.last_live
+            series.histogram[bisect.bisect_left(INTERARRIVAL_BUCKETS, gap)] += 1
+            series.gap_sum += gap
+            series.gap_count += 1
+        series.last_seen = series.last_live = now
+
+    def window_rates(self, series, now=None):
+        """{window: (messages/s, bytes/s)} over the last `window` seconds"""
+        now = self.clock() if now is None else now
+        second = int(now)
+        uptime = max(1.0, now - self.started)
+        rates = {}
+        for window in self.windows:
+            messages = size = 0
+            for index in range(self.slots):
+                if second - series.epochs[index] < window:
+                    messages += series.counts[index]
+                    size += series.sizes[index]
+            span = min(float(window), uptime)
+            rates[window] = (messages / span, size / span)
+        return rates
+
+    def snapshot(self, now=None):
+        """Plain dict per topic - for logs and JSON"""
+        now = self.clock() if now is None else now
+        result = {}
+        for topic, series in list(self.series.items()):
+            rates = self.window_rates(series, now)
+            result[topic] = {
+                "live": series.live, "retained": series.retained, "bytes": series.total_bytes,
+                "last_seen_age": now - series.last_seen if series.last_seen is not None else None,
+                "rates": {f"{window}s": {"messages": m, "bytes": b}
+                          for window, (m, b) in rates.items()},
+                "mean_interarrival": series.gap_sum / series.gap_count if series.gap_count else None,
+            }
+        return result
+
+    def prometheus(self, now=None):
+        """Prometheus text exposition format (version 0.0.4)"""
+        now = self.clock() if now is None else now
+        items = sorted(list(self.series.items()))
+        lines = [
+            "# HELP brana_mqtt_messages_total Messages received per topic and kind.",
+            "# TYPE brana_mqtt_messages_total counter",
+        ]
+        for topic, series in items:
+            label = _label(topic)
+            lines.append(f'brana_mqtt_messages_total{{topic="{label}",kind="live"}} {series.live}')
+            lines.append(f'brana_mqtt_messages_total{{topic="{label}",kind="retained"}} {series.retained}')
+        lines += ["# HELP brana_mqtt_bytes_total Payload bytes received per topic.",
+                  "# TYPE brana_mqtt_bytes_total counter"]
+        lines += [f'brana_mqtt_bytes_total{{topic="{_label(topic)}"}} {series.total_bytes}'
+                  for topic, series in items]
+
+        rates = {topic: self.window_rates(series, now) for topic, series in items}
+        for name, position, help_text in (
+                ("brana_mqtt_message_rate", 0, "Live messages per second over a sliding window."),
+                ("brana_mqtt_byte_rate", 1, "Live payload bytes per second over a sliding window.")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for topic, _ in items:
+                for window, values in rates[topic].items():
+                    lines.append(f'{name}{{topic="{_label(topic)}",window="{window}s"}} '
+                                 f'{values[position]:.6g}')
+
+        lines += ["# HELP brana_mqtt_last_seen_age_seconds Seconds since the last message on the topic.",
+                  "# TYPE brana_mqtt_last_seen_age_seconds gauge"]
+        lines += [f'brana_mqtt_last_seen_age_seconds{{topic="{_label(topic)}"}} {now - series.last_seen:.3f}'
+                  for topic, series in items if series.last_seen is not None]
+
+        lines += ["# HELP brana_mqtt_interarrival_seconds Time between consecutive live messages.",
+                  "# TYPE brana_mqtt_interarrival_seconds histogram"]
+        for topic, series in items:
+            label = _label(topic)
+            cumulative = 0
+            for bound, count in zip(INTERARRIVAL_BUCKETS, series.histogram):
+                cumulative += count
+                lines.append(f'brana_mqtt_interarrival_seconds_bucket{{topic="{label}",le="{bound:g}"}} '
+                             f'{cumulative}')
+            lines.append(f'brana_mqtt_interarrival_seconds_bucket{{topic="{label}",le="+Inf"}} '
+                         f'{series.gap_count}')
+            lines.append(f'brana_mqtt_interarrival_seconds_sum{{topic="{label}"}} {series.gap_sum:.6f}')
+            lines.append(f'brana_mqtt_interarrival_seconds_count{{topic="{label}"}} {series.gap_count}')
+
+        lines += ["# HELP brana_mqtt_topics Distinct topics tracked.",
+                  "# TYPE brana_mqtt_topics gauge", f"brana_mqtt_topics {len(items)}",
+                  "# HELP brana_mqtt_topics_overflow_total New topics folded into __other__.",
+                  "# TYPE brana_mqtt_topics_overflow_total counter",
+                  f"brana_mqtt_topics_overflow_total {self.overflowed}"]
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsServer:
+    """Serves TopicStats on http://host:port/metrics from a daemon thread.
+
+    `extra` may return more exposition lines (e.g. output queue counters).
+    """
+
+    def __init__(self, stats, host="127.0.0.1", port=9108, extra=None):
+        self.stats = stats
+        self.extra = extra
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                text = server.stats.prometheus()
+                if server.extra is not None:
+                    text += "".join(f"{line}\n" for line in server.extra())
+                body = text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+async def run_exporter(args):
+    stats = TopicStats(max_topics=args.max_topics)
+    server = MetricsServer(stats, args.listen, args.port).start()
+    host, _, port = args.broker.partition(":")
+    client = AsyncMqttClient(f"topic-stats-{int(time.time())}",
+                             on_message=lambda topic, payload, qos, retain:
+                             stats.observe(topic, len(payload), retain))
+    print(f"📈 Metrics on http://{args.listen}:{server.port}/metrics")
+    try:
+        while True:
+            try:
+                return_code = await client.connect(host, int(port or 9001), args.transport)
+                if return_code != 0:
+                    raise ConnectionError(f"CONNACK rc={return_code}")
+                await client.subscribe([(topic_filter, 0) for topic_filter in args.filter])
+                print(f"✅ Subscribed to {', '.join(args.filter)} on {args.broker}")
+                while client.connected:
+                    await asyncio.sleep(1.0)
+                print(f"🔌 Disconnected ({client.disconnect_reason}), reconnecting...")
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                print(f"❌ {type(e).__name__}: {e} - retrying in 5s")
+                await asyncio.sleep(5.0)
+    finally:
+        client.abort()
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-topic MQTT statistics exporter")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--filter", action="append", default=None,
+                        help="topic filter to subscribe (repeatable, default #)")
+    parser.add_argument("--listen", default="127.0.0.1", help="metrics bind address")
+    parser.add_argument("--port", type=int, default=9108, help="metrics port")
+    parser.add_argument("--max-topics", type=int, default=500)
+    args = parser.parse_args(argv)
+    args.filter = args.filter or ["#"]
+    try:
+        return asyncio.run(run_exporter(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Kompaktní binární záznam MQTT provozu (segmentovaný log)
+Každá zpráva = čas přijetí, ID topicu, QoS, retain a payload. Topicy se
+internují do tabulky (v každém segmentu znovu, segmenty jsou samostatné),
+záznamy mají délkový prefix. Segmenty se rotují podle velikosti/stáří
+a celková velikost adresáře je omezená.
+
+Zápis běží ve vlákně na pozadí - paho callback jen přidá n-tici do fronty.
+Čtení prochází segmenty přes mmap, takže celý den provozu není v paměti.
+
+Formát segmentu:
+    hlavička  "BRNSEG01" + u64 čas založení (ns)
+    záznam    u8 typ + u32 délka těla + tělo
+      TOPIC   u32 id + název (UTF-8)
+      MSG     u64 čas přijetí (ns) + u32 id topicu + u8 příznaky + payload
+              (příznaky: bity 0-1 QoS, bit 2 retain)
+"""
+
+import argparse
+import collections
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+from mqtt_wire import topic_matches
+
+MAGIC = b"BRNSEG01"
+SEGMENT_HEADER = struct.Struct("<8sQ")
+RECORD_HEADER = struct.Struct("<BI")
+TOPIC_BODY = struct.Struct("<I")
+MESSAGE_BODY = struct.Struct("<QIB")
+RECORD_TOPIC = 1
+RECORD_MESSAGE = 2
+SEGMENT_SUFFIX = ".seg"
+
+
+class TrafficRecorder:
+    """Append-only segmented recorder with a background writer thread"""
+
+    def __init__(self, directory, segment_bytes=64 << 20, segment_seconds=3600,
+                 max_total_bytes=2 << 30, max_pending=200000, flush_interval=0.05):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_total_bytes = max_total_bytes
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+        self.segments_written = 0
+        self._pending = collections.deque()
+        self._file = None
+        self._segment_path = None
+        self._segment_size = 0
+        self._segment_started = 0.0
+        self._topic_ids = {}
+        self._running = False
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ----- volá se z paho vlákna
+
+    def record(self, topic, payload, qos=0, retain=False):
+        """Queue one message - O(1), no I/O, safe to call from the paho callback"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((time.time_ns(), topic, payload, qos, retain))
+
+    # ----- zapisovací vlákno
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while self._running or self._pending:
+                if self._pending:
+                    self._write_pending()
+                else:
+                    time.sleep(self.flush_interval)
+        finally:
+            self._close_segment()
+
+    def _write_pending(self):
+        pending = self._pending
+        chunks = []
+        while pending:
+            received_ns, topic, payload, qos, retain = pending.popleft()
+            if self._file is None or self._segment_full():
+                self._flush(chunks)
+                chunks = []
+                self._rotate()
+            topic_id = self._topic_ids.get(topic)
+            if topic_id is None:
+                topic_id = len(self._topic_ids) + 1
+                self._topic_ids[topic] = topic_id
+                name = topic.encode("utf-8")
+                chunks.append(RECORD_HEADER.pack(RECORD_TOPIC, TOPIC_BODY.size + len(name)))
+                chunks.append(TOPIC_BODY.pack(topic_id) + name)
+                self._segment_size += RECORD_HEADER.size + TOPIC_BODY.size + len(name)
+            flags = (qos & 0x03) | (0x04 if retain else 0)
+            size = MESSAGE_BODY.size + len(payload)
+            chunks.append(RECORD_HEADER.pack(RECORD_MESSAGE, size))
+            chunks.append(MESSAGE_BODY.pack(received_ns, topic_id, flags))
+            chunks.append(payload)
+            self._segment_size += RECORD_HEADER.size + size
+            self.recorded += 1
+        self._flush(chunks)
+
+    def _flush(self, chunks):
+        if chunks and self._file is not None:
+            self._file.write(b"".join(chunks))
+        if self._file is not None:
+            self._file.flush()
+
+    def _segment_full(self):
+        return (self._segment_size >= self.segment_bytes
+                or time.monotonic() - self._segment_started >= self.segment_seconds)
+
+    def _rotate(self):
+        self._close_segment()
+        now_ns = time.time_ns()
+        stamp = datetime.fromtimestamp(now_ns / 1e9).strftime("%Y%m%d-%H%M%S")
+        self.segments_written += 1
+        self._segment_path = os.path.join(
+            self.directory, f"brana-{stamp}-{os.getpid()}-{self.segments_written:04d}{SEGMENT_SUFFIX}")
+        self._file = open(self._segment_path, "wb", buffering=1 << 20)
+        self._file.write(SEGMENT_HEADER.pack(MAGIC, now_ns))
+        self._segment_size = SEGMENT_HEADER.size
+        self._segment_started = time.monotonic()
+        self._topic_ids = {}
+        self._enforce_cap()
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _enforce_cap(self):
+        """Delete the oldest segments while the directory exceeds max_total_bytes"""
+        segments = list_segments(self.directory)
+        total = sum(os.path.getsize(path) for path in segments)
+        for path in segments:
+            if total <= self.max_total_bytes or path == self._segment_path:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+
+# --- čtení -----------------------------------------------------------------
+
+RecordedMessage = collections.namedtuple(
+    "RecordedMessage", "received_ns topic qos retain payload")
+
+
+def list_segments(directory):
+    """Segment files sorted by name (= creation time)"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+
+def segment_start_ns(path):
+    with open(path, "rb") as f:
+        header = f.read(SEGMENT_HEADER.size)
+    if len(header) < SEGMENT_HEADER.size:
+        return None
+    magic, started_ns = SEGMENT_HEADER.unpack(header)
+    return started_ns if magic == MAGIC else None
+
+
+def read_segment(path, topic_filter=None, since_ns=None, until_ns=None):
+    """Yield RecordedMessage from one segment via mmap.
+
+    Messages on topics not matching `topic_filter` are skipped without
+    copying their payload. A truncated last record (segment still being
+    written) ends the scan quietly.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < SEGMENT_HEADER.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, _ = SEGMENT_HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a recorder segment")
+            topics = {}
+            wanted = {}
+            offset = SEGMENT_HEADER.size
+            header_size = RECORD_HEADER.size
+            while offset + header_size <= size:
+                record_type, length = RECORD_HEADER.unpack_from(mm, offset)
+                body = offset + header_size
+                if body + length > size:
+                    break
+                if record_type == RECORD_TOPIC:
+                    topic_id = TOPIC_BODY.unpack_from(mm, body)[0]
+                    name = mm[body + TOPIC_BODY.size:body + length].decode("utf-8")
+                    topics[topic_id] = name
+                    wanted[topic_id] = topic_filter is None or topic_matches(topic_filter, name)
+                elif record_type == RECORD_MESSAGE:
+                    received_ns, topic_id, flags = MESSAGE_BODY.unpack_from(mm, body)
+                    if (wanted.get(topic_id)
+                            and (since_ns is None or received_ns >= since_ns)
+                            and (until_ns is None or received_ns < until_ns)):
+                        yield RecordedMessage(received_ns, topics[topic_id], flags & 0x03,
+                                              bool(flags & 0x04),
+                                              mm[body + MESSAGE_BODY.size:body + length])
+                offset = body + length
+
+
+def read_messages(directory, topic_filter=None, since_ns=None, until_ns=None):
+    """Yield messages from all segments in time order, skipping whole
+    segments that start after `until_ns` or end before `since_ns`"""
+    segments = list_segments(directory)
+    starts = [segment_start_ns(path) for path in segments]
+    for index, path in enumerate(segments):
+        if until_ns is not None and starts[index] is not None and starts[index] >= until_ns:
+            break
+        next_start = starts[index + 1] if index + 1 < len(starts) else None
+        if since_ns is not None and next_start is not None and next_start < since_ns:
+            continue
+        yield from read_segment(path, topic_filter, since_ns, until_ns)
+
+
+def parse_time(value):
+    """'2025-01-31T08:00' / unix seconds -> ns"""
+    if value is None:
+        return None
+    try:
+        return int(float(value) * 1e9)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp() * 1e9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect recorded MQTT traffic")
+    parser.add_argument("command", choices=["dump", "stats"])
+    parser.add_argument("directory")
+    parser.add_argument("--topic", help="MQTT topic filter (+ and # wildcards)")
+    parser.add_argument("--since", help="ISO time or unix seconds")
+    parser.add_argument("--until", help="ISO time or unix seconds")
+    args = parser.parse_args(argv)
+
+    messages = read_messages(args.directory, args.topic, parse_time(args.since), parse_time(args.until))
+    if args.command == "dump":
+        for message in messages:
+            stamp = datetime.fromtimestamp(message.received_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            retain = " (retained)" if message.retain else ""
+            payload = message.payload.decode("utf-8", errors="replace")
+            print(f"[{stamp}] q{message.qos}{retain} {message.topic} = {payload}")
+        return 0
+
+    per_topic = {}
+    first = last = None
+    for message in messages:
+        count, size = per_topic.get(message.topic, (0, 0))
+        per_topic[message.topic] = (count + 1, size + len(message.payload))
+        first = message.received_ns if first is None else first
+        last = message.received_ns
+    total = sum(count for count, _ in per_topic.values())
+    print(f"📼 {total} messages on {len(per_topic)} topics in {len(list_segments(args.directory))} segments")
+    if first is not None:
+        print(f"⏱️  {datetime.fromtimestamp(first / 1e9)} → {datetime.fromtimestamp(last / 1e9)}")
+    for topic, (count, size) in sorted(per_topic.items(), key=lambda item: -item[1][0]):
+        print(f"  {count:>9} msgs {size / 1024:>10.1f} kB  {topic}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
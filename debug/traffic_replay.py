@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Přehrávání zaznamenaného MQTT provozu (debug/traffic_recorder.py)
+Znovu publikuje nahranou relaci proti libovolnému brokeru - lokálnímu
+stand-in brokeru nebo stagingu - v původním čase, N× zrychleně nebo
+maximální rychlostí, volitelně s přemapováním topiců.
+
+Během přehrávání měří, jestli stíhají odběratelé (simulovaní React klienti
+se stejnými subscriptions) a cache lastMessages v api/mqtt-proxy.js
+(dotazováním GET /api/mqtt-proxy). Sada rychlostí (--speed 1,10,100,max)
+ukáže, od jaké rychlosti proxy zaostává.
+
+Proxy proti lokálnímu brokeru:
+    MQTT_BROKER_URL=ws://127.0.0.1:1884 node dev-mqtt-proxy.js
+    python debug/traffic_replay.py REC_DIR --broker local:1884 \\
+        --proxy http://localhost:3003/api/mqtt-proxy --speed 1,10,100,max
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+
+from async_http import HttpClient, HttpError
+from bench_stats import format_summary, summarize
+from mqtt_wire import AsyncMqttClient, MqttProtocolError, is_loopback, topic_matches
+from sim_harness import GATE_COMMAND_TOPIC, SimulationHarness
+from traffic_recorder import parse_time, read_messages
+
+# Co odebírá React aplikace (src/services/mqttService.ts)
+CLIENT_FILTERS = ["IoT/Brana/Status", "IoT/Brana/Status2", "Log/Brana/ID"]
+
+# Kolik posledních zpráv na topic se drží pro porovnání s cache proxy
+PROXY_HISTORY = 10000
+
+
+def parse_speeds(spec):
+    """'1,10,max' -> [1.0, 10.0, None] (None = max rate)"""
+    speeds = []
+    for part in spec.split(","):
+        part = part.strip().lower()
+        speeds.append(None if part in ("max", "0") else float(part.rstrip("x")))
+    return speeds
+
+
+def speed_label(speed):
+    return "max" if speed is None else f"{speed:g}x"
+
+
+def parse_remap(specs):
+    """['IoT/Brana/=replay/IoT/Brana/'] -> [(old_prefix, new_prefix)]"""
+    remap = []
+    for spec in specs or []:
+        old, sep, new = spec.partition("=")
+        if not sep:
+            raise ValueError(f"Remap must be OLD=NEW, got {spec!r}")
+        remap.append((old, new))
+    return remap
+
+
+def remap_topic(topic, remap):
+    for old, new in remap:
+        if topic.startswith(old):
+            return new + topic[len(old):]
+    return topic
+
+
+class ReplaySubscriber:
+    """Simulated app client - matches deliveries to sends by per-topic order.
+
+    MQTT keeps per-topic order for one publisher, so the n-th message on a
+    topic belongs to the n-th replayed send. Foreign publishers on the
+    same topics skew this - remap to a private prefix on shared brokers.
+    """
+
+    def __init__(self, index, sent_times):
+        self.index = index
+        self.sent_times = sent_times
+        self.received = collections.Counter()
+        self.latencies = []
+        self.client = AsyncMqttClient(f"replay-sub-{index}-{int(time.time())}",
+                                      on_message=self._on_message)
+
+    def _on_message(self, topic, payload, qos, retain):
+        if retain:
+            return
+        now = time.perf_counter()
+        sent = self.sent_times.get(topic)
+        position = self.received[topic]
+        self.received[topic] = position + 1
+        if sent is not None and position < len(sent):
+            self.latencies.append(now - sent[position])
+
+
+class ProxyWatcher:
+    """Polls the proxy's GET endpoint and measures how far lastMessages
+    lags behind what was published.
+
+    Lag = time since the oldest replayed message the cache does not show
+    yet. Repeated payloads ("Brána zavřena" twice) are indistinguishable,
+    so the lag is a lower bound on such topics.
+    """
+
+    def __init__(self, url, interval=0.1, timeout=5.0):
+        self.url = url
+        self.interval = interval
+        self.client = HttpClient(concurrency=1, per_host=1, timeout=timeout)
+        self.history = {}
+        self.polls = 0
+        self.errors = 0
+        self.disconnected = 0
+        self.fresh = 0
+        self.stale = 0
+        self.lags = []
+        self.poll_latencies = []
+        self._task = None
+
+    def sent(self, topic, payload, sent_at):
+        history = self.history.get(topic)
+        if history is None:
+            history = self.history[topic] = collections.deque(maxlen=PROXY_HISTORY)
+        history.append((sent_at, payload))
+
+    def reset(self):
+        self.history = {}
+        self.polls = self.errors = self.disconnected = self.fresh = self.stale = 0
+        self.lags = []
+        self.poll_latencies = []
+
+    def _lag(self, topic, value, now):
+        history = self.history.get(topic)
+        if not history:
+            return None
+        if history[-1][1] == value:
+            return 0.0
+        missing_since = history[0][0]
+        for index in range(len(history) - 1, 0, -1):
+            if history[index - 1][1] == value:
+                missing_since = history[index][0]
+                break
+        return now - missing_since
+
+    async def poll_once(self):
+        started = time.perf_counter()
+        try:
+            response, body = await self.client.fetch("GET", self.url, read_limit=1 << 20)
+            document = json.loads(body)
+        except (HttpError, OSError, asyncio.TimeoutError, ValueError):
+            self.errors += 1
+            return
+        now = time.perf_counter()
+        self.polls += 1
+        self.poll_latencies.append(now - started)
+        if response.status != 200 or not document.get("connected"):
+            self.disconnected += 1
+        for topic, value in (document.get("messages") or {}).items():
+            lag = self._lag(topic, value, now)
+            if lag is None:
+                continue
+            self.lags.append(lag)
+            if lag == 0.0:
+                self.fresh += 1
+            else:
+                self.stale += 1
+
+    async def wait_ready(self, timeout=15.0):
+        """Poll until the proxy answers with a connected MQTT client"""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            polls, disconnected = self.polls, self.disconnected
+            await self.poll_once()
+            if self.polls > polls and self.disconnected == disconnected:
+                self.reset()
+                return True
+            await asyncio.sleep(self.interval)
+        self.reset()
+        return False
+
+    async def _run(self):
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self):
+        checks = self.fresh + self.stale
+        return {"url": self.url, "polls": self.polls, "errors": self.errors,
+                "disconnected": self.disconnected,
+                "stale_ratio": self.stale / checks if checks else None,
+                "lag": summarize(self.lags), "poll_latency": summarize(self.poll_latencies)}
+
+
+class TrafficReplay:
+    """Re-publishes recorded traffic at a given speed and measures consumers"""
+
+    def __init__(self, directory, host, port, transport="tcp", path="/mqtt",
+                 topic_filter=None, since_ns=None, until_ns=None, limit=None,
+                 remap=None, qos=None, include_retained=False, include_commands=False,
+                 subscribers=1, subscribe_filters=None, window=100, proxy=None, log=print):
+        self.directory = directory
+        self.host = host
+        self.port = port
+        self.transport = transport
+        self.path = path
+        self.topic_filter = topic_filter
+        self.since_ns = since_ns
+        self.until_ns = until_ns
+        self.limit = limit
+        self.remap = remap or []
+        self.qos = qos
+        self.include_retained = include_retained
+        self.include_commands = include_commands
+        self.subscriber_count = subscribers
+        self.subscribe_filters = subscribe_filters or [
+            remap_topic(topic, self.remap) for topic in CLIENT_FILTERS]
+        self.window = window
+        self.proxy = proxy
+        self.log = log
+
+    def _messages(self):
+        """Recorded messages worth replaying - broker $SYS, retained snapshots
+        and (unless asked) gate commands are skipped"""
+        count = 0
+        for message in read_messages(self.directory, self.topic_filter, self.since_ns, self.until_ns):
+            if message.topic.startswith("$"):
+                continue
+            if message.retain and not self.include_retained:
+                continue
+            if message.topic == GATE_COMMAND_TOPIC and not self.include_commands:
+                continue
+            yield message
+            count += 1
+            if self.limit is not None and count >= self.limit:
+                return
+
+    async def _connect(self, client):
+        return_code = await client.connect(self.host, self.port, self.transport, self.path)
+        if return_code != 0:
+            raise ConnectionError(f"{client.client_id}: CONNACK rc={return_code}")
+
+    async def run(self, speed=1.0, settle=2.0):
+        """One replay pass - speed None = as fast as the broker accepts"""
+        sent_times = {}
+        subscribers = [ReplaySubscriber(index, sent_times) for index in range(self.subscriber_count)]
+        publisher = AsyncMqttClient(f"replay-pub-{int(time.time())}")
+        for subscriber in subscribers:
+            await self._connect(subscriber.client)
+            await subscriber.client.subscribe([(topic, 1) for topic in self.subscribe_filters])
+        await self._connect(publisher)
+        if self.proxy is not None:
+            self.proxy.reset()
+
+        schedule_lags = []
+        pending = set()
+        errors = 0
+        sent = 0
+        watched = {}
+        first_ns = None
+        started = time.perf_counter()
+        for message in self._messages():
+            if first_ns is None:
+                first_ns = message.received_ns
+            if speed is not None:
+                target = started + (message.received_ns - first_ns) / 1e9 / speed
+                delay = target - time.perf_counter()
+                if delay > 0.001:
+                    await publisher.stream.drain()
+                    await asyncio.sleep(delay)
+                schedule_lags.append(max(0.0, time.perf_counter() - target))
+            topic = remap_topic(message.topic, self.remap)
+            payload = bytes(message.payload)
+            qos = message.qos if self.qos is None else self.qos
+            if not publisher.connected:
+                errors += 1
+                break
+            now = time.perf_counter()
+            is_watched = watched.get(topic)
+            if is_watched is None:
+                is_watched = watched[topic] = any(topic_matches(f, topic) for f in self.subscribe_filters)
+            if is_watched:
+                sent_times.setdefault(topic, []).append(now)
+            if self.proxy is not None:
+                self.proxy.sent(topic, payload.decode("utf-8", errors="replace"), now)
+            waiter = publisher.publish_nowait(topic, payload, qos, False)
+            sent += 1
+            if waiter is not None:
+                pending.add(waiter)
+                if len(pending) >= self.window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    errors += sum(1 for future in done if future.exception() is not None)
+            if sent % 64 == 0:
+                await publisher.stream.drain()
+        await publisher.stream.drain()
+        if pending:
+            done, pending = await asyncio.wait(pending, timeout=settle)
+            errors += sum(1 for future in done if future.exception() is not None) + len(pending)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(settle)
+
+        expected = sum(len(times) for times in sent_times.values())
+        received = [sum(subscriber.received.values()) for subscriber in subscribers]
+        latencies = [value for subscriber in subscribers for value in subscriber.latencies]
+        for client in [publisher] + [subscriber.client for subscriber in subscribers]:
+            await client.disconnect()
+        report = {
+            "speed": speed_label(speed),
+            "sent": sent,
+            "publish_errors": errors,
+            "duration": elapsed,
+            "rate": sent / elapsed if elapsed > 0 else 0.0,
+            "schedule_lag": summarize(schedule_lags),
+            "subscribers": {
+                "count": len(subscribers),
+                "expected_each": expected,
+                "lost": sum(max(0, expected - count) for count in received),
+                "extra": sum(max(0, count - expected) for count in received),
+                "latency": summarize(latencies),
+            },
+        }
+        if self.proxy is not None:
+            report["proxy"] = self.proxy.report()
+        return report
+
+
+def falls_behind(report, threshold):
+    """True when subscribers or the proxy lag more than `threshold` seconds at p95"""
+    subscribers = report["subscribers"]
+    if subscribers["lost"] or (subscribers["latency"]["p95"] or 0) > threshold:
+        return True
+    proxy = report.get("proxy")
+    if proxy is not None:
+        if proxy["errors"] or proxy["disconnected"]:
+            return True
+        if (proxy["lag"]["p95"] or 0) > threshold:
+            return True
+    return False
+
+
+def print_replay_report(report, log=print):
+    subscribers = report["subscribers"]
+    log(f"▶️  {report['speed']:>6}: {report['sent']} msgs in {report['duration']:.2f}s "
+        f"({report['rate']:.0f} msg/s), {report['publish_errors']} publish errors")
+    if report["schedule_lag"]["count"]:
+        log(f"    schedule lag:  {format_summary(report['schedule_lag'], unit='ms', scale=1000)}")
+    log(f"    subscribers:   {subscribers['count']} × {subscribers['expected_each']} expected, "
+        f"{subscribers['lost']} lost, latency "
+        f"{format_summary(subscribers['latency'], unit='ms', scale=1000)}")
+    proxy = report.get("proxy")
+    if proxy is not None:
+        stale = f"{proxy['stale_ratio']:.0%}" if proxy["stale_ratio"] is not None else "-"
+        log(f"    proxy cache:   {proxy['polls']} polls, {proxy['errors']} errors, "
+            f"{proxy['disconnected']} disconnected, stale {stale}, lag "
+            f"{format_summary(proxy['lag'], unit='ms', scale=1000)}")
+
+
+async def run_replay(args):
+    remap = parse_remap(args.remap)
+    host, _, port = args.broker.partition(":")
+    local = host == "local"
+    harness = None
+    if local:
+        harness = SimulationHarness("127.0.0.1", int(port or 0), gate=False, camera=False)
+        await harness.start()
+        host, port = "127.0.0.1", harness.mqtt_port
+        print(f"🏠 Stand-in broker on 127.0.0.1:{port} (tcp + ws)")
+    else:
+        port = int(port or 1883)
+    if (args.include_commands and not local and not is_loopback(host)
+            and remap_topic(GATE_COMMAND_TOPIC, remap) == GATE_COMMAND_TOPIC
+            and not args.yes_move_the_gate):
+        print("🛑 Replaying IoT/Brana/Ovladani to a remote broker moves the real gate - "
+              "remap it or add --yes-move-the-gate")
+        return 2
+
+    proxy = ProxyWatcher(args.proxy, args.proxy_interval) if args.proxy else None
+    replay = TrafficReplay(args.directory, host, port, args.transport, args.path,
+                           args.topic, parse_time(args.since), parse_time(args.until), args.limit,
+                           remap, args.qos, args.include_retained, args.include_commands,
+                           args.subscribers, args.subscribe, args.window, proxy)
+    reports = []
+    try:
+        if proxy is not None:
+            if not await proxy.wait_ready():
+                print(f"⚠️  Proxy {args.proxy} is not connected to the broker - measuring anyway")
+            proxy.start()
+        for speed in parse_speeds(args.speed):
+            try:
+                report = await replay.run(speed, args.settle)
+            except (OSError, ConnectionError, MqttProtocolError, asyncio.TimeoutError) as e:
+                print(f"❌ {speed_label(speed)}: {type(e).__name__}: {e}")
+                break
+            report["falls_behind"] = falls_behind(report, args.lag_threshold)
+            print_replay_report(report)
+            reports.append(report)
+    finally:
+        if proxy is not None:
+            await proxy.stop()
+            await proxy.client.close()
+        if harness is not None:
+            await harness.stop()
+
+    behind = [report["speed"] for report in reports if report["falls_behind"]]
+    if behind:
+        print(f"\n🐢 Consumers fall behind (> {args.lag_threshold * 1000:.0f}ms p95 or loss) "
+              f"from {behind[0]}")
+    elif reports:
+        print(f"\n✅ Consumers kept up at every speed up to {reports[-1]['speed']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "traffic_replay", "version": 1, "broker": args.broker,
+                       "directory": args.directory, "runs": reports}, f, indent=2)
+        print(f"💾 Result saved to {args.output}")
+    return 0 if reports else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded MQTT traffic against a broker")
+    parser.add_argument("directory", help="segment directory written by --record")
+    parser.add_argument("--broker", default="local",
+                        help="host:port, or local[:port] for the in-process stand-in broker")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="tcp")
+    parser.add_argument("--path", default="/mqtt", help="WebSocket path")
+    parser.add_argument("--speed", default="1",
+                        help="comma list of speed-ups, 'max' = no pacing (e.g. 1,10,100,max)")
+    parser.add_argument("--topic", help="only replay topics matching this filter")
+    parser.add_argument("--since", help="ISO time or unix seconds")
+    parser.add_argument("--until", help="ISO time or unix seconds")
+    parser.add_argument("--limit", type=int, help="replay at most N messages per pass")
+    parser.add_argument("--remap", action="append", metavar="OLD=NEW",
+                        help="rewrite topic prefix (repeatable)")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], help="override recorded QoS")
+    parser.add_argument("--window", type=int, default=100, help="max unacked QoS>0 publishes")
+    parser.add_argument("--include-retained", action="store_true",
+                        help="also replay retained snapshots captured at subscribe time")
+    parser.add_argument("--include-commands", action="store_true",
+                        help=f"also replay {GATE_COMMAND_TOPIC} (moves a real gate!)")
+    parser.add_argument("--yes-move-the-gate", action="store_true")
+    parser.add_argument("--subscribers", type=int, default=1, help="simulated app clients")
+    parser.add_argument("--subscribe", action="append", metavar="FILTER",
+                        help="subscriber filters (default: the app's topics, remapped)")
+    parser.add_argument("--proxy", metavar="URL", help="GET endpoint of api/mqtt-proxy.js to watch")
+    parser.add_argument("--proxy-interval", type=float, default=0.1, help="proxy poll interval [s]")
+    parser.add_argument("--lag-threshold", type=float, default=1.0,
+                        help="p95 lag [s] above which consumers count as falling behind")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="wait for late deliveries after each pass [s]")
+    parser.add_argument("--output", metavar="PATH", help="save result JSON")
+    args = parser.parse_args(argv)
+    print("🔁 MQTT traffic replay")
+    print("=" * 50)
+    return asyncio.run(run_replay(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,9 @@ app.use((req, res, next) => {
   next();
 });
 
+// Broker URL can be overridden (e.g. local stand-in broker for replay/load tests)
+const MQTT_BROKER_URL = process.env.MQTT_BROKER_URL || 'ws://89.24.76.191:9001';
+
 // Global MQTT client to maintain connection
 let mqttClient = null;
 let isConnecting = false;
@@ -33,10 +36,10 @@ function connectToMqtt() {
   }
 
   isConnecting = true;
-  console.log('DEV MQTT Proxy: Attempting to connect to ws://89.24.76.191:9001');
+  console.log(`DEV MQTT Proxy: Attempting to connect to ${MQTT_BROKER_URL}`);
   
   try {
-    mqttClient = mqtt.connect('ws://89.24.76.191:9001', {
+    mqttClient = mqtt.connect(MQTT_BROKER_URL, {
       clientId: `dev-proxy-${Math.random().toString(16).substring(2, 8)}`,
       clean: false,
       reconnectPeriod: 5000,
@@ -2,19 +2,35 @@
 """
 MQTT Debug Tool - Systematic testing of MQTT connections
 Helps identify root cause of connack timeout and multiple connections
+
+paho, requests a moduly z debug/ se importují až v testu, který je
+potřebuje - `--help` a jednotlivé kontroly tak startují hned.
 """
 
-import paho.mqtt.client as mqtt
+import argparse
 import json
-import time
+import os
 import threading
-import requests
-import subprocess
+import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Sdílené moduly z debug/ (asyncio MQTT, statistiky, ...)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'debug'))
+
+CHECKS = ("mqtt", "proxy", "connections", "multiple")
+
 class MqttDebugTool:
-    def __init__(self):
+    def __init__(self, broker_host="89.24.76.191", broker_port=9001,
+                 proxy_url="http://localhost:3003/api/mqtt-proxy", canary_rate=None, canary_qos=0,
+                 transport="websockets"):
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.transport = transport
+        self.proxy_url = proxy_url
+        self.canary_rate = canary_rate
+        self.canary_qos = canary_qos
         self.test_results = []
         self.active_clients = []
         self.message_count = 0
@@ -24,14 +40,38 @@ class MqttDebugTool:
         timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
         print(f"[{timestamp}] {level}: {message}")
         
-    def test_mqtt_broker_direct(self, broker_host="89.24.76.191", broker_port=9001):
-        """Test direct connection to MQTT broker"""
+    def test_mqtt_broker_direct(self, broker_host=None, broker_port=None, timeout=15.0,
+                                hold=10.0, until_message=False, canary_rate=None):
+        """Test direct connection to MQTT broker
+
+        Waits on events instead of polling: the connect wait ends with the
+        CONNACK, the stability hold ends early on a disconnect (fail) or,
+        with `until_message`, on the first IoT/Brana/Status message (pass).
+        With `canary_rate` a CanaryProbe (debug/canary.py) publishes during
+        the whole hold and this client's lag and callback time are compared
+        with the probe's reference subscriber.
+        """
+        import paho.mqtt.client as mqtt
+        
+        broker_host = broker_host or self.broker_host
+        broker_port = broker_port or self.broker_port
+        canary_rate = canary_rate or self.canary_rate
+        probe = tracker = None
+        if canary_rate:
+            from canary import CanaryProbe, CanaryTracker
+            # paho zde jede po TCP, kanárky stejnou cestou
+            probe = CanaryProbe(broker_host, broker_port, "tcp", canary_rate, self.canary_qos,
+                                log=self.log)
+            tracker = CanaryTracker("debug-tool")
         self.log("🔍 Testing direct MQTT broker connection...")
         
         client_id = f"debug-tool-{int(time.time())}"
         client = mqtt.Client(client_id)
         
         connection_result = {"success": False, "error": None, "time": None}
+        connected = threading.Event()
+        settled = threading.Event()
+        closing = threading.Event()
         
         def on_connect(client, userdata, flags, rc):
             if rc == 0:
@@ -39,60 +79,97 @@ class MqttDebugTool:
                 connection_result["time"] = time.time()
                 self.log(f"✅ Direct MQTT connection successful (rc={rc})")
                 client.subscribe("IoT/Brana/Status")
+                if probe is not None:
+                    client.subscribe(probe.topic, probe.qos)
             else:
                 connection_result["error"] = f"Connection failed with code {rc}"
                 self.log(f"❌ Direct MQTT connection failed (rc={rc})")
+            connected.set()
         
         def on_message(client, userdata, msg):
+            started = time.perf_counter()
+            if probe is not None and msg.topic == probe.topic:
+                tracker.observe(msg.payload)
+                return
             self.message_count += 1
             self.log(f"📨 Message: {msg.topic} = {msg.payload.decode()}")
+            if until_message and probe is None:
+                settled.set()
+            if tracker is not None:
+                tracker.callback_done(time.perf_counter() - started)
             
         def on_disconnect(client, userdata, rc):
             self.log(f"🔌 Disconnected from MQTT broker (rc={rc})")
+            if not closing.is_set() and connection_result["success"]:
+                # Spojení spadlo během testu stability
+                connection_result["success"] = False
+                connection_result["error"] = (f"Disconnected after "
+                                              f"{time.time() - connection_result['time']:.1f}s (rc={rc})")
+            elif not closing.is_set() and connection_result["error"] is None:
+                connection_result["error"] = f"Disconnected before CONNACK (rc={rc})"
+            connected.set()
+            settled.set()
             
         client.on_connect = on_connect
         client.on_message = on_message  
         client.on_disconnect = on_disconnect
         
-        start_time = time.time()
         try:
             self.log(f"🔌 Connecting to ws://{broker_host}:{broker_port}")
             client.connect(broker_host, broker_port, 60)
             client.loop_start()
             
             # Wait for connection result
-            timeout = 15
-            while time.time() - start_time < timeout:
-                if connection_result["success"] or connection_result["error"]:
-                    break
-                time.sleep(0.1)
-                
-            if not connection_result["success"] and not connection_result["error"]:
-                connection_result["error"] = "Connection timeout after 15s"
+            if not connected.wait(timeout):
+                connection_result["error"] = f"Connection timeout after {timeout:g}s"
                 
             # Keep connection alive for a bit to test stability
-            if connection_result["success"]:
-                self.log("📡 Testing message reception for 10 seconds...")
-                time.sleep(10)
+            if connection_result["success"] and probe is not None:
+                try:
+                    probe.start_in_thread()
+                except (OSError, ConnectionError, TimeoutError) as e:
+                    self.log(f"❌ Canary probe failed: {type(e).__name__}: {e}")
+                    probe = None
                 
-            client.loop_stop()
+            if connection_result["success"] and hold:
+                until = " or the first status message" if until_message and probe is None else ""
+                self.log(f"📡 Testing message reception for up to {hold:g} seconds{until}...")
+                settled.wait(hold)
+                
+            if probe is not None:
+                probe.stop_thread()
+            closing.set()
             client.disconnect()
+            client.loop_stop()
             
         except Exception as e:
             connection_result["error"] = str(e)
             self.log(f"❌ Exception: {e}")
             
         self.active_clients.append(client)
-        self.test_results.append({
+        entry = {
             "test": "direct_mqtt",
             "result": connection_result,
             "messages_received": self.message_count
-        })
+        }
+        if probe is not None and probe.published:
+            from canary import lag_breakdown, print_canary_report
+            reference, consumer = probe.reference.report(), tracker.report()
+            self.log(f"🐤 Canary published {probe.published}")
+            print_canary_report(reference, histograms=False, log=self.log)
+            print_canary_report(consumer, reference, log=self.log)
+            entry["canary"] = {"published": probe.published, "rate": canary_rate,
+                               "qos": probe.qos, "reference": reference, "consumer": consumer,
+                               "breakdown": lag_breakdown(consumer, reference)}
+        self.test_results.append(entry)
         
         return connection_result["success"]
         
-    def test_http_proxy(self, proxy_url="http://localhost:3003/api/mqtt-proxy"):
+    def test_http_proxy(self, proxy_url=None):
         """Test HTTP MQTT proxy"""
+        import requests
+        
+        proxy_url = proxy_url or self.proxy_url
         self.log("🌐 Testing HTTP MQTT proxy...")
         
         try:
@@ -127,96 +204,98 @@ class MqttDebugTool:
         self.test_results.append({"test": "http_proxy", "result": {"success": False}})
         return False
         
+    def test_http_proxy_load(self, proxy_url="http://localhost:3003/api/mqtt-proxy",
+                             rates=None, concurrency=None, duration=10.0, post_ratio=0.1):
+        """Sustained GET/POST load on the HTTP MQTT proxy over keep-alive connections
+
+        Steps through `rates` (req/s, open loop) and/or `concurrency`
+        (clients, closed loop) - see debug/proxy_load.py.
+        """
+        from proxy_load import run_proxy_load
+        
+        if not rates and not concurrency:
+            rates = [5, 10, 20, 50]
+        self.log(f"🌐 Load testing HTTP MQTT proxy {proxy_url}...")
+        
+        analysis = run_proxy_load(proxy_url, rates, concurrency, duration, post_ratio, log=self.log)
+        steps = [{key: step[key] for key in ("mode", "target", "requests", "error_rate", "errors",
+                                             "throughput", "latency", "histogram_ms", "over_time",
+                                             "degraded")}
+                 for step in analysis["steps"]]
+        
+        self.test_results.append({
+            "test": "http_proxy_load",
+            "result": {
+                "success": analysis["knee"] is None,
+                "url": proxy_url,
+                "knee": analysis["knee"],
+                "baseline_p95": analysis["baseline_p95"],
+                "steps": steps,
+            }
+        })
+        return analysis["knee"] is None
+        
     def check_network_connections(self):
         """Check active network connections to MQTT port"""
+        from conn_tracker import ConnectionTracker
+        
         self.log("🔍 Checking network connections to MQTT port...")
         
         try:
-            result = subprocess.run(['lsof', '-i', ':9001', '-P'], 
-                                  capture_output=True, text=True)
+            tracker = ConnectionTracker([self.broker_port])
+            connections = [info.as_dict() for info in tracker.snapshot().values()]
             
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # Skip header
-                self.log(f"📊 Found {len(lines)} active connections:")
-                
-                for line in lines:
-                    if line.strip():
-                        self.log(f"  🔗 {line}")
-                        
-                self.test_results.append({
-                    "test": "network_connections",
-                    "result": {"count": len(lines), "connections": lines}
-                })
-                
-            else:
-                self.log("❌ Failed to check network connections")
+            self.log(f"📊 Found {len(connections)} active connections:")
+            for connection in connections:
+                self.log(f"  🔗 [{connection['category']}] {connection['local']} -> "
+                         f"{connection['remote']} {connection['state']} "
+                         f"({connection['process'] or '?'}[{connection['pid'] or '?'}])")
+                    
+            self.test_results.append({
+                "test": "network_connections",
+                "result": {"count": len(connections), "connections": connections}
+            })
                 
         except Exception as e:
             self.log(f"❌ Network check exception: {e}")
             
-    def test_multiple_connections(self, count=3):
-        """Test creating multiple MQTT connections to identify issues"""
-        self.log(f"🔄 Testing {count} simultaneous MQTT connections...")
-        
-        clients = []
-        results = []
-        
-        def create_client(index):
-            client_id = f"debug-multi-{index}-{int(time.time())}"
-            client = mqtt.Client(client_id)
-            
-            result = {"client_id": client_id, "connected": False, "error": None}
-            
-            def on_connect(client, userdata, flags, rc):
-                if rc == 0:
-                    result["connected"] = True
-                    self.log(f"✅ Client {index} connected successfully")
-                else:
-                    result["error"] = f"Connection failed rc={rc}"
-                    self.log(f"❌ Client {index} failed: rc={rc}")
-                    
-            client.on_connect = on_connect
-            
-            try:
-                client.connect("89.24.76.191", 9001, 60)
-                client.loop_start()
-                time.sleep(5)  # Wait for connection
-                client.loop_stop()
-                
-            except Exception as e:
-                result["error"] = str(e)
-                self.log(f"❌ Client {index} exception: {e}")
-                
-            results.append(result)
-            clients.append(client)
-            
-        # Create multiple clients
-        threads = []
-        for i in range(count):
-            thread = threading.Thread(target=create_client, args=(i,))
-            threads.append(thread)
-            thread.start()
-            
-        # Wait for all to complete
-        for thread in threads:
-            thread.join()
-            
-        # Cleanup
-        for client in clients:
-            try:
-                client.disconnect()
-            except:
-                pass
-                
-        successful = sum(1 for r in results if r["connected"])
-        self.log(f"📊 Multiple connection test: {successful}/{count} successful")
-        
+    def test_multiple_connections(self, count=3, ramp=None, hold=5.0,
+                                  broker_host=None, broker_port=None,
+                                  transport=None):
+        """Test creating multiple MQTT connections to identify issues
+
+        All clients run on one asyncio loop (debug/mqtt_load.py), so `count`
+        can go into the thousands. `ramp` is a list of (clients, per_second)
+        stages; by default all clients start within one second.
+        """
+        from mqtt_load import print_load_report, run_load_test
+        
+        broker_host = broker_host or self.broker_host
+        broker_port = broker_port or self.broker_port
+        transport = transport or self.transport
+        stages = ramp or [(count, float(count))]
+        total = sum(clients for clients, _ in stages)
+        self.log(f"🔄 Testing {total} MQTT connections ({transport}://{broker_host}:{broker_port})...")
+        self.connection_attempts += total
+
+        report = run_load_test(broker_host, broker_port, stages, transport=transport,
+                               hold=hold, log=self.log)
+        print_load_report(report, log=self.log)
+        self.log(f"📊 Multiple connection test: {report['successful']}/{total} successful")
+
         self.test_results.append({
             "test": "multiple_connections",
-            "result": {"successful": successful, "total": count, "details": results}
+            "result": {
+                "successful": report["successful"],
+                "total": total,
+                "connack_latency": report["connack_latency"],
+                "errors": report["errors"],
+                "curve": report["curve"],
+                "details": report["details"],
+            }
         })
-        
-        return successful
+
+        return report["successful"]
         
     def generate_report(self):
         """Generate comprehensive debug report"""
@@ -240,6 +319,20 @@ class MqttDebugTool:
                     "❌ Direct MQTT connection failed - check broker accessibility and firewall"
                 )
                 
+            elif test["test"] == "direct_mqtt" and test.get("canary"):
+                canary = test["canary"]
+                if canary["consumer"]["lost"] > canary["reference"]["lost"]:
+                    report["recommendations"].append(
+                        f"⚠️ Debug client lost {canary['consumer']['lost']} canary messages the "
+                        f"reference subscriber got - the paho client falls behind"
+                    )
+                client_p95 = (canary["breakdown"]["p95"] or {}).get("client", 0.0)
+                if client_p95 > 0.05:
+                    report["recommendations"].append(
+                        f"⚠️ Python client adds {client_p95 * 1000:.0f}ms (p95) on top of broker "
+                        f"lag - check on_message callback time"
+                    )
+                
             elif test["test"] == "network_connections":
                 conn_count = test["result"].get("count", 0)
                 if conn_count > 4:
@@ -247,6 +340,13 @@ class MqttDebugTool:
                         f"⚠️ Too many MQTT connections ({conn_count}) - investigate connection leaks"
                     )
                     
+            elif test["test"] == "http_proxy_load" and test["result"]["knee"]:
+                knee = test["result"]["knee"]
+                unit = "req/s" if knee["mode"] == "rate" else "concurrent clients"
+                report["recommendations"].append(
+                    f"⚠️ HTTP proxy latency/errors degrade from {knee['target']:g} {unit}"
+                )
+                    
             elif test["test"] == "multiple_connections":
                 success_rate = test["result"]["successful"] / test["result"]["total"]
                 if success_rate < 0.8:
@@ -261,34 +361,51 @@ class MqttDebugTool:
         self.log("💾 Debug report saved to mqtt-debug-report.json")
         return report
         
-    def run_full_diagnosis(self):
+    def run_checks(self, checks=CHECKS, fast=False):
+        """Run the selected checks
+
+        Sequential by default. With `fast` the connection snapshot runs
+        first (before any of our own clients exist, so they are not counted
+        as leaks) and the remaining checks run in parallel, each finishing
+        as soon as its pass/fail criterion is met.
+        """
+        steps = {
+            "mqtt": lambda: self.test_mqtt_broker_direct(until_message=fast),
+            "proxy": self.test_http_proxy,
+            "connections": self.check_network_connections,
+            "multiple": lambda: self.test_multiple_connections(3, hold=0.0 if fast else 5.0),
+        }
+        if not fast:
+            for name in checks:
+                steps[name]()
+            return
+        if "connections" in checks:
+            self.check_network_connections()
+        parallel = [name for name in checks if name != "connections"]
+        if not parallel:
+            return
+        with ThreadPoolExecutor(max_workers=len(parallel)) as executor:
+            futures = {name: executor.submit(steps[name]) for name in parallel}
+        for name, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                self.log(f"❌ {name} check crashed: {type(error).__name__}: {error}")
+                self.test_results.append({"test": name, "result": {"success": False,
+                                                                   "error": str(error)}})
+        
+    def run_full_diagnosis(self, fast=False, checks=CHECKS):
         """Run complete MQTT diagnosis"""
-        self.log("🚀 Starting comprehensive MQTT diagnosis...")
+        self.log(f"🚀 Starting {'fast ' if fast else 'comprehensive '}MQTT diagnosis...")
         self.log("=" * 60)
+        started = time.perf_counter()
         
-        # Test 1: Direct MQTT connection
-        self.test_mqtt_broker_direct()
-        
-        time.sleep(2)
-        
-        # Test 2: HTTP Proxy
-        self.test_http_proxy()
-        
-        time.sleep(2)
-        
-        # Test 3: Check existing connections
-        self.check_network_connections() 
-        
-        time.sleep(2)
-        
-        # Test 4: Multiple connections stress test
-        self.test_multiple_connections(3)
+        self.run_checks(checks, fast)
         
         # Generate final report
         self.log("=" * 60)
         report = self.generate_report()
         
-        self.log("🎯 DIAGNOSIS COMPLETE!")
+        self.log(f"🎯 DIAGNOSIS COMPLETE in {time.perf_counter() - started:.1f}s!")
         self.log("📋 Check mqtt-debug-report.json for detailed results")
         
         if report["recommendations"]:
@@ -300,26 +417,102 @@ class MqttDebugTool:
             
         return report
 
-if __name__ == "__main__":
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MQTT Debug Tool")
+    parser.add_argument("--load", type=int, metavar="N",
+                        help="only run the connection load test with N clients")
+    parser.add_argument("--ramp", help="load test stages as clients@per_second, "
+                                       "e.g. 200@20,1000@100 (overrides --load)")
+    parser.add_argument("--hold", type=float, default=5.0,
+                        help="seconds to hold load test connections open")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--transport", choices=["websockets", "tcp"], default="websockets")
+    parser.add_argument("--sim", action="store_true",
+                        help="run against the in-process stand-in broker and fake gate "
+                             "(debug/sim_harness.py) instead of production")
+    parser.add_argument("--proxy-load", action="store_true",
+                        help="only run the HTTP proxy load test")
+    parser.add_argument("--proxy-url", default="http://localhost:3003/api/mqtt-proxy")
+    parser.add_argument("--rates", help="proxy load steps in req/s, e.g. 5,10,20,50")
+    parser.add_argument("--concurrency", help="proxy load steps in concurrent clients, e.g. 1,4,16")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per proxy load step")
+    parser.add_argument("--post-ratio", type=float, default=0.1,
+                        help="share of POST requests in the proxy load")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run the checks continuously and keep history in SQLite "
+                             "(debug/diag_daemon.py; query/compare via that script)")
+    parser.add_argument("--db", default="brana-diagnostics.db", help="daemon history database")
+    parser.add_argument("--fast", action="store_true",
+                        help="run independent checks in parallel and stop each one as soon "
+                             "as it passes or fails")
+    parser.add_argument("--check", action="append", choices=CHECKS,
+                        help="run only this check (repeatable, default all)")
+    parser.add_argument("--canary", type=float, default=None, metavar="RATE",
+                        help="during the direct MQTT hold publish sequence-numbered canaries "
+                             "at RATE/s and report broker vs client lag (debug/canary.py)")
+    parser.add_argument("--canary-qos", type=int, choices=(0, 1, 2), default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🤖 MQTT Debug Tool v1.0")
     print("=" * 50)
     
-    tool = MqttDebugTool()
+    harness = None
+    if args.sim:
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(camera=False, log=print).start_in_thread()
+        broker_host, broker_port = "127.0.0.1", harness.mqtt_port
+    else:
+        broker_host, _, broker_port = args.broker.partition(":")
+        broker_port = int(broker_port or 9001)
+    tool = MqttDebugTool(broker_host, broker_port, args.proxy_url, args.canary, args.canary_qos,
+                         args.transport)
     
     try:
+        if args.load or args.ramp:
+            from mqtt_load import parse_ramp
+            stages = parse_ramp(args.ramp) if args.ramp else None
+            successful = tool.test_multiple_connections(
+                args.load or 0, ramp=stages, hold=args.hold)
+            tool.generate_report()
+            return 0 if successful else 1
+
+        if args.daemon:
+            from diag_daemon import main as daemon_main
+            return daemon_main(["--db", args.db, "run", "--broker", f"{broker_host}:{broker_port}",
+                                "--transport", tool.transport, "--proxy-url", args.proxy_url])
+
+        if args.proxy_load:
+            from proxy_load import parse_steps
+            successful = tool.test_http_proxy_load(
+                args.proxy_url,
+                rates=parse_steps(args.rates) if args.rates else None,
+                concurrency=parse_steps(args.concurrency) if args.concurrency else None,
+                duration=args.duration, post_ratio=args.post_ratio)
+            tool.generate_report()
+            return 0 if successful else 1
+
         # Run comprehensive diagnosis
-        report = tool.run_full_diagnosis()
+        checks = [name for name in CHECKS if name in args.check] if args.check else CHECKS
+        report = tool.run_full_diagnosis(fast=args.fast, checks=checks)
         
         # Exit with appropriate code
         has_errors = any(not test["result"].get("success", True) 
                         for test in report["tests"] 
                         if "success" in test["result"])
                         
-        sys.exit(1 if has_errors else 0)
+        return 1 if has_errors else 0
         
     except KeyboardInterrupt:
         print("\n🛑 Debug session interrupted by user")
-        sys.exit(130)
+        return 130
     except Exception as e:
         print(f"💥 Fatal error: {e}")
-        sys.exit(1)
\ No newline at end of file
+        return 1
+    finally:
+        if harness is not None:
+            harness.stop_thread()
+
+if __name__ == "__main__":
+    sys.exit(main())
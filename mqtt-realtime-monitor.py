@@ -5,19 +5,67 @@ Helps identify when React app attempts connections and what goes wrong
 """
 
 import paho.mqtt.client as mqtt
+import argparse
 import json
+import os
+import sys
 import time
 import threading
 from datetime import datetime
 
+# Sdílené moduly z debug/ (simulace brokeru, ...)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'debug'))
+
+from output_queue import POLICIES, OutputQueue
+from canary import (CanaryProbe, CanaryTracker, add_canary_arguments, print_canary_report,
+                    prometheus_lines as canary_prometheus_lines)
+from session_tracker import SessionTracker, format_finding, print_session_report
+
 class MqttRealTimeMonitor:
-    def __init__(self):
+    def __init__(self, broker_host="89.24.76.191", broker_port=9001, recorder=None,
+                 output=None, stats_interval=0, topic_stats=None, sessions=None,
+                 session_interval=60.0, canary=None, canary_interval=30.0, shards=0,
+                 shard_mode="shared", shard_filters=None):
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.recorder = recorder
+        self.topic_stats = topic_stats
+        self.sessions = sessions
+        self.session_interval = session_interval
+        # Kanárky z CanaryProbe - zpoždění až do našeho callbacku vs. reference
+        self.canary = canary
+        self.canary_interval = canary_interval
+        self.canary_tracker = CanaryTracker("monitor") if canary is not None else None
+        # Výpis jde přes frontu - paho vlákno nikdy nečeká na terminál
+        self.output = output or OutputQueue()
+        self.stats_interval = stats_interval
+        # Příjem v N worker procesech (debug/sharded_monitor.py), 0 = jeden paho klient
+        self.shards = shards
+        self.shard_mode = shard_mode
+        self.shard_filters = shard_filters
         self.message_count = 0
         self.monitoring = True
         
+    @staticmethod
+    def _format_log(timestamp, level, message):
+        stamp = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+        return f"[{stamp}] {level}: {message}"
+        
+    @staticmethod
+    def _format_message(timestamp, topic, payload):
+        payload = payload.decode('utf-8', errors='ignore')
+        
+        # Highlight connection/disconnection events
+        if "connect" in topic.lower() or "disconnect" in topic.lower():
+            return MqttRealTimeMonitor._format_log(timestamp, "WARN", f"🔔 CONNECTION EVENT: {topic} = {payload}")
+        elif topic.startswith("IoT/Brana/"):
+            return MqttRealTimeMonitor._format_log(timestamp, "INFO", f"🚪 GATE MESSAGE: {topic} = {payload}")
+        elif topic.startswith("Log/Brana/"):
+            return MqttRealTimeMonitor._format_log(timestamp, "INFO", f"📝 ACTIVITY LOG: {topic} = {payload}")
+        return MqttRealTimeMonitor._format_log(timestamp, "INFO", f"📨 MQTT: {topic} = {payload}")
+        
     def log(self, message, level="INFO"):
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"[{timestamp}] {level}: {message}")
+        self.output.put(self._format_log, level, message, essential=True)
         
     def monitor_mqtt_messages(self):
         """Monitor all MQTT messages on broker"""
@@ -32,23 +80,32 @@ class MqttRealTimeMonitor:
                 client.subscribe("#", qos=1)
                 client.subscribe("$SYS/broker/clients/connected", qos=1)
                 client.subscribe("$SYS/broker/clients/disconnected", qos=1)
+                if self.sessions is not None:
+                    # Connect/disconnect řádky brokeru pro SessionTracker
+                    client.subscribe("$SYS/broker/log/#", qos=1)
             else:
                 self.log(f"❌ Monitor connection failed (rc={rc})")
                 
         def on_message(client, userdata, msg):
+            started = time.perf_counter()
+            if self.canary is not None and msg.topic == self.canary.topic:
+                # Kanárky se nevypisují ani nenahrávají, jen měří
+                self.canary_tracker.observe(msg.payload)
+                return
+            if self.recorder is not None:
+                # Jen do fronty - zápis na disk dělá vlákno recorderu
+                self.recorder.record(msg.topic, msg.payload, msg.qos, msg.retain)
+            if self.topic_stats is not None:
+                self.topic_stats.observe(msg.topic, len(msg.payload), msg.retain)
+            if self.sessions is not None:
+                self.sessions.observe(msg.topic, msg.payload)
             self.message_count += 1
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8', errors='ignore')
-            
-            # Highlight connection/disconnection events
-            if "connect" in topic.lower() or "disconnect" in topic.lower():
-                self.log(f"🔔 CONNECTION EVENT: {topic} = {payload}", "WARN")
-            elif topic.startswith("IoT/Brana/"):
-                self.log(f"🚪 GATE MESSAGE: {topic} = {payload}")
-            elif topic.startswith("Log/Brana/"):
-                self.log(f"📝 ACTIVITY LOG: {topic} = {payload}")
-            else:
-                self.log(f"📨 MQTT: {topic} = {payload}")
+            # Formátování a print až ve vlákně výstupní fronty
+            self.output.put(self._format_message, msg.topic, msg.payload)
+            duration = time.perf_counter() - started
+            self.output.callback_done(duration)
+            if self.canary_tracker is not None:
+                self.canary_tracker.callback_done(duration)
                 
         def on_disconnect(client, userdata, rc):
             self.log(f"🔌 Monitor disconnected (rc={rc})")
@@ -58,45 +115,86 @@ class MqttRealTimeMonitor:
         client.on_disconnect = on_disconnect
         
         try:
-            client.connect("89.24.76.191", 9001, 60)
+            client.connect(self.broker_host, self.broker_port, 60)
             client.loop_forever()
         except Exception as e:
             self.log(f"❌ Monitor exception: {e}")
             
-    def monitor_network_connections(self):
+    def monitor_sharded(self):
+        """Monitor all MQTT messages through worker processes, merged in receive order"""
+        from sharded_monitor import CANARY, LOG, ShardedListener, preformatted, print_shard_report
+        
+        sys_filters = ["$SYS/broker/clients/connected", "$SYS/broker/clients/disconnected"]
+        if self.sessions is not None:
+            sys_filters.append("$SYS/broker/log/#")
+            
+        def on_event(event):
+            received, kind, topic, size, retain, qos, line, payload, received_ns = event
+            if kind == CANARY:
+                self.canary_tracker.observe(payload, received_ns)
+                return
+            if kind == LOG:
+                self.output.put(preformatted, line, essential=True)
+                return
+            if self.recorder is not None:
+                self.recorder.record(topic, payload, qos, retain)
+            if self.topic_stats is not None:
+                self.topic_stats.observe(topic, size, retain)
+            if self.sessions is not None and payload is not None:
+                self.sessions.observe(topic, payload)
+            self.message_count += 1
+            # Řádek naformátoval worker, fronta ho jen vypíše
+            self.output.put(preformatted, line)
+            
+        def on_stats(count, total, maximum, canary_callback):
+            self.output.add_callbacks(count, total, maximum)
+            if self.canary_tracker is not None and canary_callback is not None:
+                self.canary_tracker.set_callback(canary_callback)
+                
+        listener = ShardedListener(self.broker_host, self.broker_port, self.shards, self.shard_mode,
+                                   self.shard_filters, sys_filters=sys_filters,
+                                   formatter=self._format_message, log_formatter=self._format_log,
+                                   canary_topic=self.canary.topic if self.canary is not None else None,
+                                   payloads=self.recorder is not None,
+                                   on_event=on_event, on_stats=on_stats)
+        self.log(f"📡 Starting MQTT message monitor with {self.shards} {self.shard_mode} shards...")
+        if self.shard_mode == "shared":
+            self.log("💡 Shared subscriptions get no retained messages - no initial state snapshot")
+        listener.start()
+        try:
+            listener.run()
+        finally:
+            listener.stop()
+            print_shard_report(listener.report(), log=self.log)
+            
+    def monitor_network_connections(self, interval=0.25):
         """Monitor network connections in real-time"""
-        import subprocess
+        from conn_tracker import ConnectionTracker, format_event
         
-        self.log("🔍 Starting network connection monitor...")
-        last_count = 0
+        tracker = ConnectionTracker([self.broker_port])
+        source = "/proc/net/tcp" if tracker.use_proc else "lsof"
+        self.log(f"🔍 Starting network connection monitor ({source}, every {interval}s)...")
+        last_count = len(tracker.current)
         
         while self.monitoring:
             try:
-                result = subprocess.run(['lsof', '-i', ':9001', '-P'], 
-                                      capture_output=True, text=True)
-                                      
-                if result.returncode == 0:
-                    lines = [l for l in result.stdout.strip().split('\n')[1:] if l.strip()]
-                    current_count = len(lines)
+                for kind, info, lifetime in tracker.poll():
+                    self.log(format_event(kind, info, lifetime), "WARN" if kind == "close" else "INFO")
                     
-                    if current_count != last_count:
-                        self.log(f"📊 MQTT connections changed: {last_count} → {current_count}", "WARN")
-                        for line in lines:
-                            if "chromium" in line.lower():
-                                self.log(f"  🌐 BROWSER: {line}")
-                            elif "node" in line.lower():
-                                self.log(f"  ⚙️  NODE: {line}")
-                            else:
-                                self.log(f"  ❓ OTHER: {line}")
-                        last_count = current_count
+                current_count = len(tracker.current)
+                if current_count != last_count:
+                    by_category = ", ".join(f"{k}={v}" for k, v in sorted(tracker.counts_by_category().items()))
+                    self.log(f"📊 MQTT connections changed: {last_count} → {current_count} ({by_category})", "WARN")
+                    last_count = current_count
                         
             except Exception as e:
                 self.log(f"❌ Network monitor error: {e}")
                 
-            time.sleep(2)  # Check every 2 seconds
+            time.sleep(interval)
             
     def run_monitor(self):
         """Run both monitors simultaneously"""
+        self.output.start()
         self.log("🚀 Starting comprehensive MQTT monitoring...")
         self.log("💡 This will show real-time MQTT activity and connection changes")
         self.log("🔍 Looking for connack timeouts and connection issues...")
@@ -107,21 +205,195 @@ class MqttRealTimeMonitor:
         network_thread.daemon = True
         network_thread.start()
         
+        if self.stats_interval:
+            stats_thread = threading.Thread(target=self.report_output_stats)
+            stats_thread.daemon = True
+            stats_thread.start()
+        
+        if self.sessions is not None:
+            sessions_thread = threading.Thread(target=self.report_sessions)
+            sessions_thread.daemon = True
+            sessions_thread.start()
+        
+        if self.canary is not None:
+            try:
+                self.canary.start_in_thread()
+            except (OSError, ConnectionError, TimeoutError) as e:
+                self.log(f"❌ Canary probe failed: {type(e).__name__}: {e}")
+                self.canary = None
+        if self.canary is not None:
+            canary_thread = threading.Thread(target=self.report_canary)
+            canary_thread.daemon = True
+            canary_thread.start()
+        
         # Run MQTT monitor in main thread
         try:
-            self.monitor_mqtt_messages()
+            if self.shards:
+                self.monitor_sharded()
+            else:
+                self.monitor_mqtt_messages()
         except KeyboardInterrupt:
             self.log("🛑 Monitoring stopped by user")
             self.monitoring = False
         except Exception as e:
             self.log(f"💥 Fatal error: {e}")
+        finally:
+            self.monitoring = False
+            if self.recorder is not None:
+                self.recorder.stop()
+                self.log(f"📼 Recorded {self.recorder.recorded} messages "
+                         f"({self.recorder.dropped} dropped) to {self.recorder.directory}")
+            if self.sessions is not None:
+                print_session_report(self.sessions.report(), log=self.log)
+            if self.canary is not None:
+                self.canary.stop_thread()
+                self.log(f"🐤 Canary published {self.canary.published}")
+                print_canary_report(self.canary.reference.report(), log=self.log)
+                print_canary_report(self.canary_tracker.report(),
+                                    self.canary.reference.report(), log=self.log)
+            self.log(f"📤 Output {self.output.describe()}")
+            self.output.stop()
+            
+    def output_metrics(self):
+        """Output queue counters as extra /metrics lines"""
+        stats = self.output.stats()
+        yield "# TYPE brana_monitor_output_queue_depth gauge"
+        yield f"brana_monitor_output_queue_depth {stats['depth']}"
+        yield "# TYPE brana_monitor_output_dropped_total counter"
+        yield f"brana_monitor_output_dropped_total {stats['dropped'] + stats['sampled_out']}"
+        yield "# TYPE brana_monitor_callback_seconds_max gauge"
+        yield f"brana_monitor_callback_seconds_max {stats['callback_max']:.6f}"
+        yield "# TYPE brana_monitor_callback_seconds_avg gauge"
+        yield f"brana_monitor_callback_seconds_avg {stats['callback_avg']:.9f}"
+        if self.sessions is not None:
+            yield from self.sessions.prometheus_lines()
+        if self.canary is not None:
+            yield from canary_prometheus_lines([self.canary.reference, self.canary_tracker])
+            
+    def report_output_stats(self):
+        """Periodically log output queue depth, drops and callback time"""
+        while self.monitoring:
+            time.sleep(self.stats_interval)
+            self.log(f"📤 Output {self.output.describe()}")
+            
+    def report_sessions(self):
+        """Periodically log the session summary, new findings as WARN"""
+        reported = set()
+        while self.monitoring:
+            time.sleep(self.session_interval)
+            report = self.sessions.report()
+            print_session_report(report, log=self.log)
+            for finding in report["findings"]:
+                key = (finding["kind"], finding["family"], finding["client_id"])
+                if key not in reported:
+                    reported.add(key)
+                    self.log(f"🚨 Session leak suspect: {format_finding(finding)}", "WARN")
+            
+    def report_canary(self):
+        """Periodically log the monitor's canary lag split, histograms only at exit"""
+        while self.monitoring:
+            time.sleep(self.canary_interval)
+            print_canary_report(self.canary_tracker.report(), self.canary.reference.report(),
+                                histograms=False, log=self.log)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MQTT Real-Time Monitor")
+    parser.add_argument("--broker", default="89.24.76.191:9001", help="host:port")
+    parser.add_argument("--sim", action="store_true",
+                        help="monitor the in-process stand-in broker with a fake gate "
+                             "(debug/sim_harness.py) instead of production")
+    parser.add_argument("--sim-rate", type=float, default=1.0,
+                        help="fake gate status + activity messages per second (--sim)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="append every message to a segmented binary log "
+                             "(read it back with debug/traffic_recorder.py)")
+    parser.add_argument("--segment-mb", type=float, default=64,
+                        help="rotate record segments at this size [MB]")
+    parser.add_argument("--record-cap-mb", type=float, default=2048,
+                        help="delete oldest segments above this total size [MB]")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="max output lines waiting for the writer thread")
+    parser.add_argument("--overflow", choices=POLICIES, default="drop-oldest",
+                        help="what to do when the output queue is full")
+    parser.add_argument("--sample-every", type=int, default=10,
+                        help="keep every Nth message under pressure (--overflow sample)")
+    parser.add_argument("--stats-interval", type=float, default=0,
+                        help="log output queue counters every N seconds (0 = only at exit)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve per-topic stats on http://127.0.0.1:PORT/metrics (Prometheus)")
+    parser.add_argument("--sessions", action="store_true",
+                        help="track client sessions from $SYS log events and flag reconnect "
+                             "storms, orphans and client ID growth (debug/session_tracker.py)")
+    parser.add_argument("--session-interval", type=float, default=60.0,
+                        help="log the session summary every N seconds (--sessions)")
+    add_canary_arguments(parser)
+    parser.add_argument("--canary-interval", type=float, default=30.0,
+                        help="log the canary lag summary every N seconds (--canary)")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="receive in N worker processes merged by receive time "
+                             "(debug/sharded_monitor.py), 0 = single paho client")
+    parser.add_argument("--shard-mode", choices=("shared", "filters"), default="shared",
+                        help="shared: $share/ subscription split by the broker (no retained "
+                             "snapshot); filters: --shard-filter values split between shards")
+    parser.add_argument("--shard-filter", action="append", metavar="FILTER",
+                        help="topic filter (repeatable, must not overlap), e.g. IoT/# Log/#")
+    args = parser.parse_args(argv)
+    if args.shards < 0:
+        parser.error("--shards must be 0 or more")
+    if not args.shards and (args.shard_filter or args.shard_mode != "shared"):
+        parser.error("--shard-mode/--shard-filter need --shards N")
+    if args.shards:
+        from sharded_monitor import shard_subscriptions
+        try:
+            # Stejná kontrola jako ShardedListener - chyba ještě před startem simulace a fronty
+            shard_subscriptions(args.shards, args.shard_mode, args.shard_filter)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 if __name__ == "__main__":
+    args = parse_args()
     print("🔍 MQTT Real-Time Monitor v1.0")
     print("================================")
     print("💡 Press Ctrl+C to stop monitoring")
     print("🎯 Open http://localhost:3000 in browser to trigger MQTT activity")
     print()
     
-    monitor = MqttRealTimeMonitor()
+    if args.sim:
+        from sim_harness import SimulationHarness
+        harness = SimulationHarness(camera=False, log=print,
+                                    gate_options={"status_rate": args.sim_rate,
+                                                  "log_rate": args.sim_rate}).start_in_thread()
+        broker_host, broker_port = "127.0.0.1", harness.mqtt_port
+    else:
+        broker_host, _, broker_port = args.broker.partition(":")
+        broker_port = int(broker_port or 9001)
+
+    recorder = None
+    if args.record:
+        from traffic_recorder import TrafficRecorder
+        recorder = TrafficRecorder(args.record,
+                                   segment_bytes=int(args.segment_mb * 1024 * 1024),
+                                   max_total_bytes=int(args.record_cap_mb * 1024 * 1024)).start()
+        print(f"📼 Recording all messages to {args.record}")
+
+    output = OutputQueue(maxsize=args.queue_size, policy=args.overflow,
+                         sample_every=args.sample_every)
+    topic_stats = None
+    if args.metrics_port is not None:
+        from topic_stats import MetricsServer, TopicStats
+        topic_stats = TopicStats()
+
+    canary = None
+    if args.canary:
+        # Monitor se připojuje přes paho po TCP, kanárky jdou stejnou cestou
+        canary = CanaryProbe(broker_host, broker_port, "tcp", args.canary, args.canary_qos)
+
+    monitor = MqttRealTimeMonitor(broker_host, broker_port, recorder, output, args.stats_interval,
+                                  topic_stats, SessionTracker() if args.sessions else None,
+                                  args.session_interval, canary, args.canary_interval,
+                                  args.shards, args.shard_mode, args.shard_filter)
+    if topic_stats is not None:
+        metrics = MetricsServer(topic_stats, port=args.metrics_port, extra=monitor.output_metrics).start()
+        print(f"📈 Metrics on http://127.0.0.1:{metrics.port}/metrics")
     monitor.run_monitor()
\ No newline at end of file